@@ -0,0 +1,64 @@
+#!/usr/bin/env python3
+# This file is part of Xpra.
+# Copyright (C) 2021 Antoine Martin <antoine@xpra.org>
+# Xpra is released under the terms of the GNU GPL v2, or, at your option, any
+# later version. See the file COPYING for details.
+
+import unittest
+
+try:
+    from xpra.buffers.membuf import get_pooled_membuf, get_pool_info, clear_pool    #@UnresolvedImport
+    HAS_MEMBUF = True
+except ImportError:
+    HAS_MEMBUF = False
+
+
+@unittest.skipIf(not HAS_MEMBUF, "no membuf module found")
+class TestMemBufPool(unittest.TestCase):
+
+    def setUp(self):
+        clear_pool()
+
+    def test_reuse(self):
+        info = get_pool_info()
+        if not info.get("enabled") or not info.get("slots"):
+            return
+        size = max(1024*1024, info.get("min-size", 0))
+        buf = get_pooled_membuf(size)
+        assert len(buf)==size
+        ptr = buf.get_mem_ptr()
+        del buf
+        info = get_pool_info()
+        assert info.get("size")>=size
+        #a slightly smaller buffer should come from the same size class:
+        buf = get_pooled_membuf(size-16)
+        assert buf.get_mem_ptr()==ptr
+        hits = get_pool_info().get("hits")
+        assert hits>0
+        assert len(memoryview(buf))==size-16
+        del buf
+        clear_pool()
+        assert get_pool_info().get("size")==0
+
+    def test_limits(self):
+        info = get_pool_info()
+        slots = info.get("slots")
+        size = max(1024*1024, info.get("min-size", 0))
+        bufs = [get_pooled_membuf(size) for _ in range(slots+2)]
+        freed = info.get("freed")
+        del bufs
+        info = get_pool_info()
+        assert sum(info.get("buffers", {}).values())<=slots
+        if info.get("enabled"):
+            #the buffers which did not fit in the pool have been freed:
+            assert info.get("freed")>=freed+2
+        #small buffers are not pooled:
+        small = get_pooled_membuf(16)
+        assert len(small)==16
+
+
+def main():
+    unittest.main()
+
+if __name__ == '__main__':
+    main()
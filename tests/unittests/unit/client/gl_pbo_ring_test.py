@@ -0,0 +1,273 @@
+#!/usr/bin/env python3
+# This file is part of Xpra.
+# Copyright (C) 2021 Antoine Martin <antoine@xpra.org>
+# Xpra is released under the terms of the GNU GPL v2, or, at your option, any
+# later version. See the file COPYING for details.
+
+import os
+import unittest
+from unittest.mock import patch
+
+#use Mesa's software renderer so this can run without a GPU,
+#this must be set before loading OpenGL:
+os.environ.setdefault("LIBGL_ALWAYS_SOFTWARE", "1")
+os.environ.setdefault("PYOPENGL_PLATFORM", "osmesa")
+
+from xpra.util import AdHocStruct
+from unit.test_util import silence_warn
+
+try:
+    from xpra.client.gl import gl_pbo_ring
+    from xpra.client.gl.gl_pbo_ring import (
+        PBORing, PBOSlot,
+        FREE, WRITING, STAGED, PENDING, PLANE_ALIGNMENT,
+        is_pbo_ring_supported,
+        )
+except Exception:
+    gl_pbo_ring = None
+
+
+def make_gl_context(width=64, height=64):
+    """ returns a current OSMesa context and its buffer, or None """
+    try:
+        from OpenGL import osmesa, arrays
+        from OpenGL.GL import GL_UNSIGNED_BYTE
+        context = osmesa.OSMesaCreateContextExt(osmesa.OSMESA_RGBA, 24, 0, 0, None)
+        if not context:
+            return None
+        buf = arrays.GLubyteArray.zeros((height, width, 4))
+        if not osmesa.OSMesaMakeCurrent(context, buf, GL_UNSIGNED_BYTE, width, height):
+            osmesa.OSMesaDestroyContext(context)
+            return None
+        return context, buf
+    except Exception:
+        return None
+
+def destroy_gl_context(gl_context):
+    from OpenGL import osmesa
+    osmesa.OSMesaDestroyContext(gl_context[0])
+
+
+def make_ring(nslots=2, slot_size=1024):
+    #a ring backed by plain memory instead of pixel buffer objects:
+    ring = PBORing(nslots, slot_size)
+    ring.slots = [PBOSlot(i, 0, memoryview(bytearray(slot_size))) for i in range(nslots)]
+    return ring
+
+
+@unittest.skipIf(gl_pbo_ring is None, "OpenGL is not available")
+class TestPBORingState(unittest.TestCase):
+
+    def test_offsets(self):
+        ring = make_ring(1, 1024)
+        planes = (b"y"*100, b"u"*30, b"v"*30)
+        pixels = ring.stage(planes, (100, 30, 30))
+        assert pixels
+        #each plane starts on an aligned offset:
+        assert pixels.offsets==(0, 128, 192), "got %s" % (pixels.offsets, )
+        assert all(offset%PLANE_ALIGNMENT==0 for offset in pixels.offsets)
+        assert len(pixels)==256
+        view = pixels.slot.view
+        for plane, offset in zip(planes, pixels.offsets):
+            assert view[offset:offset+len(plane)]==plane
+        assert pixels.get_pixels(1).value==128
+
+    def test_state_machine(self):
+        ring = make_ring(2)
+        assert ring.is_idle() and not ring.has_pending()
+        p1 = ring.stage((b"1"*10, ), (10, ))
+        p2 = ring.stage((b"2"*10, ), (10, ))
+        assert p1.slot.state==STAGED and p2.slot.state==STAGED and p1.slot is not p2.slot
+        #all the slots are in use:
+        assert ring.stage((b"3"*10, ), (10, )) is None
+        assert ring.full==1
+        assert not ring.is_idle()
+        #released without being uploaded:
+        p1.release()
+        assert p1.slot.state==FREE
+        p3 = ring.stage((b"3"*10, ), (10, ))
+        assert p3.slot is p1.slot
+        #once the upload is queued, release does nothing:
+        p3.slot.state = PENDING
+        p3.release()
+        assert p3.slot.state==PENDING and ring.has_pending()
+        #the copy failed:
+        p2.release()
+        assert ring.stage(("not a buffer", ), (10, )) is None
+        assert p2.slot.state==FREE
+        #retired rings don't stage anything:
+        ring.retire()
+        assert ring.stage((b"4"*10, ), (10, )) is None
+        ring.discard()
+        assert ring.closed and not ring.slots
+
+    def test_oversize(self):
+        ring = make_ring(1, 256)
+        assert ring.stage((b"0"*200, b"1"*100), (200, 100)) is None, "aligned planes don't fit"
+        assert ring.oversize==1
+        assert ring.stage((b"0"*256, ), (256, ))
+
+    def test_writing(self):
+        ring = make_ring(1)
+        ring.slots[0].state = WRITING
+        assert ring.stage((b"0"*10, ), (10, )) is None
+        ring.writers = 0
+        ring.wait(0)
+
+    def test_info(self):
+        ring = make_ring(3, 4096)
+        ring.stage((b"0"*10, ), (10, ))
+        ring.stage((b"0"*8192, ), (8192, ))
+        info = ring.get_info()
+        assert info["slots"]==3 and info["slot-size"]==4096
+        assert info["staged"]==1 and info["oversize"]==1 and info["uploads"]==0
+        assert info["state"]=={"free" : 2, "writing" : 0, "staged" : 1, "pending" : 0}, "got %s" % (info["state"], )
+        assert not info["retired"] and not info["closed"]
+
+
+@unittest.skipIf(gl_pbo_ring is None, "OpenGL is not available")
+class TestPBORingGL(unittest.TestCase):
+
+    def setUp(self):
+        self.gl_context = make_gl_context()
+        if not self.gl_context:
+            self.skipTest("no OpenGL context available")
+        if not is_pbo_ring_supported():
+            destroy_gl_context(self.gl_context)
+            self.skipTest("pixel buffer object rings are not supported by this driver")
+
+    def tearDown(self):
+        destroy_gl_context(self.gl_context)
+
+    def upload(self, pixels, size=16):
+        #upload an RGBA texture from the pixel buffer object and read it back:
+        from OpenGL.GL import (
+            GL_TEXTURE_2D, GL_RGBA, GL_UNSIGNED_BYTE,
+            glGenTextures, glBindTexture, glTexImage2D, glGetTexImage, glDeleteTextures,
+            )
+        texture = glGenTextures(1)
+        glBindTexture(GL_TEXTURE_2D, texture)
+        with pixels:
+            glTexImage2D(GL_TEXTURE_2D, 0, GL_RGBA, size, size, 0, GL_RGBA, GL_UNSIGNED_BYTE, pixels.get_pixels())
+        data = glGetTexImage(GL_TEXTURE_2D, 0, GL_RGBA, GL_UNSIGNED_BYTE)
+        glBindTexture(GL_TEXTURE_2D, 0)
+        glDeleteTextures([texture])
+        return data.tobytes() if hasattr(data, "tobytes") else bytes(data)
+
+    def test_upload(self):
+        from OpenGL.GL import glFinish
+        ring = PBORing(2, 16*16*4)
+        ring.init()
+        try:
+            assert len(ring.slots)==2 and all(slot.view for slot in ring.slots)
+            data = bytes(range(256))*4
+            pixels = ring.stage((data, ), (len(data), ))
+            assert pixels and pixels.slot.state==STAGED
+            assert self.upload(pixels)==data
+            #the upload has been submitted, the slot waits for its fence:
+            assert pixels.slot.state==PENDING and pixels.slot.fence
+            assert ring.has_pending()
+            glFinish()
+            ring.poll()
+            assert pixels.slot.state==FREE and pixels.slot.fence is None
+            assert ring.is_idle() and ring.get_info()["uploads"]==1
+        finally:
+            ring.close()
+        assert ring.closed and not ring.slots
+
+    def test_reuse(self):
+        from OpenGL.GL import glFinish
+        ring = PBORing(1, 16*16*4)
+        ring.init()
+        try:
+            data = b"\x80"*(16*16*4)
+            p1 = ring.stage((data, ), (len(data), ))
+            assert ring.stage((data, ), (len(data), )) is None
+            self.upload(p1)
+            #still pending until polled:
+            assert ring.stage((data, ), (len(data), )) is None
+            glFinish()
+            ring.poll()
+            p2 = ring.stage((data, ), (len(data), ))
+            assert p2 and p2.slot is p1.slot
+            assert self.upload(p2)==data
+            glFinish()
+            ring.poll()
+            assert ring.get_info()["full"]==2
+        finally:
+            ring.close()
+
+    def test_oversize(self):
+        ring = PBORing(1, 1024)
+        ring.init()
+        try:
+            assert ring.stage((b"0"*1025, ), (1025, )) is None
+            assert ring.oversize==1 and ring.is_idle()
+        finally:
+            ring.close()
+
+    def test_init_failure(self):
+        from OpenGL.GL import glIsBuffer
+        gen_buffers = gl_pbo_ring.glGenBuffers
+        map_buffer = gl_pbo_ring.glMapBufferRange
+        pbos = []
+        def record_buffers(n):
+            v = gen_buffers(n)
+            pbos[:] = list(v) if n>1 else [v]
+            return v
+        calls = []
+        def fail_second_map(*args):
+            calls.append(args)
+            if len(calls)==2:
+                return None
+            return map_buffer(*args)
+        ring = PBORing(3, 1024)
+        with patch.object(gl_pbo_ring, "glGenBuffers", record_buffers):
+            with patch.object(gl_pbo_ring, "glMapBufferRange", fail_second_map):
+                with self.assertRaises(Exception):
+                    ring.init()
+        assert ring.closed and not ring.slots
+        assert len(pbos)==3
+        #all the buffers have been deleted, including the ones never mapped:
+        assert not any(glIsBuffer(pbo) for pbo in pbos)
+
+    def test_backing_fallback(self):
+        from xpra.client.gl import gl_window_backing_base
+        from xpra.client.gl.gl_window_backing_base import GLWindowBackingBase
+        def make_backing():
+            backing = AdHocStruct()
+            backing.size = 64, 64
+            backing.pbo_ring = None
+            backing.pbo_ring_supported = None
+            backing.retired_pbo_rings = []
+            return backing
+        if not getattr(gl_window_backing_base, "PBO_RING", False):
+            self.skipTest("pixel buffer object ring disabled")
+        #the driver does not support it:
+        backing = make_backing()
+        with patch.object(gl_window_backing_base, "is_pbo_ring_supported", lambda : False):
+            GLWindowBackingBase.gl_init_pbo_ring(backing)
+        assert backing.pbo_ring is None and backing.pbo_ring_supported is False
+        #the pixels are then uploaded the regular way:
+        assert GLWindowBackingBase.stage_pixels(backing, (b"0"*10, ), (10, )) is None
+        #the ring fails to initialize:
+        backing = make_backing()
+        def fail_init(_ring):
+            raise Exception("test failure")
+        with patch.object(PBORing, "init", fail_init):
+            with silence_warn(gl_window_backing_base.log):
+                GLWindowBackingBase.gl_init_pbo_ring(backing)
+        assert backing.pbo_ring is None and backing.pbo_ring_supported is False
+        #a working ring:
+        backing = make_backing()
+        GLWindowBackingBase.gl_init_pbo_ring(backing)
+        assert backing.pbo_ring and backing.pbo_ring_supported
+        assert backing.pbo_ring.slot_size==64*64*4
+        backing.pbo_ring.close()
+
+
+def main():
+    unittest.main()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,64 @@
+#!/usr/bin/env python3
+# This file is part of Xpra.
+# Copyright (C) 2021 Antoine Martin <antoine@xpra.org>
+# Xpra is released under the terms of the GNU GPL v2, or, at your option, any
+# later version. See the file COPYING for details.
+
+import unittest
+
+from xpra.net import compression
+from xpra.client.window_backing_base import fire_paint_callbacks
+from xpra.client.paint_benchmark import make_packets, make_pixels, PaintBenchmark
+
+
+class CountingBacking:
+    def __init__(self):
+        self.painted = []
+    def idle_add(self, fn, *args):
+        raise Exception("should have been replaced by the benchmark")
+    def draw_region(self, _x, _y, width, height, coding, img_data, _rowstride, options, callbacks):
+        def paint():
+            self.painted.append((coding, width, height, len(img_data)))
+            fire_paint_callbacks(callbacks, options.intget("fail", 0)==0)
+        self.idle_add(paint)
+
+
+class PaintBenchmarkTest(unittest.TestCase):
+
+    def test_pixels(self):
+        a = make_pixels(64, 32, 0, 3)
+        b = make_pixels(64, 32, 1, 3)
+        assert len(a)==len(b)==64*32*3
+        assert a!=b
+
+    def test_packets(self):
+        encodings = ["rgb24", "rgb32", "scroll"]
+        if compression.use("zlib"):
+            encodings.append("rgb24/zlib")
+        for encoding in encodings:
+            packets = make_packets(encoding, 64, 32, 4)
+            assert len(packets)==4
+            for packet in packets:
+                assert packet[0]=="draw"
+                assert packet[4:6]==[64, 32]
+                assert packet[6]==encoding.split("/")[0]
+
+    def test_run(self):
+        backing = CountingBacking()
+        packets = make_packets("rgb32", 16, 16, 10)
+        packets[-1][10]["fail"] = 1
+        r = PaintBenchmark(backing).run(packets)
+        assert len(backing.painted)==10
+        assert r["packets"]==10
+        assert r["frames"]==9
+        assert r["errors"]==1
+        assert r["fps"]>0 and r["mpps"]>0
+        assert r["decode"]>=0 and r["paint"]>=0
+
+
+def main():
+    unittest.main()
+
+
+if __name__ == '__main__':
+    main()
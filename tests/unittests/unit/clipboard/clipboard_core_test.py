@@ -0,0 +1,197 @@
+#!/usr/bin/env python3
+# This file is part of Xpra.
+# Copyright (C) 2021 Antoine Martin <antoine@xpra.org>
+# Xpra is released under the terms of the GNU GPL v2, or, at your option, any
+# later version. See the file COPYING for details.
+
+import os
+import unittest
+from gi.repository import GLib
+
+from xpra.net.compression import Compressible
+from xpra.clipboard.clipboard_core import ClipboardProxyCore, CLIPBOARD_CHUNK_SIZE, CLIPBOARD_CHUNKS_WINDOW, log
+from xpra.clipboard.clipboard_timeout_helper import ClipboardTimeoutHelper
+
+from unit.test_util import silence_warn
+
+SELECTION = "CLIPBOARD"
+TARGET = "image/png"
+
+
+class LoopbackClipboardProxy(ClipboardProxyCore):
+    #serves 'contents' and records what it receives
+
+    def __init__(self, selection):
+        super().__init__(selection)
+        self.contents = {}
+        self.received = []
+
+    def get_contents(self, target, got_contents):
+        got_contents(*self.contents.get(target, (None, None, None)))
+
+    def got_contents(self, target, dtype=None, dformat=None, data=None):
+        self.received.append((target, dtype, dformat, data))
+
+    def got_token(self, *_args):
+        pass
+
+
+class LoopbackClipboardHelper(ClipboardTimeoutHelper):
+
+    def __init__(self, queue, chunks=True, cache=False):
+        self.queue = queue
+        super().__init__(self.queue_packet, None, **{"clipboards.local" : (SELECTION, )})
+        self.set_direction(True, True)
+        self.set_clipboard_contents_slice_fix(True)
+        self.set_clipboard_chunks(chunks)
+        self.set_clipboard_cache(cache)
+
+    def make_proxy(self, selection):
+        return LoopbackClipboardProxy(selection)
+
+    def queue_packet(self, *parts):
+        #the network layer would compress and decompress:
+        packet = [x.data if isinstance(x, Compressible) else x for x in parts]
+        self.queue.append((self, packet))
+
+
+class ClipboardCoreTest(unittest.TestCase):
+
+    def make_helpers(self, chunks=True, cache=False):
+        queue = []
+        owner = LoopbackClipboardHelper(queue, chunks, cache)
+        requester = LoopbackClipboardHelper(queue, chunks, cache)
+        return queue, owner, requester
+
+    def run_packets(self, queue, owner, requester):
+        #returns the packet types exchanged
+        packet_types = []
+        context = GLib.MainContext.default()
+        while True:
+            while queue:
+                src, packet = queue.pop(0)
+                packet_types.append(packet[0])
+                dst = requester if src is owner else owner
+                dst.process_clipboard_packet(packet)
+            if not context.pending():
+                break
+            context.iteration(False)
+        return packet_types
+
+    def request(self, owner, requester, data):
+        owner._clipboard_proxies[SELECTION].contents[TARGET] = (TARGET, 8, data)
+        proxy = requester._clipboard_proxies[SELECTION]
+        requester._send_clipboard_request_handler(proxy, SELECTION, TARGET)
+        return proxy
+
+    def test_chunked_contents(self):
+        for chunks in (True, False):
+            queue, owner, requester = self.make_helpers(chunks)
+            data = os.urandom(CLIPBOARD_CHUNK_SIZE*5+17)
+            proxy = self.request(owner, requester, data)
+            packet_types = self.run_packets(queue, owner, requester)
+            assert packet_types.count("clipboard-contents")==1
+            assert packet_types.count("clipboard-contents-chunk")==5*int(chunks)
+            #every chunk is acknowledged, including the first one:
+            assert packet_types.count("clipboard-contents-chunk-ack")==6*int(chunks)
+            assert proxy.received==[(TARGET, TARGET, 8, data)]
+            assert not requester._clipboard_outstanding_requests
+            assert not requester._clipboard_incoming and not owner._clipboard_outgoing
+            owner.cleanup()
+            requester.cleanup()
+
+    def test_cache(self):
+        queue, owner, requester = self.make_helpers(True, True)
+        data = os.urandom(CLIPBOARD_CHUNK_SIZE*2)
+        def paste(expected_packets):
+            proxy = self.request(owner, requester, data)
+            proxy.received = []
+            packet_types = self.run_packets(queue, owner, requester)
+            assert packet_types==expected_packets, "expected %s but got %s" % (expected_packets, packet_types)
+            assert proxy.received==[(TARGET, TARGET, 8, data)]
+        paste(["clipboard-request", "clipboard-contents", "clipboard-contents-chunk",
+               "clipboard-contents-chunk-ack", "clipboard-contents-chunk-ack"])
+        #same token, answered locally:
+        paste([])
+        assert requester.cache_hits==1
+        #new token, but the contents have not changed:
+        requester.process_clipboard_packet(["clipboard-token", SELECTION])
+        paste(["clipboard-request", "clipboard-contents-cached"])
+        assert requester.cache_unchanged==1
+        paste([])
+        #new token and new contents:
+        requester.process_clipboard_packet(["clipboard-token", SELECTION])
+        data = os.urandom(1024)
+        paste(["clipboard-request", "clipboard-contents"])
+        assert requester.cache_misses==2
+        assert requester.get_info()["cache"]["hits"]==2
+        owner.cleanup()
+        requester.cleanup()
+
+    def test_invalid_chunk(self):
+        queue, owner, requester = self.make_helpers()
+        data = os.urandom(CLIPBOARD_CHUNK_SIZE*3)
+        proxy = self.request(owner, requester, data)
+        #drop the second chunk:
+        def drop_chunk(packet):
+            if packet[0]=="clipboard-contents-chunk" and packet[3]==CLIPBOARD_CHUNK_SIZE:
+                return
+            process(packet)
+        process = requester.process_clipboard_packet
+        requester.process_clipboard_packet = drop_chunk
+        with silence_warn(log):
+            self.run_packets(queue, owner, requester)
+        #the request fails without any data:
+        assert proxy.received==[(TARGET, None, None, None)]
+        assert not requester._clipboard_incoming
+        #the owner was told to stop sending:
+        assert not owner._clipboard_outgoing
+        owner.cleanup()
+        requester.cleanup()
+
+    def test_flow_control(self):
+        queue, owner, requester = self.make_helpers()
+        count = CLIPBOARD_CHUNKS_WINDOW*3
+        data = os.urandom(CLIPBOARD_CHUNK_SIZE*count)
+        proxy = self.request(owner, requester, data)
+        #hold back the acks:
+        acks = []
+        def hold_acks(packet):
+            if packet[0]=="clipboard-contents-chunk-ack":
+                acks.append(packet)
+                return
+            process(packet)
+        process = owner.process_clipboard_packet
+        owner.process_clipboard_packet = hold_acks
+        self.run_packets(queue, owner, requester)
+        #the first packet and the chunks that follow are capped by the window:
+        assert len(acks)==CLIPBOARD_CHUNKS_WINDOW, "expected %i acks, got %i" % (CLIPBOARD_CHUNKS_WINDOW, len(acks))
+        states = tuple(owner._clipboard_outgoing.values())
+        assert len(states)==1 and states[0][4]==CLIPBOARD_CHUNKS_WINDOW
+        #each ack allows one more chunk to be sent:
+        process(acks.pop(0))
+        assert [packet[0] for _, packet in queue]==["clipboard-contents-chunk"]
+        owner.process_clipboard_packet = process
+        for ack in acks:
+            process(ack)
+        self.run_packets(queue, owner, requester)
+        assert proxy.received==[(TARGET, TARGET, 8, data)]
+        assert not owner._clipboard_outgoing
+        #the peer never acknowledges the chunks:
+        proxy = self.request(owner, requester, data)
+        owner.process_clipboard_packet = hold_acks
+        self.run_packets(queue, owner, requester)
+        assert owner._clipboard_outgoing
+        with silence_warn(log):
+            for request_id in tuple(owner._clipboard_outgoing.keys()):
+                owner._clipboard_chunks_timeout(request_id)
+        assert not owner._clipboard_outgoing
+        owner.cleanup()
+        requester.cleanup()
+
+
+def main():
+    unittest.main()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+# This file is part of Xpra.
+# Copyright (C) 2021 Antoine Martin <antoine@xpra.org>
+# Xpra is released under the terms of the GNU GPL v2, or, at your option, any
+# later version. See the file COPYING for details.
+
+import os
+import types
+import shutil
+import unittest
+import tempfile
+
+from xpra.codecs import probe_cache
+from xpra.codecs.probe_cache import CodecProbeCache
+
+
+def make_module(filename, version="1.0"):
+    module = types.ModuleType("fake_codec")
+    module.__file__ = filename
+    module.get_version = lambda : version
+    module.CODECS = ("vp8", "vp9")
+    module.MAX_SIZE = {"vp8" : (4096, 4096)}
+    module.MAX_WIDTH = 4096
+    return module
+
+
+class TestProbeCache(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.cache_file = os.path.join(self.tmpdir, "subdir", "codec-cache.json")
+        self.module_file = os.path.join(self.tmpdir, "codec.py")
+        with open(self.module_file, "w") as f:
+            f.write("#version 1")
+        probe_cache._digests.clear()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def test_restore(self):
+        cache = CodecProbeCache(self.cache_file)
+        module = make_module(self.module_file)
+        assert not cache.restore("enc_test", module, False), "cache should be empty"
+        #the self test has detected some limits:
+        module.CODECS = ("vp8", )
+        module.MAX_SIZE = {"vp8" : (8192, 4096)}
+        module.MAX_WIDTH = 8192
+        cache.record("enc_test", module, False)
+        assert os.path.exists(self.cache_file)
+        #a new process loads the results:
+        cache = CodecProbeCache(self.cache_file)
+        module = make_module(self.module_file)
+        assert cache.restore("enc_test", module, False)
+        assert module.CODECS==("vp8", ), "got %s" % (module.CODECS, )
+        assert module.MAX_SIZE=={"vp8" : (8192, 4096)}, "got %s" % (module.MAX_SIZE, )
+        assert module.MAX_WIDTH==8192
+        #a full self test is not the same as a quick one:
+        assert not cache.restore("enc_test", make_module(self.module_file), True)
+        #different library version:
+        assert not cache.restore("enc_test", make_module(self.module_file, "2.0"), False)
+        #forced refresh:
+        assert not CodecProbeCache(self.cache_file, True).restore("enc_test", make_module(self.module_file), False)
+        #another machine or driver:
+        for attr in ("machine", "driver"):
+            entry = cache.load()["enc_test"]
+            saved = entry["key"][attr]
+            entry["key"][attr] = "something-else"
+            assert not cache.restore("enc_test", make_module(self.module_file), False)
+            entry["key"][attr] = saved
+        assert cache.restore("enc_test", make_module(self.module_file), False)
+
+    def test_module_changed(self):
+        cache = CodecProbeCache(self.cache_file)
+        cache.record("enc_test", make_module(self.module_file), False)
+        with open(self.module_file, "w") as f:
+            f.write("#version 2")
+        probe_cache._digests.clear()
+        assert not CodecProbeCache(self.cache_file).restore("enc_test", make_module(self.module_file), False)
+
+    def test_nocache(self):
+        cache = CodecProbeCache(self.cache_file)
+        for name in probe_cache.NOCACHE:
+            cache.record(name, make_module(self.module_file), False)
+            assert not cache.restore(name, make_module(self.module_file), False)
+        #disabled:
+        cache = CodecProbeCache("")
+        cache.record("enc_test", make_module(self.module_file), False)
+        assert not cache.restore("enc_test", make_module(self.module_file), False)
+
+    def test_invalid_file(self):
+        os.makedirs(os.path.dirname(self.cache_file))
+        with open(self.cache_file, "w") as f:
+            f.write("not json")
+        cache = CodecProbeCache(self.cache_file)
+        assert not cache.restore("enc_test", make_module(self.module_file), False)
+        cache.record("enc_test", make_module(self.module_file), False)
+        assert CodecProbeCache(self.cache_file).restore("enc_test", make_module(self.module_file), False)
+
+
+def main():
+    unittest.main()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,61 @@
+#!/usr/bin/env python3
+# This file is part of Xpra.
+# Copyright (C) 2021 Antoine Martin <antoine@xpra.org>
+# Xpra is released under the terms of the GNU GPL v2, or, at your option, any
+# later version. See the file COPYING for details.
+
+import timeit
+import unittest
+
+from xpra.log import Logger, enable_debug_for, disable_debug_for
+
+
+class TestLogger(unittest.TestCase):
+
+    def test_debug_enabled_flag(self):
+        log = Logger("logtest-flag")
+        messages = []
+        def record(*args):
+            messages.append(args)
+        log.log = lambda _level, msg, *args, **_kwargs : record(msg, *args)
+        def hot_path(value):
+            if log.debug_enabled:
+                log("value=%s", value)
+        hot_path(1)
+        assert not messages
+        log.enable_debug()
+        hot_path(2)
+        assert messages==[("value=%s", 2)]
+        log.disable_debug()
+        hot_path(3)
+        assert len(messages)==1
+        #enabling by category at runtime updates the flag:
+        assert enable_debug_for("logtest-flag")==[log]
+        hot_path(4)
+        assert len(messages)==2
+        assert disable_debug_for("logtest-flag")==[log]
+        hot_path(5)
+        assert len(messages)==2
+
+    def test_disabled_cost(self):
+        log = Logger("logtest-cost")
+        assert not log.debug_enabled
+        value = (1, 2, 3)
+        def unguarded():
+            log("value=%s", value)
+        def guarded():
+            if log.debug_enabled:
+                log("value=%s", value)
+        N = 100000
+        #best of a few runs to limit the noise:
+        t_unguarded = min(timeit.repeat(unguarded, number=N, repeat=5))
+        t_guarded = min(timeit.repeat(guarded, number=N, repeat=5))
+        assert t_guarded<t_unguarded, "guarded call took %.1fns vs %.1fns unguarded" % (
+            t_guarded*1e9/N, t_unguarded*1e9/N)
+
+
+def main():
+    unittest.main()
+
+if __name__ == '__main__':
+    main()
@@ -5,13 +5,47 @@
 # later version. See the file COPYING for details.
 
 import os
+import shutil
 import unittest
+import tempfile
 
 from xpra.util import typedict
 from xpra.net.file_transfer import (
     basename, safe_open_download_file,
     FileTransferAttributes, FileTransferHandler,
+    FILE_CHUNKS_WINDOW,
     )
+from xpra.net import file_cache
+from xpra.net.file_cache import FILE_BLOCK_SIZE
+
+
+class LoopbackFileTransferHandler(FileTransferHandler):
+    #sends packets to a shared queue, timers never fire
+    def __init__(self, queue):
+        self.queue = queue
+        self.timers = {}
+        self.timeout_add = self.idle_add = self.add_timer
+        self.source_remove = self.remove_timer
+        super().__init__()
+        self.init_attributes("yes", "1G")
+        self.downloaded = []
+
+    def add_timer(self, *args):
+        t = max(self.timers or (0, ))+1
+        self.timers[t] = args
+        return t
+
+    def remove_timer(self, t):
+        self.timers.pop(t, None)
+
+    def send(self, *parts):
+        self.queue.append((self, list(parts)))
+
+    def compressed_wrapper(self, datatype, data, level=5):
+        return data
+
+    def process_downloaded_file(self, filename, *_args):
+        self.downloaded.append(filename)
 
 
 class TestVersionUtilModule(unittest.TestCase):
@@ -53,6 +87,178 @@ class TestVersionUtilModule(unittest.TestCase):
         assert fth.get_info()
         fth.cleanup()
 
+    def setUp(self):
+        #don't use the user's file cache:
+        self.cache_dir = tempfile.mkdtemp(prefix="xpra-file-cache-test")
+        self.saved_cache_dir = file_cache.FILE_CACHE_DIR
+        file_cache.FILE_CACHE_DIR = self.cache_dir
+        file_cache._file_caches.clear()
+
+    def tearDown(self):
+        file_cache.FILE_CACHE_DIR = self.saved_cache_dir
+        file_cache._file_caches.clear()
+        shutil.rmtree(self.cache_dir)
+
+    def make_handlers(self, window=FILE_CHUNKS_WINDOW, resume=True, uuid="test-peer"):
+        queue = []
+        sender = LoopbackFileTransferHandler(queue)
+        receiver = LoopbackFileTransferHandler(queue)
+        #the file cache is opt-in:
+        sender.file_resume = receiver.file_resume = resume
+        caps = typedict(sender.get_file_transfer_features())
+        caps["uuid"] = uuid
+        sender.parse_file_transfer_caps(caps)
+        receiver.parse_file_transfer_caps(caps)
+        #zero emulates an older version:
+        sender.remote_file_chunks_window = window
+        sender.remote_file_resume = resume
+        return queue, sender, receiver
+
+    def run_transfer(self, queue, sender, receiver, max_bytes=-1):
+        #returns the number of bytes sent in chunks, and the maximum number of chunks in flight
+        handlers = {
+            "send-file"         : "_process_send_file",
+            "send-file-chunk"   : "_process_send_file_chunk",
+            "ack-file-chunk"    : "_process_ack_file_chunk",
+            }
+        in_flight = 0
+        sent = 0
+        while queue:
+            src, packet = queue.pop(0)
+            dst = receiver if src is sender else sender
+            for chunk_sender in sender.send_chunks_in_progress.values():
+                in_flight = max(in_flight, len(chunk_sender.in_flight))
+            if packet[0]=="send-file-chunk":
+                if 0<=max_bytes<=sent:
+                    #connection lost
+                    queue[:] = []
+                    break
+                sent += len(packet[3])
+            getattr(dst, handlers[packet[0]])(packet)
+        return sent, in_flight
+
+    def check_downloaded(self, receiver, *datas):
+        assert not receiver.receive_chunks_in_progress
+        assert len(receiver.downloaded)==len(datas)
+        for filename, data in zip(receiver.downloaded, datas):
+            try:
+                with open(filename, "rb") as f:
+                    assert f.read()==data
+            finally:
+                os.unlink(filename)
+
+    def test_chunked_transfer(self):
+        for window in (0, 8):
+            self.do_test_chunked_transfer(window)
+
+    def do_test_chunked_transfer(self, window):
+        queue, sender, receiver = self.make_handlers(window, False)
+        data = os.urandom(sender.file_chunks*20+17)
+        with tempfile.NamedTemporaryFile(prefix="xpra-file-transfer-test") as f:
+            f.write(data)
+            f.flush()
+            #the data will be read from the file:
+            assert sender.send_file(f.name, "", None, len(data))
+            in_flight = self.run_transfer(queue, sender, receiver)[1]
+        assert in_flight==max(1, window), "expected %i chunks in flight but got %i" % (max(1, window), in_flight)
+        assert not sender.send_chunks_in_progress
+        self.check_downloaded(receiver, data)
+
+    def test_concurrent_transfers(self):
+        queue, sender, receiver = self.make_handlers(2, False)
+        data1 = os.urandom(sender.file_chunks*10)
+        data2 = os.urandom(sender.file_chunks*10)
+        assert sender.send_file("file1", "", data1, len(data1))
+        assert sender.send_file("file2", "", data2, len(data2))
+        chunk_ids = []
+        def record(packet):
+            chunk_ids.append(packet[1])
+            receiver.__class__._process_send_file_chunk(receiver, packet)
+        receiver._process_send_file_chunk = record
+        self.run_transfer(queue, sender, receiver)
+        self.check_downloaded(receiver, data1, data2)
+        #both transfers make progress at the same time:
+        first, second = sorted(set(chunk_ids), key=chunk_ids.index)
+        assert chunk_ids.index(second)<len(chunk_ids)-1-chunk_ids[::-1].index(first)
+        assert chunk_ids[:4].count(first)==2 and chunk_ids[:4].count(second)==2
+
+    def test_rate_limit(self):
+        queue, sender, receiver = self.make_handlers(8, False)
+        data = os.urandom(sender.file_chunks*20)
+        sender.set_file_transfer_rate_limit(sender.file_chunks)
+        assert sender.send_file("file", "", data, len(data))
+        self.run_transfer(queue, sender, receiver)
+        #the scheduler is waiting for the budget to refill:
+        assert sender.file_chunk_timer in sender.timers
+        assert sender.get_file_transfer_delay()>0
+        chunk_sender = tuple(sender.send_chunks_in_progress.values())[0]
+        assert chunk_sender.position<len(data)
+        #lift the limit and let the timer fire:
+        sender.set_file_transfer_rate_limit(0)
+        sender.timers.pop(sender.file_chunk_timer)[1]()
+        self.run_transfer(queue, sender, receiver)
+        self.check_downloaded(receiver, data)
+        #congestion pauses the transfers:
+        queue, sender, receiver = self.make_handlers(8, False)
+        assert sender.send_file("file", "", data, len(data))
+        sender.file_transfer_congestion()
+        self.run_transfer(queue, sender, receiver)
+        assert sender.file_chunk_timer and sender.file_transfer_rate_factor==0.5
+        assert sender.get_info()["scheduler"]["congestion-events"]==1
+        sender.cleanup()
+        receiver.cleanup()
+
+    def test_resume_transfer(self):
+        data = os.urandom(FILE_BLOCK_SIZE*4+17)
+        #interrupt the transfer:
+        queue, sender, receiver = self.make_handlers(1)
+        assert sender.send_file("test-file", "", data, len(data))
+        sent = self.run_transfer(queue, sender, receiver, 2*FILE_BLOCK_SIZE)[0]
+        assert 2*FILE_BLOCK_SIZE<=sent<len(data)
+        receiver.cleanup()
+        assert not receiver.downloaded
+        assert os.listdir(self.cache_dir), "partial download not saved"
+        #resume it:
+        queue, sender, receiver = self.make_handlers()
+        assert sender.send_file("test-file", "", data, len(data))
+        sent = self.run_transfer(queue, sender, receiver)[0]
+        #we should only need to send the blocks which were not received in full:
+        assert sent<=len(data)-2*FILE_BLOCK_SIZE, "expected at most %i bytes to be sent, but got %i" % (
+            len(data)-2*FILE_BLOCK_SIZE, sent)
+        assert (len(data)-sent)%FILE_BLOCK_SIZE==0
+        self.check_downloaded(receiver, data)
+        #now the whole file is in the cache:
+        queue, sender, receiver = self.make_handlers()
+        assert sender.send_file("test-file", "", data, len(data))
+        assert self.run_transfer(queue, sender, receiver)[0]==0
+        assert not sender.send_chunks_in_progress
+        self.check_downloaded(receiver, data)
+        info = receiver.get_file_cache().get_info()
+        assert info["hits"]==1 and info["resumed"]==1
+        #another peer does not get to use this cache:
+        queue, sender, receiver = self.make_handlers(uuid="other-peer")
+        assert sender.send_file("test-file", "", data, len(data))
+        assert self.run_transfer(queue, sender, receiver)[0]==len(data)
+        self.check_downloaded(receiver, data)
+
+    def test_no_cache(self):
+        data = os.urandom(FILE_BLOCK_SIZE*2)
+        #disabled, or no uuid to identify the peer:
+        for resume, uuid in ((False, "test-peer"), (True, "")):
+            queue, sender, receiver = self.make_handlers(resume=resume, uuid=uuid)
+            assert receiver.get_file_cache() is None
+            assert sender.send_file("test-file", "", data, len(data))
+            self.run_transfer(queue, sender, receiver)
+            self.check_downloaded(receiver, data)
+        #print jobs are not cached:
+        queue, sender, receiver = self.make_handlers()
+        sender.printing = receiver.printing = sender.remote_printing = True
+        receiver.printing_ask = sender.remote_printing_ask = False
+        assert sender.send_file("test-file", "application/pdf", data, len(data), printit=True)
+        self.run_transfer(queue, sender, receiver)
+        self.check_downloaded(receiver, data)
+        assert not os.listdir(self.cache_dir)
+
 
 def main():
     unittest.main()
@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+# This file is part of Xpra.
+# Copyright (C) 2021 Antoine Martin <antoine@xpra.org>
+# Xpra is released under the terms of the GNU GPL v2, or, at your option, any
+# later version. See the file COPYING for details.
+
+import os
+import gzip
+import shutil
+import tempfile
+import unittest
+
+from xpra.net.http_cache import HTTPFileCache
+
+
+class TestHTTPCache(unittest.TestCase):
+
+    def setUp(self):
+        self.dirname = tempfile.mkdtemp(prefix="xpra-http-cache-test")
+
+    def tearDown(self):
+        shutil.rmtree(self.dirname)
+
+    def write(self, name, data):
+        path = os.path.join(self.dirname, name)
+        with open(path, "wb") as f:
+            f.write(data)
+        return path
+
+    def test_variants(self):
+        cache = HTTPFileCache(1024*1024)
+        data = b"var x = 1;\n"*100
+        path = self.write("test.js", data)
+        entry = cache.get(path, ("br", "gzip"))
+        assert entry.variants[""]==data
+        assert gzip.decompress(entry.variants["gzip"])==data
+        assert cache.get(path, ("br", "gzip")) is entry
+        assert cache.hits==1 and cache.misses==1
+        #the gzip variant is preferred if the client does not accept brotli:
+        assert entry.select(("gzip", ), ("br", "gzip"))[0]=="gzip"
+        assert entry.select((), ("br", "gzip"))==("", data)
+        #pre-compressed files are used when present:
+        self.write("test.js.br", b"fake-brotli")
+        entry = cache.get(path, ("br", "gzip"))
+        assert entry.variants["br"]==b"fake-brotli"
+        assert entry.select(("gzip", "br"), ("br", "gzip"))==("br", b"fake-brotli")
+        #small and already compressed files are not compressed:
+        assert tuple(cache.get(self.write("small.js", b"x"), ("gzip", )).variants.keys())==("", )
+        assert tuple(cache.get(self.write("big.png", data), ("gzip", )).variants.keys())==("", )
+        with self.assertRaises(OSError):
+            cache.get(os.path.join(self.dirname, "missing.js"), ("gzip", ))
+
+    def test_invalidation(self):
+        cache = HTTPFileCache(1024*1024)
+        path = self.write("index.html", b"<html>1</html>")
+        entry = cache.get(path, ())
+        etag = entry.get_etag()
+        assert entry.matches(etag)
+        assert entry.matches('W/%s, "other"' % etag)
+        assert entry.matches("*")
+        assert not entry.matches('"other"')
+        self.write("index.html", b"<html>22</html>")
+        entry = cache.get(path, ())
+        assert entry.variants[""]==b"<html>22</html>"
+        assert entry.get_etag()!=etag
+        assert not entry.matches(etag)
+
+    def test_eviction(self):
+        cache = HTTPFileCache(2500, 1000)
+        paths = [self.write("file%i.png" % i, bytes(1000)) for i in range(3)]
+        for path in paths[:2]:
+            cache.get(path, ())
+        #use the first one, so the second one is the least recently used:
+        cache.get(paths[0], ())
+        cache.get(paths[2], ())
+        assert tuple(cache.entries.keys())==(paths[0], paths[2])
+        info = cache.get_info()
+        assert info["evictions"]==1 and info["size"]==2000
+        #too big to be cached:
+        assert cache.get(self.write("large.png", bytes(1001)), ()) is None
+
+
+def main():
+    unittest.main()
+
+if __name__ == '__main__':
+    main()
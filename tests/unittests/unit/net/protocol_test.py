@@ -11,7 +11,7 @@ from gi.repository import GLib
 
 from xpra.util import csv, envint, envbool
 from xpra.os_util import monotonic_time
-from xpra.net.protocol import Protocol, verify_packet, log
+from xpra.net.protocol import Protocol, RawPacket, verify_packet, log
 from xpra.net.bytestreams import Connection
 from xpra.net.compression import Compressed
 from xpra.log import Logger
@@ -198,6 +198,55 @@ class ProtocolTest(unittest.TestCase):
         log("do_test_read_speed(%i) %iMB in %ims", pixel_data_size, total_size, elapsed*1000)
         return N*len(packets), total_size, elapsed
 
+    def test_splice(self):
+        #encode some packets:
+        p = self.make_memory_protocol()
+        p.enable_encoder("rencode")
+        p.enable_compressor("lz4")
+        data = []
+        def raw_write(_packet_type, items, *_args):
+            data.extend(items)
+        p.raw_write = raw_write
+        packets = self.make_test_packets(2**16)
+        for packet in packets:
+            p._add_packet_to_queue(packet)
+        #parse them, keeping the "draw" packets raw:
+        parsed_packets = []
+        def process_packet_cb(_proto, packet):
+            if packet[0]==Protocol.CONNECTION_LOST:
+                loop.quit()
+            else:
+                parsed_packets.append(packet)
+        loop = GLib.MainLoop()
+        GLib.timeout_add(TIMEOUT*1000, loop.quit)
+        protocol = self.make_memory_protocol(data, read_buffer_size=65536, process_packet_cb=process_packet_cb)
+        protocol.raw_packet_types = ("draw", )
+        protocol.start()
+        loop.run()
+        assert len(parsed_packets)==len(packets)
+        for packet, parsed in zip(packets, parsed_packets):
+            assert isinstance(parsed, RawPacket)==(packet[0]=="draw")
+        raw = parsed_packets[2]
+        assert raw[1:5]==[100, 100, 640, 480]
+        assert raw.decode()[5]==packets[2][5].data
+        assert protocol.input_spliced_packetcount==1
+        #forward it with a protocol using the same encoder and compressor:
+        f = self.make_memory_protocol()
+        f.enable_encoder("rencode")
+        f.enable_compressor("lz4")
+        assert f.can_forward(raw)
+        fdata = []
+        def forward_write(_packet_type, items, *_args):
+            fdata.extend(items)
+        f.raw_write = forward_write
+        f._add_packet_to_queue(raw)
+        assert f.output_spliced_packetcount==1
+        #websocket framing would differ:
+        if self.protocol_class==Protocol:
+            assert b"".join(fdata)==b"".join(data[-len(fdata):])
+        f.enable_encoder("bencode")
+        assert not f.can_forward(raw)
+
     def make_test_packets(self, pixel_data_size=2**18):
         pixel_data = os.urandom(pixel_data_size)
         return (
@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+# This file is part of Xpra.
+# Copyright (C) 2021 Antoine Martin <antoine@xpra.org>
+# Xpra is released under the terms of the GNU GPL v2, or, at your option, any
+# later version. See the file COPYING for details.
+
+import os
+import unittest
+
+from xpra.net.websockets.header import encode_hybi_header
+from xpra.net.websockets.protocol import (
+    WebSocketProtocol,
+    OPCODE_BINARY, OPCODE_CONTINUE, OPCODE_PING,
+    )
+
+
+class ParseOnlyProtocol(WebSocketProtocol):
+    #only the state used by the frame parser:
+    def __init__(self):  #pylint: disable=super-init-not-called
+        self._closed = False
+        self._conn = "test"
+        self.ws_data = b""
+        self.ws_frame = None
+        self.ws_payload_opcode = 0
+        self.received = []
+        self.pings = []
+
+    def _read_queue_put(self, data):
+        self.received.append(bytes(data))
+
+    def _process_ws_ping(self, payload):
+        self.pings.append(bytes(payload))
+
+
+def mask_data(mask, data):
+    return bytes(b ^ mask[i%4] for i, b in enumerate(data))
+
+def frame(opcode, payload, fin=True, mask=None):
+    header = encode_hybi_header(opcode, len(payload), bool(mask), fin)
+    if mask:
+        return header+mask+mask_data(mask, payload)
+    return header+payload
+
+
+class WebsocketProtocolTest(unittest.TestCase):
+
+    def feed(self, data, chunk_size):
+        proto = ParseOnlyProtocol()
+        for i in range(0, len(data), chunk_size):
+            proto.parse_ws_frame(data[i:i+chunk_size])
+        return proto
+
+    def test_split_frames(self):
+        payload1 = os.urandom(1000)
+        payload2 = os.urandom(70000)
+        ping = b"hello"
+        for mask in (None, b"\x01\x02\x03\x04"):
+            data = b"".join((
+                frame(OPCODE_BINARY, payload1, mask=mask),
+                frame(OPCODE_PING, ping, mask=mask),
+                #fragmented message, with a control frame in the middle:
+                frame(OPCODE_BINARY, payload2[:333], fin=False, mask=mask),
+                frame(OPCODE_PING, ping, mask=mask),
+                frame(OPCODE_CONTINUE, payload2[333:], mask=mask),
+                frame(OPCODE_BINARY, b"", mask=mask),
+                ))
+            for chunk_size in (1, 3, 7, 1000, 4096, len(data)):
+                if chunk_size==1 and mask is None:
+                    #too slow to bother with both
+                    continue
+                proto = self.feed(data, chunk_size)
+                received = b"".join(proto.received)
+                assert received==payload1+payload2, "chunk size %i: payload mismatch" % chunk_size
+                assert proto.pings==[ping, ping]
+                assert proto.ws_frame is None and not proto.ws_data and not proto.ws_payload_opcode
+                if chunk_size==len(data) and not mask:
+                    #the payload is forwarded without joining the fragments:
+                    assert len(proto.received)==3
+
+    def test_invalid_continuation(self):
+        proto = ParseOnlyProtocol()
+        with self.assertRaises(Exception):
+            proto.parse_ws_frame(frame(OPCODE_CONTINUE, b"foo"))
+        proto = ParseOnlyProtocol()
+        with self.assertRaises(Exception):
+            proto.parse_ws_frame(frame(OPCODE_BINARY, b"foo", fin=False)+frame(OPCODE_BINARY, b"bar"))
+
+
+def main():
+    unittest.main()
+
+
+if __name__ == '__main__':
+    main()
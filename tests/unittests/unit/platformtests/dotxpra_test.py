@@ -0,0 +1,70 @@
+#!/usr/bin/env python3
+# This file is part of Xpra.
+# Copyright (C) 2021 Antoine Martin <antoine@xpra.org>
+# Xpra is released under the terms of the GNU GPL v2, or, at your option, any
+# later version. See the file COPYING for details.
+
+import os
+import shutil
+import socket
+import tempfile
+import unittest
+
+from xpra.platform.dotxpra import DotXpra
+from xpra.platform.dotxpra_common import PREFIX
+
+
+class DotXpraTest(unittest.TestCase):
+
+    def setUp(self):
+        self.sockdir = tempfile.mkdtemp(prefix="xpra-dotxpra-test")
+        self.sockets = []
+
+    def tearDown(self):
+        for sock in self.sockets:
+            sock.close()
+        shutil.rmtree(self.sockdir)
+
+    def make_socket(self, display, listen=True):
+        sockpath = os.path.join(self.sockdir, PREFIX+str(display))
+        sock = socket.socket(socket.AF_UNIX)
+        sock.bind(sockpath)
+        if listen:
+            sock.listen(5)
+        self.sockets.append(sock)
+        return sockpath
+
+    def test_states(self):
+        live = [self.make_socket(i) for i in range(10, 20)]
+        unknown = self.make_socket(20, False)
+        dotxpra = DotXpra(self.sockdir, ())
+        states = dotxpra.get_server_states(live+[unknown], 1)
+        assert all(states[x]==DotXpra.LIVE for x in live)
+        assert states[unknown]==DotXpra.UNKNOWN
+        assert dotxpra.get_display_state(":10")==DotXpra.LIVE
+        assert dotxpra.get_display_state(":99")==DotXpra.DEAD
+        sd = dotxpra.socket_details(matching_state=DotXpra.LIVE)
+        assert len(sd[self.sockdir])==len(live)
+        displays = sorted(dotxpra.displays())
+        assert displays==[":%i" % i for i in range(10, 21)], "got %s" % (displays,)
+
+    def test_cache(self):
+        sockpath = self.make_socket(10)
+        dotxpra = DotXpra(self.sockdir, (), cache_ttl=60)
+        assert dotxpra.get_server_states((sockpath, ))[sockpath]==DotXpra.LIVE
+        #closing the socket does not modify the directory,
+        #so the cached state is still used:
+        self.sockets.pop(0).close()
+        assert dotxpra.get_server_states((sockpath, ))[sockpath]==DotXpra.LIVE
+        #but the uncached version sees the change:
+        assert DotXpra(self.sockdir, ()).get_server_states((sockpath, ))[sockpath]!=DotXpra.LIVE
+        #removing the socket invalidates the cache:
+        os.unlink(sockpath)
+        assert dotxpra.get_server_states((sockpath, ))[sockpath]==DotXpra.DEAD
+
+
+def main():
+    unittest.main()
+
+if __name__ == '__main__':
+    main()
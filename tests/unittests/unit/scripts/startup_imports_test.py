@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+# This file is part of Xpra.
+# Copyright (C) 2021 Antoine Martin <antoine@xpra.org>
+# Xpra is released under the terms of the GNU GPL v2, or, at your option, any
+# later version. See the file COPYING for details.
+
+import os
+import sys
+import unittest
+from subprocess import Popen, PIPE
+
+from xpra.util import envint
+
+#optional budget for the total import time of each subcommand, in milliseconds:
+IMPORT_TIME_BUDGET = envint("XPRA_TEST_IMPORT_TIME_BUDGET", 0)
+
+#the subcommands used by monitoring scripts must not load these:
+HEAVY_MODULES = (
+    "gi", "gi.repository.GLib", "gi.repository.Gtk",
+    "yaml", "inspect", "uuid",
+    "xpra.client", "xpra.server", "xpra.codecs", "xpra.net.protocol",
+    )
+
+RUN_MODE = """
+import sys
+from xpra.platform import init
+init()
+from xpra.scripts.main import main
+sys.exit(main("xpra", ["xpra", "%s"]))
+"""
+
+
+def get_import_times(mode):
+    """
+        runs the subcommand with python's import time profiler,
+        returns the exit code and the cumulative import time in microseconds for each top level module
+    """
+    env = os.environ.copy()
+    env["PYTHONPATH"] = os.pathsep.join(sys.path)
+    cmd = [sys.executable, "-X", "importtime", "-c", RUN_MODE % mode]
+    proc = Popen(cmd, stdout=PIPE, stderr=PIPE, env=env)
+    _, err = proc.communicate(timeout=60)
+    times = {}
+    for line in err.decode("latin1").splitlines():
+        #ie: "import time:       273 |       3354 |   xpra.platform.dotxpra"
+        if not line.startswith("import time:"):
+            continue
+        parts = line[len("import time:"):].split("|")
+        if len(parts)!=3 or not parts[1].strip().isdigit():
+            continue
+        times[parts[2].strip()] = (int(parts[1]), not parts[2].startswith("  "))
+    return proc.returncode, times
+
+
+class TestStartupImports(unittest.TestCase):
+
+    def check_mode(self, mode):
+        code, times = get_import_times(mode)
+        assert code==0, "'%s' failed with exit code %s" % (mode, code)
+        assert times, "no import times recorded for '%s'" % mode
+        heavy = [m for m in HEAVY_MODULES if m in times]
+        assert not heavy, "'%s' should not import %s" % (mode, heavy)
+        total = sum(t for t, toplevel in times.values() if toplevel)//1000
+        if IMPORT_TIME_BUDGET:
+            assert total<=IMPORT_TIME_BUDGET, "'%s' took %ims to import %i modules, budget is %ims" % (
+                mode, total, len(times), IMPORT_TIME_BUDGET)
+
+    def test_list(self):
+        self.check_mode("list")
+
+    def test_list_sessions(self):
+        self.check_mode("list-sessions")
+
+    def test_displays(self):
+        self.check_mode("displays")
+
+    def test_showconfig(self):
+        self.check_mode("showconfig")
+
+
+def main():
+    if os.name=="posix":
+        unittest.main()
+
+if __name__ == '__main__':
+    main()
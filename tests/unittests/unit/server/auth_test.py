@@ -318,6 +318,69 @@ class TestAuth(unittest.TestCase):
         assert sqlite_main(["main", filename, "add", "foo", "wrongpassword"])==0
         vf("the password should not match")
 
+    def test_sqlite_cache(self):
+        import sqlite3
+        from xpra.server.auth.sqlite_auth import main as sqlite_main
+        from xpra.server.auth.auth_pool import get_connection_pool, get_credential_cache, invalidate_credentials
+        filename = temp_filename("sqlite-cache")
+        try:
+            assert sqlite_main(["main", filename, "create"])==0
+            assert sqlite_main(["main", filename, "add", "foo", "hello"])==0
+            self._test_hmac_auth("sqlite", "hello", filename=filename, cache_ttl=60)
+            pool = get_connection_pool(("sqlite", filename), None)
+            assert pool.reused>0, "the connections should have been re-used"
+            cache = get_credential_cache()
+            #the passwords are never cached, only the sessions of verified credentials:
+            assert not any("hello" in key for key in cache.entries.keys())
+            a = self._init_auth("sqlite", filename=filename, cache_ttl=60)
+            assert not a.get_sessions(), "unverified credentials"
+            a.password_used = "hello"
+            sessions = a.get_sessions()
+            assert sessions
+            key = ("foo", "sessions", ("sqlite", filename), a.sessions_query, cache.digest("hello"))
+            assert cache.get(key)==sessions
+            #password changes take effect immediately:
+            db = sqlite3.connect(filename)
+            db.execute("UPDATE users SET password=? WHERE username=?", ("world", "foo"))
+            db.commit()
+            db.close()
+            self._test_hmac_auth("sqlite", "world", filename=filename, cache_ttl=60)
+            #explicit invalidation, as used by the 'invalidate-auth-cache' control command:
+            assert invalidate_credentials("foo")>0
+            assert cache.get(key) is None
+        finally:
+            get_connection_pool(("sqlite", filename), None).close_all()
+            os.unlink(filename)
+
+    def test_connection_pool(self):
+        from xpra.server.auth.auth_pool import ConnectionPool, CredentialCache
+        closed = []
+        counter = iter(range(100))
+        pool = ConnectionPool("test", lambda : next(counter), closed.append, max_size=2, timeout=1)
+        with pool.connection() as c1:
+            with pool.connection() as c2:
+                assert c1!=c2
+                #the pool is exhausted:
+                with self.assertRaises(Exception):
+                    with pool.connection():
+                        pass
+        with pool.connection() as c3:
+            assert c3 in (c1, c2)
+        #connections are discarded when an error occurs:
+        with self.assertRaises(ValueError):
+            with pool.connection() as c4:
+                raise ValueError("test")
+        assert closed==[c4]
+        cache = CredentialCache(max_size=2)
+        cache.set(("foo", 1), "a", 60)
+        cache.set(("foo", 2), "b", 0)
+        assert cache.get(("foo", 1))=="a" and cache.get(("foo", 2)) is None
+        cache.set(("bar", 1), "c", 60)
+        cache.set(("bar", 2), "d", 60)
+        assert cache.get(("foo", 1)) is None, "oldest entry should have been evicted"
+        assert cache.invalidate("bar")==2
+        assert cache.digest("password")!="password"
+
     def test_peercred(self):
         if not POSIX or OSX:
             #can't be used!
@@ -0,0 +1,42 @@
+#!/usr/bin/env python3
+# This file is part of Xpra.
+# Copyright (C) 2021 Antoine Martin <antoine@xpra.org>
+# Xpra is released under the terms of the GNU GPL v2, or, at your option, any
+# later version. See the file COPYING for details.
+
+import unittest
+
+from xpra.util import apply_dict_delta
+from xpra.server.info_subscription import InfoSubscription, INFO_SUBSCRIPTION_MIN_INTERVAL
+
+
+class TestInfoSubscription(unittest.TestCase):
+
+    def test_updates(self):
+        sub = InfoSubscription(("server", "clients"), 0)
+        assert sub.interval==INFO_SUBSCRIPTION_MIN_INTERVAL
+        def info(elapsed=1, threads=5):
+            #the server generates a new dictionary every time:
+            return {
+                "server"    : {"elapsed" : elapsed, "pid" : 10},
+                "clients"   : {"" : 1},
+                "threads"   : {"count" : threads},
+                }
+        client_info = {}
+        changed, removed = sub.update(info())
+        #categories we have not subscribed to are not sent:
+        assert "threads" not in changed and not removed
+        apply_dict_delta(client_info, changed, removed)
+        assert sub.update(info()) is None, "nothing has changed"
+        changed, removed = sub.update(info(2, 6))
+        assert changed=={"server" : {"elapsed" : 2}} and not removed
+        apply_dict_delta(client_info, changed, removed)
+        assert client_info=={"server" : {"elapsed" : 2, "pid" : 10}, "clients" : {"" : 1}}
+        assert sub.get_info()["updates"]==2
+
+
+def main():
+    unittest.main()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,48 @@
+#!/usr/bin/env python3
+# This file is part of Xpra.
+# Copyright (C) 2021 Antoine Martin <antoine@xpra.org>
+# Xpra is released under the terms of the GNU GPL v2, or, at your option, any
+# later version. See the file COPYING for details.
+
+import unittest
+
+from xpra.server.metrics import MetricsRegistry
+
+
+class TestMetrics(unittest.TestCase):
+
+    def test_format(self):
+        registry = MetricsRegistry()
+        frames = registry.counter("test_frames", "frames", ("encoding", ))
+        frames.inc(1, "png")
+        frames.inc(2, "png")
+        frames.inc(1, 'we"ird')
+        assert registry.counter("test_frames", "again") is frames
+        hist = registry.histogram("test_seconds", "timing", buckets=(0.1, 1))
+        for v in (0.05, 0.1, 0.5, 10):
+            hist.observe(v)
+        def collect(reg):
+            reg.gauge("test_queue", "queue size").set(5)
+        registry.add_collector(collect)
+        lines = registry.generate().splitlines()
+        assert lines[-1]=="# EOF"
+        for line in (
+            '# TYPE test_frames counter',
+            'test_frames_total{encoding="png"} 3',
+            'test_frames_total{encoding="we\\"ird"} 1',
+            '# TYPE test_seconds histogram',
+            'test_seconds_bucket{le="0.1"} 2',
+            'test_seconds_bucket{le="1.0"} 3',
+            'test_seconds_bucket{le="+Inf"} 4',
+            'test_seconds_sum 10.65',
+            'test_seconds_count 4',
+            'test_queue 5',
+            ):
+            assert line in lines, "'%s' not found in %s" % (line, lines)
+
+
+def main():
+    unittest.main()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,73 @@
+#!/usr/bin/env python3
+# This file is part of Xpra.
+# Copyright (C) 2021 Antoine Martin <antoine@xpra.org>
+# Xpra is released under the terms of the GNU GPL v2, or, at your option, any
+# later version. See the file COPYING for details.
+
+import time
+import pickle
+import socket
+import unittest
+from multiprocessing.reduction import recvfds
+
+from xpra.os_util import POSIX, monotonic_time
+from xpra.net.bytestreams import SocketConnection
+from xpra.server.proxy import proxy_pool
+from xpra.server.proxy.proxy_pool import ProxyPool, ProxyWorker, can_handoff
+
+
+class EchoWorker(ProxyWorker):
+    #receives the session like a real worker,
+    #but just writes the 'uid' argument to the client connection
+    def run(self):
+        self.socket.close()
+        self.worker_socket.sendall(proxy_pool.READY)
+        fds = recvfds(self.worker_socket, 2)
+        size = proxy_pool.LENGTH.unpack(proxy_pool.recv_all(self.worker_socket, proxy_pool.LENGTH.size))[0]
+        data = pickle.loads(proxy_pool.recv_all(self.worker_socket, size))
+        conn = proxy_pool.make_connection(fds[0], data["client-connection"])
+        conn.write(b"uid=%i" % data["kwargs"]["uid"])
+
+
+class ProxyPoolTest(unittest.TestCase):
+
+    def test_handoff(self):
+        client, client_peer = socket.socketpair()
+        server = socket.socketpair()[0]
+        client_conn = SocketConnection(client, "local", "remote", "target", "unix-domain")
+        server_conn = SocketConnection(server, "local", "remote", "target", "unix-domain")
+        assert can_handoff(client_conn, server_conn, {})
+        assert not can_handoff(client_conn, server_conn, {"cipher_in" : "AES"})
+        workers = []
+        pool = ProxyPool(1, (), 5, workers.append)
+        saved = proxy_pool.ProxyWorker
+        proxy_pool.ProxyWorker = EchoWorker
+        try:
+            pool.fill()
+        finally:
+            proxy_pool.ProxyWorker = saved
+        assert len(workers)==1
+        worker = pool.get_worker()
+        assert worker is workers[0]
+        start = monotonic_time()
+        while not worker.is_ready() and monotonic_time()-start<10:
+            time.sleep(0.1)
+        assert pool.handoff(worker, client_conn, server_conn, uid=1000)
+        client_peer.settimeout(10)
+        assert client_peer.recv(100)==b"uid=1000"
+        worker.join(10)
+        info = pool.get_info()
+        assert info["handoffs"]==1 and info["spawned"]==1
+        #the pool is now empty:
+        assert pool.get_worker() is None
+        assert pool.get_info()["misses"]==1
+        pool.close()
+
+
+def main():
+    if POSIX:
+        unittest.main()
+
+
+if __name__ == '__main__':
+    main()
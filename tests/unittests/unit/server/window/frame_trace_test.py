@@ -0,0 +1,67 @@
+#!/usr/bin/env python3
+# This file is part of Xpra.
+# Copyright (C) 2021 Antoine Martin <antoine@xpra.org>
+# Xpra is released under the terms of the GNU GPL v2, or, at your option, any
+# later version. See the file COPYING for details.
+
+import os
+import json
+import unittest
+import tempfile
+
+from xpra.server.window.frame_trace import FrameTracer, TRACKS
+
+
+class TestFrameTrace(unittest.TestCase):
+
+    def test_sampling(self):
+        tracer = FrameTracer(0)
+        assert tracer.new_trace(1, 1) is None, "tracing is disabled"
+        tracer.start(3)
+        traces = [tracer.new_trace(1, i) for i in range(9)]
+        assert sum(1 for t in traces if t)==3
+        tracer.stop()
+        assert tracer.new_trace(1, 10) is None
+
+    def test_export(self):
+        tracer = FrameTracer(1, 100)
+        trace = tracer.new_trace(5, 10)
+        trace.span("encode", "encode", 1.0, 1.002)
+        #invalid spans are ignored:
+        trace.span("send-queue", "network", 0, 1)
+        trace.span("network-write", "network", 2, 1)
+        trace.args["encoding"] = "png"
+        tracer.record(trace)
+        events = tracer.get_trace_events()
+        spans = [e for e in events if e["ph"]=="X"]
+        assert len(spans)==1
+        span = spans[0]
+        assert span["name"]=="encode"
+        assert span["ts"]==1000000 and span["dur"]==2000
+        assert span["tid"]==TRACKS.index("encode")
+        assert span["args"]=={"encoding" : "png", "wid" : 5, "sequence" : 10}
+        assert sum(1 for e in events if e["ph"]=="M")==len(TRACKS)+1
+        fd, filename = tempfile.mkstemp(suffix=".json")
+        os.close(fd)
+        try:
+            assert tracer.save(filename)==len(events)
+            with open(filename, "r") as f:
+                data = json.load(f)
+            assert len(data["traceEvents"])==len(events)
+        finally:
+            os.unlink(filename)
+        tracer.clear()
+        assert tracer.get_info()["frames"]==0
+
+    def test_buffer_limit(self):
+        tracer = FrameTracer(1, 100)
+        for i in range(200):
+            tracer.record(tracer.new_trace(1, i))
+        assert tracer.get_info()["buffered"]==100
+
+
+def main():
+    unittest.main()
+
+if __name__ == '__main__':
+    main()
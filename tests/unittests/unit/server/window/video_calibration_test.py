@@ -0,0 +1,205 @@
+#!/usr/bin/env python3
+# This file is part of Xpra.
+# Copyright (C) 2021 Antoine Martin <antoine@xpra.org>
+# Xpra is released under the terms of the GNU GPL v2, or, at your option, any
+# later version. See the file COPYING for details.
+
+import os
+import shutil
+import unittest
+import tempfile
+from gi.repository import GLib
+
+from xpra.util import AdHocStruct
+from xpra.server.window import video_calibration
+from xpra.server.window.video_calibration import VideoCalibration, CalibratedSpec, get_encoder_key
+from xpra.server.window.video_scoring import get_pipeline_score
+
+
+def make_encoder_spec(codec_type="test", encoding="h264"):
+    spec = AdHocStruct()
+    spec.codec_type = codec_type
+    spec.encoding = encoding
+    spec.width_mask = 0xfffe
+    spec.height_mask = 0xfffe
+    spec.quality = 50
+    spec.speed = 50
+    spec.size_efficiency = 50
+    spec.min_w = 16
+    spec.min_h = 16
+    spec.max_w = 4096
+    spec.max_h = 4096
+    spec.setup_cost = 50
+    spec.score_boost = 0
+    spec.gpu_cost = 0
+    spec.cpu_cost = 100
+    spec.can_scale = False
+    spec.has_lossless_mode = False
+    return spec
+
+
+class TestVideoCalibration(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.filename = os.path.join(self.tmpdir, "subdir", "video-calibration.json")
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def feed(self, vc, key, ms_per_frame, size=0, frames=video_calibration.MIN_SAMPLES, speed=50):
+        for _ in range(frames):
+            vc.record_encode(key, 1024*1024, ms_per_frame/1000.0, speed, size, 50)
+
+    def test_measurements(self):
+        vc = VideoCalibration(self.filename)
+        key = get_encoder_key("test", "h264")
+        spec = make_encoder_spec()
+        assert vc.get_speed(key) is None
+        assert vc.calibrate(spec, key) is spec, "not enough samples yet"
+        self.feed(vc, key, 10, frames=video_calibration.MIN_SAMPLES-1)
+        assert vc.get_speed(key) is None
+        self.feed(vc, key, 10, frames=1)
+        assert vc.get_speed(key)==50, "got %s" % vc.get_speed(key)
+        for _ in range(video_calibration.MIN_SETUPS):
+            vc.record_setup(key, 0.150)
+        assert vc.get_setup_cost(key)==75, "got %s" % vc.get_setup_cost(key)
+        vc.register_specs((spec, ))
+        cspec = vc.calibrate(spec, key, target_speed=50)
+        assert isinstance(cspec, CalibratedSpec)
+        #this is the only codec measured, so it is scaled back to the static values:
+        assert cspec.speed==50 and cspec.setup_cost==50, "got %s, %s" % (cspec.speed, cspec.setup_cost)
+        #other attributes come from the spec:
+        assert cspec.codec_type=="test"
+        info = vc.get_spec_info(key)
+        assert info["frames"]==video_calibration.MIN_SAMPLES
+        assert info["speed"]==50
+        assert info["encode-time"]=={40 : 10}, "got %s" % (info["encode-time"], )
+        #persisted:
+        vc.save()
+        assert os.path.exists(self.filename)
+        vc = VideoCalibration(self.filename)
+        assert vc.get_speed(key)==50
+        assert vc.get_setup_cost(key)==75
+
+    def test_may_save(self):
+        vc = VideoCalibration(self.filename)
+        self.feed(vc, get_encoder_key("test", "h264"), 10, frames=1)
+        vc.last_save = 0
+        vc.may_save()
+        #the file is written from the main loop, not from the encode thread:
+        assert vc.save_pending and not os.path.exists(self.filename)
+        context = GLib.MainContext.default()
+        while context.pending():
+            context.iteration(False)
+        assert not vc.save_pending and os.path.exists(self.filename)
+
+    def test_disabled(self):
+        vc = VideoCalibration(self.filename, False)
+        key = get_encoder_key("test", "h264")
+        self.feed(vc, key, 10)
+        assert vc.get_speed(key) is None
+        spec = make_encoder_spec()
+        assert vc.calibrate(spec, key) is spec
+        vc.save()
+        assert not os.path.exists(self.filename)
+
+    def test_invalid_file(self):
+        os.makedirs(os.path.dirname(self.filename))
+        with open(self.filename, "w") as f:
+            f.write("not json")
+        vc = VideoCalibration(self.filename)
+        assert not vc.load()
+        #entries from older versions, without the speed buckets:
+        with open(self.filename, "w") as f:
+            f.write('{"test:h264" : {"frames" : 100, "encode" : 10, "setups" : 0, "setup" : 0, "bpp" : {}}}')
+        vc = VideoCalibration(self.filename)
+        assert not vc.load()
+
+    def test_speed_buckets(self):
+        vc = VideoCalibration(self.filename)
+        key = get_encoder_key("test", "h264")
+        spec = make_encoder_spec()
+        #the same encoder is much faster at higher speed settings:
+        self.feed(vc, key, 30, speed=10)
+        self.feed(vc, key, 2, speed=90)
+        assert vc.get_encode_time(key, 10)==30 and vc.get_encode_time(key, 90)==2
+        assert vc.get_speed(key, 90)>vc.get_speed(key, 10)
+        #no measurements at this speed setting:
+        assert vc.get_speed(key, 50) is None
+        assert vc.calibrate(spec, key, target_speed=50) is spec
+        #all the speed settings:
+        assert vc.get_encode_time(key)==16
+        #this encoder does not get much faster at higher speed settings:
+        other = make_encoder_spec("other")
+        okey = get_encoder_key("other", "h264")
+        self.feed(vc, okey, 10, speed=10)
+        self.feed(vc, okey, 8, speed=90)
+        vc.register_specs((spec, other))
+        #so the lookups must use the target speed:
+        assert vc.calibrate(spec, key, target_speed=10).speed<vc.calibrate(other, okey, target_speed=10).speed
+        assert vc.calibrate(spec, key, target_speed=90).speed>vc.calibrate(other, okey, target_speed=90).speed
+
+    def test_efficiency(self):
+        vc = VideoCalibration(self.filename)
+        k1 = get_encoder_key("small", "h264")
+        k2 = get_encoder_key("large", "h264")
+        self.feed(vc, k1, 10, 10000)
+        self.feed(vc, k2, 10, 30000)
+        assert vc.get_efficiency_boost(k1, 50)>0
+        assert vc.get_efficiency_boost(k2, 50)<0
+        #no measurements at this quality level:
+        assert vc.get_efficiency_boost(k1, 100)==0
+
+    def test_scoring(self):
+        vc = VideoCalibration(self.filename)
+        fast = make_encoder_spec("fast")
+        slow = make_encoder_spec("slow")
+        def score(spec, calibration=None):
+            return get_pipeline_score("YUV420P", None, spec, 1920, 1080, (1, 1),
+                                      50, 0, 100, 0,
+                                      None, None,
+                                      0, 10, True, calibration)
+        #identical static values:
+        assert score(fast)[0]==score(slow)[0]
+        self.feed(vc, get_encoder_key("fast", "h264"), 2, speed=100)
+        self.feed(vc, get_encoder_key("slow", "h264"), 80, speed=100)
+        vc.register_specs((fast, slow))
+        sf = score(fast, vc)
+        ss = score(slow, vc)
+        assert sf[0]>ss[0], "measured speed should be used: %s vs %s" % (sf[0], ss[0])
+        #the original spec is returned:
+        assert sf[-1] is fast
+
+    def test_normalized(self):
+        vc = VideoCalibration(self.filename)
+        fast = make_encoder_spec("fast")
+        slow = make_encoder_spec("slow")
+        other = make_encoder_spec("other")
+        kf = get_encoder_key("fast", "h264")
+        ks = get_encoder_key("slow", "h264")
+        #all the measured encoders are much faster than the static values suggest,
+        #this must not give them an advantage over the encoders we have not measured:
+        self.feed(vc, kf, 1)
+        self.feed(vc, ks, 3)
+        assert vc.get_speed(kf, 50)>vc.get_speed(ks, 50)>50
+        #the scoring pass registers all the candidates before calibrating them,
+        #so they all get the same scale whatever the order:
+        csc = make_encoder_spec("csc", "")
+        vc.register_specs((fast, slow, other), (csc, ))
+        cs = vc.calibrate(slow, ks, target_speed=50)
+        assert vc.calibrate(other, get_encoder_key("other", "h264"), target_speed=50) is other
+        cf = vc.calibrate(fast, kf, target_speed=50)
+        assert cf.speed>other.speed>cs.speed, "got %s, %s, %s" % (cf.speed, other.speed, cs.speed)
+        assert abs(cf.speed+cs.speed-2*other.speed)<=1
+        #csc modules are scaled separately:
+        self.feed(vc, "csc", 100)
+        assert vc.calibrate(csc, "csc", target_speed=50).speed==50
+        assert vc.calibrate(fast, kf, target_speed=50).speed==cf.speed
+
+
+def main():
+    unittest.main()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,79 @@
+#!/usr/bin/env python3
+# This file is part of Xpra.
+# Copyright (C) 2021 Antoine Martin <antoine@xpra.org>
+# Xpra is released under the terms of the GNU GPL v2, or, at your option, any
+# later version. See the file COPYING for details.
+
+import unittest
+
+from xpra.os_util import monotonic_time
+from xpra.server.window.video_pool import ContextPool, get_csc_key
+
+
+class FakeContext:
+
+    def __init__(self):
+        self.closed = False
+
+    def is_closed(self):
+        return self.closed
+
+    def clean(self):
+        self.closed = True
+
+
+class TestVideoPool(unittest.TestCase):
+
+    def test_keys(self):
+        assert get_csc_key("libyuv", "BGRX", 640, 480, "YUV420P", 640, 480)
+        assert get_csc_key("libyuv", "BGRX", 640, 480, "YUV420P", 320, 240) is None, "scaled contexts are not pooled"
+
+    def test_take(self):
+        pool = ContextPool(2, 10)
+        k1 = get_csc_key("libyuv", "BGRX", 640, 480, "YUV420P", 640, 480)
+        k2 = get_csc_key("swscale", "BGRX", 640, 480, "YUV420P", 640, 480)
+        c1 = FakeContext()
+        assert pool.take(k1) is None
+        assert pool.put(k1, c1)==[]
+        #parking the same context twice is ignored:
+        assert pool.put(k1, c1)==[]
+        assert pool.take(k2) is None
+        assert pool.take(k1) is c1
+        assert pool.take(k1) is None
+        info = pool.get_info()
+        assert info["hits"]==1 and info["misses"]==3, "unexpected pool info: %s" % (info, )
+        #closed contexts are returned to the caller:
+        c1.clean()
+        assert pool.put(k1, c1)==[c1]
+        #so are the ones we can't re-use:
+        c2 = FakeContext()
+        assert pool.put(None, c2)==[c2]
+
+    def test_expire(self):
+        pool = ContextPool(2, 10)
+        contexts = [FakeContext() for _ in range(3)]
+        for i, c in enumerate(contexts):
+            expired = pool.put(("key", i), c)
+        assert expired==[contexts[0]], "the oldest context should have been evicted"
+        now = monotonic_time()
+        assert 9000<=pool.get_expire_delay(now)<=10000
+        assert pool.get_expire_delay(now+60)==0
+        assert pool.expire(monotonic_time()+60)==contexts[1:]
+        assert not pool.contexts
+        assert pool.get_info()["expired"]==3
+        assert pool.get_expire_delay()==-1
+        pool.put("key", contexts[0])
+        assert pool.clear()==[contexts[0]]
+
+    def test_disabled(self):
+        pool = ContextPool(0)
+        c = FakeContext()
+        assert pool.put("key", c)==[c]
+        assert pool.take("key") is None
+
+
+def main():
+    unittest.main()
+
+if __name__ == '__main__':
+    main()
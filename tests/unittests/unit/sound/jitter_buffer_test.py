@@ -0,0 +1,59 @@
+#!/usr/bin/env python3
+# This file is part of Xpra.
+# Copyright (C) 2021 Antoine Martin <antoine@xpra.org>
+# Xpra is released under the terms of the GNU GPL v2, or, at your option, any
+# later version. See the file COPYING for details.
+
+import unittest
+
+from xpra.sound.jitter_buffer import JitterBuffer, percentile, JITTER_MIN_LEVEL, JITTER_HEADROOM
+
+
+class TestJitterBuffer(unittest.TestCase):
+
+    def feed(self, jb, delays, clock_offset=12345):
+        #one buffer every 20ms, each one delayed by the given amount:
+        now = 100
+        for i, delay in enumerate(delays):
+            send_time = 1000*now+i*20
+            arrival = (send_time+clock_offset+delay)/1000
+            jb.record(arrival, {"time" : send_time, "latency" : 5})
+        return arrival
+
+    def test_percentile(self):
+        values = list(range(1, 101))
+        assert percentile(values, 50)==50
+        assert percentile(values, 95)==95
+        assert percentile(values, 100)==100
+        assert percentile((), 50)==0
+
+    def test_lan(self):
+        jb = JitterBuffer()
+        now = self.feed(jb, [1]*10)
+        #not enough samples yet:
+        assert jb.get_target(now) is None
+        now = self.feed(jb, [1]*100)
+        assert jb.get_target(now)==(JITTER_MIN_LEVEL, JITTER_MIN_LEVEL+JITTER_HEADROOM)
+
+    def test_wifi(self):
+        jb = JitterBuffer()
+        now = self.feed(jb, [0, 10, 150, 20, 5]*20)
+        target = jb.get_target(now)
+        assert target[0]==150, "expected a min level of 150ms but got %s" % (target,)
+        assert target[1]>target[0]+100
+        jb.set_network_jitter(30)
+        assert jb.get_target(now)[0]==180
+        info = jb.get_info(now)
+        assert info["delay"]["99p"]==150
+        assert info["source-latency"]["50p"]==5
+        assert info["network-jitter"]==30
+        assert info["jitter"]>0
+        jb.reset()
+        assert jb.get_target(now) is None
+
+
+def main():
+    unittest.main()
+
+if __name__ == '__main__':
+    main()
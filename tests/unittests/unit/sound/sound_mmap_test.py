@@ -0,0 +1,42 @@
+#!/usr/bin/env python3
+# This file is part of Xpra.
+# Copyright (C) 2021 Antoine Martin <antoine@xpra.org>
+# Xpra is released under the terms of the GNU GPL v2, or, at your option, any
+# later version. See the file COPYING for details.
+
+import os
+import unittest
+
+from xpra.os_util import POSIX
+from xpra.sound.sound_mmap import SoundBufferRing
+
+
+class TestSoundMmap(unittest.TestCase):
+
+    def test_ring(self):
+        parent = SoundBufferRing.create(64*1024)
+        filename = parent.filename
+        assert os.path.exists(filename)
+        child = SoundBufferRing.open(filename)
+        assert child.size==parent.size
+        #enough buffers to wrap around a few times:
+        for i in range(100):
+            data = os.urandom(1000+i*37)
+            chunks = child.write(data)
+            assert chunks, "failed to write buffer %i" % i
+            assert parent.read(chunks)==data
+        assert child.buffers==parent.buffers==100
+        #too big, must go through the pipe instead:
+        assert child.write(os.urandom(parent.size//2)) is None
+        assert child.get_info()["skipped"]==1
+        child.close()
+        parent.close()
+        assert not os.path.exists(filename)
+
+
+def main():
+    if POSIX:
+        unittest.main()
+
+if __name__ == '__main__':
+    main()
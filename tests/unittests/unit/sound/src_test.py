@@ -0,0 +1,144 @@
+#!/usr/bin/env python3
+# This file is part of Xpra.
+# Copyright (C) 2021 Antoine Martin <antoine@xpra.org>
+# Xpra is released under the terms of the GNU GPL v2, or, at your option, any
+# later version. See the file COPYING for details.
+
+import unittest
+from threading import Lock
+
+from xpra.util import AdHocStruct
+from xpra.sound.sound_pipeline import SoundPipeline
+from xpra.sound.src import SoundSource
+from xpra.sound.gstreamer_util import MS_TO_NS, GST_FLOW_OK, BUNDLE_DELAY, BUNDLE_MAX_FRAMES
+from xpra.server.source.audio_mixin import AudioMixin
+from xpra.client.mixins.audio import AudioClient
+
+
+class BundleSource(SoundSource):
+    #only the frame bundling state, without a pipeline,
+    #records the buffers emitted and timers never fire
+
+    def __init__(self):   #pylint: disable=super-init-not-called
+        SoundPipeline.__init__(self, "opus")
+        self.pending_metadata = []
+        self.bundle_delay = 0
+        self.bundle_max_frames = BUNDLE_MAX_FRAMES
+        self.bundle_frames = 0
+        self.bundle_size = 0
+        self.bundle_duration = 0
+        self.bundle_metadata = {}
+        self.bundle_timer = 0
+        self.bundle_lock = Lock()
+        self.bundled_frames = 0
+        self.bundled_packets = 0
+        self.timers = {}
+        self.timeout_add = self.add_timer
+        self.source_remove = self.timers.pop
+        self.emitted = []
+
+    def add_timer(self, delay, fn, *args):
+        t = max(self.timers or (0, ))+1
+        self.timers[t] = (delay, fn, args)
+        return t
+
+    def _emit_buffer(self, data, metadata):
+        self.emitted.append((data, metadata, self.pending_metadata))
+        self.pending_metadata = []
+        return GST_FLOW_OK
+
+    def new_frame(self, data, duration_ms, metadata=None):
+        #what on_new_sample does with each encoded frame:
+        metadata = metadata or {"duration" : duration_ms*MS_TO_NS}
+        with self.bundle_lock:
+            if self.bundle_buffer(data, duration_ms*MS_TO_NS, metadata):
+                return
+            self._emit_buffer(data, metadata)
+
+
+class TestSoundSource(unittest.TestCase):
+
+    def test_bundle_disabled(self):
+        src = BundleSource()
+        src.new_frame(b"0"*10, 10)
+        assert len(src.emitted)==1 and not src.timers
+        #no duration, so we can't bundle it:
+        src.set_bundle(60)
+        src.new_frame(b"1"*10, 0)
+        assert len(src.emitted)==2 and not src.timers
+
+    def test_bundle_delay(self):
+        src = BundleSource()
+        src.set_bundle(60, 100)
+        frames = [bytes([i])*10 for i in range(6)]
+        for frame in frames[:5]:
+            src.new_frame(frame, 10)
+        assert not src.emitted
+        assert src.bundle_frames==5 and len(src.timers)==1
+        #this frame reaches the 60ms latency budget:
+        src.new_frame(frames[5], 10)
+        assert len(src.emitted)==1
+        data, _, packet_metadata = src.emitted[0]
+        assert data==frames[5] and packet_metadata==frames[:5]
+        assert src.bundled_frames==6 and src.bundled_packets==1
+        assert not src.timers and not src.bundle_frames
+
+    def test_bundle_limits(self):
+        src = BundleSource()
+        src.set_bundle(1000, 3)
+        for i in range(3):
+            src.new_frame(bytes([i])*10, 10)
+        assert len(src.emitted)==1 and len(src.emitted[0][2])==2, "the bundle should be capped at 3 frames"
+        #big frames are sent as they are:
+        src.new_frame(b"0"*10000, 10)
+        assert len(src.emitted)==2 and not src.emitted[1][2]
+        assert src.bundled_packets==1
+
+    def test_flush_bundle(self):
+        src = BundleSource()
+        src.set_bundle(60)
+        #nothing to flush:
+        assert src.flush_bundle() is False
+        assert not src.emitted
+        for i in range(2):
+            src.new_frame(bytes([i])*10, 10, {"timestamp" : i, "duration" : 10*MS_TO_NS})
+        assert len(src.timers)==1
+        #the stream has paused, so the timer fires:
+        delay, fn, args = tuple(src.timers.values())[0]
+        assert delay==60
+        assert fn(*args) is False
+        assert len(src.emitted)==1
+        data, metadata, packet_metadata = src.emitted[0]
+        #the last frame is sent with its own metadata:
+        assert data==b"\1"*10 and metadata["timestamp"]==1, "got %s, %s" % (data, metadata)
+        assert packet_metadata==[b"\0"*10]
+        assert src.bundled_frames==2 and src.bundled_packets==1
+        assert not src.bundle_frames and not src.bundle_metadata
+
+    def test_bundle_delay_negotiation(self):
+        def server_delay(metadata, delay):
+            ss = AdHocStruct()
+            ss.sound_bundle_metadata = metadata
+            ss.sound_bundle_delay = delay
+            return AudioMixin.get_sound_bundle_delay(ss)
+        def client_delay(metadata, delay):
+            client = AdHocStruct()
+            client.server_sound_bundle_metadata = metadata
+            client.server_sound_bundle_delay = delay
+            return AudioClient.get_sound_bundle_delay(client)
+        for get_delay in (server_delay, client_delay):
+            #the peer can't receive bundles:
+            assert get_delay(False, 10)==0
+            #the peer did not specify a latency budget:
+            assert get_delay(True, -1)==BUNDLE_DELAY
+            #we use the lower of the two:
+            assert get_delay(True, 5)==min(5, BUNDLE_DELAY)
+            assert get_delay(True, BUNDLE_DELAY+100)==BUNDLE_DELAY
+            assert get_delay(True, 0)==0
+
+
+def main():
+    unittest.main()
+
+if __name__ == '__main__':
+    main()
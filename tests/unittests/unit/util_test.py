@@ -6,7 +6,10 @@
 
 import unittest
 
-from xpra.util import AtomicInteger, MutableInteger, typedict, log_screen_sizes, updict, pver, std, alnum, nonl
+from xpra.util import (
+    AtomicInteger, MutableInteger, typedict, log_screen_sizes, updict, pver, std, alnum, nonl,
+    dict_delta, apply_dict_delta,
+    )
 
 
 class TestIntegerClasses(unittest.TestCase):
@@ -144,6 +147,28 @@ class TestModuleFunctions(unittest.TestCase):
         self.assertEqual(d.get("d3.moo.hat"), "cow")
 
 
+    def test_dict_delta(self):
+        old = {
+            "server"    : {"pid" : 100, "elapsed" : 10, "load" : (1, 2, 3)},
+            "clients"   : {0 : {"uuid" : "a"}, 1 : {"uuid" : "b"}},
+            "gone"      : True,
+            }
+        new = {
+            "server"    : {"pid" : 100, "elapsed" : 11, "load" : (1, 2, 3)},
+            "clients"   : {0 : {"uuid" : "a"}},
+            "display"   : {"depth" : 24},
+            }
+        changed, removed = dict_delta(old, new)
+        self.assertEqual(changed, {"server" : {"elapsed" : 11}, "display" : {"depth" : 24}})
+        self.assertEqual(sorted(removed, key=str), [("clients", 1), ("gone", )])
+        self.assertEqual(apply_dict_delta(old, changed, removed), new)
+        self.assertEqual(dict_delta(new, new), ({}, []))
+        #the first update contains everything:
+        self.assertEqual(dict_delta(None, new), (new, []))
+        #a value changing type:
+        changed, removed = dict_delta({"a" : {"b" : 1}}, {"a" : 1})
+        self.assertEqual(apply_dict_delta({"a" : {"b" : 1}}, changed, removed), {"a" : 1})
+
     def test_pver(self):
         self.assertEqual(pver(""), "")
         self.assertEqual(pver("any string"), "any string")
@@ -5,7 +5,7 @@
 
 #cython: wraparound=False, boundscheck=False, language_level=3
 
-from libc.stdint cimport uint32_t, uintptr_t  #pylint: disable=syntax-error
+from libc.stdint cimport uint32_t, uint64_t, uintptr_t  #pylint: disable=syntax-error
 from xpra.buffers.membuf cimport getbuf, MemBuf, buffer_context
 from libc.string cimport memcpy, memset
 
@@ -69,52 +69,64 @@ def hybi_unmask(data, unsigned int offset, unsigned int datalen):
     with buffer_context(data) as bc:
         assert len(bc)>=<Py_ssize_t>(offset+4+datalen), "buffer too small %i vs %i: offset=%i, datalen=%i" % (len(bc), offset+4+datalen, offset, datalen)
         mp = (<uintptr_t> int(bc))+offset
-        return do_hybi_mask(mp, mp+4, datalen)
+        return do_hybi_mask(mp, mp+4, datalen, 0)
 
-def hybi_mask(mask, data):
+def hybi_mask(mask, data, unsigned int phase=0):
+    """
+        'phase' is the position of the first byte of 'data' in the masked payload,
+        so a payload can be unmasked in pieces as it arrives
+    """
     with buffer_context(mask) as mbc:
         if len(mbc)<4:
             raise Exception("mask buffer too small: %i bytes" % len(mbc))
         with buffer_context(data) as dbc:
-            return do_hybi_mask(<uintptr_t> int(mbc), <uintptr_t> int(dbc), len(dbc))
+            return do_hybi_mask(<uintptr_t> int(mbc), <uintptr_t> int(dbc), len(dbc), phase)
 
-cdef object do_hybi_mask(uintptr_t mp, uintptr_t dp, unsigned int datalen):
+cdef object do_hybi_mask(uintptr_t mp, uintptr_t dp, unsigned int datalen, unsigned int phase):
     #we skip the first 'align' bytes in the output buffer,
     #to ensure that its alignment is the same as the input data buffer
-    cdef unsigned int align = (<uintptr_t> dp) & 0x3
-    cdef unsigned int initial_chars = (4-align) & 0x3
+    cdef unsigned int align = (<uintptr_t> dp) & 0x7
     cdef MemBuf out_buf = getbuf(datalen+align)
     cdef uintptr_t op = <uintptr_t> out_buf.get_mem()
-    #char pointers:
-    cdef unsigned char *mcbuf = <unsigned char *> mp
-    cdef unsigned char *dcbuf = <unsigned char *> dp
-    cdef unsigned char *ocbuf = <unsigned char *> op
-    cdef unsigned int i, j
-    #bytes at a time until we reach the 32-bit boundary:
-    for 0 <= i < initial_chars:
-        ocbuf[align+i] = dcbuf[i] ^ mcbuf[i & 0x3]
-    #32-bit pointers:
-    cdef uint32_t *dbuf
-    cdef uint32_t *obuf
-    cdef uint32_t mask_value
-    cdef unsigned int uint32_steps = 0
-    cdef unsigned int last_chars = 0
-    if datalen>initial_chars:
-        uint32_steps = (datalen-initial_chars) // 4
-        if uint32_steps:
-            dbuf = <uint32_t*> (dp+initial_chars)
-            obuf = <uint32_t*> (op+align+initial_chars)
-            mask_value = 0
-            for 0 <= i < 4:
-                mask_value = mask_value<<8
-                mask_value += mcbuf[(3-i+initial_chars) & 0x3]
-            for 0 <= i < uint32_steps:
-                obuf[i] = dbuf[i] ^ mask_value
-        #bytes at a time again at the end:
-        last_chars = (datalen-initial_chars) & 0x3
-        for 0 <= i < last_chars:
-            j = datalen-last_chars+i
-            ocbuf[align+j] = dcbuf[j] ^ mcbuf[j & 0x3]
+    with nogil:
+        xor_mask(<const unsigned char *> mp, phase, <const unsigned char *> dp, <unsigned char *> (op+align), datalen)
     if align>0:
         return memoryview(out_buf)[align:]
     return memoryview(out_buf)
+
+cdef inline int xor_mask(const unsigned char *mask, unsigned int phase,
+                          const unsigned char *src, unsigned char *dst, size_t datalen) nogil:
+    """
+        xors the 4 byte mask over 'src' and writes the result to 'dst',
+        which must have the same alignment as 'src'.
+        The bulk of the data is processed 64 bits at a time,
+        which the compiler can vectorize.
+    """
+    cdef size_t i = 0
+    #bytes at a time until we reach the 64-bit boundary:
+    cdef size_t initial_chars = (8-((<uintptr_t> src) & 0x7)) & 0x7
+    if initial_chars>datalen:
+        initial_chars = datalen
+    while i<initial_chars:
+        dst[i] = src[i] ^ mask[(phase+i) & 0x3]
+        i += 1
+    #64-bit mask value matching the phase at this position,
+    #built in memory order so this does not depend on endianness:
+    cdef unsigned char pattern[8]
+    cdef unsigned int k
+    for k in range(8):
+        pattern[k] = mask[(phase+initial_chars+k) & 0x3]
+    cdef uint64_t mask_value
+    memcpy(&mask_value, pattern, 8)
+    cdef size_t uint64_steps = (datalen-initial_chars) // 8
+    cdef const uint64_t *sbuf = <const uint64_t *> (src+initial_chars)
+    cdef uint64_t *obuf = <uint64_t *> (dst+initial_chars)
+    cdef size_t j
+    for j in range(uint64_steps):
+        obuf[j] = sbuf[j] ^ mask_value
+    #bytes at a time again at the end:
+    i = initial_chars+uint64_steps*8
+    while i<datalen:
+        dst[i] = src[i] ^ mask[(phase+i) & 0x3]
+        i += 1
+    return 0
@@ -10,6 +10,7 @@ from cpython.buffer cimport PyBuffer_FillInfo   #pylint: disable=syntax-error
 cdef MemBuf getbuf(size_t l)
 cdef MemBuf padbuf(size_t l, size_t padding)
 cdef MemBuf makebuf(void *p, size_t l)
+cdef MemBuf poolbuf(size_t l, size_t padding)
 
 cdef buffer_context(object obj)
 
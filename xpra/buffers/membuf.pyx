@@ -12,6 +12,7 @@
 #    which will be freed when the python object is garbage collected
 #    (also uses memalign to allocate the buffer)
 # 2) object to buffer conversion utility functions,
+# 3) a pool of size-classed buffers, see poolbuf()
 
 #cython: auto_pickle=False, wraparound=False, cdivision=True, language_level=3
 
@@ -20,6 +21,8 @@ from libc.stdlib cimport free
 from libc.string cimport memset, memcpy
 from libc.stdint cimport uintptr_t
 
+from xpra.util import envint, envbool
+
 cdef extern from "Python.h":
     int PyObject_GetBuffer(object obj, Py_buffer *view, int flags)
     void PyBuffer_Release(Py_buffer *view)
@@ -55,6 +58,117 @@ cdef void *memalign(size_t size) nogil:
 def get_membuf(size_t l):
     return getbuf(l)
 
+def get_pooled_membuf(size_t l):
+    return poolbuf(l, 0)
+
+
+#Buffer pool:
+#buffers are allocated using size classes (4 classes per power of 2),
+#when the MemBuf is garbage collected, the memory is returned to the pool
+#so the next buffer of the same size class can re-use it.
+#The GIL protects all access to the pool:
+#pooled buffers are always allocated and deallocated with the GIL held.
+DEF POOL_CLASSES = 256
+DEF POOL_MAX_SLOTS = 16
+cdef int POOL_ENABLED = envbool("XPRA_MEMBUF_POOL", True)
+#smaller buffers are cheap enough to allocate:
+cdef size_t POOL_MIN_SIZE = envint("XPRA_MEMBUF_POOL_MIN_SIZE", 64*1024)
+#maximum amount of idle memory held in the pool (in MB):
+cdef size_t POOL_MAX_SIZE = envint("XPRA_MEMBUF_POOL_MAX_SIZE", 256)*1024*1024
+#maximum number of idle buffers for each size class:
+cdef unsigned int POOL_SLOTS = max(0, min(POOL_MAX_SLOTS, envint("XPRA_MEMBUF_POOL_SLOTS", 4)))
+
+cdef void *pool[POOL_CLASSES][POOL_MAX_SLOTS]
+cdef unsigned int pool_count[POOL_CLASSES]
+memset(pool_count, 0, sizeof(pool_count))
+cdef size_t pool_size = 0
+cdef unsigned long pool_hits = 0
+cdef unsigned long pool_misses = 0
+cdef unsigned long pool_returned = 0
+cdef unsigned long pool_freed = 0
+
+
+cdef inline size_t class_size(unsigned int index):
+    #size classes: 2^(index//4) * (1 + (index%4)/4)
+    cdef size_t base = (<size_t> 1) << (index//4)
+    return base + (index%4)*(base//4)
+
+cdef unsigned int size_class(size_t l):
+    #find the smallest size class which can hold 'l' bytes:
+    cdef unsigned int index = 0
+    while index<POOL_CLASSES and class_size(index)<l:
+        index += 1
+    return index
+
+cdef void pool_return_buf(const void *p, size_t l, void *arg):
+    global pool_size, pool_returned, pool_freed
+    cdef unsigned int index = <unsigned int> (<uintptr_t> arg)
+    cdef size_t size = class_size(index)
+    if pool_count[index]<POOL_SLOTS and pool_size+size<=POOL_MAX_SIZE:
+        pool[index][pool_count[index]] = <void *> p
+        pool_count[index] += 1
+        pool_size += size
+        pool_returned += 1
+        return
+    pool_freed += 1
+    free(<void *>p)
+
+cdef MemBuf poolbuf(size_t l, size_t padding):
+    """
+        Returns a buffer from the pool, or allocates a new one.
+        The memory is returned to the pool when the MemBuf is freed.
+    """
+    global pool_size, pool_hits, pool_misses
+    cdef const void *p = NULL
+    cdef unsigned int index
+    cdef size_t size
+    if not POOL_ENABLED or POOL_SLOTS==0 or l+padding<POOL_MIN_SIZE:
+        return padbuf(l, padding)
+    index = size_class(l+padding)
+    if index>=POOL_CLASSES:
+        return padbuf(l, padding)
+    size = class_size(index)
+    if pool_count[index]>0:
+        pool_count[index] -= 1
+        p = pool[index][pool_count[index]]
+        pool_size -= size
+        pool_hits += 1
+    else:
+        p = xmemalign(size)
+        assert p!=NULL, "failed to allocate %i bytes of memory" % size
+        pool_misses += 1
+    return MemBuf_init(p, l, &pool_return_buf, <void *> (<uintptr_t> index))
+
+
+def get_pool_info():
+    cdef unsigned int i
+    buffers = {}
+    for i in range(POOL_CLASSES):
+        if pool_count[i]:
+            buffers[class_size(i)] = pool_count[i]
+    return {
+        "enabled"   : bool(POOL_ENABLED),
+        "min-size"  : POOL_MIN_SIZE,
+        "max-size"  : POOL_MAX_SIZE,
+        "slots"     : POOL_SLOTS,
+        "size"      : pool_size,
+        "hits"      : pool_hits,
+        "misses"    : pool_misses,
+        "returned"  : pool_returned,
+        "freed"     : pool_freed,
+        "buffers"   : buffers,
+        }
+
+def clear_pool():
+    global pool_size, pool_freed
+    cdef unsigned int i
+    for i in range(POOL_CLASSES):
+        while pool_count[i]>0:
+            pool_count[i] -= 1
+            free(pool[i][pool_count[i]])
+            pool_freed += 1
+    pool_size = 0
+
 
 cdef class MemBuf:
 
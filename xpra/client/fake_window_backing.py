@@ -31,7 +31,10 @@ class FakeBacking:
 
     def draw_region(self, _x, _y, _width, _height, _coding, _img_data, _rowstride, _options, callbacks):
         log("draw_region(..) faking it after %sms", self.fake_delay)
-        GLib.timeout_add(self.fake_delay, fire_paint_callbacks, callbacks, True)
+        if self.fake_delay<=0:
+            fire_paint_callbacks(callbacks, True)
+        else:
+            GLib.timeout_add(self.fake_delay, fire_paint_callbacks, callbacks, True)
 
     def cairo_draw(self, context, x, y):
         pass
@@ -0,0 +1,314 @@
+# This file is part of Xpra.
+# Copyright (C) 2021 Antoine Martin <antoine@xpra.org>
+# Xpra is released under the terms of the GNU GPL v2, or, at your option, any
+# later version. See the file COPYING for details.
+
+"""
+A ring of persistently mapped pixel buffer objects.
+
+The decode threads copy the pixels straight into a free slot of the ring
+(no GL context needed, the buffers stay mapped for the lifetime of the ring),
+the UI thread then updates the textures from the pixel buffer object,
+so the driver can transfer the data asynchronously.
+Each slot is protected by a fence until the GPU is done with it.
+
+Requires GL_ARB_buffer_storage and GL_ARB_sync,
+the caller must fallback to regular uploads when those are missing.
+"""
+
+import ctypes
+from threading import Condition
+
+from OpenGL.GL import (
+    GL_PIXEL_UNPACK_BUFFER, GL_MAP_WRITE_BIT,
+    glGenBuffers, glBindBuffer, glDeleteBuffers,
+    glMapBufferRange, glUnmapBuffer,
+    )
+from OpenGL.GL.ARB.buffer_storage import (
+    glInitBufferStorageARB, glBufferStorage,
+    GL_MAP_PERSISTENT_BIT, GL_MAP_COHERENT_BIT,
+    )
+from OpenGL.GL.ARB.sync import (
+    glInitSyncARB, glFenceSync, glClientWaitSync, glDeleteSync,
+    GL_SYNC_GPU_COMMANDS_COMPLETE, GL_ALREADY_SIGNALED, GL_CONDITION_SATISFIED,
+    )
+
+from xpra.log import Logger
+
+log = Logger("opengl", "paint")
+
+#slot states:
+FREE = 0        #can be used by a decode thread
+WRITING = 1     #a decode thread is copying pixels into it
+STAGED = 2      #pixels are ready, waiting for the UI thread to upload them
+PENDING = 3     #the upload has been queued, waiting for its fence
+
+PLANE_ALIGNMENT = 64
+
+STATE_STR = {
+    FREE    : "free",
+    WRITING : "writing",
+    STAGED  : "staged",
+    PENDING : "pending",
+    }
+
+
+def is_pbo_ring_supported() -> bool:
+    #must be called with a GL context current
+    try:
+        return bool(glInitBufferStorageARB()) and bool(glInitSyncARB())
+    except Exception as e:
+        log("is_pbo_ring_supported()", exc_info=True)
+        log.warn("Warning: unable to query pixel buffer object support: %s", e)
+        return False
+
+
+class PBOSlot:
+    __slots__ = ("index", "pbo", "view", "state", "fence")
+
+    def __init__(self, index : int, pbo, view):
+        self.index = index
+        self.pbo = pbo
+        self.view = view
+        self.state = FREE
+        self.fence = None
+
+    def __repr__(self):
+        return "PBOSlot(%i:%s)" % (self.index, STATE_STR.get(self.state, self.state))
+
+
+class PBOPixels:
+    """
+        Pixel data staged in a ring slot,
+        one or more planes at the given offsets.
+        Use it as a context manager from the UI thread:
+        the pixel buffer is bound on enter and fenced on exit.
+    """
+    __slots__ = ("ring", "slot", "offsets", "size")
+
+    def __init__(self, ring, slot : PBOSlot, offsets, size : int):
+        self.ring = ring
+        self.slot = slot
+        self.offsets = offsets
+        self.size = size
+
+    def __len__(self):
+        return self.size
+
+    def __repr__(self):
+        return "PBOPixels(%s, %i bytes)" % (self.slot, self.size)
+
+    def get_pixels(self, plane : int=0):
+        #with the unpack buffer bound, GL interprets the data pointer as an offset:
+        return ctypes.c_void_p(self.offsets[plane])
+
+    def __enter__(self):
+        if self.ring.closed:
+            raise Exception("%s is closed" % self.ring)
+        glBindBuffer(GL_PIXEL_UNPACK_BUFFER, self.slot.pbo)
+        return self
+
+    def __exit__(self, *_args):
+        glBindBuffer(GL_PIXEL_UNPACK_BUFFER, 0)
+        self.ring.submitted(self.slot)
+
+    def release(self):
+        #safe to call from any thread, does nothing once submitted
+        self.ring.release(self.slot)
+
+
+class PBORing:
+
+    def __init__(self, slots : int, slot_size : int):
+        self.slot_size = slot_size
+        self.nslots = slots
+        self.slots = []
+        self.lock = Condition()
+        self.writers = 0
+        self.retired = False
+        self.closed = False
+        self.staged = 0
+        self.uploads = 0
+        self.full = 0
+        self.oversize = 0
+
+    def __repr__(self):
+        return "PBORing(%i x %i bytes)" % (self.nslots, self.slot_size)
+
+    def get_info(self) -> dict:
+        with self.lock:
+            states = [slot.state for slot in self.slots]
+        return {
+            "slots"     : self.nslots,
+            "slot-size" : self.slot_size,
+            "retired"   : self.retired,
+            "closed"    : self.closed,
+            "staged"    : self.staged,
+            "uploads"   : self.uploads,
+            "full"      : self.full,
+            "oversize"  : self.oversize,
+            "state"     : dict((v, states.count(k)) for k, v in STATE_STR.items()),
+            }
+
+    def init(self):
+        #must be called with a GL context current
+        flags = GL_MAP_WRITE_BIT | GL_MAP_PERSISTENT_BIT | GL_MAP_COHERENT_BIT
+        pbos = glGenBuffers(self.nslots)
+        if self.nslots==1:
+            pbos = [pbos]
+        try:
+            for i, pbo in enumerate(pbos):
+                glBindBuffer(GL_PIXEL_UNPACK_BUFFER, pbo)
+                glBufferStorage(GL_PIXEL_UNPACK_BUFFER, self.slot_size, None, flags)
+                ptr = glMapBufferRange(GL_PIXEL_UNPACK_BUFFER, 0, self.slot_size, flags)
+                address = getattr(ptr, "value", ptr)
+                if not address:
+                    raise Exception("failed to map pixel buffer object %i" % i)
+                mem = (ctypes.c_ubyte * self.slot_size).from_address(address)
+                self.slots.append(PBOSlot(i, pbo, memoryview(mem).cast("B")))
+        except Exception:
+            log("%s.init() failed", self, exc_info=True)
+            #unmap what we have mapped so far, and delete all the buffers:
+            for slot in self.slots:
+                slot.view.release()
+                slot.view = None
+                try:
+                    glBindBuffer(GL_PIXEL_UNPACK_BUFFER, slot.pbo)
+                    glUnmapBuffer(GL_PIXEL_UNPACK_BUFFER)
+                except Exception:
+                    log("failed to unmap %s", slot, exc_info=True)
+            self.slots = []
+            self.closed = True
+            glBindBuffer(GL_PIXEL_UNPACK_BUFFER, 0)
+            glDeleteBuffers(len(pbos), pbos)
+            raise
+        glBindBuffer(GL_PIXEL_UNPACK_BUFFER, 0)
+        log("%s initialized", self)
+
+
+    def stage(self, planes, sizes):
+        """
+            Copies the pixel planes into a free slot,
+            returns a PBOPixels object, or None if the pixels cannot be staged.
+            Can be called from any thread, no GL context is required.
+        """
+        try:
+            views = tuple(memoryview(plane).cast("B") for plane in planes)
+        except (TypeError, ValueError):
+            log("cannot stage %s", tuple(type(plane) for plane in planes), exc_info=True)
+            return None
+        #each plane starts on an aligned offset:
+        offsets = []
+        size = 0
+        for plane_size in sizes:
+            offsets.append(size)
+            size += (plane_size+PLANE_ALIGNMENT-1) & ~(PLANE_ALIGNMENT-1)
+        with self.lock:
+            if self.retired:
+                return None
+            if size>self.slot_size:
+                self.oversize += 1
+                return None
+            for slot in self.slots:
+                if slot.state==FREE:
+                    break
+            else:
+                self.full += 1
+                return None
+            slot.state = WRITING
+            self.writers += 1
+        #copy without holding the lock:
+        try:
+            for view, offset, plane_size in zip(views, offsets, sizes):
+                slot.view[offset:offset+plane_size] = view[:plane_size]
+        except Exception:
+            log("failed to stage %i bytes into %s", size, slot, exc_info=True)
+            with self.lock:
+                slot.state = FREE
+                self.writers -= 1
+                self.lock.notify_all()
+            return None
+        with self.lock:
+            slot.state = STAGED
+            self.staged += 1
+            self.writers -= 1
+            self.lock.notify_all()
+        return PBOPixels(self, slot, tuple(offsets), size)
+
+    def release(self, slot : PBOSlot):
+        with self.lock:
+            if slot.state==STAGED:
+                slot.state = FREE
+
+    def submitted(self, slot : PBOSlot):
+        #must be called with a GL context current, after the texture upload:
+        fence = glFenceSync(GL_SYNC_GPU_COMMANDS_COMPLETE, 0)
+        with self.lock:
+            slot.fence = fence
+            slot.state = PENDING
+            self.uploads += 1
+
+    def poll(self):
+        """
+            Frees the slots whose upload has completed.
+            Must be called with a GL context current.
+        """
+        for slot in self.slots:
+            if slot.state!=PENDING:
+                continue
+            r = glClientWaitSync(slot.fence, 0, 0)
+            if r in (GL_ALREADY_SIGNALED, GL_CONDITION_SATISFIED):
+                glDeleteSync(slot.fence)
+                with self.lock:
+                    slot.fence = None
+                    slot.state = FREE
+
+    def has_pending(self) -> bool:
+        #are there any uploads waiting for their fence?
+        with self.lock:
+            return any(slot.state==PENDING for slot in self.slots)
+
+    def is_idle(self) -> bool:
+        with self.lock:
+            return all(slot.state==FREE for slot in self.slots)
+
+    def retire(self):
+        #stop staging new pixels:
+        with self.lock:
+            self.retired = True
+
+    def wait(self, timeout : float=1):
+        #wait for the decode threads that are still copying into the ring:
+        with self.lock:
+            if self.writers:
+                self.lock.wait_for(lambda : self.writers==0, timeout)
+
+    def discard(self):
+        #the GL context is going away, and the buffers with it:
+        self.retire()
+        self.wait()
+        self.closed = True
+        self.slots = []
+
+    def close(self):
+        #must be called with a GL context current
+        self.retire()
+        self.wait()
+        self.closed = True
+        slots = self.slots
+        self.slots = []
+        pbos = []
+        for slot in slots:
+            if slot.fence:
+                glDeleteSync(slot.fence)
+                slot.fence = None
+            if slot.view:
+                slot.view.release()
+                slot.view = None
+                glBindBuffer(GL_PIXEL_UNPACK_BUFFER, slot.pbo)
+                glUnmapBuffer(GL_PIXEL_UNPACK_BUFFER)
+            pbos.append(slot.pbo)
+        glBindBuffer(GL_PIXEL_UNPACK_BUFFER, 0)
+        if pbos:
+            glDeleteBuffers(len(pbos), pbos)
+        log("%s closed", self)
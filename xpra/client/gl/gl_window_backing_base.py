@@ -78,6 +78,10 @@ DRAW_REFRESH = envbool("XPRA_OPENGL_DRAW_REFRESH", True)
 FBO_RESIZE = envbool("XPRA_OPENGL_FBO_RESIZE", True)
 FBO_RESIZE_DELAY = envint("XPRA_OPENGL_FBO_RESIZE_DELAY", -1)
 CONTEXT_REINIT = envbool("XPRA_OPENGL_CONTEXT_REINIT", False)
+PBO_RING = envbool("XPRA_OPENGL_PBO_RING", True)
+PBO_RING_SLOTS = max(1, envint("XPRA_OPENGL_PBO_RING_SLOTS", 3))
+#how often we check the fences of the pixel buffer objects still in use, in milliseconds:
+PBO_POLL_DELAY = max(1, envint("XPRA_OPENGL_PBO_POLL_DELAY", 20))
 
 CURSOR_IDLE_TIMEOUT = envint("XPRA_CURSOR_IDLE_TIMEOUT", 6)
 
@@ -88,6 +92,14 @@ if SAVE_BUFFERS not in ("png", "jpeg", None):
 if SAVE_BUFFERS:
     from OpenGL.GL import glGetTexImage     #pylint: disable=ungrouped-imports
     from PIL import Image, ImageOps
+if PBO_RING:
+    try:
+        from xpra.client.gl.gl_pbo_ring import PBORing, PBOPixels, is_pbo_ring_supported
+    except ImportError as e:
+        log("PBORing", exc_info=True)
+        log.warn("Warning: pixel buffer object uploads are not available")
+        log.warn(" %s", e)
+        PBO_RING = False
 
 
 PIXEL_FORMAT_TO_CONSTANT = {
@@ -249,6 +261,10 @@ class GLWindowBackingBase(WindowBackingBase):
         self.pending_fbo_paint = []
         self.last_flush = monotonic_time()
         self.last_present_fbo_error = None
+        self.pbo_ring = None
+        self.pbo_ring_supported = None
+        self.retired_pbo_rings = []
+        self.pbo_poll_timer = 0
 
         super().__init__(wid, window_alpha and self.HAS_ALPHA)
         self.init_gl_config()
@@ -271,6 +287,9 @@ class GLWindowBackingBase(WindowBackingBase):
             "texture-pixel-format"  : CONSTANT_TO_PIXEL_FORMAT.get(self.texture_pixel_format, str(self.texture_pixel_format)),
             "internal-format"       : INTERNAL_FORMAT_TO_STR.get(self.internal_format, str(self.internal_format)),
             })
+        pbo_ring = self.pbo_ring
+        if pbo_ring:
+            info["pbo-ring"] = pbo_ring.get_info()
         return info
 
 
@@ -353,6 +372,7 @@ class GLWindowBackingBase(WindowBackingBase):
             oldw, oldh = self.size
             self.size = bw, bh
             if CONTEXT_REINIT:
+                self.discard_pbo_rings()
                 self.close_gl_config()
                 self.init_gl_config()
                 return
@@ -480,6 +500,7 @@ class GLWindowBackingBase(WindowBackingBase):
             self.debug_setup = True
             self.gl_init_debug()
 
+        self.poll_pbo_rings()
         if self.gl_setup:
             return
         mt = get_max_texture_size()
@@ -537,9 +558,102 @@ class GLWindowBackingBase(WindowBackingBase):
 
         # Bind program 0 for YUV painting by default
         glBindProgramARB(GL_FRAGMENT_PROGRAM_ARB, self.shaders[YUV2RGB_SHADER])
+        self.gl_init_pbo_ring()
         self.gl_setup = True
         log("gl_init(%s) done", skip_fbo)
 
+    def gl_init_pbo_ring(self):
+        #must be called within a context!
+        #(re)creates the ring if the existing slots are too small for the new backing size
+        if not PBO_RING or self.pbo_ring_supported is False:
+            return
+        if self.pbo_ring_supported is None:
+            self.pbo_ring_supported = is_pbo_ring_supported()
+            if not self.pbo_ring_supported:
+                log("pixel buffer object ring not supported by this driver")
+                return
+        w, h = self.size
+        #enough for 4 bytes per pixel with rows padded to 64 pixels:
+        slot_size = ((w+63)//64*64)*h*4
+        pbo_ring = self.pbo_ring
+        if pbo_ring:
+            if pbo_ring.slot_size>=slot_size:
+                return
+            #staged pixels may still be using the old ring:
+            pbo_ring.retire()
+            self.retired_pbo_rings.append(pbo_ring)
+            self.pbo_ring = None
+        pbo_ring = PBORing(PBO_RING_SLOTS, slot_size)
+        try:
+            pbo_ring.init()
+        except Exception as e:
+            log("%s.init()", pbo_ring, exc_info=True)
+            log.warn("Warning: failed to initialize the pixel buffer objects")
+            log.warn(" %s", e)
+            self.pbo_ring_supported = False
+            return
+        self.pbo_ring = pbo_ring
+
+    def poll_pbo_rings(self):
+        #must be called within a context!
+        pbo_ring = self.pbo_ring
+        if pbo_ring:
+            pbo_ring.poll()
+        for pbo_ring in tuple(self.retired_pbo_rings):
+            pbo_ring.poll()
+            if pbo_ring.is_idle():
+                pbo_ring.close()
+                self.retired_pbo_rings.remove(pbo_ring)
+        self.schedule_pbo_poll()
+
+    def schedule_pbo_poll(self):
+        #don't wait for the next paint to free the slots,
+        #the window may not be updated again for a while:
+        if self.pbo_poll_timer:
+            return
+        pbo_ring = self.pbo_ring
+        if not self.retired_pbo_rings and not (pbo_ring and pbo_ring.has_pending()):
+            return
+        from gi.repository import GLib
+        self.pbo_poll_timer = GLib.timeout_add(PBO_POLL_DELAY, self.pbo_poll_timeout)
+
+    def cancel_pbo_poll(self):
+        ppt = self.pbo_poll_timer
+        if ppt:
+            self.pbo_poll_timer = 0
+            from gi.repository import GLib
+            GLib.source_remove(ppt)
+
+    def pbo_poll_timeout(self):
+        self.pbo_poll_timer = 0
+        context = self.gl_context()
+        if context:
+            with context:
+                self.poll_pbo_rings()
+        return False
+
+    def discard_pbo_rings(self):
+        #the context is about to be destroyed, along with the buffers
+        self.cancel_pbo_poll()
+        pbo_ring = self.pbo_ring
+        self.pbo_ring = None
+        for pbo_ring in [pbo_ring]+self.retired_pbo_rings:
+            if pbo_ring:
+                pbo_ring.discard()
+        self.retired_pbo_rings = []
+
+    def stage_pixels(self, planes, sizes):
+        """
+            Called from the decode thread,
+            copies the pixels to a pixel buffer object if we can,
+            returns None otherwise.
+        """
+        pbo_ring = self.pbo_ring
+        if not pbo_ring:
+            return None
+        return pbo_ring.stage(planes, sizes)
+
+
     def get_init_magfilter(self):
         rw, rh = self.render_size
         w, h = self.size
@@ -571,6 +685,7 @@ class GLWindowBackingBase(WindowBackingBase):
         pass
 
     def close(self):
+        self.discard_pbo_rings()
         self.close_gl_config()
         #This seems to cause problems, so we rely
         #on destroying the context to clear textures and fbos...
@@ -1009,11 +1124,12 @@ class GLWindowBackingBase(WindowBackingBase):
             flush = options.intget("flush", 0)
             w = img.get_width()
             h = img.get_height()
-            self.idle_add(self.gl_paint_planar, YUV2RGB_FULL_SHADER, flush, "jpeg", img,
-                          x, y, w, h, width, height, options, callbacks)
+            self.queue_paint_planar(YUV2RGB_FULL_SHADER, flush, "jpeg", img,
+                                    x, y, w, h, width, height, options, callbacks)
         else:
             img = self.jpeg_decoder.decompress_to_rgb("BGRX", img_data)
-            self.idle_add(self.do_paint_rgb, "BGRX", img.get_pixels(), x, y, width, height, img.get_rowstride(), options, callbacks)
+            self.queue_paint_rgb("BGRX", img.get_pixels(), x, y, img.get_width(), img.get_height(), width, height,
+                                 img.get_rowstride(), options, callbacks)
 
     def paint_webp(self, img_data, x : int, y : int, width : int, height : int, options, callbacks):
         subsampling = options.strget("subsampling")
@@ -1023,28 +1139,47 @@ class GLWindowBackingBase(WindowBackingBase):
             flush = options.intget("flush", 0)
             w = img.get_width()
             h = img.get_height()
-            self.idle_add(self.gl_paint_planar, YUV2RGB_SHADER, flush, "webp", img,
-                          x, y, w, h, width, height, options, callbacks)
+            self.queue_paint_planar(YUV2RGB_SHADER, flush, "webp", img,
+                                    x, y, w, h, width, height, options, callbacks)
             return
         super().paint_webp(img_data, x, y, width, height, options, callbacks)
 
+    def queue_paint_rgb(self, rgb_format, img_data,
+                        x : int, y : int, width : int, height : int, render_width : int, render_height : int,
+                        rowstride, options, callbacks):
+        #copy the pixels to a pixel buffer object now, from the decode thread:
+        if self.pbo_ring and options.boolget("paint", True):
+            pbo_pixels = self.stage_pixels((img_data, ), (min(len(img_data), rowstride*height), ))
+            if pbo_pixels:
+                img_data = pbo_pixels
+        super().queue_paint_rgb(rgb_format, img_data,
+                                x, y, width, height, render_width, render_height, rowstride, options, callbacks)
+
     def do_paint_rgb(self, rgb_format, img_data,
                      x : int, y : int, width : int, height : int, render_width : int, render_height : int,
                      rowstride, options, callbacks):
         log("%s.do_paint_rgb(%s, %s bytes, x=%d, y=%d, width=%d, height=%d, rowstride=%d, options=%s)",
             self, rgb_format, len(img_data), x, y, width, height, rowstride, options)
+        pbo_pixels = img_data if PBO_RING and isinstance(img_data, PBOPixels) else None
         x, y = self.gravity_adjust(x, y, options)
         context = self.gl_context()
         if not context:
             log("%s._do_paint_rgb(..) no context!", self)
+            if pbo_pixels:
+                pbo_pixels.release()
             fire_paint_callbacks(callbacks, False, "no opengl context")
             return
         if not options.boolget("paint", True):
+            if pbo_pixels:
+                pbo_pixels.release()
             fire_paint_callbacks(callbacks)
             return
         rgb_format = bytestostr(rgb_format)
         try:
-            upload, img_data = self.pixels_for_upload(img_data)
+            if pbo_pixels:
+                upload = "pbo"
+            else:
+                upload, img_data = self.pixels_for_upload(img_data)
 
             with context:
                 self.gl_init()
@@ -1072,7 +1207,13 @@ class GLWindowBackingBase(WindowBackingBase):
                 glTexParameteri(target, GL_TEXTURE_MIN_FILTER, GL_NEAREST)
                 glTexParameteri(target, GL_TEXTURE_WRAP_S, GL_CLAMP_TO_BORDER)
                 glTexParameteri(target, GL_TEXTURE_WRAP_T, GL_CLAMP_TO_BORDER)
-                glTexImage2D(target, 0, self.internal_format, width, height, 0, pformat, ptype, img_data)
+                if pbo_pixels:
+                    with pbo_pixels:
+                        glTexImage2D(target, 0, self.internal_format, width, height, 0, pformat, ptype,
+                                     pbo_pixels.get_pixels())
+                    self.schedule_pbo_poll()
+                else:
+                    glTexImage2D(target, 0, self.internal_format, width, height, 0, pformat, ptype, img_data)
 
                 # Draw textured RGB quad at the right coordinates
                 glBegin(GL_QUADS)
@@ -1101,6 +1242,8 @@ class GLWindowBackingBase(WindowBackingBase):
         except Exception as e:
             message = "OpenGL %s paint error: %s" % (rgb_format, e)
             log("Error in %s paint of %i bytes, options=%s", rgb_format, len(img_data), options, exc_info=True)
+        if pbo_pixels:
+            pbo_pixels.release()
         fire_paint_callbacks(callbacks, False, message)
 
 
@@ -1117,12 +1260,28 @@ class GLWindowBackingBase(WindowBackingBase):
             shader = RGBP2RGB_SHADER
         else:
             shader = YUV2RGB_SHADER
-        self.idle_add(self.gl_paint_planar, shader, options.intget("flush", 0), options.strget("encoding"), img,
-                      x, y, enc_width, enc_height, width, height, options, callbacks)
+        self.queue_paint_planar(shader, options.intget("flush", 0), options.strget("encoding"), img,
+                                x, y, enc_width, enc_height, width, height, options, callbacks)
+
+    def queue_paint_planar(self, shader, flush, encoding, img,
+                           x : int, y : int, enc_width : int, enc_height : int, width : int, height : int,
+                           options, callbacks):
+        #called from the decode thread,
+        #copy the planes to a pixel buffer object now if we can:
+        pbo_pixels = None
+        if self.pbo_ring:
+            divs = get_subsampling_divs(img.get_pixel_format())
+            planes = img.get_pixels()
+            rowstrides = img.get_rowstride()
+            if divs and len(planes)==3 and len(rowstrides)==3:
+                sizes = tuple(min(len(planes[i]), rowstrides[i]*(enc_height//divs[i][1])) for i in range(3))
+                pbo_pixels = self.stage_pixels(planes, sizes)
+        self.idle_add(self.gl_paint_planar, shader, flush, encoding, img,
+                      x, y, enc_width, enc_height, width, height, options, callbacks, pbo_pixels)
 
     def gl_paint_planar(self, shader, flush, encoding, img,
                         x : int, y : int, enc_width : int, enc_height : int, width : int, height : int,
-                        options, callbacks):
+                        options, callbacks, pbo_pixels=None):
         #this function runs in the UI thread, no video_decoder lock held
         log("gl_paint_planar%s", (flush, encoding, img, x, y, enc_width, enc_height, width, height, options, callbacks))
         x, y = self.gravity_adjust(x, y, options)
@@ -1134,12 +1293,16 @@ class GLWindowBackingBase(WindowBackingBase):
             context = self.gl_context()
             if not context:
                 log("%s._do_paint_rgb(..) no context!", self)
+                if pbo_pixels:
+                    pbo_pixels.release()
                 fire_paint_callbacks(callbacks, False, "failed to get a gl context")
                 return
             with context:
                 self.gl_init()
                 scaling = enc_width!=width or enc_height!=height
-                self.update_planar_textures(enc_width, enc_height, img, pixel_format, scaling=scaling)
+                self.update_planar_textures(enc_width, enc_height, img, pixel_format, scaling, pbo_pixels)
+                if pbo_pixels:
+                    self.schedule_pbo_poll()
 
                 # Update FBO texture
                 x_scale, y_scale = 1, 1
@@ -1163,9 +1326,11 @@ class GLWindowBackingBase(WindowBackingBase):
             log.error("Error painting planar update", exc_info=True)
         log.error(" flush=%i, image=%s, coords=%s, size=%ix%i",
                   flush, img, (x, y, enc_width, enc_height), width, height)
+        if pbo_pixels:
+            pbo_pixels.release()
         fire_paint_callbacks(callbacks, False, message)
 
-    def update_planar_textures(self, width : int, height : int, img, pixel_format, scaling=False):
+    def update_planar_textures(self, width : int, height : int, img, pixel_format, scaling=False, pbo_pixels=None):
         assert self.textures is not None, "no OpenGL textures!"
         log("%s.update_planar_textures%s", self, (width, height, img, pixel_format))
 
@@ -1193,8 +1358,14 @@ class GLWindowBackingBase(WindowBackingBase):
         self.gl_marker("updating planar textures: %sx%s %s", width, height, pixel_format)
         rowstrides = img.get_rowstride()
         img_data = img.get_pixels()
-        BPP = 2 if pixel_format.endswith("P16") else 1
         assert len(rowstrides)==3 and len(img_data)==3
+        #when the pixels have been staged in a pixel buffer object,
+        #bind it for the duration of the upload:
+        with pbo_pixels if pbo_pixels else DummyContextManager():
+            self.upload_planes(width, height, img_data, rowstrides, pixel_format, divs, upload_format, pbo_pixels)
+
+    def upload_planes(self, width : int, height : int, img_data, rowstrides, pixel_format, divs, upload_format, pbo_pixels=None):
+        BPP = 2 if pixel_format.endswith("P16") else 1
         for texture, index, tex_name in (
             (GL_TEXTURE0, TEX_Y, pixel_format[0:1]*BPP),
             (GL_TEXTURE1, TEX_U, pixel_format[1:2]*BPP),
@@ -1212,9 +1383,12 @@ class GLWindowBackingBase(WindowBackingBase):
             target = GL_TEXTURE_RECTANGLE_ARB
             glBindTexture(target, self.textures[index])
             self.set_alignment(w, rowstrides[index], tex_name)
-            upload, pixel_data = self.pixels_for_upload(img_data[index])
-            log("texture %s: div=%s, rowstride=%s, %sx%s, data=%s bytes, upload=%s",
-                index, divs[index], rowstrides[index], w, h, len(pixel_data), upload)
+            if pbo_pixels:
+                upload, pixel_data = "pbo", pbo_pixels.get_pixels(index)
+            else:
+                upload, pixel_data = self.pixels_for_upload(img_data[index])
+            log("texture %s: div=%s, rowstride=%s, %sx%s, upload=%s",
+                index, divs[index], rowstrides[index], w, h, upload)
             glTexParameteri(target, GL_TEXTURE_BASE_LEVEL, 0)
             try:
                 glTexParameteri(target, GL_TEXTURE_MAX_LEVEL, 0)
@@ -6,6 +6,7 @@
 
 import os.path
 import sys
+from copy import deepcopy
 
 from gi.repository import GLib
 from gi.repository import GObject
@@ -13,7 +14,7 @@ from gi.repository import GObject
 from xpra.util import (
     u, nonl, sorted_nicely, print_nested_dict, envint, flatten_dict, typedict,
     disconnect_is_an_error, ellipsizer, first_time, csv,
-    repr_ellipsized,
+    repr_ellipsized, apply_dict_delta,
     SERVER_UPGRADE, DONE,
     )
 from xpra.os_util import (
@@ -456,6 +457,11 @@ class InfoTimerClient(MonitorXpraClient):
         MonitorXpraClient.cleanup(self)
 
     def do_command(self, caps : typedict):
+        if caps.boolget("info-subscribe"):
+            #the server will send us the values that have changed:
+            self.send("info-subscribe", (), self.REFRESH_RATE*1000)
+            self.info_timer = self.timeout_add((self.REFRESH_RATE+2)*1000, self.info_timeout)
+            return
         self.send_info_request()
         self.timeout_add(self.REFRESH_RATE*1000, self.send_info_request)
 
@@ -472,6 +478,7 @@ class InfoTimerClient(MonitorXpraClient):
     def init_packet_handlers(self):
         MonitorXpraClient.init_packet_handlers(self)
         self.add_packet_handler("info-response", self._process_info_response, False)
+        self.add_packet_handler("info-update", self._process_info_update, False)
 
     def _process_server_event(self, packet):
         self.log("server event: %s" % (packet,))
@@ -487,6 +494,16 @@ class InfoTimerClient(MonitorXpraClient):
         #log.info("server_last_info=%s", self.server_last_info)
         self.update_screen()
 
+    def _process_info_update(self, packet):
+        self.log("info update: %s" % repr_ellipsized(packet))
+        changed = packet[1]
+        removed = packet[2] if len(packet)>=3 else ()
+        #the screen is redrawn from another thread, so update a copy:
+        info = deepcopy(dict(self.server_last_info))
+        self.server_last_info = typedict(apply_dict_delta(info, changed, removed))
+        self.server_last_info_time = monotonic_time()
+        self.update_screen()
+
     def cancel_info_timer(self):
         it = self.info_timer
         if it:
@@ -596,6 +596,11 @@ class GTKXpraClient(GObjectXpraClient, UIXpraClient):
             if not self.check_file_size("upload", filename, filesize):
                 self.close_file_upload_dialog()
                 return
+            if filesize>0:
+                #the file contents will be read as they are sent:
+                self.close_file_upload_dialog()
+                self.send_file(filename, "", None, filesize=filesize, openit=v==Gtk.ResponseType.ACCEPT)
+                return
         gfile = dialog.get_file()
         self.close_file_upload_dialog()
         filelog("load_contents: filename=%s, response=%s", filename, v)
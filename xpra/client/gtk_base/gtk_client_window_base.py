@@ -393,6 +393,13 @@ class GTKClientWindowBase(ClientWindowBase, Gtk.Window):
                 ctype = file_info.get_content_type()
                 size = file_info.get_size()
                 draglog("file_info(%s)=%s ctype=%s, size=%s", filename, file_info, ctype, size)
+                if size>0:
+                    #the file contents will be read as they are sent:
+                    file_done(filename)
+                    openit = self._client.remote_open_files
+                    draglog.info("sending file %s (%i bytes)", basename, size)
+                    self._client.send_file(filename, "", None, filesize=size, openit=openit)
+                    return
                 def got_file_data(gfile, result, user_data=None):
                     _, data, entity = gfile.load_contents_finish(result)
                     filesize = len(data)
@@ -16,7 +16,7 @@ gi.require_version("GdkPixbuf", "2.0")
 from gi.repository import Pango, GLib, Gtk, Gio
 
 from xpra.platform.paths import get_xpra_command, get_nodock_command
-from xpra.platform.dotxpra import DotXpra
+from xpra.platform.dotxpra import DotXpra, SOCKET_STATE_TTL
 from xpra.platform.gui import force_focus
 from xpra.child_reaper import getChildReaper
 from xpra.exit_codes import EXIT_STR
@@ -108,7 +108,7 @@ class SessionsGUI(Gtk.Window):
             username = ""
         #log.info("options=%s (%s)", options, type(options))
         self.local_info_cache = {}
-        self.dotxpra = DotXpra(options.socket_dir, options.socket_dirs, username)
+        self.dotxpra = DotXpra(options.socket_dir, options.socket_dirs, username, cache_ttl=SOCKET_STATE_TTL)
         self.poll_local_sessions()
         self.populate()
         GLib.timeout_add(5*1000, self.update)
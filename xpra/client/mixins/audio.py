@@ -3,6 +3,8 @@
 # Xpra is released under the terms of the GNU GPL v2, or, at your option, any
 # later version. See the file COPYING for details.
 
+from math import sqrt
+
 from xpra.platform.paths import get_icon_filename
 from xpra.scripts.parsing import sound_option
 from xpra.net.compression import Compressed
@@ -55,7 +57,10 @@ class AudioClient(StubClientMixin):
         self.server_sound_receive = False
         self.server_sound_send = False
         self.server_sound_bundle_metadata = False
+        self.server_sound_bundle_delay = -1
+        self.server_sound_opus_fec = False
         self.queue_used_sent = None
+        self.sound_network_jitter = -1
         #duplicated from ServerInfo mixin:
         self._remote_machine_id = None
 
@@ -167,12 +172,15 @@ class AudioClient(StubClientMixin):
             return {}
         #we don't know if the server supports new codec names,
         #so always add legacy names in hello:
+        from xpra.sound.gstreamer_util import BUNDLE_DELAY, OPUS_FEC
         caps = {
             "codec-full-names"  : True,
             "decoders"   : self.speaker_codecs,
             "encoders"   : self.microphone_codecs,
             "send"       : self.microphone_allowed,
             "receive"    : self.speaker_allowed,
+            "bundle-delay" : BUNDLE_DELAY,
+            "opus-fec"   : OPUS_FEC,
             }
         caps.update(self.sound_properties)
         log("audio capabilities: %s", caps)
@@ -197,6 +205,8 @@ class AudioClient(StubClientMixin):
         self.server_sound_receive = c.boolget("sound.receive")
         self.server_sound_send = c.boolget("sound.send")
         self.server_sound_bundle_metadata = c.boolget("sound.bundle-metadata")
+        self.server_sound_bundle_delay = c.intget("sound.bundle-delay", -1)
+        self.server_sound_opus_fec = c.boolget("sound.opus-fec")
         log("pulseaudio id=%s, server=%s, sound decoders=%s, sound encoders=%s, receive=%s, send=%s",
                  self.server_pulseaudio_id, self.server_pulseaudio_server,
                  csv(self.server_sound_decoders), csv(self.server_sound_encoders),
@@ -320,6 +330,10 @@ class AudioClient(StubClientMixin):
                 return False
             self.sound_source = ss
             ss.sequence = self.sound_source_sequence
+            bundle_delay = self.get_sound_bundle_delay()
+            if bundle_delay>0:
+                from xpra.sound.gstreamer_util import BUNDLE_MAX_FRAMES
+                ss.set_bundle(bundle_delay, BUNDLE_MAX_FRAMES)
             ss.connect("new-buffer", self.new_sound_buffer)
             ss.connect("state-changed", sound_source_state_changed)
             ss.connect("new-stream", self.new_stream)
@@ -478,11 +492,14 @@ class AudioClient(StubClientMixin):
         try:
             log("starting %s sound sink", codec)
             from xpra.sound.wrapper import start_receiving_sound
-            ss = start_receiving_sound(codec)
+            from xpra.sound.gstreamer_util import get_fec_decoder_options
+            codec_options = get_fec_decoder_options(codec) if self.server_sound_opus_fec else {}
+            ss = start_receiving_sound(codec, codec_options)
             if not ss:
                 return False
             ss.sequence = self.sound_sink_sequence
             self.sound_sink = ss
+            self.sound_network_jitter = -1
             ss.connect("state-changed", self.sound_sink_state_changed)
             ss.connect("error", self.sound_sink_error)
             ss.connect("exit", self.sound_sink_exit)
@@ -516,6 +533,15 @@ class AudioClient(StubClientMixin):
                 packet_metadata = Compressed("packet metadata", packet_metadata, can_inline=True)
         self.send_sound_data(sound_source, data, metadata, packet_metadata)
 
+    def get_sound_bundle_delay(self) -> int:
+        #the frames are bundled using 'packet_metadata':
+        if not self.server_sound_bundle_metadata:
+            return 0
+        from xpra.sound.gstreamer_util import BUNDLE_DELAY
+        if self.server_sound_bundle_delay>=0:
+            return min(BUNDLE_DELAY, self.server_sound_bundle_delay)
+        return BUNDLE_DELAY
+
     def send_sound_data(self, sound_source, data, metadata, packet_metadata=None):
         codec = sound_source.codec
         packet_data = [codec, Compressed(codec, data), metadata]
@@ -586,6 +612,7 @@ class AudioClient(StubClientMixin):
                 for x in packet_metadata:
                     ss.add_data(x)
                 packet_metadata = ()
+        self.update_sound_network_jitter(ss)
         #(some packets (ie: sos, eos) only contain metadata)
         if data or packet_metadata:
             ss.add_data(data, metadata, packet_metadata)
@@ -607,6 +634,21 @@ class AudioClient(StubClientMixin):
                 self.send_sound_sync(v)
 
 
+    def update_sound_network_jitter(self, ss):
+        #let the sink's jitter buffer know how much the round trip time varies:
+        spl = getattr(self, "server_ping_latency", ())
+        values = tuple(x[1]*1000 for x in tuple(spl)[-10:])
+        if len(values)<2:
+            return
+        avg = sum(values)/len(values)
+        jitter = int(sqrt(sum((v-avg)**2 for v in values)/len(values)))
+        if abs(jitter-self.sound_network_jitter)<5:
+            return
+        log("update_sound_network_jitter(%s) rtt jitter=%ims", ss, jitter)
+        self.sound_network_jitter = jitter
+        ss.set_network_jitter(jitter)
+
+
     def init_authenticated_packet_handlers(self):
         log("init_authenticated_packet_handlers()")
         #these handlers can run directly from the network thread:
@@ -32,6 +32,8 @@ class ClipboardClient(StubClientMixin):
         self.server_clipboard_loop_uuids = {}
         self.server_clipboard_direction = ""
         self.server_clipboard_contents_slice_fix = False
+        self.server_clipboard_chunks = False
+        self.server_clipboard_cache = False
         self.server_clipboard_preferred_targets = False
         self.server_clipboards = []
         self.clipboard_helper = None
@@ -95,6 +97,8 @@ class ClipboardClient(StubClientMixin):
                 "preferred-targets"         : CLIPBOARD_PREFERRED_TARGETS,
                 "set_enabled"               : True,     #v4 servers no longer use or show this flag
                 "contents-slice-fix"        : True,     #fixed in v2.4
+                "chunks"                    : True,
+                "cache"                     : True,
                 },
              })
         return caps
@@ -135,6 +139,8 @@ class ClipboardClient(StubClientMixin):
         self.clipboard_enabled = self.client_supports_clipboard and self.server_clipboard
         log("parse_clipboard_caps() clipboard enabled=%s", self.clipboard_enabled)
         self.server_clipboard_contents_slice_fix = c.boolget("clipboard.contents-slice-fix")
+        self.server_clipboard_chunks = c.boolget("clipboard.chunks")
+        self.server_clipboard_cache = c.boolget("clipboard.cache")
         self.server_clipboard_preferred_targets = c.strtupleget("clipboard.preferred-targets", ())
         if not self.server_clipboard_contents_slice_fix:
             log.info("server clipboard does not include contents slice fix")
@@ -150,6 +156,8 @@ class ClipboardClient(StubClientMixin):
                     log.warn(" (wayland display)")
             else:
                 ch.set_clipboard_contents_slice_fix(self.server_clipboard_contents_slice_fix)
+                ch.set_clipboard_chunks(self.server_clipboard_chunks)
+                ch.set_clipboard_cache(self.server_clipboard_cache)
             self.clipboard_helper = ch
             self.clipboard_enabled = ch is not None
             log("clipboard helper=%s", ch)
@@ -166,7 +174,7 @@ class ClipboardClient(StubClientMixin):
         self.add_packet_handler("set-clipboard-enabled", self._process_clipboard_enabled_status)
         for x in (
             "token", "request",
-            "contents", "contents-none",
+            "contents", "contents-none", "contents-chunk", "contents-chunk-ack", "contents-cached",
             "pending-requests", "enable-selections",
             ):
             self.add_packet_handler("clipboard-%s" % x, self._process_clipboard_packet)
@@ -30,7 +30,7 @@ from xpra.os_util import (
     )
 from xpra.util import (
     iround, envint, envbool, typedict,
-    make_instance, updict, repr_ellipsized, csv,
+    make_instance, updict, repr_ellipsized, csv, first_time,
     )
 from xpra.client.mixins.stub_client_mixin import StubClientMixin
 from xpra.log import Logger
@@ -52,6 +52,7 @@ MOUSE_SHOW = envbool("XPRA_MOUSE_SHOW", True)
 PAINT_FAULT_RATE = envint("XPRA_PAINT_FAULT_INJECTION_RATE")
 PAINT_FAULT_TELL = envbool("XPRA_PAINT_FAULT_INJECTION_TELL", True)
 PAINT_DELAY = envint("XPRA_PAINT_DELAY", 0)
+SAVE_DRAW_PACKETS = os.environ.get("XPRA_SAVE_DRAW_PACKETS", "")
 
 WM_CLASS_CLOSEEXIT = os.environ.get("XPRA_WM_CLASS_CLOSEEXIT", "Xephyr").split(",")
 TITLE_CLOSEEXIT = os.environ.get("XPRA_TITLE_CLOSEEXIT", "Xnest").split(",")
@@ -99,6 +100,7 @@ class WindowClient(StubClientMixin):
         self._draw_queue = None
         self._draw_thread = None
         self._draw_counter = 0
+        self._draw_packets_file = None
 
         #statistics and server info:
         self.pixel_counter = deque(maxlen=1000)
@@ -259,6 +261,10 @@ class WindowClient(StubClientMixin):
         log("WindowClient.cleanup() draw thread=%s, alive=%s", dt, dt and dt.is_alive())
         if dt and dt.is_alive():
             dt.join(0.1)
+        f = self._draw_packets_file
+        if f:
+            self._draw_packets_file = None
+            f.close()
         log("WindowClient.cleanup() done")
 
 
@@ -293,6 +299,12 @@ class WindowClient(StubClientMixin):
         }
         for wid, window in tuple(self._id_to_window.items()):
             info[wid] = window.get_info()
+        try:
+            from xpra.buffers.membuf import get_pool_info   #@UnresolvedImport
+        except ImportError:
+            pass
+        else:
+            info["buffer-pool"] = get_pool_info()
         return {"windows" : info}
 
 
@@ -1382,6 +1394,8 @@ class WindowClient(StubClientMixin):
     ######################################################################
     # painting windows:
     def _process_draw(self, packet):
+        if SAVE_DRAW_PACKETS:
+            self.save_draw_packet(packet)
         if PAINT_DELAY>0:
             self.timeout_add(PAINT_DELAY, self._draw_queue.put, packet)
         else:
@@ -1390,9 +1404,32 @@ class WindowClient(StubClientMixin):
     def _process_eos(self, packet):
         self._draw_queue.put(packet)
 
-    def send_damage_sequence(self, wid, packet_sequence, width, height, decode_time, message=""):
+    def save_draw_packet(self, packet):
+        #saves the packet so it can be replayed using xpra.client.paint_benchmark
+        #(mmap packets only contain pointers, so they cannot be replayed)
+        if bytestostr(packet[6])=="mmap":
+            return
+        from xpra.net.packet_encoding import pack_one_packet
+        data = pack_one_packet(packet)
+        if isinstance(data, str):
+            #no packet encoders are available,
+            #so we only have a string representation which cannot be replayed:
+            if first_time("save-draw-packets"):
+                drawlog.warn("Warning: cannot save the draw packets to '%s'", SAVE_DRAW_PACKETS)
+                drawlog.warn(" no packet encoders available")
+            return
+        f = self._draw_packets_file
+        if not f:
+            f = self._draw_packets_file = open(SAVE_DRAW_PACKETS, "wb")
+            drawlog.info("saving draw packets to '%s'", SAVE_DRAW_PACKETS)
+        f.write(data)
+
+    def send_damage_sequence(self, wid, packet_sequence, width, height, decode_time, message="", trace=None):
         packet = "damage-sequence", packet_sequence, wid, width, height, decode_time, message
-        drawlog("sending ack: %s", packet)
+        if trace:
+            packet += (trace, )
+        if drawlog.debug_enabled:
+            drawlog("sending ack: %s", packet)
         self.send_now(*packet)
 
     def _draw_thread_loop(self):
@@ -1439,18 +1476,29 @@ class WindowClient(StubClientMixin):
         if len(packet)>10:
             options = packet[10]
         options = typedict(options)
-        dtype = DRAW_TYPES.get(type(data), type(data))
-        drawlog("process_draw: %7i %8s for window %3i, sequence %8i, %4ix%-4i at %4i,%-4i using %6s encoding with options=%s",
-                len(data), dtype, wid, packet_sequence, width, height, x, y, coding, options)
+        if drawlog.debug_enabled:
+            dtype = DRAW_TYPES.get(type(data), type(data))
+            drawlog("process_draw: %7i %8s for window %3i, sequence %8i, %4ix%-4i at %4i,%-4i using %6s encoding with options=%s",
+                    len(data), dtype, wid, packet_sequence, width, height, x, y, coding, options)
         start = monotonic_time()
+        #the server wants to know how long the decoding and painting took:
+        trace = {} if options.boolget("trace") else None
+        decoded_at = []
         def record_decode_time(success, message=""):
             if success>0:
                 end = monotonic_time()
                 decode_time = int(end*1000*1000-start*1000*1000)
+                if trace is not None:
+                    decoded = (decoded_at or [end])[0]
+                    trace.update({
+                        "decode"    : int((decoded-start)*1000*1000),
+                        "paint"     : int((end-decoded)*1000*1000),
+                        })
                 self.pixel_counter.append((start, end, width*height))
-                dms = "%sms" % (int(decode_time/100)/10.0)
-                paintlog("record_decode_time(%s, %s) wid=%s, %s: %sx%s, %s",
-                         success, message, wid, coding, width, height, dms)
+                if paintlog.debug_enabled:
+                    dms = "%sms" % (int(decode_time/100)/10.0)
+                    paintlog("record_decode_time(%s, %s) wid=%s, %s: %sx%s, %s",
+                             success, message, wid, coding, width, height, dms)
             elif success==0:
                 decode_time = -1
                 paintlog("record_decode_time(%s, %s) decoding error on wid=%s, %s: %sx%s",
@@ -1460,7 +1508,8 @@ class WindowClient(StubClientMixin):
                 decode_time = 0
                 paintlog("record_decode_time(%s, %s) decoding or painting skipped on wid=%s, %s: %sx%s",
                          success, message, wid, coding, width, height)
-            self.send_damage_sequence(wid, packet_sequence, width, height, decode_time, repr_ellipsized(message, 512))
+            self.send_damage_sequence(wid, packet_sequence, width, height, decode_time,
+                                      repr_ellipsized(message, 512), trace)
         self._draw_counter += 1
         if PAINT_FAULT_RATE>0 and (self._draw_counter % PAINT_FAULT_RATE)==0:
             drawlog.warn("injecting paint fault for %s draw packet %i, sequence number=%i",
@@ -1474,6 +1523,9 @@ class WindowClient(StubClientMixin):
         try:
             window.draw_region(x, y, width, height, coding, data, rowstride,
                                packet_sequence, options, [record_decode_time])
+            if trace is not None and not trace:
+                #the paint itself may still be pending in the UI thread:
+                decoded_at.append(monotonic_time())
         except KeyboardInterrupt:
             raise
         except Exception as e:
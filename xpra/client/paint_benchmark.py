@@ -0,0 +1,365 @@
+#!/usr/bin/env python3
+# This file is part of Xpra.
+# Copyright (C) 2021 Antoine Martin <antoine@xpra.org>
+# Xpra is released under the terms of the GNU GPL v2, or, at your option, any
+# later version. See the file COPYING for details.
+
+"""
+Headless client paint path benchmark:
+replays synthetic or captured draw packets through the real decoders
+and window backings (offscreen), without connecting to a server.
+
+ie:
+python3 -m xpra.client.paint_benchmark --size=1920x1080 --frames=50 --encodings=rgb24,png,h264
+python3 -m xpra.client.paint_benchmark --replay=/tmp/draw-packets.bin
+
+Draw packets can be captured from a real client session using:
+XPRA_SAVE_DRAW_PACKETS=/tmp/draw-packets.bin xpra attach ...
+"""
+
+import sys
+
+from xpra.net import compression
+from xpra.net.header import unpack_header, HEADER_SIZE
+from xpra.net.packet_encoding import decode
+from xpra.codecs.image_wrapper import ImageWrapper
+from xpra.os_util import monotonic_time, bytestostr
+from xpra.util import typedict, csv
+from xpra.log import Logger
+
+log = Logger("paint", "benchmark")
+
+DEFAULT_ENCODINGS = (
+    "rgb24", "rgb24/lz4", "rgb24/zlib",
+    "rgb32", "rgb32/lz4", "rgb32/zlib",
+    "png", "jpeg", "webp",
+    "vp8", "vp9", "h264",
+    "scroll",
+    )
+DEFAULT_BACKINGS = ("fake", "cairo")
+DEFAULT_SIZE = 1280, 720
+DEFAULT_FRAMES = 25
+QUALITY = 80
+SPEED = 50
+
+
+def make_pixels(width : int, height : int, frame : int, Bpp : int=4) -> bytes:
+    """
+        generates a moving gradient so that every frame is different
+        and the lossless compressors cannot take too many shortcuts
+    """
+    rowstride = width*Bpp
+    row = bytes((i*7+frame*3) & 0xff for i in range(rowstride+height))
+    return b"".join(row[(y+frame) % height:(y+frame) % height+rowstride] for y in range(height))
+
+def make_image(width : int, height : int, frame : int, pixel_format : str="BGRX") -> ImageWrapper:
+    Bpp = len(pixel_format)
+    pixels = make_pixels(width, height, frame, Bpp)
+    return ImageWrapper(0, 0, width, height, pixels, pixel_format, Bpp*8, width*Bpp, Bpp)
+
+
+def get_encoder(encoding : str):
+    from xpra.codecs.loader import load_codec, get_codec
+    for name in {
+        "jpeg"  : ("enc_jpeg", "enc_pillow"),
+        "webp"  : ("enc_webp", "enc_pillow"),
+        }.get(encoding, ("enc_pillow", )):
+        load_codec(name)
+        mod = get_codec(name)
+        if mod and encoding in mod.get_encodings():
+            return mod
+    return None
+
+def picture_encode(encoder, coding : str, image):
+    if encoder.get_type()=="pillow":
+        ret = encoder.encode(coding, image, QUALITY, SPEED, False)
+    elif coding=="webp":
+        ret = encoder.encode(image, QUALITY, SPEED, False)
+    else:
+        ret = encoder.encode(image, QUALITY, SPEED)
+    if not ret:
+        return None
+    if len(ret)==2:
+        #enc_webp returns cdata, client_options:
+        cdata, client_options = ret
+    else:
+        cdata, client_options = ret[1], ret[2]
+    return getattr(cdata, "data", cdata), client_options
+
+
+def make_rgb_packets(coding : str, width : int, height : int, frames : int):
+    parts = coding.split("/")
+    coding = parts[0]
+    algo = parts[1] if len(parts)>1 else None
+    rgb_format = {"rgb24" : "BGR", "rgb32" : "BGRX"}[coding]
+    Bpp = len(rgb_format)
+    for i in range(frames):
+        pixels = make_pixels(width, height, i, Bpp)
+        options = {"rgb_format" : rgb_format}
+        if algo:
+            if not compression.use(algo):
+                raise Exception("%s compression is not available" % algo)
+            _, pixels = compression.COMPRESSION[algo].compress(pixels, 1)
+            options[algo] = 1
+        yield coding, pixels, width*Bpp, options
+
+def make_picture_packets(coding : str, width : int, height : int, frames : int):
+    encoder = get_encoder(coding)
+    if not encoder:
+        raise Exception("no encoder found for %s" % coding)
+    for i in range(frames):
+        ret = picture_encode(encoder, coding, make_image(width, height, i))
+        if not ret:
+            raise Exception("%s failed to compress frame %i" % (encoder.get_type(), i))
+        data, client_options = ret
+        yield coding, data, 0, client_options
+
+def make_video_packets(coding : str, width : int, height : int, frames : int):
+    from xpra.codecs.video_helper import getVideoHelper
+    from xpra.codecs.codec_checks import make_test_image
+    vh = getVideoHelper()
+    specs = vh.get_encoder_specs(coding)
+    if not specs:
+        raise Exception("no video encoder found for %s" % coding)
+    src_format = tuple(specs.keys())[0]
+    spec = specs[src_format][0]
+    csc = None
+    for csc_spec in vh.get_csc_specs("BGRX").get(src_format, ()):
+        try:
+            csc = csc_spec.make_instance()
+            csc.init_context(width, height, "BGRX", width, height, src_format, 100)
+            break
+        except Exception:
+            log("failed to initialize %s", csc_spec, exc_info=True)
+            csc = None
+    if not csc:
+        log.warn("Warning: no csc module for BGRX to %s, using a static test image", src_format)
+    encoder = spec.make_instance()
+    encoder.init_context(None, width, height, src_format, [src_format], coding,
+                         QUALITY, SPEED, (1, 1), typedict())
+    try:
+        for i in range(frames):
+            if csc:
+                image = csc.convert_image(make_image(width, height, i))
+            else:
+                image = make_test_image(src_format, width, height)
+            ret = encoder.compress_image(None, image)
+            if not ret or not ret[0]:
+                continue
+            data, client_options = ret
+            yield coding, data, 0, client_options
+    finally:
+        encoder.clean()
+        if csc:
+            csc.clean()
+
+def make_scroll_packets(_coding : str, width : int, height : int, frames : int):
+    for i in range(frames):
+        dy = 1+i%16
+        yield "scroll", [(0, dy, width, height-dy, 0, -dy)], 0, {}
+
+def make_packets(encoding : str, width : int, height : int, frames : int):
+    """
+        generates a list of draw packets for the given encoding,
+        the encoding step is not included in the benchmark timings
+    """
+    if encoding.startswith("rgb"):
+        fn = make_rgb_packets
+    elif encoding in ("png", "jpeg", "webp"):
+        fn = make_picture_packets
+    elif encoding=="scroll":
+        fn = make_scroll_packets
+    else:
+        fn = make_video_packets
+    packets = []
+    for seq, (coding, data, rowstride, options) in enumerate(fn(encoding, width, height, frames)):
+        packets.append(["draw", 1, 0, 0, width, height, coding, data, seq, rowstride, options])
+    return packets
+
+def load_packets(filename : str):
+    """ loads the draw packets saved by the client using XPRA_SAVE_DRAW_PACKETS """
+    packets = {}
+    with open(filename, "rb") as f:
+        while True:
+            header = f.read(HEADER_SIZE)
+            if len(header)<HEADER_SIZE:
+                break
+            _, protocol_flags, _, _, data_size = unpack_header(header)
+            packet = list(decode(f.read(data_size), protocol_flags))
+            packets.setdefault(bytestostr(packet[6]), []).append(packet)
+    return packets
+
+
+def make_backing(name : str, width : int, height : int):
+    if name=="fake":
+        from xpra.client.fake_window_backing import FakeBacking
+        backing = FakeBacking(1)
+        #fire the paint callbacks synchronously:
+        backing.fake_delay = 0
+        return backing
+    if name=="cairo":
+        from xpra.client.gtk3.cairo_backing import CairoBacking
+        backing = CairoBacking(1, False)
+        backing.init(width, height, width, height)
+        return backing
+    raise Exception("unknown backing '%s'" % name)
+
+
+class PaintBenchmark:
+    """
+        draws the packets onto the backing and records the time spent:
+        * 'decode' is the time spent in draw_region before handing over to the UI thread
+        * 'paint' is the time spent in the functions scheduled via idle_add
+        Both run synchronously here, so the total is the sum of the two.
+    """
+
+    def __init__(self, backing):
+        self.backing = backing
+        self.paint_time = 0
+        self.pending = []
+        if hasattr(backing, "idle_add"):
+            backing.idle_add = self.idle_add
+
+    def idle_add(self, fn, *args, **kwargs):
+        start = monotonic_time()
+        try:
+            fn(*args, **kwargs)
+        finally:
+            self.paint_time += monotonic_time()-start
+        return False
+
+    def run(self, packets) -> dict:
+        frames = pixels = errors = 0
+        paint_time = decode_time = 0
+        start = monotonic_time()
+        for packet in packets:
+            x, y, width, height, coding, data, _, rowstride = packet[2:10]
+            options = typedict(packet[10] if len(packet)>10 else {})
+            results = []
+            def paint_done(success, message=""):
+                results.append((success, message))
+            self.paint_time = 0
+            frame_start = monotonic_time()
+            self.backing.draw_region(x, y, width, height, bytestostr(coding), data, rowstride, options, [paint_done])
+            elapsed = monotonic_time()-frame_start
+            paint_time += self.paint_time
+            decode_time += elapsed-self.paint_time
+            if not results:
+                #video decoders can delay frames:
+                continue
+            success, message = results[0]
+            if success>0:
+                frames += 1
+                pixels += width*height
+            elif success==0:
+                errors += 1
+                log.warn("Warning: %s paint error: %s", coding, message)
+        elapsed = max(0.000001, monotonic_time()-start)
+        n = max(1, len(packets))
+        return {
+            "packets"   : len(packets),
+            "frames"    : frames,
+            "errors"    : errors,
+            "elapsed"   : elapsed,
+            "fps"       : frames/elapsed,
+            "mpps"      : pixels/elapsed/1000/1000,
+            "decode"    : decode_time*1000/n,
+            "paint"     : paint_time*1000/n,
+            }
+
+
+def run_benchmark(backing_names, encodings, width : int, height : int, frames : int, replay=None) -> dict:
+    """ returns the results for each backing and encoding combination """
+    if replay:
+        all_packets = replay
+        encodings = [x for x in encodings if x in replay] or sorted(replay.keys())
+    else:
+        all_packets = {}
+    results = {}
+    for encoding in encodings:
+        packets = all_packets.get(encoding)
+        if packets is None:
+            try:
+                packets = make_packets(encoding, width, height, frames)
+            except Exception as e:
+                log("make_packets%s", (encoding, width, height, frames), exc_info=True)
+                log.warn("Warning: skipping %s: %s", encoding, e)
+                continue
+        if not packets:
+            continue
+        #the backing must be large enough for all the packets we replay:
+        bw = max(p[2]+p[4] for p in packets)
+        bh = max(p[3]+p[5] for p in packets)
+        for backing_name in backing_names:
+            try:
+                backing = make_backing(backing_name, bw, bh)
+            except Exception as e:
+                log("make_backing%s", (backing_name, bw, bh), exc_info=True)
+                log.warn("Warning: cannot use the %s backing: %s", backing_name, e)
+                continue
+            try:
+                results.setdefault(backing_name, {})[encoding] = PaintBenchmark(backing).run(packets)
+            finally:
+                backing.close()
+    return results
+
+
+def print_results(results):
+    print("%-8s %-12s %8s %8s %10s %10s %10s" % ("backing", "encoding", "frames", "fps", "MPixels/s", "decode ms", "paint ms"))
+    for backing_name, backing_results in results.items():
+        for encoding, r in backing_results.items():
+            print("%-8s %-12s %8i %8.1f %10.1f %10.2f %10.2f" % (
+                backing_name, encoding, r["frames"], r["fps"], r["mpps"], r["decode"], r["paint"]))
+
+
+def main(argv): # pragma: no cover
+    from xpra.platform import program_context
+    from xpra.log import enable_color
+    from xpra.codecs.loader import load_codecs
+    from xpra.codecs.video_helper import getVideoHelper
+    with program_context("Paint-Benchmark", "Paint Benchmark"):
+        enable_color()
+        width, height = DEFAULT_SIZE
+        frames = DEFAULT_FRAMES
+        encodings = DEFAULT_ENCODINGS
+        backings = DEFAULT_BACKINGS
+        replay = None
+        for arg in argv[1:]:
+            if arg in ("-v", "--verbose"):
+                log.enable_debug()
+                continue
+            if not arg.startswith("--") or arg.find("=")<0:
+                print("invalid argument: %r" % arg)
+                print("usage: %s [--size=WIDTHxHEIGHT] [--frames=N] [--encodings=E1,E2] [--backings=fake,cairo] [--replay=FILE]" % argv[0])
+                return 1
+            k, v = arg[2:].split("=", 1)
+            if k=="size":
+                width, height = (int(x) for x in v.lower().split("x", 1))
+            elif k=="frames":
+                frames = int(v)
+            elif k=="encodings":
+                encodings = v.split(",")
+            elif k=="backings":
+                backings = v.split(",")
+            elif k=="replay":
+                replay = load_packets(v)
+            else:
+                print("unknown option %r" % k)
+                return 1
+        load_codecs()
+        getVideoHelper().init()
+        print("benchmarking %s using %s" % (csv(encodings), csv(backings)))
+        results = run_benchmark(backings, encodings, width, height, frames, replay)
+        print_results(results)
+        try:
+            from xpra.buffers.membuf import get_pool_info   #@UnresolvedImport
+        except ImportError:
+            pass
+        else:
+            pool = get_pool_info()
+            print("buffer pool: %i hits, %i misses" % (pool.get("hits", 0), pool.get("misses", 0)))
+    return 0
+
+
+if __name__ == "__main__":  # pragma: no cover
+    sys.exit(main(sys.argv))
@@ -20,7 +20,7 @@ from xpra.os_util import (
 from xpra.exit_codes import EXIT_STR
 from xpra.make_thread import start_thread
 from xpra.client.gobject_client_base import InfoTimerClient
-from xpra.platform.dotxpra import DotXpra
+from xpra.platform.dotxpra import DotXpra, SOCKET_STATE_TTL
 from xpra.platform.paths import get_nodock_command
 from xpra.simple_stats import std_unit
 from xpra.common import GRAVITY_STR
@@ -106,7 +106,7 @@ class TopClient:
         self.selected_session = None
         self.message = None
         self.exit_code = None
-        self.dotxpra = DotXpra(self.socket_dir, self.socket_dirs)
+        self.dotxpra = DotXpra(self.socket_dir, self.socket_dirs, cache_ttl=SOCKET_STATE_TTL)
         self.last_getch = 0
         self.psprocess = {}
 
@@ -346,15 +346,15 @@ class WindowBackingBase:
         rowstride = img.get_rowstride()
         w = img.get_width()
         h = img.get_height()
-        self.idle_add(self.do_paint_rgb, rgb_format, img_data,
-                      x, y, w, h, width, height, rowstride, options, callbacks)
+        self.queue_paint_rgb(rgb_format, img_data,
+                             x, y, w, h, width, height, rowstride, options, callbacks)
 
 
     def paint_image(self, coding, img_data, x, y, width, height, options, callbacks):
         # can be called from any thread
         rgb_format, img_data, iwidth, iheight, rowstride = self.pil_decoder.decompress(coding, img_data, options)
-        self.idle_add(self.do_paint_rgb, rgb_format, img_data,
-                      x, y, iwidth, iheight, width, height, rowstride, options, callbacks)
+        self.queue_paint_rgb(rgb_format, img_data,
+                             x, y, iwidth, iheight, width, height, rowstride, options, callbacks)
 
     def paint_webp(self, img_data, x, y, width, height, options, callbacks):
         if not self.webp_decoder or WEBP_PILLOW:
@@ -385,8 +385,8 @@ class WindowBackingBase:
             stride = img.get_rowstride()
         #replace with the actual rgb format we get from the decoder:
         options["rgb_format"] = rgb_format
-        self.idle_add(self.do_paint_rgb, rgb_format, data,
-                                 x, y, iwidth, iheight, width, height, stride, options, callbacks)
+        self.queue_paint_rgb(rgb_format, data,
+                             x, y, iwidth, iheight, width, height, stride, options, callbacks)
 
     def paint_rgb(self, rgb_format, raw_data, x, y, width, height, rowstride, options, callbacks):
         """ can be called from a non-UI thread """
@@ -398,8 +398,16 @@ class WindowBackingBase:
             rgb_data = compression.decompress_by_name(raw_data, algo=comp[0])
         else:
             rgb_data = raw_data
-        self.idle_add(self.do_paint_rgb, rgb_format, rgb_data,
-                      x, y, iwidth, iheight, width, height, rowstride, options, callbacks)
+        self.queue_paint_rgb(rgb_format, rgb_data,
+                             x, y, iwidth, iheight, width, height, rowstride, options, callbacks)
+
+    def queue_paint_rgb(self, rgb_format, img_data,
+                        x, y, width, height, render_width, render_height, rowstride, options, callbacks):
+        """ called from the decode thread,
+            schedules the call to do_paint_rgb from the UI thread
+        """
+        self.idle_add(self.do_paint_rgb, rgb_format, img_data,
+                      x, y, width, height, render_width, render_height, rowstride, options, callbacks)
 
     def do_paint_rgb(self, rgb_format, img_data,
                      x, y, width, height, render_width, render_height, rowstride, options, callbacks):
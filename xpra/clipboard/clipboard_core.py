@@ -7,6 +7,7 @@
 import os
 import struct
 import re
+import hashlib
 from io import BytesIO
 from gi.repository import GLib
 
@@ -22,6 +23,18 @@ MIN_CLIPBOARD_COMPRESS_SIZE = envint("XPRA_MIN_CLIPBOARD_COMPRESS_SIZE", 512)
 MAX_CLIPBOARD_PACKET_SIZE = 16*1024*1024
 MAX_CLIPBOARD_RECEIVE_SIZE = envint("XPRA_MAX_CLIPBOARD_RECEIVE_SIZE", -1)
 MAX_CLIPBOARD_SEND_SIZE = envint("XPRA_MAX_CLIPBOARD_SEND_SIZE", -1)
+#contents bigger than this are sent in chunks (if the peer supports it):
+CLIPBOARD_CHUNK_SIZE = max(4096, envint("XPRA_CLIPBOARD_CHUNK_SIZE", 256*1024))
+#maximum number of chunks sent that the peer has not acknowledged yet:
+CLIPBOARD_CHUNKS_WINDOW = max(1, envint("XPRA_CLIPBOARD_CHUNKS_WINDOW", 4))
+#give up sending the chunks if the peer does not acknowledge them within this delay, in milliseconds:
+CLIPBOARD_CHUNK_TIMEOUT = max(1000, envint("XPRA_CLIPBOARD_CHUNK_TIMEOUT", 10*1000))
+#the maximum size of the contents we send or accept in chunks:
+MAX_CLIPBOARD_CHUNKED_SIZE = envint("XPRA_MAX_CLIPBOARD_CHUNKED_SIZE", 128*1024*1024)
+#cache the contents so we don't need to request or send them again when they have not changed:
+CLIPBOARD_CACHE = envbool("XPRA_CLIPBOARD_CACHE", True)
+#contents bigger than this are not cached:
+MAX_CLIPBOARD_CACHE_SIZE = envint("XPRA_MAX_CLIPBOARD_CACHE_SIZE", 16*1024*1024)
 
 ALL_CLIPBOARDS = [strtobytes(x) for x in PLATFORM_CLIPBOARDS]
 CLIPBOARDS = PLATFORM_CLIPBOARDS
@@ -89,6 +102,16 @@ def _filter_targets(targets):
     log("_filter_targets(%s)=%s", csv(targets_strs), f)
     return f
 
+def get_contents_digest(dtype, dformat, data) -> str:
+    h = hashlib.sha1()
+    h.update(strtobytes("%s/%s:" % (dtype, dformat)))
+    if isinstance(data, (bytes, bytearray, memoryview)):
+        h.update(data)
+    else:
+        #ie: TARGETS as a tuple of strings
+        h.update(strtobytes(repr(data)))
+    return h.hexdigest()
+
 #CARD32 can actually be 64-bits...
 CARD32_SIZE = sizeof_long*8
 def get_format_size(dformat):
@@ -106,6 +129,15 @@ class ClipboardProtocolHelperCore:
         self.max_clipboard_receive_size = d.intget("max-receive-size", MAX_CLIPBOARD_RECEIVE_SIZE)
         self.max_clipboard_send_size = d.intget("max-send-size", MAX_CLIPBOARD_SEND_SIZE)
         self.clipboard_contents_slice_fix = False
+        self.clipboard_chunks = False
+        self.clipboard_cache = False
+        self.cache_hits = 0
+        self.cache_unchanged = 0
+        self.cache_misses = 0
+        #request_id -> [selection, chunk_data, next offset, total, chunks in flight, timeout timer]
+        self._clipboard_outgoing = {}
+        #request_id -> [dtype, dformat, wire_encoding, total, received, chunks]
+        self._clipboard_incoming = {}
         self.disabled_by_loop = []
         self.filter_res = []
         filter_res = d.strtupleget("filters")
@@ -160,6 +192,13 @@ class ClipboardProtocolHelperCore:
                 "max_size"  :       self.max_clipboard_packet_size,
                 "max_recv_size":    self.max_clipboard_receive_size,
                 "max_send_size":    self.max_clipboard_send_size,
+                "chunks"    :       self.clipboard_chunks,
+                "cache"     : {
+                    "enabled"   : self.clipboard_cache,
+                    "hits"      : self.cache_hits,
+                    "unchanged" : self.cache_unchanged,
+                    "misses"    : self.cache_misses,
+                    },
                 "filters"   : [x.pattern for x in self.filter_res],
                 "requests"  : self._clipboard_request_counter,
                 "pending"   : tuple(self._clipboard_outstanding_requests.keys()),
@@ -175,6 +214,10 @@ class ClipboardProtocolHelperCore:
         def nosend(*_args):
             pass
         self.send = nosend
+        for state in self._clipboard_outgoing.values():
+            GLib.source_remove(state[-1])
+        self._clipboard_outgoing = {}
+        self._clipboard_incoming = {}
         for x in self._clipboard_proxies.values():
             x.cleanup()
         self._clipboard_proxies = {}
@@ -218,6 +261,12 @@ class ClipboardProtocolHelperCore:
     def set_clipboard_contents_slice_fix(self, v):
         self.clipboard_contents_slice_fix = v
 
+    def set_clipboard_chunks(self, v):
+        self.clipboard_chunks = v
+
+    def set_clipboard_cache(self, v):
+        self.clipboard_cache = CLIPBOARD_CACHE and v
+
     def enable_selections(self, selections):
         #when clients first connect or later through the "clipboard-enable-selections" packet,
         #they can tell us which clipboard selections they want enabled
@@ -245,6 +294,9 @@ class ClipboardProtocolHelperCore:
             "clipboard-request"             : self._process_clipboard_request,
             "clipboard-contents"            : self._process_clipboard_contents,
             "clipboard-contents-none"       : self._process_clipboard_contents_none,
+            "clipboard-contents-chunk"      : self._process_clipboard_contents_chunk,
+            "clipboard-contents-chunk-ack"  : self._process_clipboard_contents_chunk_ack,
+            "clipboard-contents-cached"     : self._process_clipboard_contents_cached,
             "clipboard-pending-requests"    : self._process_clipboard_pending_requests,
             "clipboard-enable-selections"   : self._process_clipboard_enable_selections,
             "clipboard-loop-uuids"          : self._process_clipboard_loop_uuids,
@@ -296,6 +348,8 @@ class ClipboardProtocolHelperCore:
             l("ignoring token for disabled clipboard '%s'", name)
             return
         log("process clipboard token selection=%s, local clipboard name=%s, proxy=%s", selection, name, proxy)
+        #the contents may have changed:
+        proxy.expire_cache()
         targets = None
         target_data = None
         if proxy._can_receive:
@@ -401,6 +455,8 @@ class ClipboardProtocolHelperCore:
         request_id, selection, target = packet[1:4]
         selection = bytestostr(selection)
         target = bytestostr(target)
+        #the digest of the contents the peer already has:
+        known_digest = bytestostr(packet[4]) if len(packet)>=5 else ""
         def no_contents():
             self.send("clipboard-contents-none", request_id, selection)
         if must_discard(target):
@@ -431,10 +487,10 @@ class ClipboardProtocolHelperCore:
             log.warn("clipboard request %s dropped for testing!", request_id)
             return
         def got_contents(dtype, dformat, data):
-            self.proxy_got_contents(request_id, selection, target, dtype, dformat, data)
+            self.proxy_got_contents(request_id, selection, target, dtype, dformat, data, known_digest)
         proxy.get_contents(target, got_contents)
 
-    def proxy_got_contents(self, request_id, selection, target, dtype, dformat, data):
+    def proxy_got_contents(self, request_id, selection, target, dtype, dformat, data, known_digest=""):
         def no_contents():
             self.send("clipboard-contents-none", request_id, selection)
         dtype = bytestostr(dtype)
@@ -452,14 +508,37 @@ class ClipboardProtocolHelperCore:
             if len(data) > max_send_datalen:
                 truncated = len(data) - max_send_datalen
                 data = data[:max_send_datalen]
-        munged = self._munge_raw_selection_to_wire(target, dtype, dformat, data)
-        if is_debug_enabled("clipboard"):
-            log("clipboard raw -> wire: %r -> %r",
-                (dtype, dformat, ellipsizer(data)), ellipsizer(munged))
+        digest = ""
+        proxy = None
+        if self.clipboard_cache:
+            digest = get_contents_digest(dtype, dformat, data)
+            if known_digest==digest:
+                log("clipboard contents for '%s' unchanged: %s", target, digest)
+                self.send("clipboard-contents-cached", request_id, selection, digest)
+                return
+            proxy = self._clipboard_proxies.get(self.remote_to_local(selection))
+        #re-use the wire data if we have sent the same contents before:
+        munged = proxy.get_cached_wire_data(target, digest) if proxy else None
+        if munged is None:
+            munged = self._munge_raw_selection_to_wire(target, dtype, dformat, data)
+            if is_debug_enabled("clipboard"):
+                log("clipboard raw -> wire: %r -> %r",
+                    (dtype, dformat, ellipsizer(data)), ellipsizer(munged))
+            if proxy:
+                proxy.cache_wire_data(target, digest, munged)
         wire_encoding, wire_data = munged
         if wire_encoding is None:
             no_contents()
             return
+        if (self.clipboard_chunks and self.clipboard_contents_slice_fix and
+            bytestostr(wire_encoding)=="bytes" and len(wire_data)>CLIPBOARD_CHUNK_SIZE):
+            if len(wire_data)>MAX_CLIPBOARD_CHUNKED_SIZE:
+                log.warn("Warning: clipboard contents are too big and have not been sent")
+                log.warn(" %s bytes dropped (maximum is %s)", len(wire_data), MAX_CLIPBOARD_CHUNKED_SIZE)
+                no_contents()
+                return
+            self.send_contents_chunks(request_id, selection, dtype, dformat, wire_encoding, wire_data, truncated, digest)
+            return
         wire_data = self._may_compress(dtype, dformat, wire_data)
         if wire_data is not None:
             packet = ["clipboard-contents", request_id, selection,
@@ -467,8 +546,70 @@ class ClipboardProtocolHelperCore:
             if self.clipboard_contents_slice_fix:
                 #sending the extra argument requires the fix
                 packet.append(truncated)
+                if digest:
+                    #not chunked, so the total size is not needed
+                    packet += [0, digest]
             self.send(*packet)
 
+    def send_contents_chunks(self, request_id, selection, dtype, dformat, wire_encoding, wire_data,
+                             truncated, digest=""):
+        """
+            The first chunk is sent with the 'clipboard-contents' packet, along with the total size,
+            the peer acknowledges each chunk it receives and we only send more
+            when there are fewer than CLIPBOARD_CHUNKS_WINDOW chunks in flight,
+            so that the chunks don't fill up the network queue ahead of other packets.
+        """
+        data = memoryview(strtobytes(wire_data))
+        total = len(data)
+        log("send_contents_chunks(%s, %s, ..) %i bytes in %i chunks",
+            request_id, selection, total, (total+CLIPBOARD_CHUNK_SIZE-1)//CLIPBOARD_CHUNK_SIZE)
+        def chunk_data(offset):
+            return self._may_compress(dtype, dformat, data[offset:offset+CLIPBOARD_CHUNK_SIZE].tobytes())
+        packet = ["clipboard-contents", request_id, selection,
+                  dtype, dformat, wire_encoding, chunk_data(0), truncated, total]
+        if digest:
+            packet.append(digest)
+        self.send(*packet)
+        timer = GLib.timeout_add(CLIPBOARD_CHUNK_TIMEOUT, self._clipboard_chunks_timeout, request_id)
+        self._clipboard_outgoing[request_id] = [selection, chunk_data, CLIPBOARD_CHUNK_SIZE, total, 1, timer]
+        self._send_clipboard_chunks(request_id)
+        self.progress()
+
+    def _send_clipboard_chunks(self, request_id):
+        state = self._clipboard_outgoing[request_id]
+        selection, chunk_data, offset, total, in_flight = state[:5]
+        while in_flight<CLIPBOARD_CHUNKS_WINDOW and offset<total:
+            self.send("clipboard-contents-chunk", request_id, selection, offset, chunk_data(offset))
+            offset += CLIPBOARD_CHUNK_SIZE
+            in_flight += 1
+        state[2] = offset
+        state[4] = in_flight
+
+    def _process_clipboard_contents_chunk_ack(self, packet):
+        request_id, selection, received = packet[1:4]
+        state = self._clipboard_outgoing.get(request_id)
+        if not state:
+            log("ignoring clipboard chunk ack for %s: request %s not found", bytestostr(selection), request_id)
+            return
+        GLib.source_remove(state[-1])
+        if received<0 or received>=state[3]:
+            #the peer has failed the request, or it has received everything:
+            log("clipboard request %s: %s", request_id, "failed" if received<0 else "all chunks received")
+            del self._clipboard_outgoing[request_id]
+            self.progress()
+            return
+        state[4] = max(0, state[4]-1)
+        state[-1] = GLib.timeout_add(CLIPBOARD_CHUNK_TIMEOUT, self._clipboard_chunks_timeout, request_id)
+        self._send_clipboard_chunks(request_id)
+
+    def _clipboard_chunks_timeout(self, request_id):
+        state = self._clipboard_outgoing.pop(request_id, None)
+        if state:
+            log.warn("Warning: clipboard contents chunks for request %s have not been acknowledged", request_id)
+            log.warn(" %i bytes sent out of %i", min(state[2], state[3]), state[3])
+            self.progress()
+        return False
+
     def _may_compress(self, dtype, dformat, wire_data):
         if len(wire_data)>self.max_clipboard_packet_size:
             log.warn("Warning: clipboard contents are too big and have not been sent")
@@ -484,11 +625,69 @@ class ClipboardProtocolHelperCore:
         wire_encoding = bytestostr(wire_encoding)
         dtype = bytestostr(dtype)
         log("process clipboard contents, selection=%s, type=%s, format=%s", selection, dtype, dformat)
+        total = packet[8] if len(packet)>=9 else 0
+        digest = bytestostr(packet[9]) if len(packet)>=10 else ""
+        if total>len(wire_data or b""):
+            #more chunks will follow:
+            if total>MAX_CLIPBOARD_CHUNKED_SIZE:
+                log.warn("Warning: clipboard contents are too big and have been dropped")
+                log.warn(" %s bytes (maximum is %s)", total, MAX_CLIPBOARD_CHUNKED_SIZE)
+                self._clipboard_got_contents(request_id, None, None, None)
+                return
+            self._clipboard_incoming[request_id] = [dtype, dformat, wire_encoding, total, len(wire_data), [wire_data],
+                                                    digest]
+            self.send("clipboard-contents-chunk-ack", request_id, selection, len(wire_data))
+            self._clipboard_contents_progress(request_id, len(wire_data), total)
+            return
+        self._clipboard_got_wire_contents(request_id, dtype, dformat, wire_encoding, wire_data, digest)
+
+    def _process_clipboard_contents_chunk(self, packet):
+        request_id, selection, offset, data = packet[1:5]
+        state = self._clipboard_incoming.get(request_id)
+        if not state:
+            log("ignoring clipboard contents chunk for %s: request %s not found", bytestostr(selection), request_id)
+            return
+        dtype, dformat, wire_encoding, total, received, chunks, digest = state
+        if offset!=received or received+len(data)>total:
+            log.warn("Warning: invalid clipboard contents chunk for request %s", request_id)
+            log.warn(" at offset %i, expected %i (%i bytes, total is %i)", offset, received, len(data), total)
+            del self._clipboard_incoming[request_id]
+            self.send("clipboard-contents-chunk-ack", request_id, selection, -1)
+            self._clipboard_got_contents(request_id, None, None, None)
+            return
+        chunks.append(data)
+        received += len(data)
+        state[4] = received
+        self.send("clipboard-contents-chunk-ack", request_id, selection, received)
+        if received<total:
+            self._clipboard_contents_progress(request_id, received, total)
+            return
+        del self._clipboard_incoming[request_id]
+        self._clipboard_got_wire_contents(request_id, dtype, dformat, wire_encoding, b"".join(chunks), digest)
+
+    def _clipboard_contents_progress(self, request_id, received, total):
+        log("clipboard request %s: received %i%% of %i bytes", request_id, received*100//total, total)
+        self.progress()
+
+    def _clipboard_got_wire_contents(self, request_id, dtype, dformat, wire_encoding, wire_data, digest=""):
         raw_data = self._munge_wire_selection_to_raw(wire_encoding, dtype, dformat, wire_data)
         if log.is_debug_enabled():
             r = ellipsizer
             log("clipboard wire -> raw: %s -> %s", (dtype, dformat, wire_encoding, r(wire_data)), r(raw_data))
-        self._clipboard_got_contents(request_id, dtype, dformat, raw_data)
+        if digest:
+            self.cache_misses += 1
+            self._clipboard_got_contents(request_id, dtype, dformat, raw_data, digest=digest)
+        else:
+            self._clipboard_got_contents(request_id, dtype, dformat, raw_data)
+
+    def _process_clipboard_contents_cached(self, packet):
+        #the contents have not changed since we last received them:
+        request_id, selection, digest = packet[1:4]
+        log("process clipboard contents cached, selection=%s, digest=%s", bytestostr(selection), bytestostr(digest))
+        self._clipboard_got_cached_contents(request_id, bytestostr(digest))
+
+    def _clipboard_got_cached_contents(self, request_id, digest):
+        raise NotImplementedError()
 
     def _process_clipboard_contents_none(self, packet):
         log("process clipboard contents none")
@@ -501,7 +700,8 @@ class ClipboardProtocolHelperCore:
 
     def progress(self):
         if self.progress_cb:
-            self.progress_cb(len(self._clipboard_outstanding_requests), None)
+            #requests we are waiting for and contents we are still sending:
+            self.progress_cb(len(self._clipboard_outstanding_requests)+len(self._clipboard_outgoing), None)
 
 
     def _process_clipboard_pending_requests(self, packet):
@@ -557,6 +757,10 @@ class ClipboardProxyCore:
         self.preferred_targets = []
 
         self._loop_uuid = ""
+        #contents received from the peer: target -> (digest, dtype, dformat, data, fresh)
+        self._contents_cache = {}
+        #contents sent to the peer: target -> (digest, (wire_encoding, wire_data))
+        self._wire_cache = {}
 
     def init_uuid(self):
         self._loop_uuid = LOOP_PREFIX+get_hex_uuid()
@@ -594,6 +798,41 @@ class ClipboardProxyCore:
     def cleanup(self):
         self._enabled = False
         self.cancel_emit_token()
+        self._contents_cache = {}
+        self._wire_cache = {}
+
+    def cache_contents(self, target, digest, dtype, dformat, data):
+        if data is None or len(data)>MAX_CLIPBOARD_CACHE_SIZE:
+            self._contents_cache.pop(target, None)
+            return
+        self._contents_cache[target] = (digest, dtype, dformat, data, True)
+
+    def get_cached_contents(self, target, fresh=True):
+        """
+            returns the cached (digest, dtype, dformat, data) for this target,
+            'fresh' contents are still valid, the others must be verified with the peer first
+        """
+        entry = self._contents_cache.get(target)
+        if not entry or (fresh and not entry[-1]):
+            return None
+        return entry[:-1]
+
+    def expire_cache(self):
+        #keep the contents but verify them before using them again:
+        for target, entry in tuple(self._contents_cache.items()):
+            self._contents_cache[target] = entry[:-1]+(False, )
+
+    def cache_wire_data(self, target, digest, munged):
+        if munged[0] is None or len(munged[1] or ())>MAX_CLIPBOARD_CACHE_SIZE:
+            self._wire_cache.pop(target, None)
+            return
+        self._wire_cache[target] = (digest, munged)
+
+    def get_cached_wire_data(self, target, digest):
+        entry = self._wire_cache.get(target)
+        if entry and entry[0]==digest:
+            return entry[1]
+        return None
 
     def is_enabled(self) -> bool:
         return self._enabled
@@ -80,6 +80,14 @@ class ClipboardTimeoutHelper(ClipboardProtocolHelperCore):
 
     def _send_clipboard_request_handler(self, proxy, selection, target):
         log("send_clipboard_request_handler%s", (proxy, selection, target))
+        if self.clipboard_cache:
+            cached = proxy.get_cached_contents(target)
+            if cached:
+                #we have these contents already, reply from the main loop:
+                log("using cached contents for '%s': %s", target, cached[0])
+                self.cache_hits += 1
+                GLib.idle_add(proxy.got_contents, target, *cached[1:])
+                return
         request_id = self._clipboard_request_counter
         self._clipboard_request_counter += 1
         remote = self.local_to_remote(selection)
@@ -87,9 +95,15 @@ class ClipboardTimeoutHelper(ClipboardProtocolHelperCore):
         timer = GLib.timeout_add(REMOTE_TIMEOUT, self.timeout_request, request_id, selection, target)
         self._clipboard_outstanding_requests[request_id] = (timer, selection, target)
         self.progress()
-        self.send("clipboard-request", request_id, remote, target)
+        cached = proxy.get_cached_contents(target, False) if self.clipboard_cache else None
+        if cached:
+            #only send the contents if they have changed:
+            self.send("clipboard-request", request_id, remote, target, cached[0])
+        else:
+            self.send("clipboard-request", request_id, remote, target)
 
     def timeout_request(self, request_id, selection, target):
+        self._clipboard_incoming.pop(request_id, None)
         try:
             selection, target = self._clipboard_outstanding_requests.pop(request_id)[1:]
         except KeyError:
@@ -104,7 +118,34 @@ class ClipboardTimeoutHelper(ClipboardProtocolHelperCore):
         if proxy:
             proxy.got_contents(target)
 
-    def _clipboard_got_contents(self, request_id, dtype=None, dformat=None, data=None):
+    def _clipboard_contents_progress(self, request_id, received, total):
+        #the contents are still arriving, restart the timeout:
+        request = self._clipboard_outstanding_requests.get(request_id)
+        if request:
+            timer, selection, target = request
+            GLib.source_remove(timer)
+            timer = GLib.timeout_add(REMOTE_TIMEOUT, self.timeout_request, request_id, selection, target)
+            self._clipboard_outstanding_requests[request_id] = (timer, selection, target)
+        super()._clipboard_contents_progress(request_id, received, total)
+
+    def _clipboard_got_cached_contents(self, request_id, digest):
+        request = self._clipboard_outstanding_requests.get(request_id)
+        if not request:
+            log.warn("Warning: request id %i not found", request_id)
+            return
+        selection, target = request[1:]
+        proxy = self._get_proxy(selection)
+        cached = proxy.get_cached_contents(target, False) if proxy else None
+        if not cached or cached[0]!=digest:
+            #we no longer have them!
+            log("cached contents for '%s' not found", target)
+            self._clipboard_got_contents(request_id)
+            return
+        self.cache_unchanged += 1
+        self._clipboard_got_contents(request_id, *cached[1:], digest=digest)
+
+    def _clipboard_got_contents(self, request_id, dtype=None, dformat=None, data=None, digest=""):
+        self._clipboard_incoming.pop(request_id, None)
         try:
             timer, selection, target = self._clipboard_outstanding_requests.pop(request_id)
         except KeyError:
@@ -118,6 +159,8 @@ class ClipboardTimeoutHelper(ClipboardProtocolHelperCore):
         log("clipboard got contents%s: proxy=%s for selection=%s",
             (request_id, dtype, dformat, ellipsizer(data)), proxy, selection)
         if proxy:
+            if digest:
+                proxy.cache_contents(target, digest, dtype, dformat, data)
             proxy.got_contents(target, dtype, dformat, data)
 
     def client_reset(self):
@@ -7,7 +7,7 @@
 #cython: boundscheck=False, wraparound=False, cdivision=True, language_level=3
 
 from xpra.util import first_time
-from xpra.buffers.membuf cimport getbuf, padbuf, MemBuf, buffer_context #pylint: disable=syntax-error
+from xpra.buffers.membuf cimport poolbuf, MemBuf, buffer_context #pylint: disable=syntax-error
 
 from libc.stdint cimport uintptr_t, uint32_t, uint16_t, uint8_t
 
@@ -35,7 +35,7 @@ cdef bgr565data_to_rgbx(const uint16_t* rgb565, const int rgb565_len):
     if rgb565_len <= 0:
         return None
     assert rgb565_len>0 and rgb565_len % 2 == 0, "invalid buffer size: %s is not a multiple of 2" % rgb565_len
-    cdef MemBuf output_buf = padbuf(rgb565_len*2, 2)
+    cdef MemBuf output_buf = poolbuf(rgb565_len*2, 2)
     cdef uint32_t *rgbx = <uint32_t*> output_buf.get_mem()
     cdef uint16_t v
     cdef unsigned int i = 0
@@ -56,7 +56,7 @@ cdef bgr565data_to_rgb(const uint16_t* rgb565, const int rgb565_len):
     if rgb565_len <= 0:
         return None
     assert rgb565_len>0 and rgb565_len % 2 == 0, "invalid buffer size: %s is not a multiple of 2" % rgb565_len
-    cdef MemBuf output_buf = padbuf(rgb565_len*3//2, 3)
+    cdef MemBuf output_buf = poolbuf(rgb565_len*3//2, 3)
     cdef uint8_t *rgb = <uint8_t*> output_buf.get_mem()
     cdef uint32_t v
     cdef unsigned int i = 0
@@ -84,7 +84,7 @@ def r210_to_rgba(buf,
 cdef r210data_to_rgba(unsigned int* r210,
                       const unsigned int w, const unsigned int h,
                       const unsigned int src_stride, const unsigned int dst_stride):
-    cdef MemBuf output_buf = getbuf(h*dst_stride)
+    cdef MemBuf output_buf = poolbuf(h*dst_stride, 0)
     cdef unsigned char* rgba = <unsigned char*> output_buf.get_mem()
     cdef unsigned int y = 0
     cdef unsigned int i = 0
@@ -117,7 +117,7 @@ def r210_to_rgbx(buf,
 cdef r210data_to_rgbx(unsigned int* r210,
                       const unsigned int w, const unsigned int h,
                       const unsigned int src_stride, const unsigned int dst_stride):
-    cdef MemBuf output_buf = getbuf(h*dst_stride)
+    cdef MemBuf output_buf = poolbuf(h*dst_stride, 0)
     cdef unsigned char* rgba = <unsigned char*> output_buf.get_mem()
     cdef unsigned int y = 0
     cdef unsigned int i = 0
@@ -155,7 +155,7 @@ def r210_to_rgb(buf,
 cdef r210data_to_rgb(unsigned int* r210,
                      const unsigned int w, const unsigned int h,
                      const unsigned int src_stride, const unsigned int dst_stride):
-    cdef MemBuf output_buf = getbuf(h*dst_stride)
+    cdef MemBuf output_buf = poolbuf(h*dst_stride, 0)
     cdef unsigned char* rgba = <unsigned char*> output_buf.get_mem()
     cdef unsigned int y = 0
     cdef unsigned int i = 0
@@ -183,7 +183,7 @@ cdef argbdata_to_rgba(const unsigned char* argb, const int argb_len):
     if argb_len <= 0:
         return None
     assert argb_len>0 and argb_len % 4 == 0, "invalid buffer size: %s is not a multiple of 4" % argb_len
-    cdef MemBuf output_buf = getbuf(argb_len)
+    cdef MemBuf output_buf = poolbuf(argb_len, 0)
     cdef unsigned char* rgba = <unsigned char*> output_buf.get_mem()
     #number of pixels:
     cdef int i = 0
@@ -209,7 +209,7 @@ cdef argbdata_to_rgb(const unsigned char *argb, const int argb_len):
     #number of pixels:
     cdef unsigned int mi = argb_len//4                #@DuplicateSignature
     #3 bytes per pixel:
-    cdef MemBuf output_buf = padbuf(mi*3, 3)
+    cdef MemBuf output_buf = poolbuf(mi*3, 3)
     cdef unsigned char* rgb = <unsigned char*> output_buf.get_mem()
     cdef int i = 0, di = 0                          #@DuplicateSignature
     while i < argb_len:
@@ -235,7 +235,7 @@ cdef bgradata_to_rgb(const unsigned char* bgra, const int bgra_len):
     #number of pixels:
     cdef int mi = bgra_len//4                #@DuplicateSignature
     #3 bytes per pixel:
-    cdef MemBuf output_buf = padbuf(mi*3, 3)
+    cdef MemBuf output_buf = poolbuf(mi*3, 3)
     cdef unsigned char* rgb = <unsigned char*> output_buf.get_mem()
     cdef int di = 0, si = 0                  #@DuplicateSignature
     while si < bgra_len:
@@ -258,7 +258,7 @@ cdef bgradata_to_rgba(const unsigned char* bgra, const int bgra_len):
         return None
     assert bgra_len>0 and bgra_len % 4 == 0, "invalid buffer size: %s is not a multiple of 4" % bgra_len
     #same number of bytes:
-    cdef MemBuf output_buf = getbuf(bgra_len)
+    cdef MemBuf output_buf = poolbuf(bgra_len, 0)
     cdef unsigned char* rgba = <unsigned char*> output_buf.get_mem()
     cdef int i = 0                      #@DuplicateSignature
     while i < bgra_len:
@@ -286,7 +286,7 @@ cdef bgradata_to_rgbx(const unsigned char* bgra, const int bgra_len):
         return None
     assert bgra_len>0 and bgra_len % 4 == 0, "invalid buffer size: %s is not a multiple of 4" % bgra_len
     #same number of bytes:
-    cdef MemBuf output_buf = getbuf(bgra_len)
+    cdef MemBuf output_buf = poolbuf(bgra_len, 0)
     cdef unsigned char* rgbx = <unsigned char*> output_buf.get_mem()
     cdef int i = 0                      #@DuplicateSignature
     while i < bgra_len:
@@ -314,7 +314,7 @@ cdef do_premultiply_argb(unsigned int *buf, Py_ssize_t argb_len):
     cdef unsigned char a, r, g, b                #@DuplicateSignature
     cdef unsigned int argb                      #@DuplicateSignature
     assert argb_len>0 and argb_len % 4 == 0, "invalid buffer size: %s is not a multiple of 4" % argb_len
-    cdef MemBuf output_buf = getbuf(argb_len)
+    cdef MemBuf output_buf = poolbuf(argb_len, 0)
     cdef unsigned int* argb_out = <unsigned int*> output_buf.get_mem()
     cdef int i                                  #@DuplicateSignature
     for 0 <= i < argb_len / 4:
@@ -353,7 +353,7 @@ cdef do_unpremultiply_argb(unsigned int * argb_in, Py_ssize_t argb_len):
     cdef unsigned char a, r, g, b                #@DuplicateSignature
     cdef unsigned int argb                      #@DuplicateSignature
     assert argb_len>0 and argb_len % 4 == 0, "invalid buffer size: %s is not a multiple of 4" % argb_len
-    cdef MemBuf output_buf = getbuf(argb_len)
+    cdef MemBuf output_buf = poolbuf(argb_len, 0)
     cdef unsigned char* argb_out = <unsigned char*> output_buf.get_mem()
     cdef int i                                  #@DuplicateSignature
     for 0 <= i < argb_len // 4:
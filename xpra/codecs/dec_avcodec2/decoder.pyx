@@ -16,10 +16,9 @@ from xpra.codecs.codec_constants import get_subsampling_divs
 from xpra.codecs.image_wrapper import ImageWrapper
 from xpra.codecs.libav_common.av_log cimport override_logger, restore_logger, av_error_str #@UnresolvedImport pylint: disable=syntax-error
 from xpra.codecs.libav_common.av_log import suspend_nonfatal_logging, resume_nonfatal_logging
-from xpra.buffers.membuf cimport memalign, buffer_context
+from xpra.buffers.membuf cimport poolbuf, MemBuf, buffer_context
 
 from libc.stdint cimport uintptr_t, uint8_t
-from libc.stdlib cimport free
 from libc.string cimport memset, memcpy
 
 
@@ -900,14 +899,15 @@ cdef class Decoder:
 
         #copy the whole input buffer into a padded C buffer:
         cdef Py_ssize_t buf_len = 0
+        cdef MemBuf padded_membuf
         cdef unsigned char * padded_buf = NULL
         cdef const void * src
         with buffer_context(data) as bc:
             buf_len = len(bc)
             src = <const void*> (<uintptr_t> int(bc))
-            padded_buf = <unsigned char *> memalign(buf_len+128)
-            if padded_buf==NULL:
-                raise Exception("failed to allocate %i bytes of memory" % (buf_len+128))
+            #the buffer is returned to the pool when 'padded_membuf' goes out of scope:
+            padded_membuf = poolbuf(buf_len, 128)
+            padded_buf = <unsigned char *> padded_membuf.get_mem()
             memcpy(padded_buf, src, buf_len)
         memset(padded_buf+buf_len, 0, 128)
 
@@ -928,13 +928,12 @@ cdef class Decoder:
             ret = avcodec_send_packet(self.codec_ctx, avpkt)
         if ret!=0:
             av_packet_free(&avpkt)
-            free(padded_buf)
             log("%s.decompress_image(%s:%s, %s) avcodec_send_packet failure: %s", self, type(input), buf_len, options, av_error_str(ret))
             self.log_av_error(buf_len, ret, options)
             return None
         with nogil:
             ret = avcodec_receive_frame(self.codec_ctx, av_frame)
-        free(padded_buf)
+        padded_membuf = None
         av_packet_free(&avpkt)
         if ret==-errno.EAGAIN:
             if options:
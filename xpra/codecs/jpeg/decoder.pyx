@@ -10,7 +10,7 @@ log = Logger("decoder", "jpeg")
 
 from xpra.util import envbool, reverse_dict
 from xpra.codecs.image_wrapper import ImageWrapper
-from xpra.buffers.membuf cimport getbuf, MemBuf #pylint: disable=syntax-error
+from xpra.buffers.membuf cimport poolbuf, MemBuf #pylint: disable=syntax-error
 
 from libc.stdint cimport uint8_t
 from xpra.monotonic_time cimport monotonic_time
@@ -175,7 +175,7 @@ def decompress_to_yuv(data):
             plane_sizes[i] = tjPlaneSizeYUV(i, w, strides[i], h, subsamp)
             assert plane_sizes[i]>0, "cannot get plane size - out of bounds?"
             total_size += plane_sizes[i]
-            membuf = getbuf(plane_sizes[i])     #add padding?
+            membuf = poolbuf(plane_sizes[i], 0)     #add padding?
             planes[i] = <unsigned char*> membuf.get_mem()
             #python objects for each plane:
             pystrides.append(strides[i])
@@ -237,7 +237,7 @@ def decompress_to_rgb(rgb_format, data):
         start = monotonic_time()
         stride = w*4
         size = stride*h
-        membuf = getbuf(size)
+        membuf = poolbuf(size, 0)
         dst_buf = <unsigned char*> membuf.get_mem()
         with nogil:
             r = tjDecompress2(decompressor,
@@ -67,14 +67,17 @@ def codec_import_check(name, description, top_module, class_module, classnames):
                 if SELFTEST and selftest:
                     if name in CODEC_FAIL_SELFTEST:
                         raise ImportError("codec found in fail selftest list")
-                    try:
-                        selftest(FULL_SELFTEST)
-                    except Exception as e:
-                        log.warn("Warning: %s failed its self test", name)
-                        for x in str(e).splitlines():
-                            log.warn(" %s", x)
-                        log("%s failed", selftest, exc_info=True)
-                        return None
+                    from xpra.codecs.probe_cache import probe_cache
+                    if not probe_cache.restore(name, ic, FULL_SELFTEST):
+                        try:
+                            selftest(FULL_SELFTEST)
+                        except Exception as e:
+                            log.warn("Warning: %s failed its self test", name)
+                            for x in str(e).splitlines():
+                                log.warn(" %s", x)
+                            log("%s failed", selftest, exc_info=True)
+                            return None
+                        probe_cache.record(name, ic, FULL_SELFTEST)
             finally:
                 cleanup_module = getattr(ic, "cleanup_module", None)
                 log("%s: cleanup_module=%s", class_module, cleanup_module)
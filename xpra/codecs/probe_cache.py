@@ -0,0 +1,183 @@
+# This file is part of Xpra.
+# Copyright (C) 2021 Antoine Martin <antoine@xpra.org>
+# Xpra is released under the terms of the GNU GPL v2, or, at your option, any
+# later version. See the file COPYING for details.
+
+"""
+Remembers which codecs have passed their self test,
+and the limits they have detected while doing so (ie: max dimensions),
+so that we don't have to run the same tests every time we start.
+
+The results are only re-used if the codec module file,
+the codec library version, the xpra version, the python version,
+the machine and the graphics driver version (where we can find it)
+are all identical.
+Only successful self tests are recorded: failures may well be transient.
+"""
+
+import os
+import sys
+import json
+import hashlib
+
+from xpra.util import envbool
+from xpra.os_util import get_machine_id, load_binary_file, bytestostr, POSIX
+from xpra.log import Logger
+
+log = Logger("codec", "loader")
+
+CODEC_CACHE_FILE = os.environ.get("XPRA_CODEC_CACHE_FILE", "~/.xpra/codec-cache.json")
+#ignore the existing results and run all the tests again:
+CODEC_CACHE_REFRESH = envbool("XPRA_CODEC_CACHE_REFRESH", False)
+#the results of these codecs depend on the hardware and drivers:
+NOCACHE = ("nvenc", "enc_nvjpeg", "enc_ffmpeg")
+
+#the module attributes that the self tests update:
+PROBE_ATTRIBUTES = ("CODECS", "ENCODINGS", "MAX_WIDTH", "MAX_HEIGHT", "MAX_SIZE")
+
+
+_digests = {}
+def file_digest(filename : str) -> str:
+    v = _digests.get(filename)
+    if v is None:
+        h = hashlib.sha1()
+        with open(filename, "rb") as f:
+            while True:
+                data = f.read(1024*1024)
+                if not data:
+                    break
+                h.update(data)
+        v = _digests[filename] = h.hexdigest()
+    return v
+
+
+_driver_version = None
+def get_driver_version() -> str:
+    """ the version line of the NVidia kernel module, if there is one """
+    global _driver_version
+    if _driver_version is None:
+        v = None
+        if POSIX:
+            v = load_binary_file("/proc/driver/nvidia/version")
+        _driver_version = bytestostr(v or b"").split("\n")[0].strip()
+    return _driver_version
+
+
+def restore_value(current, cached):
+    #json turns tuples into lists:
+    if isinstance(current, tuple) and isinstance(cached, list):
+        return tuple(cached)
+    if isinstance(current, dict) and isinstance(cached, dict):
+        return dict((k, tuple(v) if isinstance(v, list) else v) for k, v in cached.items())
+    return cached
+
+
+class CodecProbeCache:
+
+    def __init__(self, filename=CODEC_CACHE_FILE, refresh=CODEC_CACHE_REFRESH):
+        self.filename = os.path.expanduser(filename) if filename else ""
+        self.refresh = refresh
+        self.entries = None
+
+    def __repr__(self):
+        return "CodecProbeCache(%s)" % self.filename
+
+    def load(self) -> dict:
+        if self.entries is None:
+            self.entries = {}
+            if self.filename and not self.refresh and os.path.exists(self.filename):
+                try:
+                    with open(self.filename, "r") as f:
+                        self.entries = json.load(f)
+                    assert isinstance(self.entries, dict)
+                except Exception as e:
+                    log("failed to load %s", self.filename, exc_info=True)
+                    log.warn("Warning: ignoring invalid codec cache file '%s'", self.filename)
+                    log.warn(" %s", e)
+                    self.entries = {}
+        return self.entries
+
+    def save(self):
+        if not self.filename or self.entries is None:
+            return
+        tmp = "%s.%i.tmp" % (self.filename, os.getpid())
+        try:
+            os.makedirs(os.path.dirname(self.filename), mode=0o700, exist_ok=True)
+            with open(tmp, "w") as f:
+                json.dump(self.entries, f, indent=1, sort_keys=True)
+            os.replace(tmp, self.filename)
+        except OSError as e:
+            log("failed to save %s", self.filename, exc_info=True)
+            log.warn("Warning: failed to save the codec cache file '%s'", self.filename)
+            log.warn(" %s", e)
+            try:
+                os.unlink(tmp)
+            except OSError:
+                pass
+
+    def get_key(self, module, full : bool):
+        from xpra import __version__
+        version = None
+        get_version = getattr(module, "get_version", None)
+        if get_version:
+            version = get_version()
+        from xpra.codecs import codec_checks
+        key = {
+            "xpra"      : __version__,
+            "python"    : sys.version,
+            "module"    : file_digest(module.__file__),
+            "checks"    : file_digest(codec_checks.__file__),
+            "version"   : version,
+            "full"      : full,
+            "machine"   : get_machine_id(),
+            "driver"    : get_driver_version(),
+            }
+        #normalize it so it can be compared with the values loaded from the cache file:
+        return json.loads(json.dumps(key, default=str))
+
+    def is_cacheable(self, name, module) -> bool:
+        return bool(self.filename) and name not in NOCACHE and bool(getattr(module, "__file__", None))
+
+    def restore(self, name : str, module, full : bool) -> bool:
+        """
+            if this codec has already passed the same self test,
+            update the module with the values detected and return True
+        """
+        if not self.is_cacheable(name, module):
+            return False
+        entry = self.load().get(name)
+        if not entry:
+            return False
+        try:
+            if entry.get("key")!=self.get_key(module, full):
+                log("codec cache entry for %s is stale", name)
+                return False
+            for attr, cached in entry.get("attributes", {}).items():
+                if attr in PROBE_ATTRIBUTES and hasattr(module, attr):
+                    setattr(module, attr, restore_value(getattr(module, attr), cached))
+        except Exception:
+            log("failed to restore %s from the codec cache", name, exc_info=True)
+            return False
+        log("%s self test results loaded from %s", name, self.filename)
+        return True
+
+    def record(self, name : str, module, full : bool):
+        if not self.is_cacheable(name, module):
+            return
+        try:
+            attributes = {}
+            for attr in PROBE_ATTRIBUTES:
+                if hasattr(module, attr):
+                    attributes[attr] = getattr(module, attr)
+            entry = {
+                "key"           : self.get_key(module, full),
+                "attributes"    : json.loads(json.dumps(attributes)),
+                }
+        except Exception:
+            log("cannot cache the %s self test results", name, exc_info=True)
+            return
+        self.load()[name] = entry
+        self.save()
+
+
+probe_cache = CodecProbeCache()
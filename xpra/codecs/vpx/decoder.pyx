@@ -18,7 +18,7 @@ from xpra.util import envint
 from libc.stdint cimport uintptr_t, uint8_t
 from libc.string cimport memset, memcpy
 from libc.stdlib cimport malloc
-from xpra.buffers.membuf cimport padbuf, MemBuf, buffer_context #pylint: disable=syntax-error
+from xpra.buffers.membuf cimport poolbuf, MemBuf, buffer_context #pylint: disable=syntax-error
 from xpra.monotonic_time cimport monotonic_time
 
 
@@ -290,7 +290,7 @@ cdef class Decoder:
 
             plane_len = height * stride
             #add one extra line of padding:
-            output_buf = padbuf(plane_len, stride)
+            output_buf = poolbuf(plane_len, stride)
             output = <void *>output_buf.get_mem()
             memcpy(output, <void *>img.planes[i], plane_len)
             memset(<void *>((<char *>output)+plane_len), 0, stride)
@@ -9,10 +9,9 @@ from xpra.log import Logger
 log = Logger("encoder", "webp")
 
 from xpra.codecs.image_wrapper import ImageWrapper
-from xpra.buffers.membuf cimport memalign   #pylint: disable=syntax-error
+from xpra.buffers.membuf cimport poolbuf, MemBuf   #pylint: disable=syntax-error
 
 from libc.stdint cimport uint8_t, uint32_t, uintptr_t
-from libc.stdlib cimport free
 
 cdef extern from *:
     ctypedef unsigned long size_t
@@ -165,14 +164,16 @@ cdef inline int roundup(int n, int m):
 cdef class WebpBufferWrapper:
     """
         Opaque object wrapping the buffer,
-        calling free will free the underlying memory.
+        calling free will return the underlying memory to the pool.
     """
 
     cdef uintptr_t buffer_ptr
     cdef size_t size
+    cdef object membuf
 
-    def __cinit__(self, uintptr_t buffer_ptr, size_t size):
-        self.buffer_ptr = buffer_ptr
+    def __cinit__(self, MemBuf membuf, size_t size):
+        self.membuf = membuf
+        self.buffer_ptr = <uintptr_t> membuf.get_mem()
         self.size = size
 
     def __del__(self):
@@ -183,9 +184,8 @@ cdef class WebpBufferWrapper:
         return PyMemoryView_FromMemory(<char *> self.buffer_ptr, self.size, True)
 
     def free(self):
-        if self.buffer_ptr!=0:
-            free(<void *>self.buffer_ptr)
-            self.buffer_ptr = 0
+        self.buffer_ptr = 0
+        self.membuf = None
 
 
 def decompress(data, has_alpha, rgb_format=None, rgb_formats=()):
@@ -224,8 +224,9 @@ def decompress(data, has_alpha, rgb_format=None, rgb_formats=()):
             out_format = "BGRX"
     cdef size_t size = stride * config.input.height
     #allocate the buffer:
-    cdef uint8_t *buf = <uint8_t*> memalign(size + stride)      #add one line of padding
-    cdef WebpBufferWrapper b = WebpBufferWrapper(<uintptr_t> buf, size)
+    cdef MemBuf membuf = poolbuf(size, stride)      #add one line of padding
+    cdef uint8_t *buf = <uint8_t*> membuf.get_mem()
+    cdef WebpBufferWrapper b = WebpBufferWrapper(membuf, size)
     config.output.u.RGBA.rgba   = buf
     config.output.u.RGBA.stride = stride
     config.output.u.RGBA.size   = size
@@ -275,7 +276,8 @@ def decompress_yuv(data, has_alpha=False):
     YUVA.v_size = v_size
     YUVA.a_size = a_size
     #allocate a buffer big enough for all planes with 1 stride of padding after each:
-    cdef uint8_t *buf = <uint8_t*> memalign(y_size + u_size + v_size + a_size + YUVA.y_stride + YUVA.u_stride + YUVA.v_stride + YUVA.a_stride)
+    cdef MemBuf membuf = poolbuf(y_size + u_size + v_size + a_size, YUVA.y_stride + YUVA.u_stride + YUVA.v_stride + YUVA.a_stride)
+    cdef uint8_t *buf = <uint8_t*> membuf.get_mem()
     YUVA.y = buf
     YUVA.u = <uint8_t*> (<uintptr_t> buf + y_size + YUVA.y_stride)
     YUVA.v = <uint8_t*> (<uintptr_t> buf + y_size + YUVA.y_stride + u_size + YUVA.u_stride)
@@ -303,22 +305,22 @@ def decompress_yuv(data, has_alpha=False):
             PyMemoryView_FromMemory(<char *> YUVA.v, v_size, True),
             )
     img = YUVImageWrapper(0, 0, w, h, planes, "YUV420P", (3+alpha)*8, strides, 3+alpha, ImageWrapper.PLANAR_3+alpha)
-    img.cython_buffer = <uintptr_t> buf
+    img.membuf = membuf
     return img
 
 
 class YUVImageWrapper(ImageWrapper):
 
+    membuf = None
+
     def _cn(self):
         return "webp.YUVImageWrapper"
 
     def free(self):
-        cdef uintptr_t buf = self.cython_buffer
-        self.cython_buffer = 0
-        log("webp.YUVImageWrapper.free() cython_buffer=%#x", buf)
+        log("webp.YUVImageWrapper.free() membuf=%s", self.membuf)
         super().free()
-        if buf!=0:
-            free(<void *> buf)
+        #returns the buffer to the pool:
+        self.membuf = None
 
 
 def selftest(full=False):
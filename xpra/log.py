@@ -183,6 +183,7 @@ STRUCT_KNOWN_FILTERS = {
                 "client"        : "All client code",
                 "paint"         : "Client window paint code",
                 "draw"          : "Client draw packets",
+                "benchmark"     : "Client paint benchmark",
                 "cairo"         : "Cairo paint code used with the GTK3 client",
                 "opengl"        : "Client OpenGL rendering",
                 "info"          : "About and Session info dialogs",
@@ -352,6 +353,11 @@ class Logger:
     * __call__ is an alias for debug
     * we bypass the logging system unless debugging is enabled for the logger,
         which is much faster than relying on the python logging code
+    * for hot paths, the 'debug_enabled' attribute can be tested before calling,
+        this avoids building the arguments and the method dispatch:
+        if log.debug_enabled:
+            log("expensive %s", value)
+        this attribute is updated whenever debug logging is enabled or disabled
     """
 
     def __init__(self, *categories):
@@ -0,0 +1,192 @@
+# This file is part of Xpra.
+# Copyright (C) 2021 Antoine Martin <antoine@xpra.org>
+# Xpra is released under the terms of the GNU GPL v2, or, at your option, any
+# later version. See the file COPYING for details.
+
+"""
+Content addressed cache of the files received,
+used for resuming interrupted transfers and skipping files we already have.
+
+Files are identified by their sha1 digest,
+and split into blocks which are verified using their own sha1 digest
+before being re-used.
+Interrupted downloads are kept as partial files ("<sha1>.part").
+Each peer has its own cache directory, so that a peer cannot find out
+which files we have received from another one.
+"""
+
+import os
+import re
+import shutil
+import hashlib
+
+from xpra.util import envint
+from xpra.log import Logger
+
+log = Logger("file")
+
+FILE_CACHE_DIR = os.environ.get("XPRA_FILE_CACHE_DIR", "~/.xpra/file-cache")
+#maximum size of the cache in MB, zero disables it:
+FILE_CACHE_SIZE = max(0, envint("XPRA_FILE_CACHE_SIZE", 512))
+FILE_BLOCK_SIZE = max(4096, envint("XPRA_FILE_BLOCK_SIZE", 1024*1024))
+#keep the list of block digests small enough to fit in the 'send-file' packet:
+FILE_MAX_BLOCKS = max(1, envint("XPRA_FILE_MAX_BLOCKS", 64))
+
+SHA1_RE = re.compile("^[0-9a-f]{40}$")
+PARTIAL_EXT = ".part"
+
+
+def get_block_size(filesize : int) -> int:
+    block_size = FILE_BLOCK_SIZE
+    while filesize>block_size*FILE_MAX_BLOCKS:
+        block_size *= 2
+    return block_size
+
+
+def hash_blocks(filename, data, filesize : int, block_size : int):
+    """
+        returns the sha1 hex digest of the whole file,
+        and the list of sha1 hex digests of each block,
+        the data is read from the file if it is None
+    """
+    digest = hashlib.sha1()
+    blocks = []
+    def add_block(block):
+        digest.update(block)
+        blocks.append(hashlib.sha1(block).hexdigest())
+    if data is not None:
+        view = memoryview(data).cast("B")
+        for pos in range(0, filesize, block_size):
+            add_block(view[pos:pos+block_size])
+    else:
+        with open(filename, "rb") as f:
+            for _ in range(0, filesize, block_size):
+                add_block(f.read(block_size))
+    return digest.hexdigest(), blocks
+
+
+def copy_verified_blocks(filename, fd, block_size : int, hashes, digest) -> int:
+    """
+        copies the blocks from 'filename' to the file descriptor,
+        as long as they match the expected 'hashes',
+        and updates 'digest' with the data copied.
+        Returns the number of bytes copied.
+    """
+    copied = 0
+    with open(filename, "rb") as f:
+        for expected in hashes:
+            block = f.read(block_size)
+            if not block or hashlib.sha1(block).hexdigest()!=expected:
+                break
+            os.write(fd, block)
+            digest.update(block)
+            copied += len(block)
+    return copied
+
+
+class FileCache:
+
+    def __init__(self, dirname=FILE_CACHE_DIR, max_size=FILE_CACHE_SIZE*1024*1024):
+        self.dirname = os.path.expanduser(dirname)
+        self.max_size = max_size
+        self.hits = 0
+        self.resumed = 0
+        self.misses = 0
+
+    def __repr__(self):
+        return "FileCache(%s)" % self.dirname
+
+    def get_info(self) -> dict:
+        return {
+            "directory" : self.dirname,
+            "max-size"  : self.max_size,
+            "hits"      : self.hits,
+            "resumed"   : self.resumed,
+            "misses"    : self.misses,
+            }
+
+    def path(self, sha1 : str, partial=False):
+        #never trust the remote end with our filenames:
+        if not self.max_size or not SHA1_RE.match(sha1 or ""):
+            return None
+        return os.path.join(self.dirname, sha1+(PARTIAL_EXT if partial else ""))
+
+    def find(self, sha1 : str):
+        """ returns the path to the complete file, or to the partial one """
+        for partial in (False, True):
+            path = self.path(sha1, partial)
+            if path and os.path.exists(path):
+                #so prune() will keep it:
+                os.utime(path)
+                return path
+        return None
+
+    def add(self, sha1 : str, filename, partial=False):
+        """
+            Adds a complete file to the cache (as a link or a copy),
+            or moves a partial download to the cache.
+        """
+        path = self.path(sha1, partial)
+        if not path:
+            return False
+        try:
+            os.makedirs(self.dirname, mode=0o700, exist_ok=True)
+            tmp = path+".tmp"
+            if partial:
+                shutil.move(filename, tmp)
+            else:
+                try:
+                    os.link(filename, tmp)
+                except OSError:
+                    shutil.copyfile(filename, tmp)
+            os.replace(tmp, path)
+        except OSError as e:
+            log("FileCache.add%s", (sha1, filename, partial), exc_info=True)
+            log.warn("Warning: failed to add '%s' to the file cache", filename)
+            log.warn(" %s", e)
+            return False
+        if not partial:
+            self.remove(sha1, True)
+        log("added %s to %s", filename, path)
+        self.prune()
+        return True
+
+    def remove(self, sha1 : str, partial=False):
+        path = self.path(sha1, partial)
+        if path and os.path.exists(path):
+            try:
+                os.unlink(path)
+            except OSError as e:
+                log("os.unlink(%s) %s", path, e)
+
+    def prune(self):
+        #remove the least recently used files until we fit in max-size:
+        try:
+            entries = []
+            for name in os.listdir(self.dirname):
+                path = os.path.join(self.dirname, name)
+                stat = os.stat(path)
+                entries.append((stat.st_atime, stat.st_size, path))
+        except OSError:
+            log("prune()", exc_info=True)
+            return
+        total = sum(entry[1] for entry in entries)
+        for _, size, path in sorted(entries):
+            if total<=self.max_size:
+                break
+            log("pruning %s", path)
+            try:
+                os.unlink(path)
+                total -= size
+            except OSError as e:
+                log("os.unlink(%s) %s", path, e)
+
+
+_file_caches = {}
+def get_file_cache(peer_id : str) -> FileCache:
+    """ returns the cache for this peer, which is identified by its uuid """
+    namespace = hashlib.sha1(peer_id.encode("utf8")).hexdigest()
+    cache = _file_caches.get(namespace)
+    if cache is None:
+        cache = _file_caches[namespace] = FileCache(os.path.join(FILE_CACHE_DIR, namespace))
+    return cache
@@ -10,10 +10,12 @@ import hashlib
 import uuid
 
 from xpra.child_reaper import getChildReaper
-from xpra.os_util import monotonic_time, bytestostr, strtobytes, umask_context, POSIX, WIN32
+from xpra.os_util import monotonic_time, bytestostr, strtobytes, umask_context, load_binary_file, POSIX, WIN32
 from xpra.util import typedict, csv, envint, envbool, engs
 from xpra.scripts.config import parse_bool, parse_with_unit
 from xpra.simple_stats import std_unit
+from xpra.net.common import MAX_PACKET_SIZE
+from xpra.net.file_cache import get_file_cache, get_block_size, hash_blocks, copy_verified_blocks, FILE_CACHE_SIZE
 from xpra.make_thread import start_thread
 from xpra.log import Logger
 
@@ -22,6 +24,20 @@ filelog = Logger("file")
 
 DELETE_PRINTER_FILE = envbool("XPRA_DELETE_PRINTER_FILE", True)
 FILE_CHUNKS_SIZE = max(0, envint("XPRA_FILE_CHUNKS_SIZE", 65536))
+#maximum number of chunks sent without waiting for their acknowledgement:
+FILE_CHUNKS_WINDOW = max(1, envint("XPRA_FILE_CHUNKS_WINDOW", 8))
+#when the remote end supports windowed transfers,
+#the chunk size is adjusted to the measured bandwidth, up to this size:
+FILE_CHUNKS_MAX_SIZE = max(FILE_CHUNKS_SIZE, min(MAX_PACKET_SIZE//4, envint("XPRA_FILE_CHUNKS_MAX_SIZE", 1024*1024)))
+#how long it should take to send one chunk (in milliseconds):
+FILE_CHUNKS_TARGET_TIME = max(1, envint("XPRA_FILE_CHUNKS_TARGET_TIME", 50))
+#maximum transfer rate for all the file chunks, in bytes per second (zero for unlimited):
+FILE_TRANSFER_RATE_LIMIT = max(0, envint("XPRA_FILE_TRANSFER_RATE_LIMIT", 0))
+#how long to pause the file transfers for when the network is congested (in milliseconds):
+FILE_CONGESTION_DELAY = max(0, envint("XPRA_FILE_CONGESTION_DELAY", 1000))
+#resume interrupted transfers and skip the data we already have,
+#this keeps a copy of the files received (except print jobs) in the file cache:
+FILE_RESUME = envbool("XPRA_FILE_RESUME", False) and FILE_CACHE_SIZE>0
 MAX_CONCURRENT_FILES = max(1, envint("XPRA_MAX_CONCURRENT_FILES", 10))
 PRINT_JOB_TIMEOUT = max(60, envint("XPRA_PRINT_JOB_TIMEOUT", 3600))
 SEND_REQUEST_TIMEOUT = max(300, envint("XPRA_SEND_REQUEST_TIMEOUT", 3600))
@@ -104,6 +120,124 @@ def utf8_decode(url):
         return bytestostr(url)
 
 
+class ChunkSender:
+    """
+        The state of a chunked file transfer we are sending.
+        The file data is read lazily, one chunk at a time,
+        either from the in-memory buffer or from the file on disk,
+        and the sha1 digest is updated as we go.
+        Up to 'window' chunks can be in flight,
+        the chunk size is adjusted so that each chunk takes roughly FILE_CHUNKS_TARGET_TIME to send.
+    """
+
+    def __init__(self, chunk_id, filename, data, filesize : int,
+                 chunk_size : int, max_chunk_size : int, window : int, send_id=""):
+        self.chunk_id = chunk_id
+        self.filename = filename
+        self.data = memoryview(data).cast("B") if data is not None else None
+        self.file = None
+        self.filesize = filesize
+        self.send_id = send_id
+        self.start = monotonic_time()
+        self.digest = hashlib.sha1()
+        #the digest of the whole file, if it was calculated upfront:
+        self.sha1 = None
+        self.min_chunk_size = chunk_size
+        self.max_chunk_size = max(chunk_size, max_chunk_size)
+        self.chunk_size = chunk_size
+        self.window = max(1, window)
+        self.position = 0           #bytes read
+        self.chunk = 0              #last chunk sent
+        self.acked = 0              #last chunk acknowledged
+        self.acked_bytes = 0
+        self.skipped = 0            #bytes the remote end already had
+        self.in_flight = {}         #chunk no -> size
+        self.timer = 0
+        self.first_send = 0
+        self.last_send = 0
+        self.started = False        #the remote end has accepted the transfer
+        self.rate = 0               #bytes per second
+
+    def __repr__(self):
+        return "ChunkSender(%s)" % self.chunk_id
+
+    def get_info(self) -> dict:
+        return {
+            "filename"  : s(self.filename),
+            "size"      : self.filesize,
+            "position"  : self.position,
+            "acked"     : self.acked_bytes,
+            "skipped"   : self.skipped,
+            "chunk"     : self.chunk,
+            "chunk-size": self.chunk_size,
+            "window"    : self.window,
+            "in-flight" : len(self.in_flight),
+            "rate"      : int(self.rate),
+            }
+
+    def has_more(self) -> bool:
+        return self.position<self.filesize
+
+    def can_send(self) -> bool:
+        return self.started and self.has_more() and len(self.in_flight)<self.window
+
+    def is_complete(self) -> bool:
+        return not self.has_more() and not self.in_flight
+
+    def skip(self, offset : int):
+        #the remote end already has the data up to 'offset'
+        self.skipped = offset
+        self.position = offset
+        if self.data is None and self.has_more():
+            self.file = open(self.filename, "rb")
+            self.file.seek(offset)
+        if not self.has_more():
+            self.close()
+
+    def read_chunk(self):
+        size = min(self.chunk_size, self.filesize-self.position)
+        if self.data is not None:
+            #slicing a memoryview does not copy the data:
+            data = self.data[self.position:self.position+size].tobytes()
+        else:
+            if not self.file:
+                self.file = open(self.filename, "rb")
+            data = self.file.read(size)
+            if len(data)!=size:
+                raise Exception("expected %i bytes from '%s' but got %i" % (size, s(self.filename), len(data)))
+        if not self.sha1:
+            self.digest.update(data)
+        self.position += size
+        self.chunk += 1
+        self.in_flight[self.chunk] = size
+        self.last_send = monotonic_time()
+        if not self.first_send:
+            self.first_send = self.last_send
+        if not self.has_more():
+            self.close()
+        return data
+
+    def ack(self, chunk : int) -> bool:
+        #acknowledgements arrive in order:
+        if chunk!=self.acked+1 or chunk not in self.in_flight:
+            return False
+        self.acked = chunk
+        self.acked_bytes += self.in_flight.pop(chunk)
+        elapsed = monotonic_time()-self.first_send
+        if elapsed>0:
+            self.rate = self.acked_bytes/elapsed
+            size = int(self.rate*FILE_CHUNKS_TARGET_TIME/1000) & ~0xfff
+            self.chunk_size = max(self.min_chunk_size, min(self.max_chunk_size, size))
+        return True
+
+    def close(self):
+        f = self.file
+        if f:
+            self.file = None
+            f.close()
+        self.data = None
+
+
 class FileTransferAttributes:
 
     def __init__(self):
@@ -127,6 +261,8 @@ class FileTransferAttributes:
         self.file_transfer = fta or pbool("file-transfer", file_transfer)
         self.file_size_limit = parse_with_unit("file-size-limit", file_size_limit, "B", min_value=0)
         self.file_chunks = FILE_CHUNKS_SIZE
+        self.file_chunks_window = FILE_CHUNKS_WINDOW
+        self.file_resume = FILE_RESUME
         pa = pask(printing)
         self.printing_ask = pa and can_ask
         self.printing = pa or pbool("printing", printing)
@@ -152,6 +288,8 @@ class FileTransferAttributes:
                 "file-size-limit"   : self.file_size_limit//1024//1024,     #legacy name (use max-file-size)
                 "max-file-size"     : self.file_size_limit,
                 "file-chunks"       : self.file_chunks,
+                "file-chunks-window": self.file_chunks_window,
+                "file-resume"       : self.file_resume,
                 "open-files"        : self.open_files,
                 "open-files-ask"    : self.open_files_ask,
                 "printing"          : self.printing,
@@ -169,6 +307,8 @@ class FileTransferAttributes:
                 "ask"               : self.file_transfer_ask,
                 "size-limit"        : self.file_size_limit,
                 "chunks"            : self.file_chunks,
+                "chunks-window"     : self.file_chunks_window,
+                "resume"            : self.file_resume,
                 "open"              : self.open_files,
                 "open-ask"          : self.open_files_ask,
                 "open-url"          : self.open_url,
@@ -198,11 +338,23 @@ class FileTransferHandler(FileTransferAttributes):
         self.remote_file_ask_timeout = SEND_REQUEST_TIMEOUT
         self.remote_file_size_limit = 0
         self.remote_file_chunks = 0
+        self.remote_file_chunks_window = 0
+        self.remote_file_resume = False
+        self.remote_uuid = ""
         self.pending_send_data = {}
         self.pending_send_data_timers = {}
         self.send_chunks_in_progress = {}
         self.receive_chunks_in_progress = {}
         self.file_descriptors = set()
+        #scheduling of the chunks from all the transfers we are sending:
+        self.file_chunk_timer = 0
+        self.file_transfer_rate_limit = FILE_TRANSFER_RATE_LIMIT
+        self.file_transfer_rate_factor = 1
+        self.file_transfer_budget = 0
+        self.file_transfer_budget_time = 0
+        self.file_transfer_backoff = 0
+        self.file_transfer_congestion_time = 0
+        self.file_transfer_congestion_events = 0
         if not getattr(self, "timeout_add", None):
             from gi.repository import GLib
             self.timeout_add = GLib.timeout_add
@@ -213,9 +365,18 @@ class FileTransferHandler(FileTransferAttributes):
         for t in self.pending_send_data_timers.values():
             self.source_remove(t)
         self.pending_send_data_timers = {}
+        for chunk_id in tuple(self.send_chunks_in_progress.keys()):
+            self.cancel_sending(chunk_id)
+        fct = self.file_chunk_timer
+        if fct:
+            self.file_chunk_timer = 0
+            self.source_remove(fct)
         for v in self.receive_chunks_in_progress.values():
             t = v[-2]
-            self.source_remove(t)
+            if t:
+                self.source_remove(t)
+            if not v[-4]:
+                self.save_partial_download(v)
         self.receive_chunks_in_progress = {}
         for x in tuple(self.file_descriptors):
             try:
@@ -237,6 +398,10 @@ class FileTransferHandler(FileTransferAttributes):
         self.remote_file_ask_timeout = c.intget("file-ask-timeout")
         self.remote_file_size_limit = c.intget("max-file-size") or c.intget("file-size-limit")*1024*1024
         self.remote_file_chunks = max(0, min(self.remote_file_size_limit, c.intget("file-chunks")))
+        #older versions can only handle one chunk at a time:
+        self.remote_file_chunks_window = max(0, c.intget("file-chunks-window"))
+        self.remote_file_resume = c.boolget("file-resume")
+        self.remote_uuid = c.strget("uuid")
         self.dump_remote_caps()
 
     def dump_remote_caps(self):
@@ -256,6 +421,8 @@ class FileTransferHandler(FileTransferAttributes):
             "file-transfer-ask" : self.remote_file_transfer_ask,
             "file-size-limit"   : self.remote_file_size_limit,
             "file-chunks"       : self.remote_file_chunks,
+            "file-chunks-window": self.remote_file_chunks_window,
+            "file-resume"       : self.remote_file_resume,
             "open-files"        : self.remote_open_files,
             "open-files-ask"    : self.remote_open_files_ask,
             "open-url"          : self.remote_open_url,
@@ -264,6 +431,17 @@ class FileTransferHandler(FileTransferAttributes):
             "printing-ask"      : self.remote_printing_ask,
             "file-ask-timeout"  : self.remote_file_ask_timeout,
             }
+        info["sending"] = dict((chunk_id, chunk_sender.get_info())
+                               for chunk_id, chunk_sender in self.send_chunks_in_progress.items())
+        info["scheduler"] = {
+            "rate-limit"        : self.file_transfer_rate_limit,
+            "rate-factor"       : self.file_transfer_rate_factor,
+            "congestion-events" : self.file_transfer_congestion_events,
+            "backoff"           : max(0, int((self.file_transfer_backoff-monotonic_time())*1000)),
+            }
+        cache = self.get_file_cache()
+        if cache:
+            info["cache"] = cache.get_info()
         return info
 
 
@@ -281,9 +459,37 @@ class FileTransferHandler(FileTransferAttributes):
                 #transfer has been cancelled
                 return
             chunk_state[-2] = 0     #this timer has been used
-            if chunk_state[-1]==0:
+            if chunk_state[-1]==chunk_no:
                 filelog.error("Error: chunked file transfer '%s' timed out", chunk_id)
                 self.receive_chunks_in_progress.pop(chunk_id, None)
+                self.save_partial_download(chunk_state)
+
+    def get_file_cache(self):
+        """ the file cache for the files received from this peer, if enabled """
+        if not self.file_resume or not self.remote_uuid:
+            return None
+        return get_file_cache(self.remote_uuid)
+
+    def save_partial_download(self, chunk_state):
+        """
+            The transfer has been interrupted,
+            keep the data we have received so far if the transfer can be resumed later.
+        """
+        fd, filename = chunk_state[1:3]
+        options = chunk_state[7]
+        self.file_descriptors.discard(fd)
+        osclose(fd)
+        sha1 = options.strget("sha1")
+        printit = chunk_state[4]
+        cache = self.get_file_cache()
+        if cache and not printit and chunk_state[9]>0 and sha1 and options.strtupleget("block-hashes"):
+            if cache.add(sha1, filename, True):
+                filelog.info("partial download of '%s' saved, %sB", os.path.basename(filename), std_unit(chunk_state[9]))
+                return
+        try:
+            os.unlink(filename)
+        except OSError:
+            filelog("os.unlink(%s)", filename, exc_info=True)
 
     def cancel_download(self, send_id, message="Cancelled"):
         filelog("cancel_download(%s, %s)", send_id, message)
@@ -323,6 +529,8 @@ class FileTransferHandler(FileTransferAttributes):
     def _process_send_file_chunk(self, packet):
         chunk_id, chunk, file_data, has_more = packet[1:5]
         chunk_id = bytestostr(chunk_id)
+        #newer versions send the digest with the last chunk:
+        chunk_options = typedict(packet[5] if len(packet)>=6 else {})
         filelog("_process_send_file_chunk%s", (chunk_id, chunk, "%i bytes" % len(file_data), has_more))
         chunk_state = self.receive_chunks_in_progress.get(chunk_id)
         if not chunk_state:
@@ -333,10 +541,7 @@ class FileTransferHandler(FileTransferAttributes):
             filelog("got chunk for a cancelled file transfer, ignoring it")
             return
         def progress(position, error=None):
-            start = chunk_state[0]
-            send_id = chunk_state[-3]
-            filesize = chunk_state[6]
-            self.transfer_progress_update(False, send_id, monotonic_time()-start, position, filesize, error)
+            self.receive_progress(chunk_state, position, error)
         fd = chunk_state[1]
         if chunk_state[-1]+1!=chunk:
             filelog.error("Error: chunk number mismatch, expected %i but got %i", chunk_state[-1]+1, chunk)
@@ -370,27 +575,88 @@ class FileTransferHandler(FileTransferAttributes):
             timer = self.timeout_add(CHUNK_TIMEOUT, self._check_chunk_receiving, chunk_id, chunk)
             chunk_state[-2] = timer
             return
+        self.chunked_file_complete(chunk_id, chunk_state, chunk_options.strget("sha1"))
+
+    def receive_progress(self, chunk_state, position, error=None):
+        start = chunk_state[0]
+        send_id = chunk_state[-3]
+        filesize = chunk_state[6]
+        self.transfer_progress_update(False, send_id, monotonic_time()-start, position, filesize, error)
+
+    def chunked_file_complete(self, chunk_id, chunk_state, expected_digest=None):
         self.receive_chunks_in_progress.pop(chunk_id, None)
+        timer = chunk_state[-2]
+        if timer:
+            chunk_state[-2] = 0
+            self.source_remove(timer)
+        fd = chunk_state[1]
+        self.file_descriptors.discard(fd)
         osclose(fd)
         #check file size and digest then process it:
-        filename, mimetype, printit, openit, filesize, options = chunk_state[2:8]
+        filename, mimetype, printit, openit, filesize, options, digest, written = chunk_state[2:10]
         if written!=filesize:
             filelog.error("Error: expected a file of %i bytes, got %i", filesize, written)
-            progress(-1, "file size mismatch")
+            self.receive_progress(chunk_state, -1, "file size mismatch")
             return
-        expected_digest = options.strget("sha1")
+        expected_digest = expected_digest or options.strget("sha1")
         if expected_digest and digest.hexdigest()!=expected_digest:
-            progress(-1, "checksum mismatch")
+            self.receive_progress(chunk_state, -1, "checksum mismatch")
             self.digest_mismatch(filename, digest, expected_digest, "sha1")
             return
 
-        progress(written)
+        self.receive_progress(chunk_state, written)
         start_time = chunk_state[0]
         elapsed = monotonic_time()-start_time
         mimetype = bytestostr(mimetype)
-        filelog("%i bytes received in %i chunks, took %ims", filesize, chunk, elapsed*1000)
+        filelog("%i bytes received in %i chunks, took %ims", filesize, chunk_state[-1], elapsed*1000)
+        cache = self.get_file_cache()
+        #print jobs are deleted once printed, don't keep a copy:
+        if cache and not printit and expected_digest and options.strtupleget("block-hashes"):
+            cache.add(expected_digest, filename)
         self.process_downloaded_file(filename, mimetype, printit, openit, filesize, options)
 
+    def resume_download(self, chunk_state) -> int:
+        """
+            Copies the blocks we already have for this file,
+            from a previous download or from an interrupted one.
+            Returns the number of bytes we don't need the remote end to send.
+        """
+        options = chunk_state[7]
+        hashes = options.strtupleget("block-hashes")
+        block_size = options.intget("block-size")
+        sha1 = options.strget("sha1")
+        printit = chunk_state[4]
+        cache = self.get_file_cache()
+        if not cache or printit or not hashes or block_size<=0 or not sha1:
+            return 0
+        path = cache.find(sha1)
+        filelog("resume_download: cache entry for %s: %s", sha1, path)
+        if not path:
+            cache.misses += 1
+            return 0
+        fd, filename = chunk_state[1:3]
+        filesize = chunk_state[6]
+        try:
+            copied = copy_verified_blocks(path, fd, block_size, hashes, chunk_state[8])
+        except OSError as e:
+            filelog("copy_verified_blocks%s", (path, fd, block_size, hashes), exc_info=True)
+            filelog.warn("Warning: failed to re-use the cached data for '%s'", os.path.basename(filename))
+            filelog.warn(" %s", e)
+            #start again from scratch:
+            os.lseek(fd, 0, os.SEEK_SET)
+            os.ftruncate(fd, 0)
+            chunk_state[8] = hashlib.sha1()
+            copied = 0
+        chunk_state[9] = copied
+        if copied==filesize:
+            cache.hits += 1
+        elif copied:
+            cache.resumed += 1
+        else:
+            cache.misses += 1
+        filelog("resume_download: %i bytes of %i found in %s", copied, filesize, path)
+        return copied
+
     def accept_data(self, send_id, dtype, basefilename, printit, openit):
         #subclasses should check the flags,
         #and if ask is True, verify they have accepted this specific send_id
@@ -482,7 +748,11 @@ class FileTransferHandler(FileTransferAttributes):
                 timer, chunk,
                 ]
             self.receive_chunks_in_progress[chunk_id] = chunk_state
-            self.send("ack-file-chunk", chunk_id, True, "", chunk)
+            resume = self.resume_download(chunk_state)
+            self.send("ack-file-chunk", chunk_id, True, "", chunk, {"resume" : resume} if resume else {})
+            if resume==filesize:
+                #we already had the whole file:
+                self.chunked_file_complete(chunk_id, chunk_state)
             return
         #not chunked, full file:
         assert file_data, "no data, got %s" % (file_data,)
@@ -722,8 +992,11 @@ class FileTransferHandler(FileTransferAttributes):
                 else:
                     ask |= self.remote_open_files_ask
                     action = "open"
-        assert len(data)>=filesize, "data is smaller then the given file size!"
-        data = data[:filesize]          #gio may null terminate it
+        if data is not None:
+            #(otherwise the data will be read from the file as we send it)
+            assert len(data)>=filesize, "data is smaller then the given file size!"
+            if len(data)>filesize:
+                data = data[:filesize]      #gio may null terminate it
         l("send_file%s action=%s, ask=%s",
           (filename, mimetype, type(data), "%i bytes" % filesize, printit, openit, options), action, ask)
         try:
@@ -874,12 +1147,7 @@ class FileTransferHandler(FileTransferAttributes):
         l("do_send_file%s", (s(filename), mimetype, type(data), "%i bytes" % filesize, printit, openit, options))
         if not self.check_file_size(action, filename, filesize):
             return False
-        u = hashlib.sha1()
-        u.update(data)
-        absfile = os.path.abspath(filename)
-        filelog("sha1 digest('%s')=%s", s(absfile), u.hexdigest())
         options = options or {}
-        options["sha1"] = u.hexdigest()
         chunk_size = min(self.file_chunks, self.remote_file_chunks)
         if 0<chunk_size<filesize:
             if len(self.send_chunks_in_progress)>=MAX_CONCURRENT_FILES:
@@ -887,15 +1155,45 @@ class FileTransferHandler(FileTransferAttributes):
             #chunking is supported and the file is big enough
             chunk_id = uuid.uuid4().hex
             options["file-chunk-id"] = chunk_id
+            window = min(self.file_chunks_window, self.remote_file_chunks_window)
+            if window>0:
+                #the digest will be sent with the last chunk:
+                max_chunk_size = FILE_CHUNKS_MAX_SIZE
+                if self.remote_file_resume:
+                    #announce the block digests so the remote end can resume or skip the transfer:
+                    block_size = get_block_size(filesize)
+                    try:
+                        sha1, block_hashes = hash_blocks(filename, data, filesize, block_size)
+                    except OSError as e:
+                        filelog("hash_blocks%s", (filename, type(data), filesize, block_size), exc_info=True)
+                        l.error("Error: failed to read '%s'", s(filename))
+                        l.error(" %s", e)
+                        return False
+                    options.update({
+                        "sha1"          : sha1,
+                        "block-size"    : block_size,
+                        "block-hashes"  : block_hashes,
+                        })
+            else:
+                #the remote end expects the digest upfront and fixed size chunks:
+                options["sha1"] = self.file_digest(filename, data)
+                max_chunk_size = chunk_size
+            chunk_sender = ChunkSender(chunk_id, filename, data, filesize, chunk_size, max_chunk_size, window, send_id)
+            chunk_sender.sha1 = options.get("sha1")
             #timer to check that the other end is requesting more chunks:
-            timer = self.timeout_add(CHUNK_TIMEOUT, self._check_chunk_sending, chunk_id, 0)
-            chunk_state = [monotonic_time(), data, chunk_size, timer, 0]
-            self.send_chunks_in_progress[chunk_id] = chunk_state
+            chunk_sender.timer = self.timeout_add(CHUNK_TIMEOUT, self._check_chunk_sending, chunk_id, 0)
+            self.send_chunks_in_progress[chunk_id] = chunk_sender
             cdata = ""
-            filelog("using chunks, sending initial file-chunk-id=%s, for chunk size=%s",
-                    chunk_id, chunk_size)
+            filelog("using chunks, sending initial file-chunk-id=%s, for chunk size=%s, window=%i",
+                    chunk_id, chunk_size, window)
         else:
             #send everything now:
+            if data is None:
+                data = load_binary_file(filename)
+                if data is None or len(data)!=filesize:
+                    l.error("Error: failed to read %i bytes from '%s'", filesize, s(filename))
+                    return False
+            options["sha1"] = self.file_digest(filename, data)
             cdata = self.compressed_wrapper("file-data", data)
             assert len(cdata)<=filesize     #compressed wrapper ensures this is true
             filelog("sending full file: %i bytes (chunk size=%i)", filesize, chunk_size)
@@ -908,24 +1206,42 @@ class FileTransferHandler(FileTransferAttributes):
         self.send("send-file", base, mimetype, printit, openit, filesize, cdata, options, send_id)
         return True
 
+    def file_digest(self, filename, data=None):
+        u = hashlib.sha1()
+        if data is not None:
+            u.update(data)
+        else:
+            with open(filename, "rb") as f:
+                while True:
+                    buf = f.read(FILE_CHUNKS_MAX_SIZE)
+                    if not buf:
+                        break
+                    u.update(buf)
+        filelog("sha1 digest('%s')=%s", s(os.path.abspath(filename)), u.hexdigest())
+        return u.hexdigest()
+
     def _check_chunk_sending(self, chunk_id, chunk_no):
-        chunk_state = self.send_chunks_in_progress.get(chunk_id)
-        filelog("_check_chunk_sending(%s, %s) chunk_state found: %s", chunk_id, chunk_no, bool(chunk_state))
-        if chunk_state:
-            chunk_state[3] = 0         #timer has fired
-            if chunk_state[-1]==chunk_no:
+        chunk_sender = self.send_chunks_in_progress.get(chunk_id)
+        filelog("_check_chunk_sending(%s, %s) chunk_state found: %s", chunk_id, chunk_no, bool(chunk_sender))
+        if chunk_sender:
+            chunk_sender.timer = 0         #timer has fired
+            if not chunk_sender.in_flight and chunk_sender.chunk>0:
+                #the scheduler is holding back this transfer, not the remote end:
+                chunk_sender.timer = self.timeout_add(CHUNK_TIMEOUT, self._check_chunk_sending, chunk_id, chunk_no)
+            elif chunk_sender.acked==chunk_no:
                 filelog.error("Error: chunked file transfer '%s' timed out", chunk_id)
                 filelog.error(" on chunk %i", chunk_no)
                 self.cancel_sending(chunk_id)
 
     def cancel_sending(self, chunk_id):
-        chunk_state = self.send_chunks_in_progress.pop(chunk_id, None)
-        filelog("cancel_sending(%s) chunk state found: %s", chunk_id, bool(chunk_state))
-        if chunk_state:
-            timer = chunk_state[3]
+        chunk_sender = self.send_chunks_in_progress.pop(chunk_id, None)
+        filelog("cancel_sending(%s) chunk state found: %s", chunk_id, bool(chunk_sender))
+        if chunk_sender:
+            timer = chunk_sender.timer
             if timer:
-                chunk_state[3] = 0
+                chunk_sender.timer = 0
                 self.source_remove(timer)
+            chunk_sender.close()
 
     def _process_ack_file_chunk(self, packet):
         #the other end received our send-file or send-file-chunk,
@@ -938,32 +1254,130 @@ class FileTransferHandler(FileTransferAttributes):
             filelog.info(" %s", bytestostr(error_message))
             self.cancel_sending(chunk_id)
             return
-        chunk_state = self.send_chunks_in_progress.get(chunk_id)
-        if not chunk_state:
+        chunk_sender = self.send_chunks_in_progress.get(chunk_id)
+        if not chunk_sender:
             filelog.error("Error: cannot find the file transfer id '%r'", chunk_id)
             return
-        if chunk_state[-1]!=chunk:
-            filelog.error("Error: chunk number mismatch (%i vs %i)", chunk_state, chunk)
-            self.cancel_sending(chunk_id)
-            return
-        start_time, data, chunk_size, timer, chunk = chunk_state
-        if not data:
+        #chunk 0 acknowledges the initial 'send-file' packet:
+        if chunk==0 and chunk_sender.chunk==0:
+            chunk_sender.started = True
+            ack_options = typedict(packet[5] if len(packet)>=6 else {})
+            resume = ack_options.intget("resume")
+            if resume and chunk_sender.sha1 and 0<resume<=chunk_sender.filesize:
+                filelog("resuming transfer at %i", resume)
+                try:
+                    chunk_sender.skip(resume)
+                except OSError as e:
+                    filelog("skip(%i)", resume, exc_info=True)
+                    filelog.error("Error reading file data for '%s':", s(chunk_sender.filename))
+                    filelog.error(" %s", e)
+                    self.cancel_sending(chunk_id)
+                    return
+        else:
+            if not chunk_sender.ack(chunk):
+                filelog.error("Error: chunk number mismatch (%i vs %i)", chunk_sender.acked+1, chunk)
+                self.cancel_sending(chunk_id)
+                return
+            self.transfer_progress_update(True, chunk_sender.send_id, monotonic_time()-chunk_sender.start,
+                                          chunk_sender.skipped+chunk_sender.acked_bytes, chunk_sender.filesize, None)
+        if chunk_sender.is_complete():
             #all sent!
-            elapsed = monotonic_time()-start_time
-            filelog("%i chunks of %i bytes sent in %ims (%sB/s)",
-                    chunk, chunk_size, elapsed*1000, std_unit(chunk*chunk_size/elapsed))
+            elapsed = monotonic_time()-chunk_sender.start
+            filelog("%i chunks, %i bytes sent in %ims (%sB/s)",
+                    chunk_sender.chunk, chunk_sender.filesize, elapsed*1000,
+                    std_unit(chunk_sender.filesize/max(0.001, elapsed)))
             self.cancel_sending(chunk_id)
             return
-        assert chunk_size>0
-        #carve out another chunk:
-        cdata = self.compressed_wrapper("file-data", data[:chunk_size])
-        data = data[chunk_size:]
-        chunk += 1
+        timer = chunk_sender.timer
         if timer:
             self.source_remove(timer)
-        timer = self.timeout_add(CHUNK_TIMEOUT, self._check_chunk_sending, chunk_id, chunk)
-        self.send_chunks_in_progress[chunk_id] = [start_time, data, chunk_size, timer, chunk]
-        self.send("send-file-chunk", chunk_id, chunk, cdata, bool(data))
+        chunk_sender.timer = self.timeout_add(CHUNK_TIMEOUT, self._check_chunk_sending, chunk_id, chunk_sender.acked)
+        self.schedule_file_chunks()
+
+    def schedule_file_chunks(self):
+        """
+            Sends the next chunks of all the transfers in progress,
+            one chunk from each transfer in turn,
+            until the windows are full or the rate limit is reached.
+        """
+        if self.file_chunk_timer:
+            #we'll be called again when the timer fires
+            return
+        while True:
+            senders = [cs for cs in self.send_chunks_in_progress.values() if cs.can_send()]
+            if not senders:
+                return
+            delay = self.get_file_transfer_delay()
+            if delay>0:
+                filelog("schedule_file_chunks() delaying %i transfers by %ims", len(senders), delay)
+                self.file_chunk_timer = self.timeout_add(delay, self.file_chunk_timer_fired)
+                return
+            #the transfer which has been waiting the longest goes first:
+            chunk_sender = min(senders, key=lambda cs : cs.last_send)
+            self.send_next_file_chunk(chunk_sender)
+
+    def file_chunk_timer_fired(self):
+        self.file_chunk_timer = 0
+        self.schedule_file_chunks()
+        return False
+
+    def get_file_transfer_delay(self) -> int:
+        """ how long to wait before sending the next chunk, in milliseconds """
+        now = monotonic_time()
+        if now<self.file_transfer_backoff:
+            return max(1, int((self.file_transfer_backoff-now)*1000))
+        factor = self.file_transfer_rate_factor
+        if factor<1 and now-self.file_transfer_congestion_time>FILE_CONGESTION_DELAY*2/1000:
+            #no congestion for a while, increase the rate again:
+            self.file_transfer_rate_factor = min(1, factor*2)
+            self.file_transfer_congestion_time = now
+        rate = self.file_transfer_rate_limit*self.file_transfer_rate_factor
+        if rate<=0:
+            return 0
+        #refill the budget, allowing bursts of up to 250ms:
+        elapsed = now-(self.file_transfer_budget_time or now)
+        self.file_transfer_budget = min(rate/4, self.file_transfer_budget+elapsed*rate)
+        self.file_transfer_budget_time = now
+        if self.file_transfer_budget>=0:
+            return 0
+        return max(1, int(-self.file_transfer_budget*1000/rate))
+
+    def set_file_transfer_rate_limit(self, rate : int):
+        filelog("set_file_transfer_rate_limit(%i)", rate)
+        self.file_transfer_rate_limit = rate
+
+    def file_transfer_congestion(self):
+        """ the network is congested, back off """
+        now = monotonic_time()
+        self.file_transfer_congestion_events += 1
+        self.file_transfer_congestion_time = now
+        self.file_transfer_rate_factor = max(1/8, self.file_transfer_rate_factor/2)
+        if self.send_chunks_in_progress:
+            filelog("file_transfer_congestion() pausing file transfers for %ims", FILE_CONGESTION_DELAY)
+            self.file_transfer_backoff = now+FILE_CONGESTION_DELAY/1000
+
+    def send_next_file_chunk(self, chunk_sender):
+        chunk_id = chunk_sender.chunk_id
+        try:
+            data = chunk_sender.read_chunk()
+        except Exception as e:
+            filelog("read_chunk()", exc_info=True)
+            filelog.error("Error reading file data for '%s':", s(chunk_sender.filename))
+            filelog.error(" %s", e)
+            self.cancel_sending(chunk_id)
+            return
+        if self.file_transfer_rate_limit>0:
+            self.file_transfer_budget -= len(data)
+        cdata = self.compressed_wrapper("file-data", data)
+        has_more = chunk_sender.has_more()
+        chunk_options = {}
+        if not has_more and self.remote_file_chunks_window>0:
+            chunk_options["sha1"] = chunk_sender.sha1 or chunk_sender.digest.hexdigest()
+        self.send_file_chunk("send-file-chunk", chunk_id, chunk_sender.chunk, cdata, has_more, chunk_options)
+
+    def send_file_chunk(self, *parts):
+        #subclasses may send the file data with a lower priority:
+        self.send(*parts)
 
     def send(self, *parts):
         raise NotImplementedError()
@@ -0,0 +1,233 @@
+# This file is part of Xpra.
+# Copyright (C) 2021 Antoine Martin <antoine@xpra.org>
+# Xpra is released under the terms of the GNU GPL v2, or, at your option, any
+# later version. See the file COPYING for details.
+
+"""
+In-memory cache of the static files served by the builtin HTTP server.
+
+Each entry holds the raw file contents and its compressed variants,
+either loaded from the pre-compressed files found next to it ("file.br", "file.gzip")
+or compressed once when the file is first requested.
+Entries are validated against the modification time and size of the files
+and the least recently used ones are evicted when the cache grows too big.
+"""
+
+import os
+import zlib
+import hashlib
+from threading import Lock
+from collections import OrderedDict
+
+from xpra.util import envint
+from xpra.log import Logger
+
+log = Logger("http")
+
+#maximum size of the cache in MB, zero disables it:
+HTTP_CACHE_SIZE = max(0, envint("XPRA_HTTP_CACHE_SIZE", 64))
+#files bigger than this (in MB) are not cached:
+HTTP_CACHE_MAX_FILE_SIZE = max(1, envint("XPRA_HTTP_CACHE_MAX_FILE_SIZE", 16))
+#don't bother compressing small files or files that are already compressed:
+MIN_COMPRESS_SIZE = 128
+NO_COMPRESS_EXTENSIONS = (".png", ".jpg", ".jpeg", ".gif", ".webp", ".ico", ".woff", ".woff2", ".br", ".gz")
+
+PRECOMPRESSED_EXTENSIONS = {
+    "br"    : ("br", ),
+    "gzip"  : ("gzip", "gz"),
+    }
+
+
+def gzip_compress(data : bytes) -> bytes:
+    compressor = zlib.compressobj(9, zlib.DEFLATED, zlib.MAX_WBITS | 16)
+    return compressor.compress(data) + compressor.flush()
+
+def brotli_compress(data : bytes) -> bytes:
+    try:
+        import brotli
+    except ImportError:
+        return None
+    #quality 11 is too slow for big files:
+    quality = 11 if len(data)<1024*1024 else 9
+    return brotli.compress(data, quality=quality)
+
+COMPRESSORS = {
+    "br"    : brotli_compress,
+    "gzip"  : gzip_compress,
+    }
+
+
+def get_stamp(path):
+    """ used for detecting changes to a file (None if the file does not exist) """
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return st.st_mtime_ns, st.st_size
+
+
+def find_precompressed(path, enc):
+    for ext in PRECOMPRESSED_EXTENSIONS.get(enc, ()):
+        compressed_path = "%s.%s" % (path, ext)     #ie: "/path/to/index.html.br"
+        if os.path.isfile(compressed_path) and os.access(compressed_path, os.R_OK):
+            if os.path.getsize(compressed_path)>0:
+                return compressed_path
+            log.warn("Warning: '%s' is empty", compressed_path)
+    return None
+
+
+class CachedFile:
+
+    def __init__(self, path, stamp, mtime : float, variants : dict):
+        self.path = path
+        self.stamp = stamp
+        self.mtime = mtime
+        #maps the content-encoding to the data, "" for the raw file:
+        self.variants = variants
+        self.digest = hashlib.sha1(variants[""]).hexdigest()[:20]
+
+    def __repr__(self):
+        return "CachedFile(%s : %s)" % (self.path, tuple(self.variants.keys()))
+
+    def get_size(self) -> int:
+        return sum(len(v) for v in self.variants.values())
+
+    def get_etag(self, enc="") -> str:
+        #each variant needs its own entity tag:
+        if enc:
+            return '"%s-%s"' % (self.digest, enc)
+        return '"%s"' % self.digest
+
+    def matches(self, if_none_match : str) -> bool:
+        """ does the If-None-Match header value match any of our variants? """
+        etags = set(self.get_etag(enc) for enc in self.variants.keys())
+        for tag in if_none_match.split(","):
+            tag = tag.strip()
+            if tag.startswith("W/"):
+                tag = tag[2:]
+            if tag=="*" or tag in etags:
+                return True
+        return False
+
+    def select(self, accept, encodings):
+        """ returns the encoding and data to send for this accept-encoding """
+        for enc in encodings:
+            if enc in accept and enc in self.variants:
+                return enc, self.variants[enc]
+        return "", self.variants[""]
+
+
+class HTTPFileCache:
+
+    def __init__(self, max_size=HTTP_CACHE_SIZE*1024*1024, max_file_size=HTTP_CACHE_MAX_FILE_SIZE*1024*1024):
+        self.max_size = max_size
+        self.max_file_size = max_file_size
+        self.entries = OrderedDict()
+        self.size = 0
+        self.lock = Lock()
+        #only load one file at a time, so concurrent requests for the same file
+        #wait for it to be cached instead of all compressing it:
+        self.load_lock = Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __repr__(self):
+        return "HTTPFileCache(%iMB)" % (self.max_size//1024//1024)
+
+    def get_info(self) -> dict:
+        with self.lock:
+            return {
+                "max-size"  : self.max_size,
+                "size"      : self.size,
+                "entries"   : len(self.entries),
+                "hits"      : self.hits,
+                "misses"    : self.misses,
+                "evictions" : self.evictions,
+                }
+
+    def get_stamp(self, path, encodings):
+        #the pre-compressed files can be updated separately:
+        return (get_stamp(path), ) + tuple(get_stamp("%s.%s" % (path, ext))
+                                           for enc in encodings
+                                           for ext in PRECOMPRESSED_EXTENSIONS.get(enc, ()))
+
+    def lookup(self, path, stamp):
+        with self.lock:
+            entry = self.entries.get(path)
+            if entry and entry.stamp==stamp:
+                self.entries.move_to_end(path)
+                self.hits += 1
+                return entry
+        return None
+
+    def get(self, path, encodings):
+        """
+            returns the cached file, loading it if needed,
+            or None if the file cannot be cached.
+            Raises OSError if the file cannot be read.
+        """
+        stamp = self.get_stamp(path, encodings)
+        if stamp[0] is None:
+            raise FileNotFoundError("'%s' not found" % path)
+        if stamp[0][1]>self.max_file_size:
+            return None
+        entry = self.lookup(path, stamp)
+        if entry:
+            return entry
+        with self.load_lock:
+            entry = self.lookup(path, stamp)
+            if entry:
+                return entry
+            entry = self.load(path, stamp, encodings)
+            self.add(entry)
+        return entry
+
+    def load(self, path, stamp, encodings) -> CachedFile:
+        with open(path, "rb") as f:
+            content = f.read()
+            mtime = os.fstat(f.fileno()).st_mtime
+        variants = {"" : content}
+        compress = len(content)>MIN_COMPRESS_SIZE and os.path.splitext(path)[1].lower() not in NO_COMPRESS_EXTENSIONS
+        for enc in encodings:
+            compressed_path = find_precompressed(path, enc)
+            if compressed_path:
+                with open(compressed_path, "rb") as f:
+                    variants[enc] = f.read()
+                log("loaded pre-compressed file '%s'", compressed_path)
+                continue
+            compressor = COMPRESSORS.get(enc)
+            if not compress or not compressor:
+                continue
+            compressed = compressor(content)
+            if compressed and len(compressed)<len(content):
+                log("%s compressed '%s': %i down to %i bytes", enc, path, len(content), len(compressed))
+                variants[enc] = compressed
+        self.misses += 1
+        return CachedFile(path, stamp, mtime, variants)
+
+    def add(self, entry : CachedFile):
+        size = entry.get_size()
+        with self.lock:
+            old = self.entries.pop(entry.path, None)
+            if old:
+                self.size -= old.get_size()
+            if size>self.max_size:
+                return
+            self.entries[entry.path] = entry
+            self.size += size
+            #evict the least recently used entries:
+            while self.size>self.max_size:
+                _, evicted = self.entries.popitem(last=False)
+                self.size -= evicted.get_size()
+                self.evictions += 1
+                log("evicted %s", evicted)
+
+
+_http_cache = None
+def get_http_cache():
+    """ returns the cache, or None if it is disabled """
+    global _http_cache
+    if _http_cache is None and HTTP_CACHE_SIZE>0:
+        _http_cache = HTTPFileCache()
+    return _http_cache
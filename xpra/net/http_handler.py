@@ -7,12 +7,15 @@ import os
 import glob
 import posixpath
 import mimetypes
+from datetime import timezone
+from email.utils import parsedate_to_datetime
 from urllib.parse import unquote
 from http.server import BaseHTTPRequestHandler, SimpleHTTPRequestHandler
 
 from xpra.common import DEFAULT_XDG_DATA_DIRS
 from xpra.util import envbool, std, csv, AdHocStruct, repr_ellipsized
 from xpra.platform.paths import get_desktop_background_paths
+from xpra.net.http_cache import get_http_cache
 from xpra.log import Logger
 
 log = Logger("http")
@@ -53,6 +56,8 @@ class HTTPRequestHandler(BaseHTTPRequestHandler):
     * sets cache headers on responses,
     * supports delegation to external script classes,
     * supports pre-compressed brotli and gzip, can gzip on-the-fly,
+    * caches the static files and their compressed variants in memory,
+      and honours the If-None-Match and If-Modified-Since headers,
     (subclassed in WebSocketRequestHandler to add WebSocket support)
     """
 
@@ -247,12 +252,6 @@ class HTTPRequestHandler(BaseHTTPRequestHandler):
         ext = os.path.splitext(path)[1]
         f = None
         try:
-            # Always read in binary mode. Opening files in text mode may cause
-            # newline translations, making the actual size of the content
-            # transmitted *less* than the content-length!
-            f = open(path, 'rb')
-            fs = os.fstat(f.fileno())
-            content_length = fs[6]
             headers = {}
             content_type = EXTENSION_TO_MIMETYPE.get(ext)
             if not content_type:
@@ -266,8 +265,18 @@ class HTTPRequestHandler(BaseHTTPRequestHandler):
                 headers["Content-type"] = content_type
             accept = self.headers.get('accept-encoding', '').split(",")
             accept = tuple(x.split(";")[0].strip() for x in accept)
-            content = None
             log("accept-encoding=%s", csv(accept))
+            cache = get_http_cache()
+            entry = cache.get(path, HTTP_ACCEPT_ENCODING) if cache else None
+            if entry:
+                return self.send_cached(entry, headers, accept)
+            # Always read in binary mode. Opening files in text mode may cause
+            # newline translations, making the actual size of the content
+            # transmitted *less* than the content-length!
+            f = open(path, 'rb')
+            fs = os.fstat(f.fileno())
+            content_length = fs[6]
+            content = None
             for enc in HTTP_ACCEPT_ENCODING:
                 #find a matching pre-compressed file:
                 if enc not in accept:
@@ -341,3 +350,45 @@ class HTTPRequestHandler(BaseHTTPRequestHandler):
                 except OSError:
                     log("failed to close", exc_info=True)
         return content
+
+    def send_cached(self, entry, headers, accept):
+        enc, content = entry.select(accept, HTTP_ACCEPT_ENCODING)
+        cache_headers = {
+            "ETag"          : entry.get_etag(enc),
+            "Last-Modified" : self.date_time_string(entry.mtime),
+            "Vary"          : "Accept-Encoding",
+            }
+        if self.is_not_modified(entry):
+            log("'%s' not modified", entry.path)
+            self.send_response(304)
+            for k,v in cache_headers.items():
+                self.send_header(k, v)
+            self.end_headers()
+            return None
+        if enc:
+            headers["Content-Encoding"] = enc
+        headers["Content-Length"] = len(content)
+        headers.update(cache_headers)
+        self.send_response(200)
+        for k,v in headers.items():
+            self.send_header(k, v)
+        self.end_headers()
+        return content
+
+    def is_not_modified(self, entry) -> bool:
+        if_none_match = self.headers.get("If-None-Match")
+        if if_none_match:
+            #takes precedence over If-Modified-Since:
+            return entry.matches(if_none_match)
+        if_modified_since = self.headers.get("If-Modified-Since")
+        if not if_modified_since:
+            return False
+        try:
+            since = parsedate_to_datetime(if_modified_since)
+        except (TypeError, ValueError, IndexError):
+            log("invalid If-Modified-Since value '%s'", if_modified_since)
+            return False
+        if since.tzinfo is None:
+            since = since.replace(tzinfo=timezone.utc)
+        #http dates only have a one second resolution:
+        return int(entry.mtime)<=since.timestamp()
@@ -55,10 +55,21 @@ def init_bencode():
 
 def init_yaml():
     #json messes with strings and unicode (makes it unusable for us)
-    from yaml import dump, safe_load, __version__
+    #importing yaml is slow and it is rarely used,
+    #so we only load it when it is actually needed:
+    from importlib.util import find_spec
+    if not find_spec("yaml"):
+        raise ImportError("yaml module not found")
     def yaml_dump(v):
+        from yaml import dump
         return dump(v).encode("latin1"), FLAGS_YAML
-    return Encoding("yaml", FLAGS_YAML, __version__, yaml_dump, safe_load)
+    def yaml_load(data):
+        from yaml import safe_load
+        return safe_load(data)
+    def yaml_version():
+        from yaml import __version__
+        return __version__
+    return Encoding("yaml", FLAGS_YAML, yaml_version, yaml_dump, yaml_load)
 
 def init_none():
     def encode(data):
@@ -95,7 +106,10 @@ def get_packet_encoding_caps() -> dict:
         d[""] = e is not None
         if e is None:
             continue
-        d["version"] = e.version
+        version = e.version
+        if callable(version):
+            version = version()
+        d["version"] = version
     return caps
 
 def get_enabled_encoders(order=ALL_ENCODERS):
@@ -116,6 +116,33 @@ def do_verify_packet(tree, packet):
     return r
 
 
+class RawPacket(list):
+    """
+        A packet received with its chunks kept as they were received:
+        the main packet is decoded, but the other chunks are left as-is (not decompressed)
+        and the packet items they belong to are empty placeholders.
+        Another Protocol instance using the same packet encoder and compressor
+        can forward the chunks without re-encoding them, see Protocol.can_forward().
+    """
+    __slots__ = ("chunks", )
+
+    def __init__(self, packet, chunks):
+        super().__init__(packet)
+        #chunks in the same format as the ones returned by Protocol.encode():
+        #(proto_flags, index, compression_level, data)
+        self.chunks = chunks
+
+    def decode(self) -> list:
+        """ returns the regular packet, with all the chunks decompressed and added back in """
+        packet = list(self)
+        for _, index, level, data in self.chunks:
+            if index>0:
+                if level>0:
+                    data = decompress(data, level)
+                packet[index] = data
+        return packet
+
+
 class Protocol:
     """
         This class handles sending and receiving packets,
@@ -164,6 +191,10 @@ class Protocol:
         self.output_stats = {}
         self.output_packetcount = 0
         self.output_raw_packetcount = 0
+        self.input_spliced_packetcount = 0
+        self.output_spliced_packetcount = 0
+        #packet types passed to process_packet_cb as RawPacket instances:
+        self.raw_packet_types = ()
         #initial value which may get increased by client/server after handshake:
         self.max_packet_size = MAX_PACKET_SIZE
         self.abs_max_packet_size = 256*1024*1024
@@ -301,6 +332,7 @@ class Protocol:
                        "hangup-delay"           : self.hangup_delay,
                        "packetcount"            : self.input_packetcount,
                        "raw_packetcount"        : self.input_raw_packetcount,
+                       "spliced_packetcount"    : self.input_spliced_packetcount,
                        "count"                  : self.input_stats,
                        "cipher"                 : {"": self.cipher_in_name or "",
                                                    "padding"        : self.cipher_in_padding,
@@ -313,6 +345,7 @@ class Protocol:
                         "min-compress-size"     : MIN_COMPRESS_SIZE,
                         "packetcount"           : self.output_packetcount,
                         "raw_packetcount"       : self.output_raw_packetcount,
+                        "spliced_packetcount"   : self.output_spliced_packetcount,
                         "count"                 : self.output_stats,
                         "cipher"                : {"": self.cipher_out_name or "",
                                                    "padding" : self.cipher_out_padding
@@ -390,7 +423,13 @@ class Protocol:
             return
         #log("add_packet_to_queue(%s ... %s, %s, %s)", packet[0], synchronous, has_more, wait_for_more)
         packet_type = packet[0]
-        chunks = self.encode(packet)
+        if isinstance(packet, RawPacket):
+            #forward the chunks as they were received:
+            chunks = packet.chunks
+            self.output_stats[packet_type] = self.output_stats.get(packet_type, 0)+1
+            self.output_spliced_packetcount += 1
+        else:
+            chunks = self.encode(packet)
         with self._write_lock:
             if self._closed:
                 return
@@ -420,8 +459,9 @@ class Protocol:
                 assert len(padded)==actual_size, "expected padded size to be %i, but got %i" % (len(padded), actual_size)
                 data = self.cipher_out.encrypt(padded)
                 assert len(data)==actual_size, "expected encrypted size to be %i, but got %i" % (len(data), actual_size)
-                cryptolog("sending %s bytes %s encrypted with %s padding",
-                          payload_size, self.cipher_out_name, padding_size)
+                if cryptolog.debug_enabled:
+                    cryptolog("sending %s bytes %s encrypted with %s padding",
+                              payload_size, self.cipher_out_name, padding_size)
             if proto_flags & FLAGS_NOHEADER:
                 assert not self.cipher_out
                 #for plain/text packets (ie: gibberish response)
@@ -628,6 +668,21 @@ class Protocol:
         may_log_packet(True, packet_type, packet)
         return packets
 
+    def can_forward(self, packet : RawPacket) -> bool:
+        """
+            Can the peer decode the raw chunks of this packet?
+            They must use the same packet encoder and compressor as this protocol instance.
+        """
+        if self.send_aliases and USE_ALIASES:
+            #the packet type would need to be replaced by its alias
+            return False
+        for proto_flags, index, level, _ in packet.chunks:
+            if index==0 and packet_encoding.get_packet_encoding_type(proto_flags)!=self.encoder:
+                return False
+            if level>0 and compression.get_compression_type(level)!=self.compressor:
+                return False
+        return True
+
     def set_compression_level(self, level : int):
         #this may be used next time encode() is called
         assert 0<=level<=10, "invalid compression level: %s (must be between 0 and 10" % level
@@ -830,6 +885,7 @@ class Protocol:
         packet_index = 0
         compression_level = 0
         raw_packets = {}
+        raw_chunks = {}
         PACKET_HEADER_CHAR = ord("P")
         while not self._closed:
             buf = self._read_queue.get()
@@ -931,8 +987,9 @@ class Protocol:
                     if not protocol_flags & FLAGS_CIPHER:
                         self.invalid("unencrypted packet dropped", data)
                         return
-                    cryptolog("received %i %s encrypted bytes with %i padding",
-                              payload_size, self.cipher_in_name, padding_size)
+                    if cryptolog.debug_enabled:
+                        cryptolog("received %i %s encrypted bytes with %i padding",
+                                  payload_size, self.cipher_in_name, padding_size)
                     data = self.cipher_in.decrypt(data)
                     if padding_size > 0:
                         def debug_str(s):
@@ -957,6 +1014,17 @@ class Protocol:
                             self._internal_error("%s encryption padding error - wrong key?" % self.cipher_in_name)
                             return
                         data = data[:-padding_size]
+                if packet_index>0 and self.raw_packet_types:
+                    #keep the chunk as it is until we know which packet it belongs to,
+                    #so it can be forwarded without being decompressed:
+                    header = b""
+                    payload_size = -1
+                    raw_chunks[packet_index] = (protocol_flags, compression_level, data)
+                    if len(raw_chunks)>=4:
+                        self.invalid("too many raw packets: %s" % len(raw_chunks), data)
+                        return
+                    continue
+                received_data = data
                 #uncompress if needed:
                 if compression_level>0:
                     try:
@@ -1015,6 +1083,32 @@ class Protocol:
                 if self._closed:
                     return
                 payload_size = -1
+                packet_type = packet[0]
+                if self.receive_aliases and isinstance(packet_type, int):
+                    packet_type = self.receive_aliases.get(packet_type)
+                    if packet_type:
+                        packet[0] = packet_type
+                if self.raw_packet_types and packet_type in self.raw_packet_types and not self.receive_aliases:
+                    #keep all the chunks as received,
+                    #without the flags that only apply to this connection:
+                    mask = ~(FLAGS_CIPHER | FLAGS_FLUSH)
+                    chunks = [(flags & mask, index, level, raw_data)
+                              for index, (flags, level, raw_data) in raw_chunks.items()]
+                    chunks.append((protocol_flags & mask, 0, compression_level, received_data))
+                    packet = RawPacket(packet, chunks)
+                    raw_chunks = {}
+                    self.input_spliced_packetcount += 1
+                elif raw_chunks:
+                    for index, (_, level, raw_data) in raw_chunks.items():
+                        if level>0:
+                            try:
+                                raw_data = decompress(raw_data, level)
+                            except Exception as e:
+                                log("%s chunk decompression failed", packet_type, exc_info=True)
+                                self.invalid("invalid compression: %s" % e, raw_data)
+                                return
+                        raw_packets[index] = raw_data
+                    raw_chunks = {}
                 #add any raw packets back into it:
                 if raw_packets:
                     for index,raw_data in raw_packets.items():
@@ -1022,11 +1116,6 @@ class Protocol:
                         packet[index] = raw_data
                     raw_packets = {}
 
-                packet_type = packet[0]
-                if self.receive_aliases and isinstance(packet_type, int):
-                    packet_type = self.receive_aliases.get(packet_type)
-                    if packet_type:
-                        packet[0] = packet_type
                 self.input_stats[packet_type] = self.output_stats.get(packet_type, 0)+1
                 if LOG_RAW_PACKET_SIZE:
                     log("%s: %i bytes", packet_type, HEADER_SIZE + payload_size)
@@ -22,15 +22,19 @@ def encode_hybi_header(opcode, payload_len, has_mask=False, fin=True):
     return struct.pack('>BBQ', b1, 127 | mask_bit, payload_len)
 
 
-def decode_hybi(buf):
-    """ Decode HyBi style WebSocket packets """
+def decode_hybi_header(buf):
+    """
+        Decode the header of a HyBi style WebSocket frame,
+        returns the opcode, fin flag, mask (or None), header length and payload length,
+        or None if the buffer does not contain the whole header yet.
+    """
     blen = len(buf)
     hlen = 2
     if blen < hlen:
         #log("decode_hybi_header() buffer too small: %i", blen)
         return None
 
-    b1, b2 = struct.unpack(">BB", buf[:2])
+    b1, b2 = buf[0], buf[1]
     opcode = b1 & 0x0f
     fin = bool(b1 & 0x80)
     masked = bool(b2 & 0x80)
@@ -53,18 +57,29 @@ def decode_hybi(buf):
             #log("decode_hybi_header() buffer too small for 127 payload: %i", blen)
             return None
         payload_len = struct.unpack('>Q', buf[2:10])[0]
-
+    mask = None
+    if masked:
+        mask = bytes(buf[hlen-4:hlen])
     #log("decode_hybi_header() decoded header '%s': hlen=%i,
     #    payload_len=%i, buffer len=%i", binascii.hexlify(buf[:hlen]), hlen, payload_len, blen)
+    return opcode, fin, mask, hlen, payload_len
+
+
+def decode_hybi(buf):
+    """ Decode HyBi style WebSocket packets """
+    header = decode_hybi_header(buf)
+    if header is None:
+        return None
+    opcode, fin, mask, hlen, payload_len = header
     length = hlen + payload_len
-    if blen < length:
-        #log("decode_hybi_header() buffer too small for payload: %i (needed %i)", blen, length)
+    if len(buf) < length:
+        #log("decode_hybi() buffer too small for payload: %i (needed %i)", len(buf), length)
         return None
 
-    if masked:
+    if mask:
         payload = hybi_unmask(buf, hlen-4, payload_len)
     else:
         payload = buf[hlen:length]
-    #log("decode_hybi_header() payload_len=%i, hlen=%i,
+    #log("decode_hybi() payload_len=%i, hlen=%i,
     #    length=%i, fin=%s", payload_len, hlen, length, fin)
     return opcode, payload, length, fin
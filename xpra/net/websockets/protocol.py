@@ -6,7 +6,8 @@
 import os
 import struct
 
-from xpra.net.websockets.header import encode_hybi_header, decode_hybi
+from xpra.net.websockets.header import encode_hybi_header, decode_hybi_header
+from xpra.buffers.cyxor import hybi_mask     #@UnresolvedImport
 from xpra.net.protocol import Protocol
 from xpra.util import first_time, envbool
 from xpra.os_util import memoryview_to_bytes
@@ -40,8 +41,11 @@ class WebSocketProtocol(Protocol):
 
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
+        #incomplete frame header or control frame:
         self.ws_data = b""
-        self.ws_payload = []
+        #the data frame we are receiving the payload for:
+        self.ws_frame = None
+        #the opcode of the fragmented message we are receiving:
         self.ws_payload_opcode = 0
         self.ws_mask = MASK
         self._process_read = self.parse_ws_frame
@@ -54,7 +58,7 @@ class WebSocketProtocol(Protocol):
     def close(self, message=None):
         super().close(message)
         self.ws_data = b""
-        self.ws_payload = []
+        self.ws_frame = None
 
 
     def make_wsframe_header(self, packet_type, items):
@@ -63,73 +67,116 @@ class WebSocketProtocol(Protocol):
             packet_type, len(items), payload_len, self.ws_mask)
         header = encode_hybi_header(OPCODE_BINARY, payload_len, self.ws_mask)
         if self.ws_mask:
-            from xpra.buffers.cyxor import hybi_mask     #@UnresolvedImport
             mask = os.urandom(4)
-            #now mask all the items:
+            #now mask all the items,
+            #each one continues where the previous one left off:
+            phase = 0
             for i, item in enumerate(items):
-                items[i] = hybi_mask(mask, item)
+                if item:
+                    items[i] = hybi_mask(mask, item, phase & 0x3)
+                    phase += len(item)
             return header+mask
         return header
 
     def parse_ws_frame(self, buf):
+        """
+            Parses the frames in place:
+            the payload of data frames is forwarded to the packet layer as it arrives,
+            without waiting for the end of the frame or of the fragmented message,
+            since the xpra packets are a stream which does not depend on the frame boundaries.
+            Only the control frames are buffered until they are complete.
+        """
         if not buf:
             self._read_queue_put(buf)
             return
+        view = memoryview(buf)
+        pos = 0
+        if self.ws_frame:
+            #more payload for the current data frame:
+            pos = self._parse_ws_payload(view)
+            if pos==len(view):
+                return
         if self.ws_data:
-            ws_data = self.ws_data+buf
+            #join the partial header with the new data:
+            view = memoryview(self.ws_data+view[pos:].tobytes())
             self.ws_data = b""
-        else:
-            ws_data = buf
-        log("parse_ws_frame(%i bytes) total buffer is %i bytes", len(buf), len(ws_data))
-        while ws_data and not self._closed:
-            parsed = decode_hybi(ws_data)
-            if parsed is None:
-                log("parse_ws_frame(%i bytes) not enough data", len(ws_data))
-                #not enough data to get a full websocket frame,
-                #save it for later:
-                self.ws_data = ws_data
+            pos = 0
+        log("parse_ws_frame(%i bytes) total buffer is %i bytes", len(buf), len(view))
+        while pos<len(view) and not self._closed:
+            header = decode_hybi_header(view[pos:])
+            if header is None:
+                log("parse_ws_frame(%i bytes) not enough data for the frame header", len(buf))
+                self.ws_data = view[pos:].tobytes()
                 return
-            opcode, payload, processed, fin = parsed
-            ws_data = ws_data[processed:]
-            log("parse_ws_frame(%i bytes) payload=%i bytes, processed=%i, remaining=%i, opcode=%s, fin=%s",
-                len(buf), len(payload), processed, len(ws_data), OPCODES.get(opcode, opcode), fin)
-            if opcode==OPCODE_CONTINUE:
-                assert self.ws_payload_opcode and self.ws_payload, "continuation frame does not follow a partial frame"
-                self.ws_payload.append(payload)
+            opcode, fin, mask, hlen, payload_len = header
+            log("parse_ws_frame(%i bytes) payload=%i bytes, opcode=%s, fin=%s",
+                len(buf), payload_len, OPCODES.get(opcode, opcode), fin)
+            if opcode>=OPCODE_CLOSE:
+                #control frames are small and never fragmented,
+                #so we can wait for the whole frame:
                 if not fin:
-                    #wait for more
-                    continue
-                #join all the frames and process the payload:
-                full_payload = b"".join(memoryview_to_bytes(v) for v in self.ws_payload)
-                self.ws_payload = []
-                opcode = self.ws_payload_opcode
-                self.ws_payload_opcode = 0
+                    raise Exception("cannot handle fragmented '%s' frames" % OPCODES.get(opcode, opcode))
+                end = pos+hlen+payload_len
+                if end>len(view):
+                    log("parse_ws_frame(%i bytes) not enough data for the control frame", len(buf))
+                    self.ws_data = view[pos:].tobytes()
+                    return
+                payload = view[pos+hlen:end]
+                if mask and payload_len:
+                    payload = hybi_mask(mask, payload)
+                pos = end
+                self._process_ws_control(opcode, payload)
+                continue
+            discard = False
+            if opcode==OPCODE_CONTINUE:
+                assert self.ws_payload_opcode, "continuation frame does not follow a partial frame"
+                discard = self.ws_payload_opcode not in (OPCODE_BINARY, OPCODE_TEXT)
             else:
-                if self.ws_payload and self.ws_payload_opcode:
+                if self.ws_payload_opcode:
                     raise Exception("expected a continuation frame not %s" % OPCODES.get(opcode, opcode))
-                full_payload = payload
-                if not fin:
-                    if opcode not in (OPCODE_BINARY, OPCODE_TEXT):
-                        raise Exception("cannot handle fragmented '%s' frames" % OPCODES.get(opcode, opcode))
-                    #fragmented, keep this payload for later
-                    self.ws_payload_opcode = opcode
-                    self.ws_payload.append(payload)
-                    continue
-            if opcode==OPCODE_BINARY:
-                self._read_queue_put(full_payload)
-            elif opcode==OPCODE_TEXT:
-                if first_time("ws-text-frame-from-%s" % self._conn):
-                    log.warn("Warning: handling text websocket frame as binary")
-                self._read_queue_put(full_payload)
-            elif opcode==OPCODE_CLOSE:
-                self._process_ws_close(full_payload)
-            elif opcode==OPCODE_PING:
-                self._process_ws_ping(full_payload)
-            elif opcode==OPCODE_PONG:
-                self._process_ws_pong(full_payload)
-            else:
-                log.warn("Warning unhandled websocket opcode '%s'", OPCODES.get(opcode, "%#x" % opcode))
-                log("payload=%r", payload)
+                if opcode==OPCODE_TEXT:
+                    if first_time("ws-text-frame-from-%s" % self._conn):
+                        log.warn("Warning: handling text websocket frame as binary")
+                elif opcode!=OPCODE_BINARY:
+                    log.warn("Warning unhandled websocket opcode '%s'", OPCODES.get(opcode, "%#x" % opcode))
+                    discard = True
+            if fin:
+                self.ws_payload_opcode = 0
+            elif opcode!=OPCODE_CONTINUE:
+                #fragmented, the payload continues in the next frames:
+                self.ws_payload_opcode = opcode
+            pos += hlen
+            if payload_len:
+                self.ws_frame = [mask, payload_len, 0, discard]
+                pos += self._parse_ws_payload(view[pos:])
+
+    def _parse_ws_payload(self, view):
+        """ forwards the payload of the current data frame, returns the number of bytes used """
+        mask, remaining, phase, discard = self.ws_frame
+        size = min(remaining, len(view))
+        if size and not discard:
+            payload = view[:size]
+            if mask:
+                #unmask straight into a new buffer:
+                payload = hybi_mask(mask, payload, phase & 0x3)
+            self._read_queue_put(payload)
+        remaining -= size
+        if remaining:
+            self.ws_frame = [mask, remaining, phase+size, discard]
+        else:
+            self.ws_frame = None
+        return size
+
+    def _process_ws_control(self, opcode, payload):
+        if opcode==OPCODE_CLOSE:
+            self._process_ws_close(payload)
+        elif opcode==OPCODE_PING:
+            self._process_ws_ping(payload)
+        elif opcode==OPCODE_PONG:
+            self._process_ws_pong(payload)
+        else:
+            log.warn("Warning unhandled websocket opcode '%s'", OPCODES.get(opcode, "%#x" % opcode))
+            log("payload=%r", payload)
 
     def _process_ws_ping(self, payload):
         log("_process_ws_ping(%r)", payload)
@@ -9,7 +9,6 @@ import re
 import os
 import sys
 import signal
-import uuid
 import time
 import struct
 import binascii
@@ -244,9 +243,11 @@ def get_rand_chars(l=16, chars=b"0123456789abcdefghijklmnopqrstuvwxyzABCDEFGHIJK
     return b"".join(chars[random.randint(0, len(chars)-1):][:1] for _ in range(l))
 
 def get_hex_uuid() -> str:
+    import uuid
     return uuid.uuid4().hex
 
 def get_int_uuid() -> int:
+    import uuid
     return uuid.uuid4().int
 
 def get_machine_id() -> str:
@@ -262,6 +263,7 @@ def get_machine_id() -> str:
             if v is not None:
                 break
     elif WIN32:
+        import uuid
         v = uuid.getnode()
     return bytestostr(v).strip("\n\r")
 
@@ -9,13 +9,22 @@ import glob
 import socket
 import errno
 import stat
+from threading import Lock
+from concurrent.futures import ThreadPoolExecutor
 
-from xpra.os_util import get_util_logger, osexpand, umask_context
+from xpra.util import envint
+from xpra.os_util import get_util_logger, osexpand, umask_context, monotonic_time
 from xpra.platform.dotxpra_common import PREFIX, LIVE, DEAD, UNKNOWN, INACCESSIBLE
 from xpra.platform import platform_import
 
 DISPLAY_PREFIX = ":"
 
+#how many sockets we probe at the same time:
+PROBE_THREADS = max(1, envint("XPRA_SOCKET_PROBE_THREADS", 32))
+#how long the long running processes can re-use a socket state for, in seconds,
+#see DotXpra(cache_ttl=..):
+SOCKET_STATE_TTL = max(0, envint("XPRA_SOCKET_STATE_TTL", 2))
+
 
 def norm_makepath(dirpath, name):
     if DISPLAY_PREFIX and name.startswith(DISPLAY_PREFIX):
@@ -32,8 +41,88 @@ def debug(msg, *args, **kwargs):
     log(msg, *args, **kwargs)
 
 
+def get_dir_stamp(dirpath):
+    try:
+        return os.stat(dirpath).st_mtime_ns
+    except OSError:
+        return None
+
+
+class SocketStateCache:
+    """
+        Remembers the state of the sockets we have probed,
+        entries expire after 'ttl' seconds or as soon as the directory is modified
+        (ie: a socket is created or removed),
+        which we detect using inotify if available or by checking the directory's mtime.
+    """
+
+    def __init__(self):
+        #sockpath -> (state, time, directory stamp):
+        self.states = {}
+        self.lock = Lock()
+        self.watch_manager = None
+        self.watch_notifier = None
+        self.watched = set()
+
+    def __repr__(self):
+        return "SocketStateCache(%i)" % len(self.states)
+
+    def get(self, sockpath, ttl):
+        with self.lock:
+            value = self.states.get(sockpath)
+        if not value:
+            return None
+        state, when, stamp = value
+        dirpath = os.path.dirname(sockpath)
+        if monotonic_time()-when>ttl or (dirpath not in self.watched and get_dir_stamp(dirpath)!=stamp):
+            self.invalidate(sockpath)
+            return None
+        return state
+
+    def set(self, sockpath, state):
+        dirpath = os.path.dirname(sockpath)
+        with self.lock:
+            self.states[sockpath] = (state, monotonic_time(), get_dir_stamp(dirpath))
+
+    def invalidate(self, path):
+        """ forget the socket path, or all the sockets in this directory """
+        prefix = path.rstrip(os.sep)+os.sep
+        with self.lock:
+            for sockpath in tuple(self.states.keys()):
+                if sockpath==path or sockpath.startswith(prefix):
+                    self.states.pop(sockpath, None)
+
+    def watch(self, dirs):
+        try:
+            import pyinotify
+        except ImportError:
+            debug("cannot watch the socket directories without pyinotify")
+            return
+        if not self.watch_manager:
+            self.watch_manager = pyinotify.WatchManager()
+            cache = self
+            class EventHandler(pyinotify.ProcessEvent):
+                def process_default(self, event):
+                    debug("socket directory event: %s", event)
+                    cache.invalidate(event.pathname)
+            self.watch_notifier = pyinotify.ThreadedNotifier(self.watch_manager, EventHandler())
+            self.watch_notifier.setDaemon(True)
+            self.watch_notifier.start()
+        mask = pyinotify.IN_DELETE | pyinotify.IN_CREATE | pyinotify.IN_ATTRIB  #@UndefinedVariable pylint: disable=no-member
+        for d in dirs:
+            if d in self.watched or not os.path.isdir(d):
+                continue
+            wdd = self.watch_manager.add_watch(d, mask)
+            debug("watching socket directory '%s': %s", d, wdd)
+            self.watched.add(d)
+            #we may have missed some changes:
+            self.invalidate(d)
+
+_state_cache = SocketStateCache()
+
+
 class DotXpra:
-    def __init__(self, sockdir=None, sockdirs=None, actual_username="", uid=0, gid=0):
+    def __init__(self, sockdir=None, sockdirs=None, actual_username="", uid=0, gid=0, cache_ttl=0):
         self.uid = uid or os.getuid()
         self.gid = gid or os.getgid()
         self.username = actual_username
@@ -47,6 +136,10 @@ class DotXpra:
             sockdirs.insert(0, sockdir)
         self._sockdir = self.osexpand(sockdir)
         self._sockdirs = [self.osexpand(x) for x in sockdirs]
+        #long running processes can re-use the socket states for a short while:
+        self.cache_ttl = cache_ttl
+        if cache_ttl>0:
+            _state_cache.watch(self.get_socket_dirs())
 
     def osexpand(self, v):
         return osexpand(v, self.username, self.uid, self.gid)
@@ -124,33 +217,53 @@ class DotXpra:
                 debug("%s.close()", sock, exc_info=True)
 
 
-    def displays(self, check_uid=0, matching_state=None):
-        return list(set(v[1] for v in self.sockets(check_uid, matching_state)))
+    def get_server_states(self, sockpaths, timeout=5):
+        """
+            Probes all the socket paths at the same time,
+            so a single server that does not respond does not hold up the others.
+            Returns a dictionary with the state of each socket.
+        """
+        states = {}
+        probe = []
+        for sockpath in sockpaths:
+            state = _state_cache.get(sockpath, self.cache_ttl) if self.cache_ttl>0 else None
+            if state:
+                states[sockpath] = state
+            elif sockpath not in probe:
+                probe.append(sockpath)
+        debug("get_server_states(%s, %i) cached=%s, probing %i sockets", sockpaths, timeout, states, len(probe))
+        def get_state(sockpath):
+            return self.get_server_state(sockpath, timeout)
+        if len(probe)==1:
+            probed = (get_state(probe[0]), )
+        elif probe:
+            with ThreadPoolExecutor(max_workers=min(PROBE_THREADS, len(probe))) as executor:
+                probed = tuple(executor.map(get_state, probe))
+        else:
+            probed = ()
+        for sockpath, state in zip(probe, probed):
+            states[sockpath] = state
+            if self.cache_ttl>0:
+                _state_cache.set(sockpath, state)
+        return states
 
-    def sockets(self, check_uid=0, matching_state=None):
-        #flatten the dictionnary into a list:
-        return list(set((v[0], v[1]) for details_values in
-                        self.socket_details(check_uid, matching_state).values() for v in details_values))
-
-    def socket_paths(self, check_uid=0, matching_state=None, matching_display=None):
-        paths = []
-        for details in self.socket_details(check_uid, matching_state, matching_display).values():
-            for _, _, socket_path in details:
-                paths.append(socket_path)
-        return paths
-
-    def get_display_state(self, display):
+    def get_socket_dirs(self):
         dirs = []
         if self._sockdir!="undefined":
             dirs.append(self._sockdir)
         dirs += [x for x in self._sockdirs if x not in dirs]
-        debug("get_display_state(%s) sockdir=%s, sockdirs=%s, testing=%s",
-              display, self._sockdir, self._sockdirs, dirs)
+        return dirs
+
+    def find_sockets(self, display_str, check_uid=0):
+        """
+            returns a list of (directory, base, sockpath) for the sockets matching 'display_str'
+            in all the socket directories (in order)
+        """
         seen = set()
-        state = None
-        for d in dirs:
+        sockets = []
+        for d in self.get_socket_dirs():
             if not d or not os.path.exists(d):
-                debug("get_display_state: '%s' path does not exist", d)
+                debug("find_sockets: '%s' path does not exist", d)
                 continue
             real_dir = os.path.realpath(d)
             if real_dir in seen:
@@ -158,73 +271,76 @@ class DotXpra:
             seen.add(real_dir)
             #ie: "~/.xpra/HOSTNAME-"
             base = os.path.join(d, PREFIX)
-            potential_sockets = glob.glob(base + strip_display_prefix(display))
+            potential_sockets = glob.glob(base + display_str)
             for sockpath in sorted(potential_sockets):
                 try:
                     s = os.stat(sockpath)
                 except OSError as e:
-                    debug("get_display_state: '%s' path cannot be accessed: %s", sockpath, e)
+                    debug("find_sockets: '%s' path cannot be accessed: %s", sockpath, e)
                     #socket cannot be accessed
                     continue
-                if stat.S_ISSOCK(s.st_mode):
-                    local_display = DISPLAY_PREFIX+sockpath[len(base):]
-                    if local_display!=display:
-                        debug("get_display_state: '%s' display does not match (%s vs %s)",
-                              sockpath, local_display, display)
-                        continue
-                    state = self.get_server_state(sockpath)
-                    if state not in (self.DEAD, self.INACCESSIBLE):
-                        return state
+                if not stat.S_ISSOCK(s.st_mode):
+                    continue
+                if check_uid>0 and s.st_uid!=check_uid:
+                    #socket uid does not match
+                    debug("find_sockets: '%s' uid does not match (%s vs %s)", sockpath, s.st_uid, check_uid)
+                    continue
+                sockets.append((d, base, sockpath))
+        return sockets
+
+
+    def displays(self, check_uid=0, matching_state=None):
+        return list(set(v[1] for v in self.sockets(check_uid, matching_state)))
+
+    def sockets(self, check_uid=0, matching_state=None):
+        #flatten the dictionnary into a list:
+        return list(set((v[0], v[1]) for details_values in
+                        self.socket_details(check_uid, matching_state).values() for v in details_values))
+
+    def socket_paths(self, check_uid=0, matching_state=None, matching_display=None):
+        paths = []
+        for details in self.socket_details(check_uid, matching_state, matching_display).values():
+            for _, _, socket_path in details:
+                paths.append(socket_path)
+        return paths
+
+    def get_display_state(self, display):
+        debug("get_display_state(%s) sockdir=%s, sockdirs=%s", display, self._sockdir, self._sockdirs)
+        sockets = []
+        for _, base, sockpath in self.find_sockets(strip_display_prefix(display)):
+            local_display = DISPLAY_PREFIX+sockpath[len(base):]
+            if local_display!=display:
+                debug("get_display_state: '%s' display does not match (%s vs %s)",
+                      sockpath, local_display, display)
+                continue
+            sockets.append(sockpath)
+        states = self.get_server_states(sockets)
+        state = None
+        for sockpath in sockets:
+            state = states[sockpath]
+            if state not in (self.DEAD, self.INACCESSIBLE):
+                return state
         return state or self.DEAD
 
     #find the matching sockets, and return:
     #(state, local_display, sockpath) for each socket directory we probe
     def socket_details(self, check_uid=0, matching_state=None, matching_display=None):
+        debug("socket_details%s sockdir=%s, sockdirs=%s",
+              (check_uid, matching_state, matching_display), self._sockdir, self._sockdirs)
+        if matching_display:
+            dstr = strip_display_prefix(matching_display)
+        else:
+            dstr = "*"
+        sockets = self.find_sockets(dstr, check_uid)
+        states = self.get_server_states(tuple(sockpath for _, _, sockpath in sockets))
         sd = {}
-        dirs = []
-        if self._sockdir!="undefined":
-            dirs.append(self._sockdir)
-        dirs += [x for x in self._sockdirs if x not in dirs]
-        debug("socket_details%s sockdir=%s, sockdirs=%s, testing=%s",
-              (check_uid, matching_state, matching_display), self._sockdir, self._sockdirs, dirs)
-        seen = set()
-        for d in dirs:
-            if not d or not os.path.exists(d):
-                debug("socket_details: '%s' path does not exist", d)
+        for d, base, sockpath in sockets:
+            state = states[sockpath]
+            if matching_state and state!=matching_state:
+                debug("socket_details: '%s' state does not match (%s vs %s)", sockpath, state, matching_state)
                 continue
-            real_dir = os.path.realpath(d)
-            if real_dir in seen:
-                continue
-            seen.add(real_dir)
-            #ie: "~/.xpra/HOSTNAME-"
-            base = os.path.join(d, PREFIX)
-            if matching_display:
-                dstr = strip_display_prefix(matching_display)
-            else:
-                dstr = "*"
-            potential_sockets = glob.glob(base + dstr)
-            results = []
-            for sockpath in sorted(potential_sockets):
-                try:
-                    s = os.stat(sockpath)
-                except OSError as e:
-                    debug("socket_details: '%s' path cannot be accessed: %s", sockpath, e)
-                    #socket cannot be accessed
-                    continue
-                if stat.S_ISSOCK(s.st_mode):
-                    if check_uid>0:
-                        if s.st_uid!=check_uid:
-                            #socket uid does not match
-                            debug("socket_details: '%s' uid does not match (%s vs %s)", sockpath, s.st_uid, check_uid)
-                            continue
-                    state = self.get_server_state(sockpath)
-                    if matching_state and state!=matching_state:
-                        debug("socket_details: '%s' state does not match (%s vs %s)", sockpath, state, matching_state)
-                        continue
-                    local_display = DISPLAY_PREFIX+sockpath[len(base):]
-                    results.append((state, local_display, sockpath))
-            if results:
-                sd[d] = results
+            local_display = DISPLAY_PREFIX+sockpath[len(base):]
+            sd.setdefault(d, []).append((state, local_display, sockpath))
         return sd
 
 
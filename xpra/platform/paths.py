@@ -5,7 +5,6 @@
 # Xpra is released under the terms of the GNU GPL v2, or, at your option, any
 # later version. See the file COPYING for details.
 
-import inspect
 import os.path
 import sys
 
@@ -163,6 +162,7 @@ def default_get_app_dir():
             adir = os.path.join(prefix, "share", "xpra")
             if valid_dir(adir):
                 return adir
+    import inspect
     adir = os.path.dirname(inspect.getfile(sys._getframe(1)))  #pylint: disable=protected-access
     def root_module(d):
         for psep in (os.path.sep, "/", "\\"):
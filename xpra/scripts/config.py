@@ -577,6 +577,7 @@ OPTION_TYPES = {
                     #int options:
                     "displayfd"         : int,
                     "pings"             : int,
+                    "proxy-pool"        : int,
                     "quality"           : int,
                     "min-quality"       : int,
                     "speed"             : int,
@@ -1047,6 +1048,7 @@ def get_defaults():
                     "exit-with-client"  : False,
                     "start-new-commands": True,
                     "proxy-start-sessions": True,
+                    "proxy-pool"        : 0,
                     "av-sync"           : True,
                     "exit-ssh"          : True,
                     "dbus-control"      : not WIN32 and not OSX,
@@ -65,6 +65,17 @@ SYSTEMD_RUN = envbool("XPRA_SYSTEMD_RUN", True)
 VERIFY_X11_SOCKET_TIMEOUT = envint("XPRA_VERIFY_X11_SOCKET_TIMEOUT", 1)
 LIST_REPROBE_TIMEOUT = envint("XPRA_LIST_REPROBE_TIMEOUT", 10)
 
+#subcommands which only look at local state:
+#they are often invoked from scripts so they must start quickly,
+#without configuring the network layer or importing GLib:
+LOCAL_MODES = (
+    "list", "list-windows", "list-sessions",
+    "displays", "clean-displays", "clean-sockets",
+    "showconfig",
+    )
+#the stdio proxy subcommands don't need GLib either:
+PROXY_MODES = ("_proxy", "_proxy_start", "_proxy_start_desktop", "_proxy_shadow_start")
+
 
 def nox():
     DISPLAY = os.environ.get("DISPLAY")
@@ -372,7 +383,8 @@ def run_mode(script_file, cmdline, error_cb, options, args, mode, defaults):
             return systemd_run_wrap(mode, argv, options.systemd_run_args)
     configure_env(options.env)
     configure_logging(options, mode)
-    configure_network(options)
+    if mode not in LOCAL_MODES:
+        configure_network(options)
 
     if mode not in ("showconfig", "splash") and POSIX and not OSX and os.environ.get("XDG_RUNTIME_DIR") is None and getuid()>0:
         xrd = "/run/user/%i" % getuid()
@@ -396,7 +408,10 @@ def run_mode(script_file, cmdline, error_cb, options, args, mode, defaults):
         #sound commands don't want to set the name
         #(they do it later to prevent glib import conflicts)
         #"attach" does it when it received the session name from the server
-        if mode not in ("attach", "listen", "start", "start-desktop", "upgrade", "upgrade-desktop", "proxy", "shadow"):
+        #and the scripted subcommands don't need it:
+        if mode not in (
+            "attach", "listen", "start", "start-desktop", "upgrade", "upgrade-desktop", "proxy", "shadow",
+            ) + LOCAL_MODES + PROXY_MODES:
             from xpra.platform import set_name
             set_name("Xpra", "Xpra %s" % mode.strip("_"))
 
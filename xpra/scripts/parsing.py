@@ -375,6 +375,10 @@ def do_parse_cmdline(cmdline, defaults):
                       dest="proxy_start_sessions", default=defaults.proxy_start_sessions,
                       help="Allows proxy servers to start new sessions on demand."
                       +" Default: %s." % enabled_str(defaults.proxy_start_sessions))
+    group.add_option("--proxy-pool", action="store",
+                      dest="proxy_pool", type="int", default=defaults.proxy_pool,
+                      help="Number of proxy worker processes to keep ready for new connections,"
+                      +" use zero to start a new process for each connection. Default: %default.")
     group.add_option("--dbus-launch", action="store",
                       dest="dbus_launch", metavar="CMD", default=defaults.dbus_launch,
                       help="Start the session within a dbus-launch context,"
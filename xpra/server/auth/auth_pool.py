@@ -0,0 +1,216 @@
+# This file is part of Xpra.
+# Copyright (C) 2021 Antoine Martin <antoine@xpra.org>
+# Xpra is released under the terms of the GNU GPL v2, or, at your option, any
+# later version. See the file COPYING for details.
+
+"""
+Connections and lookups shared by the authentication modules of this process.
+
+Each authentication runs in its own thread and used to open its own connection
+to the database or directory server, which does not scale well
+when many clients connect at the same time.
+The connection pools re-use the connections and limit how many are opened.
+
+The credential cache remembers successful lookups for a short while,
+it is disabled unless a time to live is specified,
+either using the "cache_ttl" module option or the environment variable.
+"""
+
+import os
+import hmac
+import hashlib
+from threading import Lock, BoundedSemaphore
+from contextlib import contextmanager
+from collections import OrderedDict, deque
+
+from xpra.util import envint
+from xpra.os_util import monotonic_time, strtobytes
+from xpra.log import Logger
+
+log = Logger("auth")
+
+#maximum number of connections to each server:
+AUTH_POOL_SIZE = max(1, envint("XPRA_AUTH_POOL_SIZE", 4))
+#close the connections that have not been used for this long, in seconds:
+AUTH_POOL_IDLE_TIMEOUT = max(0, envint("XPRA_AUTH_POOL_IDLE_TIMEOUT", 60))
+#how long to wait for a connection when they are all in use, in seconds:
+AUTH_POOL_TIMEOUT = max(1, envint("XPRA_AUTH_POOL_TIMEOUT", 10))
+#how long to cache successful lookups for, in seconds:
+AUTH_CACHE_TTL = max(0, envint("XPRA_AUTH_CACHE_TTL", 0))
+AUTH_CACHE_SIZE = max(1, envint("XPRA_AUTH_CACHE_SIZE", 1024))
+
+
+class ConnectionPool:
+
+    def __init__(self, name, connect, close=None, reset=None,
+                 max_size=AUTH_POOL_SIZE, idle_timeout=AUTH_POOL_IDLE_TIMEOUT, timeout=AUTH_POOL_TIMEOUT):
+        self.name = name
+        self.connect = connect
+        self.close_fn = close
+        self.reset = reset
+        self.idle_timeout = idle_timeout
+        self.timeout = timeout
+        self.semaphore = BoundedSemaphore(max_size)
+        self.lock = Lock()
+        #(connection, time released):
+        self.idle = deque()
+        self.created = 0
+        self.reused = 0
+
+    def __repr__(self):
+        return "ConnectionPool(%s)" % self.name
+
+    def get_info(self) -> dict:
+        return {
+            "idle"      : len(self.idle),
+            "created"   : self.created,
+            "reused"    : self.reused,
+            }
+
+    @contextmanager
+    def connection(self):
+        """
+            yields a connection for exclusive use,
+            the connection is returned to the pool unless an exception is raised
+        """
+        if not self.semaphore.acquire(timeout=self.timeout):
+            raise Exception("timeout waiting for a %s connection" % self.name)
+        try:
+            conn = self.get_idle()
+            if conn is None:
+                conn = self.connect()
+                self.created += 1
+                log("%s new connection: %s", self, conn)
+            try:
+                yield conn
+            except BaseException:
+                self.close(conn)
+                raise
+            self.release(conn)
+        finally:
+            self.semaphore.release()
+
+    def get_idle(self):
+        now = monotonic_time()
+        while True:
+            with self.lock:
+                if not self.idle:
+                    return None
+                conn, released = self.idle.pop()
+            if now-released<=self.idle_timeout:
+                self.reused += 1
+                return conn
+            log("%s closing idle connection %s", self, conn)
+            self.close(conn)
+
+    def release(self, conn):
+        if conn is None:
+            return
+        if self.reset:
+            try:
+                self.reset(conn)
+            except Exception as e:
+                log("%s failed to reset %s: %s", self, conn, e)
+                self.close(conn)
+                return
+        with self.lock:
+            self.idle.append((conn, monotonic_time()))
+
+    def close(self, conn):
+        if conn is None or not self.close_fn:
+            return
+        try:
+            self.close_fn(conn)
+        except Exception as e:
+            log("%s failed to close %s: %s", self, conn, e)
+
+    def close_all(self):
+        with self.lock:
+            idle = tuple(self.idle)
+            self.idle.clear()
+        for conn, _ in idle:
+            self.close(conn)
+
+
+_pools = {}
+_pools_lock = Lock()
+
+def get_connection_pool(key, connect, close=None, reset=None) -> ConnectionPool:
+    """ returns the pool for this key, creating it if needed """
+    with _pools_lock:
+        pool = _pools.get(key)
+        if not pool:
+            pool = ConnectionPool(key, connect, close, reset)
+            _pools[key] = pool
+        return pool
+
+def close_connection_pools():
+    with _pools_lock:
+        pools = tuple(_pools.values())
+        _pools.clear()
+    for pool in pools:
+        pool.close_all()
+
+
+class CredentialCache:
+    """
+        Cached values are keyed by a tuple starting with the username,
+        so that all the entries for a user can be invalidated at once.
+    """
+
+    def __init__(self, max_size=AUTH_CACHE_SIZE):
+        self.max_size = max_size
+        #key -> (expiry time, value):
+        self.entries = OrderedDict()
+        self.lock = Lock()
+        #never keep the secrets themselves as keys:
+        self.secret = os.urandom(32)
+
+    def __repr__(self):
+        return "CredentialCache(%i)" % len(self.entries)
+
+    def digest(self, value) -> str:
+        return hmac.new(self.secret, strtobytes(value), hashlib.sha256).hexdigest()
+
+    def get(self, key):
+        with self.lock:
+            v = self.entries.get(key)
+            if not v:
+                return None
+            expires, value = v
+            if monotonic_time()>=expires:
+                del self.entries[key]
+                return None
+            return value
+
+    def set(self, key, value, ttl : int):
+        if ttl<=0:
+            return
+        with self.lock:
+            self.entries.pop(key, None)
+            self.entries[key] = (monotonic_time()+ttl, value)
+            while len(self.entries)>self.max_size:
+                self.entries.popitem(last=False)
+
+    def invalidate(self, username=None):
+        """ forget everything we know about this user, or all users """
+        with self.lock:
+            if username is None:
+                count = len(self.entries)
+                self.entries.clear()
+            else:
+                keys = tuple(k for k in self.entries.keys() if k[0]==username)
+                for k in keys:
+                    del self.entries[k]
+                count = len(keys)
+        log("invalidated %i cached credentials for %s", count, username or "all users")
+        return count
+
+
+_credential_cache = CredentialCache()
+
+def get_credential_cache() -> CredentialCache:
+    return _credential_cache
+
+def invalidate_credentials(username=None) -> int:
+    return _credential_cache.invalidate(username)
@@ -9,6 +9,7 @@ import sys
 
 from xpra.util import obsc, typedict
 from xpra.server.auth.sys_auth_base import SysAuthenticatorBase, log, parse_uid, parse_gid
+from xpra.server.auth.auth_pool import get_connection_pool, get_credential_cache, AUTH_CACHE_TTL
 from xpra.log import enable_debug_for, is_debug_enabled
 assert log #tests will disable logging from here
 
@@ -37,6 +38,7 @@ class Authenticator(SysAuthenticatorBase):
         self.port = int(kwargs.pop("port", default_port))
         self.authentication = kwargs.pop("authentication", "NTLM").upper()
         assert self.authentication in ("SIMPLE", "SASL", "NTLM"), "invalid authentication mechanism '%s'" % self.authentication
+        self.cache_ttl = int(kwargs.pop("cache_ttl", AUTH_CACHE_TTL))
         username = kwargs.pop("username", username)
         super().__init__(username, **kwargs)
         log("ldap auth: host=%s, port=%i, tls=%s",
@@ -73,25 +75,40 @@ class Authenticator(SysAuthenticatorBase):
                 "NTLM"      : NTLM,
                 }
             authentication = MECHANISM[self.authentication]
-            tls = None
-            if self.tls:
-                tls = Tls(validate=self.tls_validate, version=self.tls_version, ca_certs_file=self.cacert)
-                log("TLS=%s", tls)
-            server = Server(self.host, port=self.port, tls=tls, use_ssl=self.tls, get_info=ALL)
-            log("ldap3 Server(%s)=%s", (self.host, self.port, self.tls), server)
-            conn = Connection(server, user=self.username, password=password, authentication=authentication, receive_timeout=10)
-            log("ldap3 Connection(%s, %s, %s)=%s", server, self.username, self.authentication, conn)
-            if self.tls:
-                conn.start_tls()
-            r = conn.bind()
-            log("ldap3 %s.bind()=%s", conn, r)
-            if not r:
-                return False
-            if is_debug_enabled("auth"):
-                log("ldap3 server info:")
-                for l in server.info.splitlines():
-                    log(" %s", l)
-            log("ldap3 who_am_i()=%s", conn.extend.standard.who_am_i())
+            cache = get_credential_cache()
+            key = (self.username, "ldap3", self.host, self.port, self.authentication, cache.digest(password))
+            if cache.get(key):
+                log("found cached ldap3 credentials for %s", self.username)
+                return True
+            def connect():
+                tls = None
+                if self.tls:
+                    tls = Tls(validate=self.tls_validate, version=self.tls_version, ca_certs_file=self.cacert)
+                    log("TLS=%s", tls)
+                server = Server(self.host, port=self.port, tls=tls, use_ssl=self.tls, get_info=ALL)
+                log("ldap3 Server(%s)=%s", (self.host, self.port, self.tls), server)
+                conn = Connection(server, receive_timeout=10)
+                log("ldap3 Connection(%s)=%s", server, conn)
+                conn.open()
+                if self.tls:
+                    conn.start_tls()
+                return conn
+            def unbind(conn):
+                conn.unbind()
+            pool_key = ("ldap3", self.host, self.port, self.tls, self.tls_version, self.tls_validate, self.cacert)
+            pool = get_connection_pool(pool_key, connect, unbind)
+            #binding again re-authenticates a pooled connection:
+            with pool.connection() as conn:
+                r = conn.rebind(user=self.username, password=password, authentication=authentication)
+                log("ldap3 %s.rebind(%s, %s)=%s", conn, self.username, self.authentication, r)
+                if not r:
+                    return False
+                if is_debug_enabled("auth"):
+                    log("ldap3 server info:")
+                    for l in conn.server.info.splitlines():
+                        log(" %s", l)
+                    log("ldap3 who_am_i()=%s", conn.extend.standard.who_am_i())
+            cache.set(key, True, self.cache_ttl)
             return True
         except Exception as e:
             log("ldap3 check(..)", exc_info=True)
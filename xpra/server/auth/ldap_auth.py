@@ -11,6 +11,7 @@ import socket
 from xpra.util import envint, obsc, typedict
 from xpra.os_util import bytestostr
 from xpra.server.auth.sys_auth_base import SysAuthenticatorBase, log, parse_uid, parse_gid
+from xpra.server.auth.auth_pool import get_connection_pool, get_credential_cache, AUTH_CACHE_TTL
 from xpra.log import is_debug_enabled, enable_debug_for
 
 LDAP_REFERRALS = envint("XPRA_LDAP_REFERRALS", 0)
@@ -35,6 +36,7 @@ class Authenticator(SysAuthenticatorBase):
             default_port = 389
         self.port = int(kwargs.pop("port", default_port))
         self.username_format = kwargs.pop("username_format", "cn=%username, o=%domain")
+        self.cache_ttl = int(kwargs.pop("cache_ttl", AUTH_CACHE_TTL))
         #self.username_format = kwargs.pop("username_format", "%username@%domain")
         super().__init__(username, **kwargs)
         log("ldap auth: host=%s, port=%i, tls=%s, username_format=%s, cacert=%s, encoding=%s",
@@ -84,12 +86,6 @@ class Authenticator(SysAuthenticatorBase):
             else:
                 protocol = "ldap"
             server = "%s://%s:%i" % (protocol, self.host, self.port)
-            conn = initialize(server, trace_level=LDAP_TRACE_LEVEL or is_debug_enabled("auth"))
-            conn.protocol_version = LDAP_PROTOCOL_VERSION
-            conn.set_option(OPT_REFERRALS, LDAP_REFERRALS)
-            if self.cacert:
-                conn.set_option(OPT_X_TLS_CACERTFILE, self.cacert)
-            log("ldap.open(%s)=%s", server, conn)
             try:
                 domain = socket.getfqdn().split(".", 1)[1]
             except Exception:
@@ -104,8 +100,31 @@ class Authenticator(SysAuthenticatorBase):
                 log("ldap encoded password as %s", self.encoding)
             except Exception:
                 pass
-            v = conn.simple_bind_s(user, password)
+            cache = get_credential_cache()
+            key = (self.username, "ldap", server, user, cache.digest(password))
+            if cache.get(key):
+                log("found cached ldap credentials for %s", user)
+                return True
+            def connect():
+                conn = initialize(server, trace_level=LDAP_TRACE_LEVEL or is_debug_enabled("auth"))
+                conn.protocol_version = LDAP_PROTOCOL_VERSION
+                conn.set_option(OPT_REFERRALS, LDAP_REFERRALS)
+                if self.cacert:
+                    conn.set_option(OPT_X_TLS_CACERTFILE, self.cacert)
+                log("ldap.open(%s)=%s", server, conn)
+                return conn
+            def unbind(conn):
+                conn.unbind_s()
+            pool = get_connection_pool(("ldap", server, self.cacert), connect, unbind)
+            #binding again re-authenticates a pooled connection:
+            with pool.connection() as conn:
+                try:
+                    v = conn.simple_bind_s(user, password)
+                except INVALID_CREDENTIALS:
+                    log("check(..)", exc_info=True)
+                    return False
             log("simple_bind_s(%s, %s)=%s", user, obsc(password), v)
+            cache.set(key, True, self.cache_ttl)
             return True
         except INVALID_CREDENTIALS:
             log("check(..)", exc_info=True)
@@ -46,14 +46,11 @@ class Authenticator(SQLAuthenticator):
         super().__init__(username, **kwargs)
         self.uri = uri
 
-    def db_cursor(self, *sqlargs):
-        db = db_from_uri(self.uri)
-        cursor = db.cursor()
-        cursor.execute(*sqlargs)
-        #keep reference to db so it doesn't get garbage collected just yet:
-        cursor.db = db
-        log("db_cursor(%s)=%s", sqlargs, cursor)
-        return cursor
+    def get_pool_key(self):
+        return ("mysql", self.uri)
+
+    def db_connect(self):
+        return db_from_uri(self.uri)
 
     def __repr__(self):
         return "mysql"
@@ -6,26 +6,37 @@
 
 import os
 import sys
+from threading import Lock
 
 from xpra.server.auth.sqlauthbase import SQLAuthenticator, DatabaseUtilBase, run_dbutil
 from xpra.server.auth.sys_auth_base import log
 
 
+_engines = {}
+_engines_lock = Lock()
+
+def get_engine(uri):
+    """ the engine for this uri is only created once and shared """
+    with _engines_lock:
+        engine = _engines.get(uri)
+        if engine is None:
+            from sqlalchemy import create_engine    #@UnresolvedImport
+            engine = _engines[uri] = create_engine(uri)
+        return engine
+
+
 class Authenticator(SQLAuthenticator):
 
     def __init__(self, username, uri, **kwargs):
         super().__init__(username, **kwargs)
         self.uri = uri
 
-    def db_cursor(self, *sqlargs):
-        from sqlalchemy import create_engine    #@UnresolvedImport
-        db = create_engine(self.uri)
-        cursor = db.cursor()
-        cursor.execute(*sqlargs)
-        #keep reference to db so it doesn't get garbage collected just yet:
-        cursor.db = db
-        log("db_cursor(%s)=%s", sqlargs, cursor)
-        return cursor
+    def get_pool_key(self):
+        return ("sql", self.uri)
+
+    def db_connect(self):
+        #the DBAPI connection, which has a cursor:
+        return get_engine(self.uri).raw_connection()
 
     def __repr__(self):
         return "sql"
@@ -40,8 +51,7 @@ class SQLDatabaseUtil(DatabaseUtilBase):
         self.param = os.environ.get("PARAMSTYLE", "%s")
 
     def exec_database_sql_script(self, cursor_cb, *sqlargs):
-        from sqlalchemy import create_engine    #@UnresolvedImport
-        db = create_engine(self.uri)
+        db = get_engine(self.uri)
         log("%s.execute%s", db, sqlargs)
         result = db.execute(*sqlargs)
         log("result=%s", result)
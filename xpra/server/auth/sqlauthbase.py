@@ -7,6 +7,15 @@
 from xpra.util import csv, parse_simple_dict
 from xpra.os_util import getuid, getgid
 from xpra.server.auth.sys_auth_base import SysAuthenticator, log
+from xpra.server.auth.auth_pool import get_connection_pool, get_credential_cache, AUTH_CACHE_TTL
+
+
+def close_db(db):
+    db.close()
+
+def rollback_db(db):
+    #end the implicit transaction so the next query sees the latest data:
+    db.rollback()
 
 
 class SQLAuthenticator(SysAuthenticator):
@@ -16,26 +25,59 @@ class SQLAuthenticator(SysAuthenticator):
         self.sessions_query = kwargs.pop("sessions_query",
                                          "SELECT uid, gid, displays, env_options, session_options "+
                                          "FROM users WHERE username=(%s) AND password=(%s)")
+        self.cache_ttl = int(kwargs.pop("cache_ttl", AUTH_CACHE_TTL))
         super().__init__(username, **kwargs)
         self.authenticate_check = self.authenticate_hmac
 
-    def db_cursor(self, *sqlargs):
+    def db_connect(self):
+        """ returns a new database connection, or None if the database is not available """
         raise NotImplementedError()
 
+    def get_pool_key(self):
+        raise NotImplementedError()
+
+    def db_query(self, fetch, *sqlargs):
+        """
+            executes the query using a pooled connection
+            and returns the result of calling 'fetch' with the cursor
+        """
+        pool = get_connection_pool(self.get_pool_key(), self.db_connect, close_db, rollback_db)
+        with pool.connection() as db:
+            if db is None:
+                return None
+            cursor = db.cursor()
+            try:
+                cursor.execute(*sqlargs)
+                log("db_query(%s, %s)=%s", fetch, sqlargs, cursor)
+                return fetch(cursor)
+            finally:
+                cursor.close()
+
     def get_passwords(self):
-        cursor = self.db_cursor(self.password_query, (self.username,))
-        data = cursor.fetchall()
+        #always query the database, so that password changes take effect immediately:
+        data = self.db_query(lambda cursor : cursor.fetchall(), self.password_query, (self.username,))
         if not data:
             log.info("username '%s' not found in sqlauth database", self.username)
             return None
         return tuple(str(x[0]) for x in data)
 
     def get_sessions(self):
-        cursor = self.db_cursor(self.sessions_query, (self.username, self.password_used or ""))
-        data = cursor.fetchone()
+        password = self.password_used or ""
+        #only cache the sessions of verified credentials, keyed by a digest of the password:
+        cache = get_credential_cache()
+        key = None
+        if self.password_used:
+            key = (self.username, "sessions", self.get_pool_key(), self.sessions_query, cache.digest(password))
+            sessions = cache.get(key)
+            if sessions:
+                return sessions
+        data = self.db_query(lambda cursor : cursor.fetchone(), self.sessions_query, (self.username, password))
         if not data:
             return None
-        return self.parse_session_data(data)
+        sessions = self.parse_session_data(data)
+        if sessions and key:
+            cache.set(key, sessions, self.cache_ttl)
+        return sessions
 
     def parse_session_data(self, data):
         try:
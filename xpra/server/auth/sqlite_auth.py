@@ -29,17 +29,19 @@ class Authenticator(SQLAuthenticator):
     def __repr__(self):
         return "sqlite"
 
-    def db_cursor(self, *sqlargs):
+    def get_pool_key(self):
+        return ("sqlite", self.filename)
+
+    def db_connect(self):
         if not os.path.exists(self.filename):
             log.error("Error: sqlauth cannot find the database file '%s'", self.filename)
             return None
         import sqlite3
-        db = sqlite3.connect(self.filename)
+        #the pool ensures that the connection is only used by one thread at a time:
+        db = sqlite3.connect(self.filename, check_same_thread=False)
         db.row_factory = sqlite3.Row
-        cursor = db.cursor()
-        cursor.execute(*sqlargs)
-        log("db_cursor(%s)=%s", sqlargs, cursor)
-        return cursor
+        log("db_connect()=%s", db)
+        return db
 
     def parse_session_data(self, data):
         try:
@@ -6,7 +6,7 @@
 import os
 from collections import deque
 
-from xpra.platform.dotxpra import DotXpra
+from xpra.platform.dotxpra import DotXpra, SOCKET_STATE_TTL
 from xpra.platform.paths import get_socket_dirs
 from xpra.util import envint, obsc, typedict
 from xpra.net.digest import get_salt, choose_digest, verify_digest, gendigest
@@ -194,7 +194,8 @@ class SysAuthenticatorBase:
         gid = self.get_gid()
         log("%s.get_sessions() uid=%i, gid=%i", self, uid, gid)
         try:
-            sockdir = DotXpra(None, self.socket_dirs, actual_username=self.username, uid=uid, gid=gid)
+            sockdir = DotXpra(None, self.socket_dirs, actual_username=self.username, uid=uid, gid=gid,
+                              cache_ttl=SOCKET_STATE_TTL)
             results = sockdir.sockets(check_uid=uid)
             displays = []
             for state, display in results:
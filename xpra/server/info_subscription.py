@@ -0,0 +1,57 @@
+# This file is part of Xpra.
+# Copyright (C) 2021 Antoine Martin <antoine@xpra.org>
+# Xpra is released under the terms of the GNU GPL v2, or, at your option, any
+# later version. See the file COPYING for details.
+
+from xpra.util import envint, dict_delta
+from xpra.log import Logger
+
+log = Logger("server")
+
+#the default and minimum update intervals in milliseconds:
+INFO_SUBSCRIPTION_INTERVAL = max(100, envint("XPRA_INFO_SUBSCRIPTION_INTERVAL", 1000))
+INFO_SUBSCRIPTION_MIN_INTERVAL = max(100, envint("XPRA_INFO_SUBSCRIPTION_MIN_INTERVAL", 250))
+
+
+class InfoSubscription:
+    """
+        Keeps track of the info data we have sent to a client,
+        so that the following updates only contain the values that have changed.
+    """
+
+    def __init__(self, categories=(), interval=INFO_SUBSCRIPTION_INTERVAL):
+        #only send these top level categories, all of them if empty:
+        self.categories = tuple(categories)
+        self.interval = max(INFO_SUBSCRIPTION_MIN_INTERVAL, interval)
+        self.timer = 0
+        self.last = None
+        self.updates = 0
+
+    def __repr__(self):
+        return "InfoSubscription(%s, %ims)" % (self.categories or "all", self.interval)
+
+    def get_info(self) -> dict:
+        return {
+            "categories"    : self.categories,
+            "interval"      : self.interval,
+            "updates"       : self.updates,
+            }
+
+    def filter(self, info : dict) -> dict:
+        if not self.categories:
+            return info
+        return dict((k,v) for k,v in info.items() if k in self.categories)
+
+    def update(self, info : dict):
+        """
+            returns the values that have changed and the keys that have been removed
+            since the last update, or None if there is nothing to send
+        """
+        info = self.filter(info)
+        changed, removed = dict_delta(self.last, info)
+        self.last = info
+        if not changed and not removed:
+            return None
+        self.updates += 1
+        log("%s update %i: %i changed, %i removed", self, self.updates, len(changed), len(removed))
+        return changed, removed
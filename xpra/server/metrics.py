@@ -0,0 +1,220 @@
+# This file is part of Xpra.
+# Copyright (C) 2021 Antoine Martin <antoine@xpra.org>
+# Xpra is released under the terms of the GNU GPL v2, or, at your option, any
+# later version. See the file COPYING for details.
+
+"""
+Counters and histograms exposed by the "/metrics" http script,
+using the OpenMetrics text format (which Prometheus can scrape).
+
+The values are updated as the events happen (frames encoded, packets acknowledged, etc)
+so generating the output does not require a full info collection.
+Values that are already maintained elsewhere, like the connection byte counters,
+are read at scrape time by the collectors.
+"""
+
+from bisect import bisect_left
+from threading import Lock
+
+from xpra.util import envbool
+from xpra.log import Logger
+
+log = Logger("http")
+
+METRICS = envbool("XPRA_METRICS", True)
+
+CONTENT_TYPE = "application/openmetrics-text; version=1.0.0; charset=utf-8"
+
+#in seconds:
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5)
+
+
+def escape_label(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def format_labels(labelnames, labelvalues, extra=()) -> str:
+    pairs = tuple(zip(labelnames, labelvalues))+tuple(extra)
+    if not pairs:
+        return ""
+    return "{%s}" % ",".join('%s="%s"' % (k, escape_label(v)) for k, v in pairs)
+
+def format_value(v) -> str:
+    if isinstance(v, float):
+        if v==float("inf"):
+            return "+Inf"
+        return repr(v)
+    return str(int(v))
+
+
+class Metric:
+    TYPE = "unknown"
+
+    def __init__(self, name : str, description : str, labelnames=()):
+        self.name = name
+        self.description = description
+        self.labelnames = tuple(labelnames)
+        self.lock = Lock()
+        self.values = {}
+
+    def __repr__(self):
+        return "%s(%s)" % (type(self).__name__, self.name)
+
+    def reset(self):
+        with self.lock:
+            self.values = {}
+
+    def set(self, value, *labelvalues):
+        """ used by the collectors to mirror values maintained elsewhere """
+        with self.lock:
+            self.values[labelvalues] = value
+
+    def get_samples(self):
+        """ returns the (suffix, labels, value) for each sample """
+        with self.lock:
+            items = tuple(self.values.items())
+        for labelvalues, value in sorted(items):
+            yield "", format_labels(self.labelnames, labelvalues), value
+
+
+class Counter(Metric):
+    TYPE = "counter"
+
+    def inc(self, amount=1, *labelvalues):
+        with self.lock:
+            self.values[labelvalues] = self.values.get(labelvalues, 0)+amount
+
+    def get_samples(self):
+        for _, labels, value in super().get_samples():
+            yield "_total", labels, value
+
+
+class Gauge(Metric):
+    TYPE = "gauge"
+
+
+class Histogram(Metric):
+    TYPE = "histogram"
+
+    def __init__(self, name : str, description : str, labelnames=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, description, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value, *labelvalues):
+        #the bucket counts are cumulated when generating the output:
+        index = bisect_left(self.buckets, value)
+        with self.lock:
+            v = self.values.get(labelvalues)
+            if v is None:
+                v = self.values[labelvalues] = [[0]*(len(self.buckets)+1), 0, 0]
+            v[0][index] += 1
+            v[1] += value
+            v[2] += 1
+
+    def get_samples(self):
+        with self.lock:
+            items = tuple((k, (tuple(v[0]), v[1], v[2])) for k, v in self.values.items())
+        for labelvalues, (counts, total, count) in sorted(items):
+            cumulated = 0
+            for bound, n in zip(self.buckets+(float("inf"), ), counts):
+                cumulated += n
+                labels = format_labels(self.labelnames, labelvalues, (("le", format_value(float(bound))), ))
+                yield "_bucket", labels, cumulated
+            labels = format_labels(self.labelnames, labelvalues)
+            yield "_sum", labels, float(total)
+            yield "_count", labels, count
+
+
+class MetricsRegistry:
+
+    def __init__(self):
+        self.metrics = {}
+        self.collectors = []
+        self.lock = Lock()
+
+    def add(self, metric : Metric) -> Metric:
+        with self.lock:
+            existing = self.metrics.get(metric.name)
+            if existing:
+                return existing
+            self.metrics[metric.name] = metric
+            return metric
+
+    def counter(self, name, description, labelnames=()) -> Counter:
+        return self.add(Counter(name, description, labelnames))
+
+    def gauge(self, name, description, labelnames=()) -> Gauge:
+        return self.add(Gauge(name, description, labelnames))
+
+    def histogram(self, name, description, labelnames=(), buckets=LATENCY_BUCKETS) -> Histogram:
+        return self.add(Histogram(name, description, labelnames, buckets))
+
+    def add_collector(self, collector):
+        """
+            the collector is called when generating the output,
+            it can update gauges and counters from the values maintained elsewhere
+        """
+        if collector not in self.collectors:
+            self.collectors.append(collector)
+
+    def remove_collector(self, collector):
+        if collector in self.collectors:
+            self.collectors.remove(collector)
+
+    def generate(self) -> str:
+        for collector in tuple(self.collectors):
+            try:
+                collector(self)
+            except Exception:
+                log.error("Error calling metrics collector %s", collector, exc_info=True)
+        lines = []
+        with self.lock:
+            metrics = tuple(self.metrics.values())
+        for metric in sorted(metrics, key=lambda m : m.name):
+            lines.append("# TYPE %s %s" % (metric.name, metric.TYPE))
+            lines.append("# HELP %s %s" % (metric.name, metric.description))
+            for suffix, labels, value in metric.get_samples():
+                lines.append("%s%s%s %s" % (metric.name, suffix, labels, format_value(value)))
+        lines.append("# EOF")
+        return "\n".join(lines)+"\n"
+
+
+registry = MetricsRegistry()
+
+def counter(name, description, labelnames=()) -> Counter:
+    return registry.counter(name, description, labelnames)
+
+def gauge(name, description, labelnames=()) -> Gauge:
+    return registry.gauge(name, description, labelnames)
+
+def histogram(name, description, labelnames=(), buckets=LATENCY_BUCKETS) -> Histogram:
+    return registry.histogram(name, description, labelnames, buckets)
+
+
+#the metrics updated by the window sources and client connections:
+FRAMES = counter("xpra_frames", "Number of screen updates encoded", ("encoding", ))
+ENCODED_PIXELS = counter("xpra_encoded_pixels", "Number of pixels encoded", ("encoding", ))
+ENCODED_BYTES = counter("xpra_encoded_bytes", "Size of the compressed screen updates", ("encoding", ))
+ENCODE_TIME = histogram("xpra_encode_seconds", "Time spent encoding screen updates", ("encoding", ))
+DAMAGE_EVENTS = counter("xpra_damage_events", "Number of damage events received")
+DAMAGE_IN_LATENCY = histogram("xpra_damage_in_latency_seconds",
+                              "Time from processing a damage event until the packet is queued")
+DAMAGE_OUT_LATENCY = histogram("xpra_damage_out_latency_seconds",
+                               "Time from processing a damage event until the packet is sent")
+CLIENT_DECODE_TIME = histogram("xpra_client_decode_seconds", "Time taken by the clients to decode screen updates")
+FRAME_LATENCY = histogram("xpra_frame_latency_seconds",
+                          "Time from the damage event until the client acknowledges the screen update")
+PING_LATENCY = histogram("xpra_ping_latency_seconds", "Ping round trip time", ("direction", ))
+DECODE_ERRORS = counter("xpra_client_decode_errors", "Number of screen updates the clients failed to decode")
+
+#the metrics updated by the collectors:
+UPTIME = gauge("xpra_uptime_seconds", "Time since the server was started")
+CONNECTIONS = gauge("xpra_connections", "Number of connections, including unauthenticated ones")
+CONNECTION_BYTES = counter("xpra_connection_bytes", "Bytes transferred by each client connection",
+                           ("client", "direction"))
+CONNECTION_PACKETS = counter("xpra_connection_packets", "Packets transferred by each client connection",
+                             ("client", "direction"))
+PACKET_QUEUE = gauge("xpra_packet_queue_size", "Number of packets waiting to be sent", ("client", ))
+ENCODE_QUEUE = gauge("xpra_encode_queue_size", "Number of screen updates waiting to be encoded", ("client", ))
+WINDOWS = gauge("xpra_windows", "Number of windows forwarded", ("client", ))
+CLIENT_LATENCY = gauge("xpra_client_latency_seconds", "Recent average client latency", ("client", ))
+CONGESTION = gauge("xpra_congestion", "Network congestion value", ("client", ))
@@ -76,6 +76,8 @@ class ClipboardServer(StubServerMixin):
                 ""                      : True,
                 "enable-selections"     : True,             #client check removed in v4
                 "contents-slice-fix"    : True,             #fixed in v2.4
+                "chunks"                : True,
+                "cache"                 : True,
                 "preferred-targets"     : CLIPBOARD_PREFERRED_TARGETS,
                 },
             }
@@ -165,6 +167,8 @@ class ClipboardServer(StubServerMixin):
             ch.set_want_targets_client(ss.clipboard_want_targets)
             ch.enable_selections(ss.clipboard_client_selections)
             ch.set_clipboard_contents_slice_fix(ss.clipboard_contents_slice_fix)
+            ch.set_clipboard_chunks(ss.clipboard_chunks)
+            ch.set_clipboard_cache(ss.clipboard_cache)
             ch.set_preferred_targets(ss.clipboard_preferred_targets)
             ch.send_tokens(ss.clipboard_client_selections)
         else:
@@ -244,7 +248,8 @@ class ClipboardServer(StubServerMixin):
         if self.clipboard:
             self.add_packet_handler("set-clipboard-enabled", self._process_clipboard_enabled_status)
             for x in (
-                "token", "request", "contents", "contents-none",
+                "token", "request",
+                "contents", "contents-none", "contents-chunk", "contents-chunk-ack", "contents-cached",
                 "pending-requests", "enable-selections", "loop-uuids",
                 ):
                 self.add_packet_handler("clipboard-%s" % x, self._process_clipboard_packet)
@@ -292,11 +292,14 @@ class FilePrintServer(StubServerMixin):
                           "File not found", "The file requested does not exist:\n%s" % filename,
                            icon_name="file")
             return
+        data = None
         try:
             stat = os.stat(filename)
             filelog("os.stat(%s)=%s", filename, stat)
         except os.error:
             filelog("os.stat(%s)", filename, exc_info=True)
+            data = load_binary_file(filename)
+            file_size = len(data)
         else:
             file_size = stat.st_size
             if file_size>self.file_transfer.file_size_limit or file_size>ss.file_size_limit:
@@ -305,8 +308,8 @@ class FilePrintServer(StubServerMixin):
                               "The file requested is too large to send:\n%s\nis %s" % (argf, std_unit(file_size)),
                                icon_name="file")
                 return
-        data = load_binary_file(filename)
-        ss.send_file(filename, "", data, len(data), openit=openit, options={"request-file" : (argf, openit)})
+        #when the data is None, the file contents are read as they are sent:
+        ss.send_file(filename, "", data, file_size, openit=openit, options={"request-file" : (argf, openit)})
 
 
     def init_packet_handlers(self):
@@ -64,6 +64,7 @@ class ServerBaseControlCommands(StubServerMixin):
             ArgsControlCommand("suspend",               "suspend screen updates",           max_args=0),
             ArgsControlCommand("resume",                "resume screen updates",            max_args=0),
             ArgsControlCommand("ungrab",                "cancels any grabs",                max_args=0),
+            ArgsControlCommand("frame-trace",           "trace the screen update pipeline: 'start [SAMPLE]', 'stop', 'clear' or 'save [FILENAME]'", min_args=1, max_args=2),
             #server globals:
             ArgsControlCommand("idle-timeout",          "set the idle tiemout",             validation=[int]),
             ArgsControlCommand("server-idle-timeout",   "set the server idle timeout",      validation=[int]),
@@ -83,6 +84,7 @@ class ServerBaseControlCommands(StubServerMixin):
             ArgsControlCommand("set-lock",              "modify the lock attribute",        min_args=1, max_args=1),
             ArgsControlCommand("set-sharing",           "modify the sharing attribute",     min_args=1, max_args=1),
             ArgsControlCommand("set-ui-driver",         "set the client connection driving the session", min_args=1, max_args=1),
+            ArgsControlCommand("invalidate-auth-cache", "forget the cached credentials of a user, or all users", min_args=0, max_args=1),
             #session and clients:
             ArgsControlCommand("client",                "forwards a control command to the client(s)", min_args=1),
             ArgsControlCommand("client-property",       "set a client property",            min_args=4, max_args=5, validation=[int]),
@@ -319,20 +321,21 @@ class ServerBaseControlCommands(StubServerMixin):
 
         #find the file and load it:
         actual_filename = os.path.abspath(os.path.expanduser(filename))
+        if not os.path.exists(actual_filename):
+            raise ControlError("file '%s' does not exist" % filename)
+        #the file contents will be read as they are sent:
+        data = None
         try:
             stat = os.stat(actual_filename)
             log("os.stat(%s)=%s", actual_filename, stat)
+            file_size = stat.st_size
         except os.error:
             log("os.stat(%s)", actual_filename, exc_info=True)
-        else:
-            checksize(stat.st_size)
-        if not os.path.exists(actual_filename):
-            raise ControlError("file '%s' does not exist" % filename)
-        data = load_binary_file(actual_filename)
-        if data is None:
-            raise ControlError("failed to load '%s'" % actual_filename)
+            data = load_binary_file(actual_filename)
+            if data is None:
+                raise ControlError("failed to load '%s'" % actual_filename) from None
+            file_size = len(data)
         #verify size:
-        file_size = len(data)
         checksize(file_size)
         #send it to each client:
         for ss in sources:
@@ -351,7 +354,7 @@ class ServerBaseControlCommands(StubServerMixin):
                 log.warn(" client %s file size limit is %sB (file is %sB)",
                          ss, std_unit(ss.file_size_limit), std_unit(file_size))
             else:
-                ss.send_file(filename, "", data, file_size, *send_file_args)
+                ss.send_file(actual_filename, "", data, file_size, *send_file_args)
         return "%s of '%s' to %s initiated" % (command_type, filename, client_uuids)
 
 
@@ -535,6 +538,40 @@ class ServerBaseControlCommands(StubServerMixin):
         self.setting_changed("clipboard-limits", {'send': max_send, 'recv': max_recv})
         return msg
 
+    def control_command_invalidate_auth_cache(self, username=None):
+        from xpra.server.auth.auth_pool import invalidate_credentials
+        count = invalidate_credentials(username)
+        return "invalidated %i cached credentials for %s" % (count, username or "all users")
+
+    def control_command_frame_trace(self, action, arg=None):
+        from xpra.server.window.frame_trace import tracer
+        action = action.lower()
+        if action=="start":
+            try:
+                sample = int(arg or 1)
+            except ValueError:
+                raise ControlError("invalid sample value '%s'" % arg) from None
+            tracer.start(sample)
+            return "tracing one frame out of %i" % tracer.sample
+        if action=="stop":
+            tracer.stop()
+            return "frame tracing stopped, %i frames recorded" % tracer.frames
+        if action=="clear":
+            tracer.clear()
+            return "frame traces cleared"
+        if action=="save":
+            filename = arg
+            if not filename:
+                import tempfile
+                fd, filename = tempfile.mkstemp(prefix="xpra-frame-trace-", suffix=".json")
+                os.close(fd)
+            try:
+                count = tracer.save(filename)
+            except OSError as e:
+                raise ControlError("failed to save the frame trace to '%s': %s" % (filename, e)) from None
+            return "saved %i trace events to '%s'" % (count, filename)
+        raise ControlError("invalid frame-trace action '%s', use 'start', 'stop', 'clear' or 'save'" % action)
+
     def _control_video_subregions_from_wid(self, wid):
         if wid not in self._id_to_window:
             raise ControlError("invalid window %i" % wid)
@@ -243,9 +243,13 @@ class WindowServer(StubServerMixin):
             message = packet[6]
         else:
             message = ""
+        #only present for the frames we asked the client to trace:
+        client_trace = None
+        if len(packet)>=8:
+            client_trace = packet[7]
         ss = self.get_server_source(proto)
         if ss:
-            ss.client_ack_damage(packet_sequence, wid, width, height, decode_time, message)
+            ss.client_ack_damage(packet_sequence, wid, width, height, decode_time, message, client_trace)
 
     def refresh_window(self, window):
         ww, wh = window.get_dimensions()
@@ -10,7 +10,7 @@ from queue import Queue
 
 from xpra.net.net_util import get_network_caps
 from xpra.net.compression import Compressed, compressed_wrapper
-from xpra.net.protocol import Protocol
+from xpra.net.protocol import Protocol, RawPacket
 from xpra.net.common import MAX_PACKET_SIZE
 from xpra.net.digest import get_salt, gendigest
 from xpra.codecs.loader import load_codec, get_codec
@@ -40,6 +40,11 @@ PASSTHROUGH_RGB = envbool("XPRA_PROXY_PASSTHROUGH_RGB", False)
 VIDEO_TIMEOUT = 5                  #destroy video encoder after N seconds of idle state
 LEGACY_SALT_DIGEST = envbool("XPRA_LEGACY_SALT_DIGEST", False)
 PASSTHROUGH_AUTH = envbool("XPRA_PASSTHROUGH_AUTH", True)
+#forward bulk packets as raw chunks, without decoding and re-encoding them:
+SPLICE = envbool("XPRA_PROXY_SPLICE", False)
+SERVER_SPLICE_PACKETS = ("draw", "window-icon", "cursor", "sound-data", "send-file", "send-file-chunk",
+                         "clipboard-contents", "clipboard-contents-chunk")
+CLIENT_SPLICE_PACKETS = ("sound-data", "send-file", "send-file-chunk", "clipboard-contents", "clipboard-contents-chunk")
 
 PING_INTERVAL = max(1, envint("XPRA_PROXY_PING_INTERVAL", 5))*1000
 PING_WARNING = max(5, envint("XPRA_PROXY_PING_WARNING", 5))
@@ -185,6 +190,47 @@ class ProxyInstance:
 
     ################################################################################
 
+    def enable_splice(self):
+        """
+            Called once the hello packets have been exchanged,
+            enable raw forwarding if both sides use the same packet encoder.
+            The compressor is verified for each packet, see Protocol.can_forward()
+        """
+        cp = self.client_protocol
+        sp = self.server_protocol
+        if not SPLICE or not cp or not sp:
+            return
+        if cp.encoder!=sp.encoder:
+            log("splice mode not enabled: packet encoders differ: client=%s, server=%s", cp.encoder, sp.encoder)
+            return
+        log("splice mode enabled using %s packet encoder, compressors: client=%s, server=%s",
+            cp.encoder, cp.compressor, sp.compressor)
+        sp.raw_packet_types = SERVER_SPLICE_PACKETS
+        cp.raw_packet_types = CLIENT_SPLICE_PACKETS
+
+    def splice_server_packet(self, packet):
+        """ returns True if the raw packet has been forwarded to the client """
+        if not self.client_protocol.can_forward(packet):
+            return False
+        if bytestostr(packet[0])=="draw":
+            #proxy video and rgb passthrough need the pixel data:
+            if PASSTHROUGH_RGB or typedict(packet[10]).boolget("proxy", False):
+                return False
+            #go through the encode thread, so the draw packets for each window stay in order
+            #and so that the frames for lost windows are dropped:
+            self.encode_queue.put(packet)
+            return True
+        self.queue_client_packet(packet)
+        return True
+
+    def splice_client_packet(self, packet):
+        """ returns True if the raw packet has been forwarded to the server """
+        if not self.server_protocol.can_forward(packet):
+            return False
+        self.queue_server_packet(packet)
+        return True
+
+
     def get_proxy_info(self, proto):
         sinfo = {}
         sinfo.update(get_server_info())
@@ -199,6 +245,7 @@ class ProxyInstance:
                 "version"    : XPRA_VERSION,
                 ""           : sinfo,
                 "latency"    : linfo,
+                "splice"     : SPLICE,
                 },
             "window" : self.get_window_info(),
             }
@@ -307,6 +354,10 @@ class ProxyInstance:
         return p, None, None, None, True, s>0
 
     def process_client_packet(self, proto, packet):
+        if isinstance(packet, RawPacket):
+            if self.splice_client_packet(packet):
+                return
+            packet = packet.decode()
         packet_type = bytestostr(packet[0])
         log("process_client_packet: %s", packet_type)
         if packet_type==Protocol.CONNECTION_LOST:
@@ -442,6 +493,10 @@ class ProxyInstance:
 
 
     def process_server_packet(self, proto, packet):
+        if isinstance(packet, RawPacket):
+            if self.splice_server_packet(packet):
+                return
+            packet = packet.decode()
         packet_type = bytestostr(packet[0])
         log("process_server_packet: %s", packet_type)
         if packet_type==Protocol.CONNECTION_LOST:
@@ -470,6 +525,7 @@ class ProxyInstance:
             #may need to bump packet size:
             proto.max_packet_size = max(MAX_PACKET_SIZE, maxw*maxh*4*4)
             packet = ("hello", caps)
+            self.enable_splice()
         elif packet_type=="ping_echo" and self.server_ping_timer and len(packet)>=7 and strtobytes(packet[6])==strtobytes(self.uuid):
             #this is one of our ping packets:
             self.server_last_ping_echo = packet[1]
@@ -578,6 +634,10 @@ class ProxyInstance:
                         del self.video_encoders[wid]
                         del self.video_encoders_last_used_time[wid]
                         ve.clean()
+                elif packet_type=="draw" and isinstance(packet, RawPacket):
+                    #spliced packet, forward it unmodified:
+                    if packet[1] not in self.lost_windows:
+                        self.queue_client_packet(packet)
                 elif packet_type=="draw":
                     #modify the packet with the video encoder:
                     if self.process_draw(packet):
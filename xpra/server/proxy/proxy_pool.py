@@ -0,0 +1,282 @@
+# This file is part of Xpra.
+# Copyright (C) 2021 Antoine Martin <antoine@xpra.org>
+# Xpra is released under the terms of the GNU GPL v2, or, at your option, any
+# later version. See the file COPYING for details.
+
+"""
+A pool of pre-started proxy worker processes.
+
+Each worker imports the network and codec modules as soon as it is started,
+then waits for the proxy server to hand it a session:
+the client and server sockets are passed over a unix domain socket,
+along with the session options.
+The worker then drops privileges and runs the proxy instance,
+just like a ProxyInstanceProcess started for this connection.
+"""
+
+import os
+import pickle
+import socket
+import struct
+from collections import deque
+from threading import Lock
+from multiprocessing import Process, Queue as MQueue
+from multiprocessing.reduction import sendfds, recvfds
+
+from xpra.os_util import monotonic_time, set_proc_title
+from xpra.net.bytestreams import SocketConnection
+from xpra.log import Logger
+
+log = Logger("proxy")
+
+READY = b"R"
+LENGTH = struct.Struct("!I")
+
+#the connection attributes we need to re-create the connection in the worker:
+CONNECTION_ATTRIBUTES = ("socktype", "socktype_wrapped", "local", "remote", "endpoint",
+                         "info", "options", "filename", "timeout")
+
+
+def can_handoff(client_conn, server_conn, client_state) -> bool:
+    """ only plain sockets and picklable protocol states can be passed to a worker """
+    if type(client_conn) is not SocketConnection or type(server_conn) is not SocketConnection:
+        return False
+    return not client_state.get("cipher_in") and not client_state.get("cipher_out")
+
+
+def get_connection_state(conn) -> dict:
+    return dict((k, getattr(conn, k)) for k in CONNECTION_ATTRIBUTES)
+
+def make_connection(fd, state):
+    sock = socket.socket(fileno=fd)
+    conn = SocketConnection(sock, state["local"], state["remote"], state["endpoint"],
+                            state["socktype_wrapped"], state["info"], state["options"])
+    conn.socktype = state["socktype"]
+    conn.filename = state["filename"]
+    conn.timeout = state["timeout"]
+    return conn
+
+
+def recv_all(sock, size : int) -> bytes:
+    data = b""
+    while len(data)<size:
+        chunk = sock.recv(size-len(data))
+        if not chunk:
+            return None
+        data += chunk
+    return data
+
+
+class ProxyWorker(Process):
+
+    def __init__(self, video_encoders, pings):
+        super().__init__(name="proxy-worker", daemon=False)
+        self.video_encoders = video_encoders
+        self.pings = pings
+        #we keep 'socket', the worker process uses 'worker_socket':
+        self.socket, self.worker_socket = socket.socketpair(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.message_queue = MQueue()
+        self.start_time = monotonic_time()
+        self.ready = False
+
+    def __repr__(self):
+        return "ProxyWorker(%s)" % self.pid
+
+
+    def is_ready(self) -> bool:
+        """ has the worker finished loading its modules? (non-blocking) """
+        if not self.ready:
+            try:
+                self.ready = self.socket.recv(1, socket.MSG_DONTWAIT)==READY
+            except BlockingIOError:
+                pass
+            except OSError as e:
+                log("%s.is_ready() %s", self, e)
+        return self.ready
+
+    def handoff(self, client_conn, server_conn, **kwargs):
+        """ pass the sockets and session arguments to the worker process """
+        data = pickle.dumps({
+            "client-connection" : get_connection_state(client_conn),
+            "server-connection" : get_connection_state(server_conn),
+            "kwargs"            : kwargs,
+            })
+        sendfds(self.socket, [client_conn._socket.fileno(), server_conn._socket.fileno()])
+        self.socket.sendall(LENGTH.pack(len(data))+data)
+
+    def close(self):
+        #the worker will exit when it sees the end of the socket:
+        try:
+            self.socket.close()
+        except OSError:
+            pass
+
+
+    def run(self):
+        #this runs in the worker process
+        self.socket.close()
+        set_proc_title("Xpra Proxy Worker")
+        self.warm_up()
+        try:
+            self.worker_socket.sendall(READY)
+            fds = recvfds(self.worker_socket, 2)
+            size = LENGTH.unpack(recv_all(self.worker_socket, LENGTH.size))[0]
+            data = pickle.loads(recv_all(self.worker_socket, size))
+        except (OSError, EOFError, RuntimeError, TypeError, struct.error) as e:
+            #the proxy server is closing the pool
+            log("%s no session: %s", self, e)
+            return
+        finally:
+            self.worker_socket.close()
+        log("%s received session with fds=%s", self, fds)
+        client_conn = make_connection(fds[0], data["client-connection"])
+        server_conn = make_connection(fds[1], data["server-connection"])
+        kwargs = data["kwargs"]
+        from xpra.server.proxy.proxy_instance_process import ProxyInstanceProcess
+        instance = ProxyInstanceProcess(kwargs["uid"], kwargs["gid"], kwargs["env_options"],
+                                        kwargs["session_options"], kwargs["socket_dir"],
+                                        self.video_encoders, self.pings,
+                                        client_conn, kwargs["disp_desc"], kwargs["client_state"],
+                                        kwargs["cipher"], kwargs["encryption_key"],
+                                        server_conn, kwargs["caps"], self.message_queue)
+        #run the instance in this process:
+        instance.run()
+
+    def warm_up(self):
+        #load everything the proxy instance will need:
+        start = monotonic_time()
+        try:
+            from xpra.server.proxy import proxy_instance_process
+            assert proxy_instance_process
+            from xpra.codecs.loader import load_codec
+            load_codec("enc_pillow")
+            #use a separate helper so the instance can still configure the main one:
+            from xpra.codecs.video_helper import VideoHelper
+            vh = VideoHelper()
+            vh.set_modules(video_encoders=self.video_encoders)
+            vh.init()
+        except Exception as e:
+            log("%s.warm_up()", self, exc_info=True)
+            log.warn("Warning: proxy worker failed to pre-load its modules")
+            log.warn(" %s", e)
+        log("%s.warm_up() took %ims", self, (monotonic_time()-start)*1000)
+
+
+class ProxyPool:
+    """
+        Keeps 'size' proxy workers started, ready to handle new sessions.
+        The workers are spawned from the main thread, see fill().
+    """
+
+    def __init__(self, size : int, video_encoders, pings, add_process_cb):
+        self.size = size
+        self.video_encoders = video_encoders
+        self.pings = pings
+        self.add_process_cb = add_process_cb
+        self.workers = []
+        self.lock = Lock()
+        self.closed = False
+        self.spawned = 0
+        self.handoffs = 0
+        self.misses = 0
+        self.failures = 0
+        self.handoff_times = deque(maxlen=100)
+
+    def __repr__(self):
+        return "ProxyPool(%i)" % self.size
+
+    def get_info(self) -> dict:
+        with self.lock:
+            workers = tuple(self.workers)
+        info = {
+            "size"      : self.size,
+            "workers"   : len(workers),
+            "warm"      : sum(1 for worker in workers if worker.is_alive() and worker.is_ready()),
+            "spawned"   : self.spawned,
+            "handoffs"  : self.handoffs,
+            "misses"    : self.misses,
+            "failures"  : self.failures,
+            }
+        times = tuple(self.handoff_times)
+        if times:
+            info["handoff-time"] = {
+                "last"  : int(times[-1]*1000),
+                "min"   : int(min(times)*1000),
+                "avg"   : int(sum(times)*1000/len(times)),
+                "max"   : int(max(times)*1000),
+                }
+        return info
+
+    def fill(self):
+        #fork new workers until we have enough:
+        with self.lock:
+            if self.closed:
+                return False
+            self.workers = [worker for worker in self.workers if worker.is_alive()]
+            missing = self.size-len(self.workers)
+        for _ in range(missing):
+            worker = ProxyWorker(self.video_encoders, self.pings)
+            try:
+                worker.start()
+            except Exception as e:
+                log("%s.start()", worker, exc_info=True)
+                log.error("Error: failed to start a proxy worker process")
+                log.error(" %s", e)
+                return False
+            worker.worker_socket.close()
+            log("started %s", worker)
+            self.spawned += 1
+            self.add_process_cb(worker)
+            with self.lock:
+                self.workers.append(worker)
+        return False
+
+    def get_worker(self):
+        """
+            returns a worker, preferably one that has already loaded its modules,
+            or None if the pool is empty
+        """
+        with self.lock:
+            workers = [worker for worker in self.workers if worker.is_alive()]
+            ready = [worker for worker in workers if worker.is_ready()]
+            worker = (ready or workers or [None])[0]
+            if worker:
+                workers.remove(worker)
+            else:
+                self.misses += 1
+            self.workers = workers
+        return worker
+
+    def handoff(self, worker, client_conn, server_conn, **kwargs) -> bool:
+        start = monotonic_time()
+        try:
+            worker.handoff(client_conn, server_conn, **kwargs)
+        except Exception as e:
+            log("%s.handoff(..)", worker, exc_info=True)
+            log.warn("Warning: failed to hand over the connection to %s", worker)
+            log.warn(" %s", e)
+            self.failures += 1
+            worker.close()
+            worker.terminate()
+            return False
+        elapsed = monotonic_time()-start
+        self.handoffs += 1
+        self.handoff_times.append(elapsed)
+        log("%s.handoff(..) took %ims", worker, elapsed*1000)
+        #the worker now owns a copy of the sockets:
+        worker.close()
+        return True
+
+    def close(self):
+        with self.lock:
+            self.closed = True
+            workers = self.workers
+            self.workers = []
+        for worker in workers:
+            log("closing %s", worker)
+            worker.close()
+            if worker.is_alive():
+                try:
+                    os.kill(worker.pid, 15)
+                except OSError:
+                    pass
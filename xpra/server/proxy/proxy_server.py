@@ -86,6 +86,8 @@ class ProxyServer(ServerCore):
         #the display they're on and the message queue we can
         # use to communicate with them
         self.instances = {}
+        #pre-started proxy instance processes:
+        self.proxy_pool = None
         #connections used exclusively for requests:
         self._requests = set()
         self.idle_add = GLib.idle_add
@@ -106,6 +108,22 @@ class ProxyServer(ServerCore):
         get_platform_info()
         self.child_reaper = getChildReaper()
         self.create_system_dir(opts.system_proxy_socket)
+        self.init_proxy_pool(opts.proxy_pool)
+
+    def init_proxy_pool(self, size):
+        if size<=0:
+            return
+        if not POSIX or PROXY_INSTANCE_THREADED:
+            log.warn("Warning: the proxy pool is not supported in threaded mode")
+            return
+        from xpra.server.proxy.proxy_pool import ProxyPool
+        def add_worker(worker):
+            #when a worker dies, update our list of proxy instances:
+            self.child_reaper.add_process(worker._popen, "xpra-proxy-worker",
+                                          "xpra-proxy-worker", True, True, self.reap)
+        self.proxy_pool = ProxyPool(size, self.video_encoders, self.pings, add_worker)
+        self.proxy_pool.fill()
+        log("%s started", self.proxy_pool)
 
     def create_system_dir(self, sps):
         if not POSIX or OSX or not sps:
@@ -233,6 +251,10 @@ class ProxyServer(ServerCore):
 
 
     def cleanup(self):
+        pp = self.proxy_pool
+        if pp:
+            self.proxy_pool = None
+            pp.close()
         self.stop_all_proxies()
         super().cleanup()
         start = monotonic_time()
@@ -527,6 +549,15 @@ class ProxyServer(ServerCore):
                     client_proto.close()
                     return
                 client_conn.set_active(True)
+                worker = self.handoff_to_worker(client_conn, server_conn,
+                                                uid=uid, gid=gid, env_options=env_options,
+                                                session_options=session_options, socket_dir=self._socket_dir,
+                                                disp_desc=disp_desc, client_state=client_state,
+                                                cipher=cipher, encryption_key=encryption_key, caps=c)
+                if worker:
+                    message_queue = worker.message_queue
+                    self.instances[worker] = (True, display, message_queue)
+                    return
                 from xpra.server.proxy.proxy_instance_process import ProxyInstanceProcess
                 process = ProxyInstanceProcess(uid, gid, env_options, session_options, self._socket_dir,
                                                self.video_encoders, self.pings,
@@ -557,6 +588,26 @@ class ProxyServer(ServerCore):
                 message_queue.put("socket-handover-complete")
         start_thread(start_proxy_process, "start_proxy(%s)" % client_proto)
 
+    def handoff_to_worker(self, client_conn, server_conn, **kwargs):
+        """
+            Passes the connections to a pre-started worker process from the pool,
+            returns None if the caller should start a new proxy instance process instead.
+        """
+        pp = self.proxy_pool
+        if not pp:
+            return None
+        from xpra.server.proxy.proxy_pool import can_handoff
+        if not can_handoff(client_conn, server_conn, kwargs.get("client_state", {})):
+            log("handoff_to_worker: cannot use the pool for %s", client_conn)
+            return None
+        worker = pp.get_worker()
+        log("handoff_to_worker: using %s", worker)
+        #replace the worker we're about to use:
+        self.idle_add(pp.fill)
+        if not worker or not pp.handoff(worker, client_conn, server_conn, **kwargs):
+            return None
+        return worker
+
     def start_new_session(self, username, _password, uid, gid, new_session_dict=None, displays=()):
         log("start_new_session%s", (username, "..", uid, gid, new_session_dict, displays))
         sns = typedict(new_session_dict or {})
@@ -687,5 +738,7 @@ class ProxyServer(ServerCore):
                         i += 1
                     info["instances"] = instances_info
                     info["proxies"] = len(instances)
+                    if self.proxy_pool:
+                        info["pool"] = self.proxy_pool.get_info()
         info.setdefault("server", {})["type"] = "Python/GLib/proxy"
         return info
@@ -11,6 +11,7 @@ import os
 from xpra.server.server_core import ServerCore
 from xpra.server.mixins.server_base_controlcommands import ServerBaseControlCommands
 from xpra.server.background_worker import add_work_item
+from xpra.server.info_subscription import InfoSubscription, INFO_SUBSCRIPTION_INTERVAL
 from xpra.net.common import may_log_packet
 from xpra.os_util import monotonic_time, bytestostr, strtobytes, WIN32
 from xpra.util import (
@@ -449,6 +450,7 @@ class ServerBase(ServerBaseClass):
         #to expose new server features:
         f = {
             "toggle_keyboard_sync" : True,  #v4.0 clients assume this is always available
+            "info-subscribe"       : True,
             }
         for c in SERVER_BASES:
             if c!=ServerCore:
@@ -554,6 +556,53 @@ class ServerBase(ServerBaseClass):
             ss.send_info_response(info)
         self.get_all_info(info_callback, proto, None)
 
+    def _process_info_subscribe(self, proto, packet):
+        """
+            the client wants to receive info updates at regular intervals,
+            only the values that have changed are sent after the first update
+        """
+        ss = self.get_server_source(proto)
+        if not ss:
+            return
+        self.cancel_info_subscription(ss)
+        categories = tuple(bytestostr(x) for x in packet[1])
+        interval = packet[2] if len(packet)>=3 else INFO_SUBSCRIPTION_INTERVAL
+        log("process_info_subscribe: categories=%s, interval=%s", categories, interval)
+        if interval<=0:
+            return
+        ss.info_subscription = InfoSubscription(categories, interval)
+        self.send_info_update(ss)
+
+    def cancel_info_subscription(self, ss):
+        sub = getattr(ss, "info_subscription", None)
+        if sub:
+            ss.info_subscription = None
+            if sub.timer:
+                self.source_remove(sub.timer)
+                sub.timer = 0
+
+    def send_info_update(self, ss):
+        sub = getattr(ss, "info_subscription", None)
+        if not sub or ss.is_closed():
+            return False
+        sub.timer = 0
+        def info_callback(_proto, info):
+            #this runs in the info thread,
+            #so the diff is calculated without blocking the main thread:
+            delta = sub.update(info)
+            self.idle_add(self.info_updated, ss, sub, delta)
+        self.get_all_info(info_callback, ss.protocol, None)
+        return False
+
+    def info_updated(self, ss, sub, delta):
+        if getattr(ss, "info_subscription", None) is not sub or ss.is_closed():
+            return
+        if delta:
+            ss.send_info_delta(*delta)
+        #the next update is only scheduled once this one has been collected,
+        #so a slow info collection cannot pile up:
+        sub.timer = self.timeout_add(sub.interval, self.send_info_update, ss)
+
     def send_hello_info(self, proto):
         self.wait_for_threaded_init()
         start = monotonic_time()
@@ -589,6 +638,38 @@ class ServerBase(ServerBaseClass):
         log("ServerBase.get_info took %.1fms", 1000.0*(monotonic_time()-start))
         return info
 
+    def collect_metrics(self, registry):
+        ServerCore.collect_metrics(self, registry)
+        from xpra.server import metrics  #pylint: disable=import-outside-toplevel
+        per_client = (
+            metrics.CONNECTION_BYTES, metrics.CONNECTION_PACKETS,
+            metrics.PACKET_QUEUE, metrics.ENCODE_QUEUE, metrics.WINDOWS,
+            metrics.CLIENT_LATENCY, metrics.CONGESTION,
+            )
+        #forget the clients that have disconnected:
+        for metric in per_client:
+            metric.reset()
+        #only read the values which are already maintained,
+        #so this is much cheaper than calling get_info():
+        for proto, ss in tuple(self._server_sources.items()):
+            client = str(ss.counter)
+            metrics.CONNECTION_PACKETS.set(proto.input_packetcount, client, "in")
+            metrics.CONNECTION_PACKETS.set(proto.output_packetcount, client, "out")
+            conn = proto._conn
+            if conn:
+                metrics.CONNECTION_BYTES.set(conn.input_bytecount, client, "in")
+                metrics.CONNECTION_BYTES.set(conn.output_bytecount, client, "out")
+            metrics.PACKET_QUEUE.set(len(ss.packet_queue), client)
+            ewq = ss.encode_work_queue
+            if ewq:
+                metrics.ENCODE_QUEUE.set(ewq.qsize(), client)
+            window_sources = getattr(ss, "window_sources", None)
+            if window_sources is not None:
+                metrics.WINDOWS.set(len(window_sources), client)
+            stats = ss.statistics
+            metrics.CLIENT_LATENCY.set(float(stats.recent_client_latency or 0), client)
+            metrics.CONGESTION.set(float(stats.congestion_value), client)
+
     def get_packet_handlers_info(self) -> dict:
         info = ServerCore.get_packet_handlers_info(self)
         info.update({
@@ -764,6 +845,7 @@ class ServerBase(ServerBaseClass):
                 self.set_ui_driver(remaining_sources[0])
             else:
                 self.set_ui_driver(None)
+        self.cancel_info_subscription(source)
         source.close()
         netlog("cleanup_source(%s) remaining sources: %s", source, remaining_sources)
         netlog.info("xpra client %i disconnected.", source.counter)
@@ -861,6 +943,7 @@ class ServerBase(ServerBaseClass):
             "shutdown-server"   : self._process_shutdown_server,
             "exit-server"       : self._process_exit_server,
             "info-request"      : self._process_info_request,
+            "info-subscribe"    : self._process_info_subscribe,
             })
 
     def init_aliases(self):
@@ -629,6 +629,7 @@ class ServerCore:
             script_options = {
                 "/Status"           : self.http_status_request,
                 "/Info"             : self.http_info_request,
+                "/metrics"          : self.http_metrics_request,
                 "/Sessions"         : self.http_sessions_request,
                 "/Displays"         : self.http_displays_request,
                 }
@@ -1296,6 +1297,7 @@ class ServerCore:
             """ adds xpra protocol tweaks after creating the instance """
             protocol = protocol_class(self, conn, self.process_packet)
             protocol.large_packets.append("info-response")
+            protocol.large_packets.append("info-update")
             protocol.receive_aliases.update(self._aliases)
             return protocol
         return self.do_make_protocol(socktype, conn, socket_options, xpra_protocol_class, pre_read)
@@ -1611,6 +1613,16 @@ class ServerCore:
             "uuid"              : self.uuid,
             }
 
+    def http_metrics_request(self, handler):
+        from xpra.server import metrics  #pylint: disable=import-outside-toplevel
+        metrics.registry.add_collector(self.collect_metrics)
+        return self.send_http_response(handler, metrics.registry.generate(), metrics.CONTENT_TYPE)
+
+    def collect_metrics(self, _registry):
+        from xpra.server import metrics  #pylint: disable=import-outside-toplevel
+        metrics.UPTIME.set(time()-self.start_time)
+        metrics.CONNECTIONS.set(len(self._potential_protocols))
+
     def http_status_request(self, handler):
         return self.send_http_response(handler, "ready")
 
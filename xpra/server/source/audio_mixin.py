@@ -54,6 +54,8 @@ class AudioMixin(StubSourceMixin):
         self.sound_receive = False
         self.sound_send = False
         self.sound_bundle_metadata = False
+        self.sound_bundle_delay = -1
+        self.sound_opus_fec = False
         self.sound_fade_timer = None
         self.new_stream_timers = {}
 
@@ -97,6 +99,9 @@ class AudioMixin(StubSourceMixin):
         self.sound_receive = c.boolget("sound.receive")
         self.sound_send = c.boolget("sound.send")
         self.sound_bundle_metadata = c.boolget("sound.bundle-metadata")
+        #the latency budget the client is willing to accept for bundling frames:
+        self.sound_bundle_delay = c.intget("sound.bundle-delay", -1)
+        self.sound_opus_fec = c.boolget("sound.opus-fec")
         log("pulseaudio id=%s, cookie-hash=%s, server=%s, sound decoders=%s, sound encoders=%s, receive=%s, send=%s",
                  self.pulseaudio_id, self.pulseaudio_cookie_hash, self.pulseaudio_server,
                  self.sound_decoders, self.sound_encoders, self.sound_receive, self.sound_send)
@@ -104,9 +109,12 @@ class AudioMixin(StubSourceMixin):
     def get_caps(self) -> dict:
         if not self.wants_sound or not self.sound_properties:
             return {}
+        from xpra.sound.gstreamer_util import BUNDLE_DELAY, OPUS_FEC
         sound_props = self.sound_properties.copy()
         sound_props.update({
             "codec-full-names"  : True,
+            "bundle-delay"      : BUNDLE_DELAY,
+            "opus-fec"          : OPUS_FEC,
             "encoders"          : self.speaker_codecs,
             "decoders"          : self.microphone_codecs,
             "send"              : self.supports_speaker and len(self.speaker_codecs)>0,
@@ -195,15 +203,21 @@ class AudioMixin(StubSourceMixin):
             return None
         try:
             from xpra.sound.wrapper import start_sending_sound
+            from xpra.sound.gstreamer_util import get_fec_encoder_options, BUNDLE_MAX_FRAMES
             plugins = self.sound_properties.strtupleget("plugins")
+            codec_options = get_fec_encoder_options(codec) if self.sound_opus_fec else {}
             ss = start_sending_sound(plugins, self.sound_source_plugin,
                                      None, codec, volume, True, [codec],
-                                     self.pulseaudio_server, self.pulseaudio_id)
+                                     self.pulseaudio_server, self.pulseaudio_id,
+                                     codec_options)
             self.sound_source = ss
             log("start_sending_sound() sound source=%s", ss)
             if not ss:
                 return None
             ss.sequence = self.sound_source_sequence
+            bundle_delay = self.get_sound_bundle_delay()
+            if bundle_delay>0:
+                ss.set_bundle(bundle_delay, BUNDLE_MAX_FRAMES)
             ss.connect("new-buffer", new_buffer or self.new_sound_buffer)
             ss.connect("new-stream", new_stream or self.new_stream)
             ss.connect("info", self.sound_source_info)
@@ -221,6 +235,15 @@ class AudioMixin(StubSourceMixin):
                 #tell the client we're not sending anything:
                 self.send_eos(codec)
 
+    def get_sound_bundle_delay(self) -> int:
+        #the frames are bundled using 'packet_metadata':
+        if not self.sound_bundle_metadata:
+            return 0
+        from xpra.sound.gstreamer_util import BUNDLE_DELAY
+        if self.sound_bundle_delay>=0:
+            return min(BUNDLE_DELAY, self.sound_bundle_delay)
+        return BUNDLE_DELAY
+
     def sound_source_error(self, source, message):
         #this should be printed to stderr by the sound process already
         if source==self.sound_source:
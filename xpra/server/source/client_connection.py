@@ -29,6 +29,8 @@ BANDWIDTH_DETECTION = envbool("XPRA_BANDWIDTH_DETECTION", True)
 MIN_BANDWIDTH = envint("XPRA_MIN_BANDWIDTH", 5*1024*1024)
 AUTO_BANDWIDTH_PCT = envint("XPRA_AUTO_BANDWIDTH_PCT", 80)
 assert 1<AUTO_BANDWIDTH_PCT<=100, "invalid value for XPRA_AUTO_BANDWIDTH_PCT: %i" % AUTO_BANDWIDTH_PCT
+#how long bulk packets (ie: file data) can be delayed by screen updates, in milliseconds:
+BULK_MAX_DELAY = envint("XPRA_BULK_MAX_DELAY", 250)
 YIELD = envbool("XPRA_YIELD", False)
 
 counter = AtomicInteger()
@@ -45,6 +47,8 @@ class ClientConnection(StubSourceMixin):
 
     Strategy: if we have 'ordinary_packets' to send, send those.
     When we don't, then send packets from the 'packet_queue'. (compressed pixels or clipboard data)
+    The 'bulk_packets' (file data) are only sent when the 'packet_queue' is empty,
+    or when they have been waiting for more than BULK_MAX_DELAY.
     See 'next_packet'.
 
     The UI thread calls damage(), which goes into WindowSource and eventually (batching may be involved)
@@ -78,6 +82,8 @@ class ClientConnection(StubSourceMixin):
         self.encode_work_queue = None
         self.encode_thread = None
         self.ordinary_packets = []
+        #low priority packets, sent when there are no screen updates waiting:
+        self.bulk_packets = deque()
         self.socket_dir = socket_dir
         self.unix_socket_paths = unix_socket_paths
         self.log_disconnect = log_disconnect
@@ -98,6 +104,7 @@ class ClientConnection(StubSourceMixin):
     def init_state(self):
         self.hello_sent = False
         self.info_namespace = False
+        self.info_subscription = None
         self.share = False
         self.lock = False
         self.control_commands = ()
@@ -174,6 +181,10 @@ class ClientConnection(StubSourceMixin):
         self.soft_bandwidth_limit = bandwidth_limit
         bandwidthlog("update_bandwidth_limits() bandwidth_limit=%s, soft bandwidth limit=%s",
                      self.bandwidth_limit, bandwidth_limit)
+        #file transfers get their own share:
+        set_file_transfer_bandwidth_limit = getattr(self, "set_file_transfer_bandwidth_limit", None)
+        if set_file_transfer_bandwidth_limit:
+            set_file_transfer_bandwidth_limit(bandwidth_limit)
         #figure out how to distribute the bandwidth amongst the windows,
         #we use the window size,
         #(we should use the number of bytes actually sent: framerate, compression, etc..)
@@ -322,9 +333,13 @@ class ClientConnection(StubSourceMixin):
         if not self.is_closed():
             if self.ordinary_packets:
                 packet, synchronous, fail_cb, will_have_more = self.ordinary_packets.pop(0)
+            elif self.bulk_packets and (not self.packet_queue or
+                                        monotonic_time()-self.bulk_packets[0][-1]>=BULK_MAX_DELAY/1000):
+                #don't let the screen updates starve the bulk data:
+                packet, synchronous, fail_cb, will_have_more, _ = self.bulk_packets.popleft()
             elif self.packet_queue:
                 packet, _, _, start_send_cb, end_send_cb, fail_cb, will_have_more = self.packet_queue.popleft()
-            have_more = packet is not None and (self.ordinary_packets or self.packet_queue)
+            have_more = packet is not None and bool(self.ordinary_packets or self.packet_queue or self.bulk_packets)
         return packet, start_send_cb, end_send_cb, fail_cb, synchronous, have_more, will_have_more
 
     def send(self, *parts, **kwargs):
@@ -337,6 +352,16 @@ class ClientConnection(StubSourceMixin):
             self.ordinary_packets.append((parts, synchronous, fail_cb, will_have_more))
             p.source_has_more()
 
+    def send_bulk(self, *parts, **kwargs):
+        """ This method queues bulk data packets (lowest priority) """
+        synchronous = kwargs.get("synchronous", True)
+        will_have_more = kwargs.get("will_have_more", not synchronous)
+        fail_cb = kwargs.get("fail_cb", None)
+        p = self.protocol
+        if p:
+            self.bulk_packets.append((parts, synchronous, fail_cb, will_have_more, monotonic_time()))
+            p.source_has_more()
+
     def send_more(self, *parts, **kwargs):
         kwargs["will_have_more"] = True
         self.send(*parts, **kwargs)
@@ -368,6 +393,9 @@ class ClientConnection(StubSourceMixin):
             info.update({
                          "connection"       : p.get_info(),
                          })
+        sub = self.info_subscription
+        if sub:
+            info["info-subscription"] = sub.get_info()
         info.update(self.get_features_info())
         return info
 
@@ -382,6 +410,9 @@ class ClientConnection(StubSourceMixin):
     def send_info_response(self, info):
         self.send_async("info-response", notypedict(info))
 
+    def send_info_delta(self, changed, removed):
+        self.send_async("info-update", notypedict(changed), removed)
+
 
     def send_setting_change(self, setting, value):
         #we always subclass InfoMixin which defines "client_setting_change":
@@ -40,6 +40,8 @@ class ClipboardConnection(StubSourceMixin):
         self.clipboard_client_selections = CLIPBOARDS
         self.clipboard_preferred_targets = ()
         self.clipboard_contents_slice_fix = False
+        self.clipboard_chunks = False
+        self.clipboard_cache = False
 
     def cleanup(self):
         self.cancel_clipboard_progress_timer()
@@ -53,6 +55,8 @@ class ClipboardConnection(StubSourceMixin):
         self.clipboard_want_targets = c.boolget("clipboard.want_targets")
         self.clipboard_client_selections = c.strtupleget("clipboard.selections", CLIPBOARDS)
         self.clipboard_contents_slice_fix = c.boolget("clipboard.contents-slice-fix")
+        self.clipboard_chunks = c.boolget("clipboard.chunks")
+        self.clipboard_cache = c.boolget("clipboard.cache")
         self.clipboard_preferred_targets = c.strtupleget("clipboard.preferred-targets", ())
         log("client clipboard: greedy=%s, want_targets=%s, client_selections=%s, contents_slice_fix=%s",
             self.clipboard_greedy, self.clipboard_want_targets,
@@ -70,6 +74,8 @@ class ClipboardConnection(StubSourceMixin):
                 "preferred-targets"     : self.clipboard_preferred_targets,
                 "selections"            : self.clipboard_client_selections,
                 "contents-slice-fix"    : self.clipboard_contents_slice_fix,
+                "chunks"                : self.clipboard_chunks,
+                "cache"                 : self.clipboard_cache,
                 },
             }
 
@@ -105,6 +111,10 @@ class ClipboardConnection(StubSourceMixin):
             return
         if getattr(self, "suspended", False):
             return
+        if packet[0] in ("clipboard-contents-chunk", "clipboard-contents-chunk-ack"):
+            #chunks are part of a request we have already accounted for:
+            self.queue_encode((True, self.compress_clipboard, packet))
+            return
         now = monotonic_time()
         self.clipboard_stats.append(now)
         if len(self.clipboard_stats)>=MAX_CLIPBOARD_LIMIT:
@@ -6,7 +6,7 @@
 
 import os
 
-from xpra.util import envbool, typedict
+from xpra.util import envbool, envint, typedict
 from xpra.os_util import get_machine_id, bytestostr
 from xpra.net.file_transfer import FileTransferHandler
 from xpra.server.source.stub_source_mixin import StubSourceMixin
@@ -16,6 +16,8 @@ log = Logger("printing")
 
 ADD_LOCAL_PRINTERS = envbool("XPRA_ADD_LOCAL_PRINTERS", False)
 PRINTER_LOCATION_STRING = os.environ.get("XPRA_PRINTER_LOCATION_STRING", "via xpra")
+#the share of the bandwidth available to file transfers:
+FILE_TRANSFER_BANDWIDTH_PCT = envint("XPRA_FILE_TRANSFER_BANDWIDTH_PCT", 25)
 
 def printer_name(name):
     try:
@@ -42,6 +44,7 @@ class FilePrintMixin(FileTransferHandler, StubSourceMixin):
 
     def cleanup(self):
         self.remove_printers()
+        FileTransferHandler.cleanup(self)
 
     def parse_client_caps(self, c : dict):
         FileTransferHandler.parse_file_transfer_caps(self, c)
@@ -62,6 +65,16 @@ class FilePrintMixin(FileTransferHandler, StubSourceMixin):
                   "file_ask_timeout", "open_command"):
             setattr(self, x, getattr(server.file_transfer, x))
 
+    ######################################################################
+    # file transfers:
+    def send_file_chunk(self, *parts):
+        #screen updates take priority over file data:
+        self.send_bulk(*parts)
+
+    def set_file_transfer_bandwidth_limit(self, bandwidth_limit : int):
+        #bandwidth_limit is in bits per second, zero for unlimited:
+        self.set_file_transfer_rate_limit(bandwidth_limit*FILE_TRANSFER_BANDWIDTH_PCT//100//8)
+
     ######################################################################
     # printing:
     def set_printers(self, printers, password_file, auth, encryption, encryption_keyfile):
@@ -10,6 +10,7 @@ import time
 from xpra.util import envbool, envint, typedict, CLIENT_PING_TIMEOUT
 from xpra.os_util import monotonic_time, POSIX
 from xpra.server.source.stub_source_mixin import StubSourceMixin
+from xpra.server.metrics import METRICS, PING_LATENCY
 from xpra.log import Logger
 
 log = Logger("network")
@@ -108,9 +109,13 @@ class NetworkStateMixin(StubSourceMixin):
         stats = getattr(self, "statistics", None)
         if stats and 0<client_ping_latency<60:
             stats.client_ping_latency.append((monotonic_time(), client_ping_latency))
+            if METRICS:
+                PING_LATENCY.observe(client_ping_latency, "client")
         self.client_load = l1, l2, l3
         if 0<=server_ping_latency<60000 and stats:
             stats.server_ping_latency.append((monotonic_time(), server_ping_latency/1000.0))
+            if METRICS:
+                PING_LATENCY.observe(server_ping_latency/1000.0, "server")
         log("ping echo client load=%s, measured server latency=%s", self.client_load, server_ping_latency)
 
 
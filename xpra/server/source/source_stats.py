@@ -14,6 +14,7 @@ from xpra.server.cystats import (                                           #@Un
     calculate_for_target, time_weighted_average, queue_inspect,             #@UnresolvedImport
     )
 from xpra.simple_stats import get_list_stats
+from xpra.server.metrics import METRICS, FRAME_LATENCY
 from xpra.os_util import monotonic_time
 from xpra.log import Logger
 
@@ -99,6 +100,8 @@ class GlobalPerformanceStatistics:
             self.min_client_latency = send_latency
         self.client_latency.append((wid, now, pixels, send_latency))
         self.frame_total_latency.append((wid, now, pixels, latency))
+        if METRICS:
+            FRAME_LATENCY.observe(latency/1000)
 
     def get_damage_pixels(self, wid):
         """ returns the list of (event_time, pixelcount) for the given window id """
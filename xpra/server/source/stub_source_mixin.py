@@ -77,5 +77,8 @@ class StubSourceMixin:
     def send_more(self, *parts, **kwargs):
         pass
 
+    def send_bulk(self, *parts, **kwargs):
+        pass
+
     def send_async(self, *parts, **kwargs):
         pass
@@ -588,7 +588,7 @@ class WindowsMixin(StubSourceMixin):
         ws = self.make_window_source(wid, window)
         ws.damage(x, y, w, h, damage_options)
 
-    def client_ack_damage(self, damage_packet_sequence, wid, width, height, decode_time, message):
+    def client_ack_damage(self, damage_packet_sequence, wid, width, height, decode_time, message, client_trace=None):
         """
             The client is acknowledging a damage packet,
             we record the 'client decode time' (which is provided by the client)
@@ -602,13 +602,17 @@ class WindowsMixin(StubSourceMixin):
             self.statistics.client_decode_time.append((wid, monotonic_time(), width*height, decode_time))
         ws = self.window_sources.get(wid)
         if ws:
-            ws.damage_packet_acked(damage_packet_sequence, width, height, decode_time, message)
+            ws.damage_packet_acked(damage_packet_sequence, width, height, decode_time, message, client_trace)
             self.may_recalculate(wid, width*height)
 
 #
 # Methods used by WindowSource:
 #
     def record_congestion_event(self, source, late_pct=0, send_speed=0):
+        #the file transfers should make way for the screen updates:
+        file_transfer_congestion = getattr(self, "file_transfer_congestion", None)
+        if file_transfer_congestion:
+            file_transfer_congestion()
         if not self.bandwidth_detection:
             return
         gs = self.statistics
@@ -0,0 +1,146 @@
+# This file is part of Xpra.
+# Copyright (C) 2021 Antoine Martin <antoine@xpra.org>
+# Xpra is released under the terms of the GNU GPL v2, or, at your option, any
+# later version. See the file COPYING for details.
+
+"""
+Records the time spent in each stage of the screen update pipeline
+for a sample of the frames:
+batch delay, capture, encode queue, encode, send queue, network send,
+client decode, client paint and the acknowledgement.
+The spans can be exported in the Chrome trace event format,
+which can be loaded in chrome://tracing or https://ui.perfetto.dev
+"""
+
+import os
+import json
+from threading import Lock
+from collections import deque
+
+from xpra.util import envint
+from xpra.log import Logger
+
+log = Logger("damage")
+
+#trace one frame out of N, zero disables tracing:
+FRAME_TRACE_SAMPLE = max(0, envint("XPRA_FRAME_TRACE_SAMPLE", 0))
+#maximum number of frames we keep:
+FRAME_TRACE_BUFFER = max(100, envint("XPRA_FRAME_TRACE_BUFFER", 10000))
+#maximum number of traces waiting for the client's acknowledgement, per window:
+MAX_PENDING_TRACES = 256
+
+#each stage is shown on its own track:
+TRACKS = ("ui", "encode", "network", "client")
+
+
+class FrameTrace:
+    __slots__ = ("wid", "sequence", "args", "spans")
+
+    def __init__(self, wid : int, sequence : int):
+        self.wid = wid
+        self.sequence = sequence
+        self.args = {}
+        #(name, track, start, end), times are in seconds:
+        self.spans = []
+
+    def __repr__(self):
+        return "FrameTrace(%i:%i)" % (self.wid, self.sequence)
+
+    def span(self, name : str, track : str, start : float, end : float):
+        if start>0 and end>=start:
+            self.spans.append((name, track, start, end))
+
+
+class FrameTracer:
+
+    def __init__(self, sample=FRAME_TRACE_SAMPLE, buffer_size=FRAME_TRACE_BUFFER):
+        self.sample = sample
+        self.counter = 0
+        self.lock = Lock()
+        self.events = deque(maxlen=buffer_size)
+        self.frames = 0
+
+    def __repr__(self):
+        return "FrameTracer(1/%i)" % self.sample
+
+    def get_info(self) -> dict:
+        return {
+            "sample"    : self.sample,
+            "frames"    : self.frames,
+            "buffered"  : len(self.events),
+            }
+
+    def start(self, sample=1):
+        self.sample = max(1, sample)
+        log.info("tracing one frame out of %i", self.sample)
+
+    def stop(self):
+        self.sample = 0
+        log.info("frame tracing stopped, %i frames recorded", self.frames)
+
+    def clear(self):
+        with self.lock:
+            self.events.clear()
+            self.frames = 0
+
+    def new_trace(self, wid : int, sequence : int):
+        """ returns a FrameTrace if this frame is sampled, None otherwise """
+        sample = self.sample
+        if not sample:
+            return None
+        self.counter += 1
+        if self.counter % sample:
+            return None
+        return FrameTrace(wid, sequence)
+
+    def record(self, trace : FrameTrace):
+        with self.lock:
+            self.frames += 1
+            self.events.append(trace)
+
+    def get_trace_events(self) -> list:
+        with self.lock:
+            traces = tuple(self.events)
+        pid = os.getpid()
+        events = [{
+            "name"  : "process_name",
+            "ph"    : "M",
+            "pid"   : pid,
+            "args"  : {"name" : "xpra server %i" % pid},
+            }]
+        for tid, track in enumerate(TRACKS):
+            events.append({
+                "name"  : "thread_name",
+                "ph"    : "M",
+                "pid"   : pid,
+                "tid"   : tid,
+                "args"  : {"name" : track},
+                })
+        for trace in traces:
+            args = dict(trace.args)
+            args.update({
+                "wid"       : trace.wid,
+                "sequence"  : trace.sequence,
+                })
+            for name, track, start, end in trace.spans:
+                events.append({
+                    "name"  : name,
+                    "cat"   : "frame",
+                    "ph"    : "X",
+                    "pid"   : pid,
+                    "tid"   : TRACKS.index(track),
+                    "ts"    : int(start*1000000),
+                    "dur"   : int((end-start)*1000000),
+                    "args"  : args,
+                    })
+        return events
+
+    def save(self, filename : str) -> int:
+        events = self.get_trace_events()
+        with open(filename, "w") as f:
+            json.dump({"traceEvents" : events, "displayTimeUnit" : "ms"}, f)
+        log("saved %i trace events to '%s'", len(events), filename)
+        return len(events)
+
+
+tracer = FrameTracer()
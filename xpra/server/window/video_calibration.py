@@ -0,0 +1,349 @@
+# This file is part of Xpra.
+# Copyright (C) 2021 Antoine Martin <antoine@xpra.org>
+# Xpra is released under the terms of the GNU GPL v2, or, at your option, any
+# later version. See the file COPYING for details.
+
+"""
+Measures the actual performance of the video encoders and csc modules:
+the time it takes to process each megapixel at each speed setting,
+the setup time and the output bitrate at each quality setting.
+Once we have enough samples, the pipeline scoring uses these figures
+instead of the static values declared in the codec specs.
+The measured values are scaled so that, on average, they match the static values
+of the same codecs: a measured codec must not win (or lose) against the codecs
+we have not measured yet just because the two scales are different.
+The measurements are saved to a file so that they can be re-used the next time.
+"""
+
+import os
+import json
+from threading import Lock
+
+from xpra.util import envint, envbool
+from xpra.os_util import monotonic_time
+from xpra.log import Logger
+
+log = Logger("score")
+
+VIDEO_CALIBRATION = envbool("XPRA_VIDEO_CALIBRATION", True)
+VIDEO_CALIBRATION_FILE = os.environ.get("XPRA_VIDEO_CALIBRATION_FILE", "~/.xpra/video-calibration.json")
+#number of frames we need to measure before we trust the figures:
+MIN_SAMPLES = max(1, envint("XPRA_VIDEO_CALIBRATION_MIN_SAMPLES", 50))
+MIN_SETUPS = 3
+#how often we save the measurements, in seconds:
+SAVE_DELAY = 60
+#weight of each new sample in the moving averages:
+WEIGHT = 0.05
+#the encode time per megapixel (in ms) which maps to a speed of 50:
+SPEED_REF = 10
+#the setup time (in ms) which maps to a setup cost of 50:
+SETUP_REF = 50
+#maximum score adjustment for encoders that produce less (or more) data than the others:
+MAX_EFFICIENCY_BOOST = 20
+
+ENTRY_KEYS = ("frames", "encode", "setups", "setup", "bpp")
+
+
+def get_encoder_key(codec_type : str, encoding : str) -> str:
+    return "%s:%s" % (codec_type, encoding)
+
+def get_quality_bucket(quality : int) -> str:
+    #json only allows string keys:
+    return str(max(0, min(4, quality//20)))
+
+def get_speed_bucket(speed : int) -> str:
+    return str(max(0, min(4, speed//20)))
+
+def average(old : float, value : float, count : int) -> float:
+    #cumulative average for the first samples, then exponential:
+    w = max(WEIGHT, 1.0/max(1, count))
+    return old*(1-w) + value*w
+
+
+class CalibratedSpec:
+    """
+        Wraps a codec spec and overrides some of its attributes
+        with the values derived from our measurements.
+    """
+
+    def __init__(self, spec, **values):
+        self.spec = spec
+        self.calibrated = values
+        self.__dict__.update(values)
+
+    def __repr__(self):
+        return "%r*" % (self.spec, )
+
+    def __getattr__(self, attr):
+        return getattr(self.spec, attr)
+
+
+class VideoCalibration:
+
+    def __init__(self, filename=VIDEO_CALIBRATION_FILE, enabled=VIDEO_CALIBRATION):
+        self.filename = os.path.expanduser(filename) if filename else ""
+        self.enabled = enabled
+        self.lock = Lock()
+        self.entries = None
+        self.dirty = False
+        self.last_save = monotonic_time()
+        self.save_pending = False
+        #key -> static values from the codec spec:
+        self.spec_values = {}
+
+    def __repr__(self):
+        return "VideoCalibration(%s)" % self.filename
+
+    def load(self) -> dict:
+        if self.entries is None:
+            entries = {}
+            if self.filename and os.path.exists(self.filename):
+                try:
+                    with open(self.filename, "r") as f:
+                        data = json.load(f)
+                    assert isinstance(data, dict)
+                    for key, entry in data.items():
+                        if isinstance(entry, dict) and all(x in entry for x in ENTRY_KEYS) and \
+                            isinstance(entry["encode"], dict):
+                            entries[key] = entry
+                except Exception as e:
+                    log("failed to load %s", self.filename, exc_info=True)
+                    log.warn("Warning: ignoring invalid video calibration file '%s'", self.filename)
+                    log.warn(" %s", e)
+                    entries = {}
+            self.entries = entries
+        return self.entries
+
+    def save(self):
+        with self.lock:
+            self.save_pending = False
+            if not self.filename or not self.dirty:
+                return
+            data = json.dumps(self.entries, indent=1, sort_keys=True)
+            self.dirty = False
+            self.last_save = monotonic_time()
+        tmp = "%s.%i.tmp" % (self.filename, os.getpid())
+        try:
+            os.makedirs(os.path.dirname(self.filename), mode=0o700, exist_ok=True)
+            with open(tmp, "w") as f:
+                f.write(data)
+            os.replace(tmp, self.filename)
+        except OSError as e:
+            log("failed to save %s", self.filename, exc_info=True)
+            log.warn("Warning: failed to save the video calibration file '%s'", self.filename)
+            log.warn(" %s", e)
+            try:
+                os.unlink(tmp)
+            except OSError:
+                pass
+        else:
+            log("video calibration saved to '%s'", self.filename)
+
+    def may_save(self):
+        #this is called from the encode thread, write the file from the main loop:
+        if self.dirty and not self.save_pending and monotonic_time()-self.last_save>=SAVE_DELAY:
+            self.save_pending = True
+            from gi.repository import GLib
+            GLib.idle_add(self.save)
+
+    def get_entry(self, key : str) -> dict:
+        entries = self.load()
+        entry = entries.get(key)
+        if entry is None:
+            entry = entries[key] = {
+                "frames"    : 0,
+                "encode"    : {},
+                "setups"    : 0,
+                "setup"     : 0,
+                "bpp"       : {},
+                }
+        return entry
+
+
+    def record_setup(self, key : str, elapsed : float):
+        """ records the time it took to initialize a new context, in seconds """
+        if not self.enabled:
+            return
+        with self.lock:
+            entry = self.get_entry(key)
+            entry["setups"] += 1
+            entry["setup"] = average(entry["setup"], elapsed*1000, entry["setups"])
+            self.dirty = True
+
+    def record_encode(self, key : str, pixels : int, elapsed : float, speed : int, size : int=0, quality : int=-1):
+        """
+            records the time it took to process this many pixels at this speed setting, in seconds,
+            and for encoders, the size of the output and the quality used
+        """
+        if not self.enabled or pixels<=0:
+            return
+        with self.lock:
+            entry = self.get_entry(key)
+            entry["frames"] += 1
+            mpixels = pixels/1024.0/1024.0
+            bucket = get_speed_bucket(speed)
+            count, ms = entry["encode"].get(bucket, (0, 0))
+            count += 1
+            entry["encode"][bucket] = (count, average(ms, elapsed*1000/mpixels, count))
+            if size>0 and quality>=0:
+                bucket = get_quality_bucket(quality)
+                count, bpp = entry["bpp"].get(bucket, (0, 0))
+                count += 1
+                entry["bpp"][bucket] = (count, average(bpp, size*8.0/pixels, count))
+            self.dirty = True
+        self.may_save()
+
+
+    def get_encode_time(self, key : str, speed : int=-1):
+        """
+            the measured encode time per megapixel at this speed setting,
+            or the average over all the speed settings when speed is negative
+        """
+        entry = self.load().get(key)
+        if not entry:
+            return None
+        if speed>=0:
+            count, ms = entry["encode"].get(get_speed_bucket(speed), (0, 0))
+        else:
+            buckets = tuple(entry["encode"].values())
+            count = sum(c for c, _ in buckets)
+            ms = sum(c*v for c, v in buckets)/max(1, count)
+        if count<MIN_SAMPLES:
+            return None
+        return ms
+
+    def get_speed(self, key : str, speed : int=-1):
+        """ the measured encode time mapped to the 0-100 speed scale of the codec specs """
+        ms = self.get_encode_time(key, speed)
+        if ms is None:
+            return None
+        return round(100*SPEED_REF/(SPEED_REF+ms))
+
+    def get_setup_cost(self, key : str):
+        """ the measured setup time mapped to the 0-100 setup cost scale of the codec specs """
+        entry = self.load().get(key)
+        if not entry or entry["setups"]<MIN_SETUPS:
+            return None
+        return round(100*entry["setup"]/(SETUP_REF+entry["setup"]))
+
+    def register_specs(self, encoder_specs=(), csc_specs=()):
+        """
+            records the static values of all the candidates of a scoring pass
+            before calibrating any of them,
+            so that they are all scaled against the same set of codecs
+        """
+        values = {}
+        for spec in encoder_specs:
+            values[get_encoder_key(spec.codec_type, spec.encoding)] = spec
+        for spec in csc_specs:
+            values[spec.codec_type] = spec
+        with self.lock:
+            for key, spec in values.items():
+                self.spec_values[key] = {
+                    "speed"         : spec.speed,
+                    "setup_cost"    : spec.setup_cost,
+                    }
+
+    def get_scale(self, key : str, attr : str, get_measured) -> float:
+        """
+            the ratio between the static values and the measured values,
+            for all the registered codecs of the same kind (encoders or csc) we have both for
+        """
+        encoder = key.find(":")>0
+        static = measured = 0
+        with self.lock:
+            spec_values = tuple(self.spec_values.items())
+        for k, values in spec_values:
+            if (k.find(":")>0)!=encoder:
+                continue
+            v = get_measured(k)
+            if v is not None:
+                static += values[attr]
+                measured += v
+        if static<=0 or measured<=0:
+            return 1
+        return static/measured
+
+    def get_bpp(self, key : str, quality : int):
+        entry = self.load().get(key)
+        if not entry:
+            return None
+        count, bpp = entry["bpp"].get(get_quality_bucket(quality), (0, 0))
+        if count<MIN_SAMPLES:
+            return None
+        return bpp
+
+    def get_efficiency_boost(self, key : str, quality : int) -> int:
+        """
+            compares the bitrate of this encoder with the other encoders
+            we have measured at the same quality level
+        """
+        bpp = self.get_bpp(key, quality)
+        if not bpp:
+            return 0
+        others = []
+        for k in tuple(self.load().keys()):
+            if k!=key and k.find(":")>0:
+                v = self.get_bpp(k, quality)
+                if v:
+                    others.append(v)
+        if not others:
+            return 0
+        mean = (bpp+sum(others))/(1+len(others))
+        boost = int(MAX_EFFICIENCY_BOOST*2*(mean-bpp)/mean)
+        return max(-MAX_EFFICIENCY_BOOST, min(MAX_EFFICIENCY_BOOST, boost))
+
+    def calibrate(self, spec, key : str, quality : int=-1, target_speed : int=-1):
+        """
+            returns the spec unchanged if we don't have enough measurements yet,
+            or a CalibratedSpec using the measured values.
+            The specs should have been registered first, see register_specs().
+        """
+        if not self.enabled or not spec:
+            return spec
+        values = {}
+        def get_speed(k):
+            return self.get_speed(k, target_speed)
+        speed = get_speed(key)
+        if speed is not None:
+            values["speed"] = max(0, min(100, round(speed*self.get_scale(key, "speed", get_speed))))
+        setup_cost = self.get_setup_cost(key)
+        if setup_cost is not None:
+            scale = self.get_scale(key, "setup_cost", self.get_setup_cost)
+            values["setup_cost"] = max(0, min(100, round(setup_cost*scale)))
+        if quality>=0:
+            boost = self.get_efficiency_boost(key, quality)
+            if boost:
+                values["score_boost"] = spec.score_boost+boost
+        if not values:
+            return spec
+        return CalibratedSpec(spec, **values)
+
+    def get_spec_info(self, key : str) -> dict:
+        entry = self.load().get(key)
+        if not entry:
+            return {}
+        info = {
+            "frames"        : entry["frames"],
+            "encode-time"   : dict((int(bucket)*20, round(ms, 3)) for bucket, (_, ms) in tuple(entry["encode"].items())),
+            "setups"        : entry["setups"],
+            "setup-time"    : round(entry["setup"], 3),
+            "bpp"           : dict((int(bucket)*20, round(bpp, 4)) for bucket, (_, bpp) in tuple(entry["bpp"].items())),
+            }
+        speed = self.get_speed(key)
+        if speed is not None:
+            info["speed"] = speed
+        setup_cost = self.get_setup_cost(key)
+        if setup_cost is not None:
+            info["setup-cost"] = setup_cost
+        return info
+
+    def get_info(self) -> dict:
+        return {
+            "enabled"   : self.enabled,
+            "file"      : self.filename,
+            "min-samples" : MIN_SAMPLES,
+            }
+
+
+calibration = VideoCalibration()
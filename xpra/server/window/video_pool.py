@@ -0,0 +1,115 @@
+# This file is part of Xpra.
+# Copyright (C) 2021 Antoine Martin <antoine@xpra.org>
+# Xpra is released under the terms of the GNU GPL v2, or, at your option, any
+# later version. See the file COPYING for details.
+
+"""
+Keeps the csc contexts replaced by a new video pipeline around for a little while,
+so that we can re-use them if the same configuration is needed again.
+(ie: when switching back and forth between video encoders or pipeline options)
+
+Video encoders are not pooled: they hold the state of the stream (reference frames)
+and the client discards its decoder whenever we start a new stream.
+"""
+
+from xpra.util import envint
+from xpra.os_util import monotonic_time
+from xpra.log import Logger
+
+log = Logger("encoding", "csc")
+
+#maximum number of idle contexts we keep for each window, zero disables the pool:
+VIDEO_POOL_SIZE = max(0, envint("XPRA_VIDEO_POOL_SIZE", 2))
+#idle contexts are freed after this delay, in seconds:
+VIDEO_POOL_TIMEOUT = max(0, envint("XPRA_VIDEO_POOL_TIMEOUT", 10))
+
+
+def get_csc_key(csc_type : str, src_format : str, src_width : int, src_height : int,
+                dst_format : str, dst_width : int, dst_height : int):
+    """
+        The key used for pooling csc contexts,
+        None if the context should not be pooled:
+        when scaling, the filter used depends on the speed setting.
+    """
+    if src_width!=dst_width or src_height!=dst_height:
+        return None
+    return (csc_type, src_format, src_width, src_height, dst_format)
+
+
+class ContextPool:
+    """
+        Not thread safe:
+        the contexts are only ever used from the 'encode' thread.
+    """
+
+    def __init__(self, size=VIDEO_POOL_SIZE, timeout=VIDEO_POOL_TIMEOUT):
+        self.size = size
+        self.timeout = timeout
+        #(key, context, parked time):
+        self.contexts = []
+        self.hits = 0
+        self.misses = 0
+        self.expired = 0
+
+    def __repr__(self):
+        return "ContextPool(%i)" % len(self.contexts)
+
+    def get_info(self) -> dict:
+        return {
+            "size"      : self.size,
+            "idle"      : len(self.contexts),
+            "hits"      : self.hits,
+            "misses"    : self.misses,
+            "expired"   : self.expired,
+            }
+
+    def take(self, key):
+        """ returns an idle context matching this key, or None """
+        if not self.size or key is None:
+            return None
+        for i, (k, context, _) in enumerate(self.contexts):
+            if k==key and not context.is_closed():
+                del self.contexts[i]
+                self.hits += 1
+                log("re-using %s from the pool", context)
+                return context
+        self.misses += 1
+        return None
+
+    def put(self, key, context) -> list:
+        """
+            parks this context in the pool,
+            returns the list of contexts the caller must clean
+        """
+        if not self.size or key is None or context.is_closed():
+            return [context]
+        if any(entry[1] is context for entry in self.contexts):
+            return []
+        now = monotonic_time()
+        self.contexts.append((key, context, now))
+        return self.expire(now)
+
+    def expire(self, now=0) -> list:
+        now = now or monotonic_time()
+        expired = []
+        while len(self.contexts)>self.size:
+            expired.append(self.contexts.pop(0)[1])
+        for entry in tuple(self.contexts):
+            if now-entry[2]>self.timeout:
+                self.contexts.remove(entry)
+                expired.append(entry[1])
+        self.expired += len(expired)
+        return expired
+
+    def get_expire_delay(self, now=0) -> int:
+        """ how long until the oldest idle context expires, in milliseconds, or -1 if there are none """
+        if not self.contexts:
+            return -1
+        now = now or monotonic_time()
+        oldest = min(entry[2] for entry in self.contexts)
+        return max(0, int((oldest+self.timeout-now)*1000))
+
+    def clear(self) -> list:
+        contexts = [entry[1] for entry in self.contexts]
+        self.contexts = []
+        return contexts
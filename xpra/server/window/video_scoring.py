@@ -6,6 +6,7 @@
 
 from xpra.util import envint
 from xpra.codecs.codec_constants import LOSSY_PIXEL_FORMATS
+from xpra.server.window.video_calibration import get_encoder_key
 from xpra.log import Logger
 
 scorelog = Logger("score")
@@ -85,7 +86,7 @@ def get_pipeline_score(enc_in_format, csc_spec, encoder_spec,
                        target_quality : int, min_quality : int,
                        target_speed : int, min_speed : int,
                        current_csce, current_ve,
-                       score_delta : int, ffps : int, detection=True):
+                       score_delta : int, ffps : int, detection=True, calibration=None):
     """
         Given an optional csc step (csc_format and csc_spec), and
         and a required encoding step (encoder_spec and width/height),
@@ -96,9 +97,17 @@ def get_pipeline_score(enc_in_format, csc_spec, encoder_spec,
         Note: we know the current pipeline settings, so the "switching
         cost" will be lower for pipelines that share components with the
         current one.
+        When a calibration object is given, the measured speed, setup cost
+        and bitrate are used in place of the values declared by the specs.
 
         Can be called from any thread.
     """
+    spec_csc, spec_encoder = csc_spec, encoder_spec
+    if calibration:
+        if csc_spec:
+            csc_spec = calibration.calibrate(csc_spec, csc_spec.codec_type, target_speed=target_speed)
+        encoder_spec = calibration.calibrate(encoder_spec, get_encoder_key(encoder_spec.codec_type, encoder_spec.encoding),
+                                             target_quality, target_speed)
     def clamp(v):
         return max(0, min(100, v))
     qscore = clamp(get_quality_score(enc_in_format, csc_spec, encoder_spec, scaling, target_quality, min_quality))
@@ -199,7 +208,7 @@ def get_pipeline_score(enc_in_format, csc_spec, encoder_spec,
              enc_in_format, csc_spec, encoder_spec, width, height,
              qscore, sscore, ecsc_score, ee_score, runtime_score, scaling, encoder_scaling, enc_width, enc_height, sizescore, score_delta,
              cpu_score, gpu_score, score)
-    return score, scaling, csc_scaling, csc_width, csc_height, csc_spec, enc_in_format, encoder_scaling, enc_width, enc_height, encoder_spec
+    return score, scaling, csc_scaling, csc_width, csc_height, spec_csc, enc_in_format, encoder_scaling, enc_width, enc_height, spec_encoder
 
 def get_encoder_dimensions(encoder_spec, width : int, height : int, scaling=(1,1)):
     """
@@ -17,7 +17,12 @@ from xpra.util import envint, envbool, csv, typedict, first_time
 from xpra.common import MAX_WINDOW_SIZE
 from xpra.server.window.windowicon_source import WindowIconSource
 from xpra.server.window.window_stats import WindowPerformanceStatistics
+from xpra.server.metrics import (
+    METRICS, FRAMES, ENCODED_PIXELS, ENCODED_BYTES, ENCODE_TIME,
+    DAMAGE_EVENTS, DAMAGE_IN_LATENCY, DAMAGE_OUT_LATENCY, CLIENT_DECODE_TIME, DECODE_ERRORS,
+    )
 from xpra.server.window.batch_config import DamageBatchConfig
+from xpra.server.window.frame_trace import tracer, MAX_PENDING_TRACES
 from xpra.server.window.batch_delay_calculator import calculate_batch_delay, get_target_speed, get_target_quality
 from xpra.server.cystats import time_weighted_average, logp #@UnresolvedImport
 from xpra.rectangle import rectangle, add_rectangle, remove_rectangle, merge_all   #@UnresolvedImport
@@ -416,6 +421,8 @@ class WindowSource(WindowIconSource):
         self._sequence = 1
         self._damage_cancelled = INFINITY
         self._damage_packet_sequence = 1
+        #sampled frames waiting for the client's ack, by damage packet sequence:
+        self.frame_traces = {}
 
     def cleanup(self):
         self.cancel_damage(INFINITY)
@@ -1361,10 +1368,13 @@ class WindowSource(WindowIconSource):
         if options is None:
             options = {}
         if options.pop("damage", False):
-            damagelog("damage%s wid=%i", (x, y, w, h, options), self.wid)
+            if damagelog.debug_enabled:
+                damagelog("damage%s wid=%i", (x, y, w, h, options), self.wid)
             self.statistics.last_damage_events.append((now, x,y,w,h))
             self.global_statistics.damage_events_count += 1
             self.statistics.damage_events_count += 1
+            if METRICS:
+                DAMAGE_EVENTS.inc()
         if self.window_dimensions != (ww, wh):
             self.statistics.last_resized = now
             self.window_dimensions = ww, wh
@@ -1415,8 +1425,9 @@ class WindowSource(WindowIconSource):
                         continue
                     if override or k not in existing_options:
                         existing_options[k] = options[k]
-            damagelog("do_damage%-24s wid=%s, using existing %i delayed regions created %.1fms ago",
-                (x, y, w, h, options), self.wid, len(regions), now-delayed.damage_time)
+            if damagelog.debug_enabled:
+                damagelog("do_damage%-24s wid=%s, using existing %i delayed regions created %.1fms ago",
+                    (x, y, w, h, options), self.wid, len(regions), now-delayed.damage_time)
             if not self.expire_timer and not self.soft_timer and self.soft_expired==0:
                 log.error("Error: bug, found a delayed region without a timer!")
                 self.expire_timer = self.timeout_add(0, self.expire_delayed_region, now)
@@ -1442,8 +1453,9 @@ class WindowSource(WindowIconSource):
         delay = max(0, delay-elapsed)
         if not self.must_batch(delay):
             #send without batching:
-            damagelog("do_damage%-24s wid=%s, sending now with sequence %s",
-                      (x, y, w, h, options), self.wid, self._sequence)
+            if damagelog.debug_enabled:
+                damagelog("do_damage%-24s wid=%s, sending now with sequence %s",
+                          (x, y, w, h, options), self.wid, self._sequence)
             actual_encoding = options.get("encoding")
             if actual_encoding is None:
                 q = options.get("quality") or self._current_quality
@@ -1927,12 +1939,16 @@ class WindowSource(WindowIconSource):
 
         if self.send_window_size:
             options["window-size"] = self.window_dimensions
+        if tracer.sample:
+            options = dict(options)
+            options["trace-capture"] = rgb_request_time
 
         now = monotonic_time()
         item = (w, h, damage_time, now, image, coding, sequence, options, flush)
         self.call_in_encode_thread(True, self.make_data_packet_cb, *item)
-        log("process_damage_region: wid=%i, sequence=%i, adding pixel data to encode queue (%4ix%-4i - %5s), elapsed time: %3.1f ms, request time: %3.1f ms",
-                self.wid, sequence, w, h, coding, 1000*(now-damage_time), 1000*(now-rgb_request_time))
+        if log.debug_enabled:
+            log("process_damage_region: wid=%i, sequence=%i, adding pixel data to encode queue (%4ix%-4i - %5s), elapsed time: %3.1f ms, request time: %3.1f ms",
+                    self.wid, sequence, w, h, coding, 1000*(now-damage_time), 1000*(now-rgb_request_time))
 
 
     def make_data_packet_cb(self, w, h, damage_time, process_damage_time, image, coding, sequence, options, flush):
@@ -1940,6 +1956,7 @@ class WindowSource(WindowIconSource):
             Extra care must be taken to prevent access to X11 functions on window.
         """
         self.statistics.encoding_pending[sequence] = (damage_time, w, h)
+        encode_start = monotonic_time()
         try:
             packet = self.make_data_packet(damage_time, process_damage_time, image, coding, sequence, options, flush)
         except Exception as e:
@@ -1958,9 +1975,37 @@ class WindowSource(WindowIconSource):
         #because the code may rely on the client having received this frame
         if not packet:
             return
+        if tracer.sample:
+            self.trace_frame(packet, damage_time, process_damage_time, encode_start, options)
         #queue packet for sending:
         self.queue_damage_packet(packet, damage_time, process_damage_time, options)
 
+    def trace_frame(self, packet, damage_time, process_damage_time, encode_start, options):
+        damage_packet_sequence = packet[8]
+        trace = tracer.new_trace(self.wid, damage_packet_sequence)
+        if not trace:
+            return
+        capture_start = options.get("trace-capture", 0)
+        if capture_start:
+            trace.span("batch-delay", "ui", damage_time, capture_start)
+            trace.span("capture", "ui", capture_start, process_damage_time)
+        else:
+            trace.span("batch-delay", "ui", damage_time, process_damage_time)
+        trace.span("encode-queue", "encode", process_damage_time, encode_start)
+        trace.span("encode", "encode", encode_start, monotonic_time())
+        client_options = packet[10]
+        trace.args.update({
+            "encoding"  : bytestostr(packet[6]),
+            "size"      : "%ix%i" % (packet[4], packet[5]),
+            "bytes"     : len(packet[7]),
+            })
+        #ask the client to report its decode and paint times:
+        client_options["trace"] = True
+        traces = self.frame_traces
+        while len(traces)>=MAX_PENDING_TRACES:
+            traces.pop(next(iter(traces)), None)
+        traces[damage_packet_sequence] = trace
+
 
     def schedule_auto_refresh(self, packet, options):
         if not self.can_refresh():
@@ -2173,15 +2218,23 @@ class WindowSource(WindowIconSource):
         ack_pending = [0, coding, 0, 0, 0, width*height, client_options, damage_time]
         statistics = self.statistics
         statistics.damage_ack_pending[damage_packet_sequence] = ack_pending
+        trace = self.frame_traces.get(damage_packet_sequence)
+        queued_at = monotonic_time()
         def start_send(bytecount):
             ack_pending[0] = monotonic_time()
             ack_pending[2] = bytecount
+            if trace:
+                trace.span("send-queue", "network", queued_at, ack_pending[0])
         def damage_packet_sent(bytecount):
             now = monotonic_time()
             ack_pending[3] = now
             ack_pending[4] = bytecount
+            if trace:
+                trace.span("network-write", "network", ack_pending[0], now)
             if process_damage_time>0:
                 statistics.damage_out_latency.append((now, width*height, actual_batch_delay, now-process_damage_time))
+                if METRICS:
+                    DAMAGE_OUT_LATENCY.observe(now-process_damage_time)
             elapsed_ms = int((now-ack_pending[0])*1000)
             #only record slow send as congestion events
             #if the bandwidth limit is already below the threshold:
@@ -2197,6 +2250,8 @@ class WindowSource(WindowIconSource):
             now = monotonic_time()
             damage_in_latency = now-process_damage_time
             statistics.damage_in_latency.append((now, width*height, actual_batch_delay, damage_in_latency))
+            if METRICS:
+                DAMAGE_IN_LATENCY.observe(damage_in_latency)
         #log.info("queuing %s packet with fail_cb=%s", coding, fail_cb)
         self.statistics.last_packet_time = monotonic_time()
         self.queue_packet(packet, self.wid, width*height, start_send, damage_packet_sent,
@@ -2269,7 +2324,7 @@ class WindowSource(WindowIconSource):
         return int(10*logp(bytecount/1024.0))
 
 
-    def damage_packet_acked(self, damage_packet_sequence, width, height, decode_time, message):
+    def damage_packet_acked(self, damage_packet_sequence, width, height, decode_time, message, client_trace=None):
         """
             The client is acknowledging a damage packet,
             we record the 'client decode time' (provided by the client itself)
@@ -2279,10 +2334,18 @@ class WindowSource(WindowIconSource):
             (warning: this runs from the non-UI network parse thread,
             don't access the window from here!)
         """
-        statslog("packet decoding sequence %s for window %s: %sx%s took %.1fms",
-                      damage_packet_sequence, self.wid, width, height, decode_time/1000.0)
+        if self.frame_traces:
+            trace = self.frame_traces.pop(damage_packet_sequence, None)
+            if trace:
+                self.complete_trace(trace, decode_time, client_trace)
+        if statslog.debug_enabled:
+            statslog("packet decoding sequence %s for window %s: %sx%s took %.1fms",
+                          damage_packet_sequence, self.wid, width, height, decode_time/1000.0)
         if decode_time>0:
             self.statistics.client_decode_time.append((monotonic_time(), width*height, decode_time))
+            if METRICS:
+                #the decode time is in microseconds:
+                CLIENT_DECODE_TIME.observe(decode_time/1000000)
         elif decode_time<0:
             self.client_decode_error(decode_time, message)
         pending = self.statistics.damage_ack_pending.pop(damage_packet_sequence, None)
@@ -2348,6 +2411,8 @@ class WindowSource(WindowIconSource):
     def client_decode_error(self, error, message):
         #don't print error code -1, which is just a generic code for error
         emsg = {-1 : ""}.get(error, error)
+        if METRICS:
+            DECODE_ERRORS.inc()
         def s(v):
             try:
                 return (v or b"").decode("utf8")
@@ -2381,6 +2446,29 @@ class WindowSource(WindowIconSource):
         return False
 
 
+    def complete_trace(self, trace, decode_time, client_trace):
+        now = monotonic_time()
+        sent_at = max((span[3] for span in trace.spans), default=0)
+        if decode_time<0:
+            trace.args["decode-error"] = True
+        trace.span("ack", "network", sent_at, now)
+        if client_trace:
+            #we don't share a clock with the client,
+            #so we place its spans just before the ack was sent back to us,
+            #which we estimate using the lowest network latency measured:
+            ctrace = typedict(client_trace)
+            decode = ctrace.intget("decode")/1000000
+            paint = ctrace.intget("paint")/1000000
+            gs = self.global_statistics
+            netlatency = (gs.min_client_latency or 0)/2 if gs else 0
+            paint_end = max(sent_at, now-netlatency)
+            paint_start = max(sent_at, paint_end-paint)
+            decode_start = max(sent_at, paint_start-decode)
+            trace.span("decode", "client", decode_start, paint_start)
+            trace.span("paint", "client", paint_start, paint_end)
+        tracer.record(trace)
+
+
     def make_data_packet(self, damage_time, process_damage_time, image, coding, sequence, options, flush):
         """
             Picture encoding - non-UI thread.
@@ -2409,7 +2497,8 @@ class WindowSource(WindowIconSource):
         #more useful is the actual number of bytes (assuming 32bpp)
         #since we generally don't send the padding with it:
         psize = w*h*4
-        log("make_data_packet: image=%s, damage data: %s", image, (self.wid, x, y, w, h, coding))
+        if log.debug_enabled:
+            log("make_data_packet: image=%s, damage data: %s", image, (self.wid, x, y, w, h, coding))
         start = monotonic_time()
 
         #by default, don't set rowstride (the container format will take care of providing it):
@@ -2453,9 +2542,15 @@ class WindowSource(WindowIconSource):
             client_options['damage_time'] = int(damage_time * 1000)
             client_options['process_damage_time'] = int(process_damage_time * 1000)
             client_options['damage_packet_time'] = int(end * 1000)
-        compresslog("compress: %5.1fms for %4ix%-4i pixels at %4i,%-4i for wid=%-5i using %9s with ratio %5.1f%%  (%5iKB to %5iKB), sequence %5i, client_options=%s",
-                 (end-start)*1000.0, outw, outh, x, y, self.wid, coding, 100.0*csize/psize, psize//1024, csize//1024, self._damage_packet_sequence, client_options)
+        if compresslog.debug_enabled:
+            compresslog("compress: %5.1fms for %4ix%-4i pixels at %4i,%-4i for wid=%-5i using %9s with ratio %5.1f%%  (%5iKB to %5iKB), sequence %5i, client_options=%s",
+                     (end-start)*1000.0, outw, outh, x, y, self.wid, coding, 100.0*csize/psize, psize//1024, csize//1024, self._damage_packet_sequence, client_options)
         self.statistics.encoding_stats.append((end, coding, w*h, bpp, csize, end-start))
+        if METRICS:
+            FRAMES.inc(1, coding)
+            ENCODED_PIXELS.inc(w*h, coding)
+            ENCODED_BYTES.inc(csize, coding)
+            ENCODE_TIME.observe(end-start, coding)
         return self.make_draw_packet(x, y, outw, outh, coding, data, outstride, client_options, options)
 
     def make_draw_packet(self, x, y, outw, outh, coding, data, outstride, client_options, options):
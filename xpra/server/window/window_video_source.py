@@ -22,6 +22,9 @@ from xpra.rectangle import rectangle, merge_all          #@UnresolvedImport
 from xpra.server.window.motion import ScrollData                    #@UnresolvedImport
 from xpra.server.window.video_subregion import VideoSubregion, VIDEO_SUBREGION
 from xpra.server.window.video_scoring import get_pipeline_score
+from xpra.server.window.frame_trace import tracer
+from xpra.server.window.video_pool import ContextPool, get_csc_key
+from xpra.server.window.video_calibration import calibration, get_encoder_key
 from xpra.codecs.codec_constants import PREFERRED_ENCODING_ORDER, EDGE_ENCODING_ORDER
 from xpra.codecs.loader import has_codec
 from xpra.util import parse_scaling_value, engs, envint, envbool, csv, roundup, print_nested_dict, first_time, typedict
@@ -91,6 +94,15 @@ DEBUG_VIDEO_CLEAN = envbool("XPRA_DEBUG_VIDEO_CLEAN", False)
 FORCE_AV_DELAY = envint("XPRA_FORCE_AV_DELAY", 0)
 B_FRAMES = envbool("XPRA_B_FRAMES", True)
 VIDEO_SKIP_EDGE = envbool("XPRA_VIDEO_SKIP_EDGE", False)
+#align the video area to a coarser size (must be a power of 2),
+#so that small size changes can keep using the same video pipeline,
+#the edges are sent using the edge encoding:
+VIDEO_ALIGN = envint("XPRA_VIDEO_ALIGN", 0)
+if VIDEO_ALIGN>1 and VIDEO_ALIGN & (VIDEO_ALIGN-1):
+    log.warn("Warning: invalid value for 'XPRA_VIDEO_ALIGN'")
+    log.warn(" %i is not a power of 2", VIDEO_ALIGN)
+    VIDEO_ALIGN = 0
+VIDEO_ALIGN_MASK = (0xFFFF & ~(VIDEO_ALIGN-1)) if VIDEO_ALIGN>1 else 0xFFFF
 SCROLL_MIN_PERCENT = max(1, min(100, envint("XPRA_SCROLL_MIN_PERCENT", 50)))
 MIN_SCROLL_IMAGE_SIZE = envint("XPRA_MIN_SCROLL_IMAGE_SIZE", 128)
 
@@ -130,6 +142,11 @@ class WindowVideoSource(WindowSource):
         self._csc_encoder = None
         self._video_encoder = None
         self._last_pipeline_check = 0
+        self.csc_pool = ContextPool()
+        self.csc_pool_timer = None
+        self.pipeline_hits = 0
+        self.pipeline_misses = 0
+        self.last_pipeline_input = None
         if has_codec("csc_libyuv"):
             #need libyuv to be able to handle 'grayscale' video:
             #(to convert ARGB to grayscale)
@@ -248,6 +265,12 @@ class WindowVideoSource(WindowSource):
                      "min-percent"  : self.scroll_min_percent,
                      }
                  }
+        einfo["pipeline_pool"] = {
+            "csc"       : self.csc_pool.get_info(),
+            "align"     : VIDEO_ALIGN,
+            "hits"      : self.pipeline_hits,
+            "misses"    : self.pipeline_misses,
+            }
         if self._last_pipeline_check>0:
             einfo["pipeline_last_check"] = int(1000*(monotonic_time()-self._last_pipeline_check))
         lps = self.last_pipeline_scores
@@ -286,6 +309,9 @@ class WindowVideoSource(WindowSource):
                                       "height"  : enc_height,
                                       },
                }
+        cinfo = calibration.get_spec_info(get_encoder_key(specinfo(encoder_spec), encoder_spec.encoding))
+        if cinfo:
+            pi["encoder"]["calibration"] = cinfo
         if csc_spec:
             pi["csc"] = {
                          ""         : specinfo(csc_spec),
@@ -293,6 +319,9 @@ class WindowVideoSource(WindowSource):
                          "width"    : csc_width,
                          "height"   : csc_height,
                          }
+            cinfo = calibration.get_spec_info(specinfo(csc_spec))
+            if cinfo:
+                pi["csc"]["calibration"] = cinfo
         else:
             pi["csc"] = "None"
         return pi
@@ -307,6 +336,7 @@ class WindowVideoSource(WindowSource):
     def cleanup(self):
         super().cleanup()
         self.cleanup_codecs()
+        calibration.save()
 
     def cleanup_codecs(self):
         """ Video encoders (x264, nvenc and vpx) and their csc helpers
@@ -315,13 +345,16 @@ class WindowVideoSource(WindowSource):
             (the encoder and csc module may be in use by that thread)
         """
         self.cancel_video_encoder_flush()
-        self.video_context_clean()
+        self.cancel_csc_pool_timer()
+        self.video_context_clean(False)
 
-    def video_context_clean(self):
-        """ Calls clean() from the encode thread """
+    def video_context_clean(self, pool=True):
+        """ Calls clean() from the encode thread,
+            when 'pool' is False, the idle csc contexts are also freed
+        """
         csce = self._csc_encoder
         ve = self._video_encoder
-        if csce or ve:
+        if csce or ve or (not pool and self.csc_pool.contexts):
             if DEBUG_VIDEO_CLEAN:
                 log.warn("video_context_clean() for wid %i: %s and %s", self.wid, csce, ve)
                 import traceback
@@ -333,11 +366,46 @@ class WindowVideoSource(WindowSource):
                     log.warn("video_context_clean() done")
                 self.csc_clean(csce)
                 self.ve_clean(ve)
+                if not pool:
+                    self.cancel_csc_pool_timer()
+                    for x in self.csc_pool.clear():
+                        x.clean()
             self.call_in_encode_thread(False, clean)
 
     def csc_clean(self, csce):
+        """ Parks the csc context in the pool, so it can be re-used by the next pipeline """
         if csce:
-            csce.clean()
+            key = get_csc_key(csce.get_type(), csce.get_src_format(), csce.get_src_width(), csce.get_src_height(),
+                              csce.get_dst_format(), csce.get_dst_width(), csce.get_dst_height())
+            for x in self.csc_pool.put(key, csce):
+                x.clean()
+            self.schedule_csc_pool_timer()
+
+    def expire_csc_pool(self):
+        """ frees the idle csc contexts that have timed out, from the encode thread """
+        for x in self.csc_pool.expire():
+            x.clean()
+
+    def cancel_csc_pool_timer(self):
+        cpt = self.csc_pool_timer
+        if cpt:
+            self.csc_pool_timer = None
+            self.source_remove(cpt)
+
+    def schedule_csc_pool_timer(self):
+        #the pool only expires contexts when it is used,
+        #so we need a timer to free the ones left over when the window stops updating:
+        if not self.csc_pool_timer:
+            delay = self.csc_pool.get_expire_delay()
+            if delay>=0:
+                self.csc_pool_timer = self.timeout_add(delay+100, self.csc_pool_timeout)
+
+    def csc_pool_timeout(self):
+        self.csc_pool_timer = None
+        def expire():
+            self.expire_csc_pool()
+            self.schedule_csc_pool_timer()
+        self.call_in_encode_thread(False, expire)
 
     def ve_clean(self, ve):
         self.cancel_video_encoder_timer()
@@ -413,6 +481,9 @@ class WindowVideoSource(WindowSource):
                 self.edge_encoding = [x for x in EDGE_ENCODING_ORDER if x in self.non_video_encodings][0]
             except IndexError:
                 self.edge_encoding = None
+        if self.edge_encoding:
+            self.width_mask &= VIDEO_ALIGN_MASK
+            self.height_mask &= VIDEO_ALIGN_MASK
         log("do_set_client_properties(%s) full_csc_modes=%s, video_subregion=%s, non_video_encodings=%s, edge_encoding=%s, scaling_control=%s",
             properties, self.full_csc_modes, self.video_subregion.supported, self.non_video_encodings, self.edge_encoding, self.scaling_control)
 
@@ -902,6 +973,9 @@ class WindowVideoSource(WindowSource):
         h = image.get_height()
         if self.send_window_size:
             options["window-size"] = self.window_dimensions
+        if tracer.sample:
+            options = dict(options)
+            options["trace-capture"] = rgb_request_time
 
         av_delay = self.get_frame_encode_delay(options)
         #TODO: encode delay can be derived rather than hard-coded
@@ -913,8 +987,9 @@ class WindowVideoSource(WindowSource):
         #   (the xshm backing may change from underneath us if we don't freeze it)
         video_mode = coding in self.video_encodings or coding=="auto"
         must_freeze = av_delay>0 or (video_mode and not image.is_thread_safe())
-        log("process_damage_region: av_delay=%s, must_freeze=%s, size=%s, encoding=%s",
-            av_delay, must_freeze, (w, h), coding)
+        if log.debug_enabled:
+            log("process_damage_region: av_delay=%s, must_freeze=%s, size=%s, encoding=%s",
+                av_delay, must_freeze, (w, h), coding)
         if must_freeze:
             image.freeze()
         def call_encode(ew, eh, eimage, encoding, eflush):
@@ -924,8 +999,9 @@ class WindowVideoSource(WindowSource):
                 log("call_encode: dropping damage request with sequence=%s", sequence)
                 return
             now = monotonic_time()
-            log("process_damage_region: wid=%i, sequence=%i, adding pixel data to encode queue (%4ix%-4i - %5s), elapsed time: %3.1f ms, request time: %3.1f ms, frame delay=%3ims",
-                    self.wid, sequence, ew, eh, encoding, 1000*(now-damage_time), 1000*(now-rgb_request_time), av_delay)
+            if log.debug_enabled:
+                log("process_damage_region: wid=%i, sequence=%i, adding pixel data to encode queue (%4ix%-4i - %5s), elapsed time: %3.1f ms, request time: %3.1f ms, frame delay=%3ims",
+                        self.wid, sequence, ew, eh, encoding, 1000*(now-damage_time), 1000*(now-rgb_request_time), av_delay)
             item = (ew, eh, damage_time, now, eimage, encoding, sequence, options, eflush)
             if av_delay<=0:
                 self.call_in_encode_thread(True, self.make_data_packet_cb, *item)
@@ -942,7 +1018,7 @@ class WindowVideoSource(WindowSource):
                 w = w & self.width_mask
             if dh>0 and w>0:
                 sub = image.get_sub_image(0, h-dh, w, dh)
-                call_encode(dw, h, sub, self.edge_encoding, flush+1)
+                call_encode(w, dh, sub, self.edge_encoding, flush+1)
                 h = h & self.height_mask
         #the main area:
         if w>0 and h>0:
@@ -1292,6 +1368,13 @@ class WindowVideoSource(WindowSource):
                  (encodings, width, height, src_format), target_s, min_s, target_q, min_q)
         vmw, vmh = self.video_max_size
         ffps = self.get_video_fps(width, height)
+        if calibration.enabled:
+            #all the candidates must be scaled against the same set of codecs:
+            calibration.register_specs(
+                tuple(spec for encoding in encodings
+                      for specs in vh.get_encoder_specs(encoding).values() for spec in specs),
+                tuple(spec for specs in vh.get_csc_specs(src_format).values() for spec in specs),
+                )
         scores = []
         for encoding in encodings:
             #these are the CSC modes the client can handle for this encoding:
@@ -1341,7 +1424,7 @@ class WindowVideoSource(WindowSource):
                     score_data = get_pipeline_score(enc_in_format, csc_spec, encoder_spec, width, height, scaling,
                                                     target_q, min_q, target_s, min_s,
                                                     self._csc_encoder, self._video_encoder,
-                                                    score_delta, ffps, detection)
+                                                    score_delta, ffps, detection, calibration)
                     if score_data:
                         scores.append(score_data)
                     else:
@@ -1593,7 +1676,13 @@ class WindowVideoSource(WindowSource):
         else:
             encodings = [encoding]
         if self.do_check_pipeline(encodings, width, height, src_format):
+            if self.last_pipeline_input!=(width, height, src_format):
+                #the input has changed but we can keep the same pipeline:
+                self.last_pipeline_input = (width, height, src_format)
+                self.pipeline_hits += 1
             return True  #OK!
+        self.last_pipeline_input = (width, height, src_format)
+        self.pipeline_misses += 1
 
         videolog("check_pipeline%s setting up a new pipeline as check failed - encodings=%s",
                  (encoding, width, height, src_format), encodings)
@@ -1741,13 +1830,21 @@ class WindowVideoSource(WindowSource):
             #csc speed is not very important compared to encoding speed,
             #so make sure it never degrades quality
             csc_speed = min(speed, 100-quality/2.0)
-            csc_start = monotonic_time()
-            csce = csc_spec.make_instance()
-            csce.init_context(csc_width, csc_height, src_format,
-                                   enc_width, enc_height, enc_in_format, csc_speed)
-            csc_end = monotonic_time()
-            csclog("setup_pipeline: csc=%s, info=%s, setup took %.2fms",
-                  csce, csce.get_info(), (csc_end-csc_start)*1000.0)
+            csc_key = get_csc_key(csc_spec.codec_type, src_format, csc_width, csc_height,
+                                  enc_in_format, enc_width, enc_height)
+            self.expire_csc_pool()
+            csce = self.csc_pool.take(csc_key)
+            if csce:
+                csclog("setup_pipeline: re-using csc=%s", csce)
+            else:
+                csc_start = monotonic_time()
+                csce = csc_spec.make_instance()
+                csce.init_context(csc_width, csc_height, src_format,
+                                       enc_width, enc_height, enc_in_format, csc_speed)
+                csc_end = monotonic_time()
+                calibration.record_setup(csc_spec.codec_type, csc_end-csc_start)
+                csclog("setup_pipeline: csc=%s, info=%s, setup took %.2fms",
+                      csce, csce.get_info(), (csc_end-csc_start)*1000.0)
         else:
             csce = None
             #use the encoder's mask directly since that's all we have to worry about!
@@ -1761,6 +1858,9 @@ class WindowVideoSource(WindowSource):
             if encoder_scaling!=(1,1) and not encoder_spec.can_scale:
                 videolog("scaling is now enabled, so skipping %s", encoder_spec)
                 return False
+        if self.edge_encoding:
+            width_mask &= VIDEO_ALIGN_MASK
+            height_mask &= VIDEO_ALIGN_MASK
         self._csc_encoder = csce
         enc_start = monotonic_time()
         #FIXME: filter dst_formats to only contain formats the encoder knows about?
@@ -1781,6 +1881,7 @@ class WindowVideoSource(WindowSource):
         self.max_w = max_w
         self.max_h = max_h
         enc_end = monotonic_time()
+        calibration.record_setup(get_encoder_key(encoder_spec.codec_type, encoder_spec.encoding), enc_end-enc_start)
         self.start_video_frame = 0
         self._video_encoder = ve
         videolog("setup_pipeline: csc=%s, video encoder=%s, info: %s, setup took %.2fms",
@@ -2272,6 +2373,9 @@ class WindowVideoSource(WindowSource):
             return None
         data, client_options = ret
         end = monotonic_time()
+        if data:
+            calibration.record_encode(get_encoder_key(ve.get_type(), ve.get_encoding()),
+                                      enc_width*enc_height, end-start, speed, len(data), quality)
 
         #populate client options:
         frame = client_options.get("frame", 0)
@@ -2441,6 +2545,7 @@ class WindowVideoSource(WindowSource):
         start = monotonic_time()
         csc_image = csce.convert_image(image)
         end = monotonic_time()
+        calibration.record_encode(csce.get_type(), width*height, end-start, self._current_speed)
         csclog("csc_image(%s, %s, %s) converted to %s in %.1fms, %6.1f MPixels/s",
                         image, width, height,
                         csc_image, (1000.0*end-1000.0*start), (width*height/(end-start+0.000001)/1024.0/1024.0))
@@ -32,6 +32,15 @@ MS_TO_NS = 1000000
 
 GST_FLOW_OK = 0     #Gst.FlowReturn.OK
 
+#bundle the small encoded frames under this latency budget (in ms):
+BUNDLE_DELAY = max(0, envint("XPRA_SOUND_BUNDLE_DELAY", 20))
+BUNDLE_MAX_FRAMES = max(1, envint("XPRA_SOUND_BUNDLE_MAX_FRAMES", 8))
+#opus in-band forward error correction,
+#only used if both ends enable it:
+OPUS_FEC = envbool("XPRA_SOUND_OPUS_FEC", False)
+#the expected packet loss, which determines how much redundancy the encoder adds:
+OPUS_FEC_LOSS = max(1, min(100, envint("XPRA_SOUND_OPUS_FEC_LOSS", 10)))
+
 
 QUEUE_LEAK = envint("XPRA_SOUND_QUEUE_LEAK", GST_QUEUE_LEAK_DEFAULT)
 if QUEUE_LEAK not in (GST_QUEUE_NO_LEAK, GST_QUEUE_LEAK_UPSTREAM, GST_QUEUE_LEAK_DOWNSTREAM):
@@ -306,6 +315,20 @@ def get_encoder_default_options(encoder):
     options.update(ENCODER_DEFAULT_OPTIONS.get(enc, {}))
     return options
 
+def get_fec_encoder_options(codec):
+    """ in-band forward error correction, only supported with opus """
+    if not OPUS_FEC or codec.split("+")[0]!=OPUS:
+        return {}
+    return {
+        "inband-fec"                : 1,
+        "packet-loss-percentage"    : OPUS_FEC_LOSS,
+        }
+
+def get_fec_decoder_options(codec):
+    if not OPUS_FEC or codec.split("+")[0]!=OPUS:
+        return {}
+    return {"use-inband-fec" : 1}
+
 
 CODECS = None
 ENCODERS = {}       #(encoder, payloader, stream-compressor)
@@ -0,0 +1,132 @@
+# This file is part of Xpra.
+# Copyright (C) 2021 Antoine Martin <antoine@xpra.org>
+# Xpra is released under the terms of the GNU GPL v2, or, at your option, any
+# later version. See the file COPYING for details.
+
+"""
+Jitter buffer controller for the sound sink.
+
+The sender timestamps each buffer just before emitting it ("time" metadata),
+so the difference between the arrival time and this timestamp
+is the transit time plus an unknown (but constant) clock offset.
+Subtracting the smallest transit time seen recently leaves us with
+the extra delay of each buffer, which is what the queue has to absorb.
+The network jitter measured by the connection (ping round trip variance)
+is added on top, so we can react before the queue runs dry.
+"""
+
+import math
+from collections import deque
+
+from xpra.util import envint
+from xpra.simple_stats import get_list_stats
+from xpra.log import Logger
+
+log = Logger("sound")
+
+#how many buffers we need before we start adjusting the queue:
+JITTER_MIN_SAMPLES = max(2, envint("XPRA_SOUND_JITTER_MIN_SAMPLES", 20))
+#how many seconds of history we use:
+JITTER_WINDOW = max(1, envint("XPRA_SOUND_JITTER_WINDOW", 10))
+#the percentile of the extra delay we want the queue to cover:
+JITTER_PERCENTILE = max(50, min(100, envint("XPRA_SOUND_JITTER_PERCENTILE", 95)))
+#bounds for the queue min level in ms:
+JITTER_MIN_LEVEL = max(0, envint("XPRA_SOUND_JITTER_MIN_LEVEL", 20))
+JITTER_MAX_LEVEL = max(JITTER_MIN_LEVEL, envint("XPRA_SOUND_JITTER_MAX_LEVEL", 800))
+#the gap between the min level and the max level in ms:
+JITTER_HEADROOM = max(50, envint("XPRA_SOUND_JITTER_HEADROOM", 100))
+
+
+def percentile(svalues, pct : int):
+    """ nearest-rank percentile of a sorted sequence """
+    if not svalues:
+        return 0
+    index = max(0, math.ceil(len(svalues)*pct/100)-1)
+    return svalues[min(index, len(svalues)-1)]
+
+
+class JitterBuffer:
+
+    def __init__(self):
+        #(arrival time, transit time in ms):
+        self.transit = deque(maxlen=1000)
+        #capture latency reported by the source, in ms:
+        self.source_latency = deque(maxlen=100)
+        #RFC 3550 style running estimate of the interarrival jitter:
+        self.jitter = 0.0
+        self.network_jitter = 0
+        self.last_transit = None
+
+    def __repr__(self):
+        return "JitterBuffer(%i)" % len(self.transit)
+
+    def reset(self):
+        self.transit.clear()
+        self.source_latency.clear()
+        self.jitter = 0.0
+        self.last_transit = None
+
+    def record(self, now : float, metadata):
+        """ records the arrival of a buffer using its metadata """
+        send_time = metadata.get("time")
+        if send_time is None:
+            return
+        transit = now*1000-send_time
+        if self.last_transit is not None:
+            self.jitter += (abs(transit-self.last_transit)-self.jitter)/16
+        self.last_transit = transit
+        self.transit.append((now, transit))
+        latency = metadata.get("latency")
+        if latency is not None and latency>=0:
+            self.source_latency.append(latency)
+
+    def set_network_jitter(self, jitter : int):
+        """ the round trip time variation of the connection, in ms """
+        self.network_jitter = max(0, int(jitter))
+
+    def get_delays(self, now : float):
+        """ the extra delay of each buffer received within the window, in ms """
+        transit = tuple(v for t, v in tuple(self.transit) if now-t<=JITTER_WINDOW)
+        if not transit:
+            return ()
+        base = min(transit)
+        return tuple(v-base for v in transit)
+
+    def get_target(self, now : float):
+        """
+            returns the min-threshold-time and max-size-time we want for the queue,
+            or None if we don't have enough data yet
+        """
+        delays = sorted(self.get_delays(now))
+        if len(delays)<JITTER_MIN_SAMPLES:
+            return None
+        #the one-way variation is roughly half the round trip variation,
+        #but it is only sampled every few seconds, so count it all:
+        level = percentile(delays, JITTER_PERCENTILE) + self.network_jitter
+        min_level = int(max(JITTER_MIN_LEVEL, min(JITTER_MAX_LEVEL, level)))
+        #leave enough room above the min level for the bursts:
+        spread = percentile(delays, 100)-percentile(delays, 50)
+        max_level = min_level + max(JITTER_HEADROOM, int(spread))
+        return min_level, max_level
+
+    def get_info(self, now : float) -> dict:
+        info = {
+            "jitter"            : int(self.jitter),
+            "network-jitter"    : self.network_jitter,
+            }
+        delays = self.get_delays(now)
+        if delays:
+            dinfo = get_list_stats(delays, show_percentile=(5, 9))
+            svalues = sorted(delays)
+            for pct in (95, 99):
+                dinfo["%ip" % pct] = int(percentile(svalues, pct))
+            info["delay"] = dinfo
+        if self.source_latency:
+            info["source-latency"] = get_list_stats(self.source_latency, show_percentile=(5, 9))
+        target = self.get_target(now)
+        if target:
+            info["target"] = {
+                "min"   : target[0],
+                "max"   : target[1],
+                }
+        return info
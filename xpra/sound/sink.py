@@ -10,6 +10,7 @@ from threading import Lock
 from gi.repository import GObject
 
 from xpra.sound.sound_pipeline import SoundPipeline
+from xpra.sound.jitter_buffer import JitterBuffer
 from xpra.gtk_common.gobject_util import one_arg_signal
 from xpra.sound.gstreamer_util import (
     plugin_str, get_decoder_elements, has_plugins,
@@ -49,6 +50,8 @@ MARGIN = max(0, min(200, envint("XPRA_SOUND_MARGIN", 50)))
 #how high we push up the min-level to prevent underruns:
 UNDERRUN_MIN_LEVEL = max(0, envint("XPRA_SOUND_UNDERRUN_MIN_LEVEL", 150))
 CLOCK_SYNC = envbool("XPRA_CLOCK_SYNC", False)
+#set the queue levels from the measured jitter:
+JITTER_BUFFER = envbool("XPRA_SOUND_JITTER_BUFFER", True)
 
 
 GST_FORMAT_BYTES = 2
@@ -104,6 +107,9 @@ class SoundSink(SoundPipeline):
         self.last_max_update = monotonic_time()
         self.last_min_update = monotonic_time()
         self.level_lock = Lock()
+        self.jitter_buffer = JitterBuffer() if JITTER_BUFFER else None
+        #the min level set from the jitter target:
+        self.jitter_level = 0
         pipeline_els = []
         appsrc_el = ["appsrc",
                      #"do-timestamp=1",
@@ -232,7 +238,7 @@ class SoundSink(SoundPipeline):
             qmin = self.queue.get_property("min-threshold-time")//MS_TO_NS
             clt = self.queue.get_property("current-level-time")//MS_TO_NS
             gstlog("queue_underrun level=%3i, min=%3i", clt, qmin)
-            if qmin==0 and clt<10:
+            if qmin<=self.jitter_level and clt<10:
                 self.last_underrun = now
                 self.refill = True
                 self.set_max_level()
@@ -268,6 +274,17 @@ class SoundSink(SoundPipeline):
         self.overruns += 1
         return True
 
+    def set_network_jitter(self, jitter):
+        jb = self.jitter_buffer
+        if jb:
+            jb.set_network_jitter(jitter)
+
+    def get_jitter_target(self, now):
+        jb = self.jitter_buffer
+        if not jb:
+            return None
+        return jb.get_target(now)
+
     def set_min_level(self):
         if not self.queue:
             return
@@ -278,16 +295,20 @@ class SoundSink(SoundPipeline):
         if elapsed<1:
             #not more than once a second
             return
+        #need to have a gap between min and max,
+        #so we cannot go higher than mst-50:
+        mst = self.queue.get_property("max-size-time")//MS_TO_NS
+        jtarget = self.get_jitter_target(now)
+        #keep enough data queued to absorb the jitter we have measured:
+        jmin = min(mst-50, jtarget[0]) if jtarget else 0
         if self.refill:
-            #need to have a gap between min and max,
-            #so we cannot go higher than mst-50:
-            mst = self.queue.get_property("max-size-time")//MS_TO_NS
-            mrange = max(lrange+100, UNDERRUN_MIN_LEVEL)
+            mrange = max(lrange+100, UNDERRUN_MIN_LEVEL, jmin)
             mtt = min(mst-50, mrange)
             gstlog("set_min_level mtt=%3i, max-size-time=%3i, lrange=%s, mrange=%s (UNDERRUN_MIN_LEVEL=%s)",
                    mtt, mst, lrange, mrange, UNDERRUN_MIN_LEVEL)
         else:
-            mtt = 0
+            mtt = max(0, jmin)
+        self.jitter_level = max(0, jmin)
         cmtt = self.queue.get_property("min-threshold-time")//MS_TO_NS
         if cmtt==mtt:
             return
@@ -321,6 +342,10 @@ class SoundSink(SoundPipeline):
         #use this last_overrun percentage value to temporarily decrease the target
         #(causes overruns that drop packets and lower the buffer level)
         target_mst = max(50, int(target_mst - pct*lrange//100))
+        jtarget = self.get_jitter_target(now)
+        if jtarget:
+            #make room for the jitter we have measured:
+            target_mst = max(target_mst, jtarget[1])
         mst = (cmst + target_mst)//2
         if self.refill:
             #temporarily raise max level during underruns,
@@ -366,6 +391,9 @@ class SoundSink(SoundPipeline):
                              "underruns"    : self.underruns,
                              "state"        : self.queue_state,
                              }
+            jb = self.jitter_buffer
+            if jb:
+                info["queue"]["jitter"] = jb.get_info(monotonic_time())
         info["sink"] = self.get_element_properties(
             self.sink,
             "buffer-time", "latency-time",
@@ -405,6 +433,8 @@ class SoundSink(SoundPipeline):
         if not self.can_push_buffer():
             return
         data = self.uncompress_data(data, metadata)
+        if metadata and self.jitter_buffer:
+            self.jitter_buffer.record(monotonic_time(), metadata)
         for x in packet_metadata:
             self.do_add_data(x)
         if self.do_add_data(data, metadata):
@@ -0,0 +1,131 @@
+# This file is part of Xpra.
+# Copyright (C) 2021 Antoine Martin <antoine@xpra.org>
+# Xpra is released under the terms of the GNU GPL v2, or, at your option, any
+# later version. See the file COPYING for details.
+
+"""
+Shared memory ring buffer for passing the sample data
+from the sound subprocess to its parent,
+so that only the small control messages go through the pipe.
+
+The parent creates the file and passes its name to the subprocess,
+the subprocess writes the buffers using 'mmap_write'
+and tells the parent where to find them,
+the parent copies them out using 'mmap_read', which frees the space.
+"""
+
+import os
+import mmap
+import tempfile
+
+from xpra.util import roundup, envint, envbool
+from xpra.os_util import POSIX, shellsub
+from xpra.net.mmap_pipe import mmap_read, mmap_write
+from xpra.platform.paths import get_mmap_dir
+from xpra.log import Logger
+
+log = Logger("sound", "mmap")
+
+SOUND_MMAP = envbool("XPRA_SOUND_MMAP", POSIX)
+SOUND_MMAP_SIZE = max(64*1024, envint("XPRA_SOUND_MMAP_SIZE", 1024*1024))
+#the environment variable used for passing the filename to the subprocess:
+SOUND_MMAP_ENV = "XPRA_SOUND_MMAP_FILE"
+
+
+def get_sound_mmap_dir():
+    mmap_dir = get_mmap_dir()
+    if mmap_dir and POSIX:
+        subs = os.environ.copy()
+        subs.update({
+            "UID"   : os.getuid(),
+            "GID"   : os.getgid(),
+            "PID"   : os.getpid(),
+            })
+        mmap_dir = shellsub(mmap_dir, subs)
+        if not os.path.exists(mmap_dir):
+            try:
+                os.mkdir(mmap_dir, 0o700)
+            except OSError as e:
+                log("os.mkdir(%s) %s", mmap_dir, e)
+                return None
+    return mmap_dir
+
+
+class SoundBufferRing:
+
+    def __init__(self, mmap_area, size : int, filename : str, temp_file=None):
+        self.mmap_area = mmap_area
+        self.size = size
+        self.filename = filename
+        #only the parent holds the temporary file:
+        self.temp_file = temp_file
+        self.buffers = 0
+        self.bytes = 0
+        self.skipped = 0
+
+    def __repr__(self):
+        return "SoundBufferRing(%s)" % self.filename
+
+    @classmethod
+    def create(cls, size=SOUND_MMAP_SIZE):
+        #NamedTemporaryFile uses mkstemp, so only the current user can access it:
+        temp = tempfile.NamedTemporaryFile(prefix="xpra-sound.", suffix=".mmap", dir=get_sound_mmap_dir())
+        #add 8 bytes for the control header:
+        size = roundup(size+8, max(4096, mmap.PAGESIZE))
+        fd = temp.file.fileno()
+        os.ftruncate(fd, size)
+        mmap_area = mmap.mmap(fd, length=size)
+        log("created %s bytes sound mmap area '%s'", size, temp.name)
+        return cls(mmap_area, size, temp.name, temp)
+
+    @classmethod
+    def open(cls, filename : str):
+        with open(filename, "r+b") as f:
+            size = os.path.getsize(filename)
+            mmap_area = mmap.mmap(f.fileno(), size)
+        log("opened %s bytes sound mmap area '%s'", size, filename)
+        return cls(mmap_area, size, filename)
+
+    def get_info(self) -> dict:
+        return {
+            "file"      : self.filename,
+            "size"      : self.size,
+            "buffers"   : self.buffers,
+            "bytes"     : self.bytes,
+            "skipped"   : self.skipped,
+            }
+
+    def write(self, data):
+        """
+            Returns the list of chunks used, or None if the data does not fit,
+            in which case the caller should send it through the pipe.
+        """
+        if not isinstance(data, (bytes, memoryview)) or len(data)>self.size//4 or not self.mmap_area:
+            self.skipped += 1
+            return None
+        chunks, free = mmap_write(self.mmap_area, self.size, data)
+        if chunks is None:
+            log("sound mmap area is full: %i bytes free", free)
+            self.skipped += 1
+            return None
+        self.buffers += 1
+        self.bytes += len(data)
+        return chunks
+
+    def read(self, chunks) -> bytes:
+        #copy the data out so the writer can re-use the space:
+        data = mmap_read(self.mmap_area, *chunks)
+        self.buffers += 1
+        self.bytes += len(data)
+        return bytes(data)
+
+    def close(self):
+        mmap_area = self.mmap_area
+        if mmap_area:
+            self.mmap_area = None
+            mmap_area.close()
+        temp_file = self.temp_file
+        if temp_file:
+            self.temp_file = None
+            #this deletes the file:
+            temp_file.close()
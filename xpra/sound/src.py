@@ -7,6 +7,7 @@
 import sys
 import os.path
 from queue import Queue
+from threading import Lock
 from gi.repository import GObject
 
 from xpra.os_util import SIGNAMES, monotonic_time
@@ -20,7 +21,7 @@ from xpra.sound.gstreamer_util import (
     MP3, CODEC_ORDER, MUXER_DEFAULT_OPTIONS, ENCODER_NEEDS_AUDIOCONVERT,
     SOURCE_NEEDS_AUDIOCONVERT, ENCODER_CANNOT_USE_CUTTER, CUTTER_NEEDS_CONVERT,
     CUTTER_NEEDS_RESAMPLE, MS_TO_NS, GST_QUEUE_LEAK_DOWNSTREAM,
-    GST_FLOW_OK,
+    GST_FLOW_OK, BUNDLE_MAX_FRAMES,
     )
 from xpra.net.compression import compressed_wrapper
 from xpra.scripts.config import InitExit
@@ -40,6 +41,11 @@ LOG_CUTTER = envbool("XPRA_SOUND_LOG_CUTTER", False)
 CUTTER_THRESHOLD = envfloat("XPRA_CUTTER_THRESHOLD", "0.0001")
 CUTTER_PRE_LENGTH = envint("XPRA_CUTTER_PRE_LENGTH", 100)
 CUTTER_RUN_LENGTH = envint("XPRA_CUTTER_RUN_LENGTH", 1000)
+#frame bundling, see set_bundle(),
+#stop bundling once the per packet overhead is below 1/BUNDLE_OVERHEAD_RATIO of the payload:
+BUNDLE_OVERHEAD_RATIO = max(1, envint("XPRA_SOUND_BUNDLE_OVERHEAD_RATIO", 20))
+#packet header plus codec name and packet structure:
+PACKET_OVERHEAD = 32
 
 
 class SoundSource(SoundPipeline):
@@ -90,6 +96,18 @@ class SoundSource(SoundPipeline):
         self.min_timestamp = 0
         self.max_timestamp = 0
         self.pending_metadata = []
+        #frame bundling, disabled until set_bundle() is called:
+        self.bundle_delay = 0
+        self.bundle_max_frames = BUNDLE_MAX_FRAMES
+        self.bundle_frames = 0
+        self.bundle_size = 0
+        self.bundle_duration = 0
+        #the metadata of the last frame we are holding:
+        self.bundle_metadata = {}
+        self.bundle_timer = 0
+        self.bundle_lock = Lock()
+        self.bundled_frames = 0
+        self.bundled_packets = 0
         self.buffer_latency = True
         self.jitter_queue = None
         self.container_format = (fmt or "").replace("mux", "").replace("pay", "")
@@ -123,7 +141,9 @@ class SoundSource(SoundPipeline):
                 pipeline_els.append("audioresample")
         pipeline_els.append("volume name=volume volume=%s" % volume)
         if encoder:
-            encoder_str = plugin_str(encoder, codec_options or get_encoder_default_options(encoder))
+            options = get_encoder_default_options(encoder)
+            options.update(codec_options or {})
+            encoder_str = plugin_str(encoder, options)
             pipeline_els.append(encoder_str)
         if fmt:
             fmt_str = plugin_str(fmt, MUXER_DEFAULT_OPTIONS.get(fmt, {}))
@@ -181,6 +201,7 @@ class SoundSource(SoundPipeline):
         return "SoundSource('%s' - %s)" % (self.pipeline_str, self.state)
 
     def cleanup(self):
+        self.cancel_bundle_timer()
         super().cleanup()
         self.src_type = ""
         self.sink = None
@@ -198,6 +219,13 @@ class SoundSource(SoundPipeline):
                 v = self.src.get_property(x)
                 if v>=0:
                     info[x] = v
+        if self.bundle_delay>0:
+            info["bundle"] = {
+                "delay"         : self.bundle_delay,
+                "max-frames"    : self.bundle_max_frames,
+                "frames"        : self.bundled_frames,
+                "packets"       : self.bundled_packets,
+                }
         info["src"] = self.get_element_properties(
             self.src,
             "actual-buffer-time", "actual-latency-time",
@@ -262,7 +290,77 @@ class SoundSource(SoundPipeline):
         if pts==-1 and duration==-1 and BUNDLE_METADATA and len(self.pending_metadata)<10:
             self.pending_metadata.append(data)
             return GST_FLOW_OK
-        return self._emit_buffer(data, metadata)
+        with self.bundle_lock:
+            if self.bundle_buffer(data, duration, metadata):
+                return GST_FLOW_OK
+            return self._emit_buffer(data, metadata)
+
+
+    def set_bundle(self, delay, max_frames=BUNDLE_MAX_FRAMES):
+        """
+            Bundle the small encoded frames into the same packet,
+            as long as we don't delay them more than 'delay' milliseconds.
+            The frames are sent as 'packet_metadata', which the receiver
+            pushes to its pipeline before the main buffer.
+        """
+        log("set_bundle(%s, %s)", delay, max_frames)
+        self.bundle_delay = max(0, int(delay))
+        self.bundle_max_frames = max(1, int(max_frames))
+
+    def bundle_buffer(self, data, duration, metadata) -> bool:
+        """ returns True if the buffer has been added to the bundle """
+        if self.bundle_delay<=0 or duration<=0:
+            return False
+        frames = self.bundle_frames+1
+        size = self.bundle_size+len(data)
+        elapsed = self.bundle_duration+duration
+        #estimate of the per packet overhead, the metadata is serialized with each packet:
+        overhead = PACKET_OVERHEAD+len(str(metadata))
+        if frames>=self.bundle_max_frames or elapsed>=self.bundle_delay*MS_TO_NS or size>=overhead*BUNDLE_OVERHEAD_RATIO:
+            #this buffer completes the bundle:
+            if self.bundle_frames:
+                self.bundled_frames += frames
+                self.bundled_packets += 1
+                log("bundled %i frames: %i bytes, %ims", frames, size, elapsed//MS_TO_NS)
+            self.reset_bundle()
+            return False
+        if not self.bundle_frames and not self.bundle_timer:
+            #don't hold on to the frames if the stream pauses (ie: cutter):
+            self.bundle_timer = self.timeout_add(self.bundle_delay, self.flush_bundle)
+        self.bundle_frames = frames
+        self.bundle_size = size
+        self.bundle_duration = elapsed
+        self.bundle_metadata = metadata
+        self.pending_metadata.append(data)
+        return True
+
+    def reset_bundle(self):
+        self.bundle_frames = 0
+        self.bundle_size = 0
+        self.bundle_duration = 0
+        self.bundle_metadata = {}
+        self.cancel_bundle_timer()
+
+    def cancel_bundle_timer(self):
+        bt = self.bundle_timer
+        if bt:
+            self.bundle_timer = 0
+            self.source_remove(bt)
+
+    def flush_bundle(self):
+        with self.bundle_lock:
+            self.bundle_timer = 0
+            if not self.bundle_frames or not self.pending_metadata:
+                return False
+            log("flush_bundle() %i frames", self.bundle_frames)
+            self.bundled_frames += self.bundle_frames
+            self.bundled_packets += 1
+            #the last frame becomes the main buffer, with its own metadata:
+            metadata = self.bundle_metadata
+            self.reset_bundle()
+            data = self.pending_metadata.pop()
+            self._emit_buffer(data, metadata)
+        return False
 
     def _emit_buffer(self, data, metadata):
         if self.stream_compressor and data:
@@ -12,6 +12,7 @@ from xpra.sound.gstreamer_util import (
     import_gst, format_element_options,
     can_decode, can_encode, get_muxers, get_demuxers, get_all_plugin_names,
     )
+from xpra.sound.sound_mmap import SoundBufferRing, SOUND_MMAP, SOUND_MMAP_ENV
 from xpra.net.subprocess_wrapper import subprocess_caller, subprocess_callee, exec_kwargs, exec_env
 from xpra.platform.paths import get_sound_command
 from xpra.os_util import WIN32, OSX, POSIX, BITS, monotonic_time, bytestostr
@@ -125,15 +126,41 @@ class sound_record(sound_subprocess):
     def __init__(self, *pipeline_args):
         from xpra.sound.src import SoundSource
         sound_pipeline = SoundSource(*pipeline_args)
-        super().__init__(sound_pipeline, [], ["new-stream", "new-buffer"])
+        super().__init__(sound_pipeline, ["set_bundle"], ["new-stream"])
         self.large_packets = ["new-buffer"]
+        self.buffer_ring = None
+        mmap_filename = os.environ.get(SOUND_MMAP_ENV)
+        if mmap_filename:
+            try:
+                self.buffer_ring = SoundBufferRing.open(mmap_filename)
+            except OSError as e:
+                log("SoundBufferRing.open(%s)", mmap_filename, exc_info=True)
+                log.warn("Warning: cannot use the sound mmap area '%s'", mmap_filename)
+                log.warn(" %s", e)
+        sound_pipeline.connect("new-buffer", self.export_buffer)
+
+    def export_buffer(self, _sound_pipeline, data, metadata, packet_metadata):
+        #the sample data goes through the shared memory area if we can:
+        ring = self.buffer_ring
+        chunks = ring.write(data) if ring else None
+        if chunks:
+            self.send("new-buffer-mmap", chunks, metadata, packet_metadata)
+        else:
+            self.send("new-buffer", data, metadata, packet_metadata)
+
+    def cleanup(self):
+        super().cleanup()
+        ring = self.buffer_ring
+        if ring:
+            self.buffer_ring = None
+            ring.close()
 
 class sound_play(sound_subprocess):
     """ wraps SoundSink as a subprocess """
     def __init__(self, *pipeline_args):
         from xpra.sound.sink import SoundSink
         sound_pipeline = SoundSink(*pipeline_args)
-        super().__init__(sound_pipeline, ["add_data"], [])
+        super().__init__(sound_pipeline, ["add_data", "set_network_jitter"], [])
 
 
 def run_sound(mode, error_cb, options, args):
@@ -313,13 +340,21 @@ class sound_subprocess_wrapper(subprocess_caller):
 
 class source_subprocess_wrapper(sound_subprocess_wrapper):
 
-    def __init__(self, plugin, options, codecs, volume, element_options):
+    def __init__(self, plugin, options, codecs, volume, element_options, codec_options=None):
         super().__init__("audio capture")
         self.large_packets = ["new-buffer"]
+        self.buffer_ring = None
+        if SOUND_MMAP:
+            try:
+                self.buffer_ring = SoundBufferRing.create()
+            except OSError as e:
+                log("SoundBufferRing.create()", exc_info=True)
+                log.warn("Warning: failed to create the sound mmap area")
+                log.warn(" %s", e)
         self.command = get_full_sound_command()+[
             "_sound_record", "-", "-",
             plugin or "", format_element_options(element_options),
-            ",".join(codecs), "",
+            ",".join(codecs), format_element_options(codec_options or {}),
             str(volume),
             ]
         _add_debug_args(self.command)
@@ -333,17 +368,55 @@ class source_subprocess_wrapper(sound_subprocess_wrapper):
                 pass
         return "source_subprocess_wrapper(%s)" % proc
 
+    def get_env(self):
+        env = super().get_env()
+        ring = self.buffer_ring
+        if ring:
+            env[SOUND_MMAP_ENV] = ring.filename
+        return env
+
+    def get_info(self) -> dict:
+        info = super().get_info()
+        ring = self.buffer_ring
+        if ring:
+            info = dict(info)
+            info["mmap"] = ring.get_info()
+        return info
+
+    def process_packet(self, proto, packet):
+        if packet[0] in ("new-buffer-mmap", b"new-buffer-mmap"):
+            #runs in the network thread, so the space is freed as soon as possible:
+            chunks, metadata, packet_metadata = packet[1:4]
+            try:
+                data = self.buffer_ring.read(chunks)
+            except (AttributeError, TypeError, ValueError) as e:
+                #closed already?
+                log("failed to read %s from %s: %s", chunks, self.buffer_ring, e)
+                return
+            packet = ["new-buffer", data, metadata, packet_metadata]
+        super().process_packet(proto, packet)
+
+    def set_bundle(self, delay, max_frames):
+        self.send("set_bundle", int(delay), int(max_frames))
+
+    def stop(self):
+        super().stop()
+        ring = self.buffer_ring
+        if ring:
+            self.buffer_ring = None
+            ring.close()
+
 
 class sink_subprocess_wrapper(sound_subprocess_wrapper):
 
-    def __init__(self, plugin, codec, volume, element_options):
+    def __init__(self, plugin, codec, volume, element_options, codec_options=None):
         super().__init__("audio playback")
         self.large_packets = ["add_data"]
         self.codec = codec
         self.command = get_full_sound_command()+[
             "_sound_play", "-", "-",
             plugin or "", format_element_options(element_options),
-            codec, "",
+            codec, format_element_options(codec_options or {}),
             str(volume),
             ]
         _add_debug_args(self.command)
@@ -353,6 +426,9 @@ class sink_subprocess_wrapper(sound_subprocess_wrapper):
             log("add_data(%s bytes, %s, %s) forwarding to %s", len(data), metadata, len(packet_metadata), self.protocol)
         self.send("add_data", data, dict(metadata or {}), packet_metadata)
 
+    def set_network_jitter(self, jitter):
+        self.send("set_network_jitter", int(jitter))
+
     def __repr__(self):
         proc = self.process
         if proc:
@@ -363,9 +439,11 @@ class sink_subprocess_wrapper(sound_subprocess_wrapper):
         return "sink_subprocess_wrapper(%s)" % proc
 
 
-def start_sending_sound(plugins, sound_source_plugin, device, codec, volume, want_monitor_device, remote_decoders, remote_pulseaudio_server, remote_pulseaudio_id):
+def start_sending_sound(plugins, sound_source_plugin, device, codec, volume, want_monitor_device,
+                        remote_decoders, remote_pulseaudio_server, remote_pulseaudio_id, codec_options=None):
     log("start_sending_sound%s",
-        (plugins, sound_source_plugin, device, codec, volume, want_monitor_device, remote_decoders, remote_pulseaudio_server, remote_pulseaudio_id))
+        (plugins, sound_source_plugin, device, codec, volume, want_monitor_device,
+         remote_decoders, remote_pulseaudio_server, remote_pulseaudio_id, codec_options))
     try:
         #info about the remote end:
         PAInfo = namedtuple("PAInfo", "pulseaudio_server,pulseaudio_id,remote_decoders")
@@ -379,16 +457,16 @@ def start_sending_sound(plugins, sound_source_plugin, device, codec, volume, wan
         log("parsed '%s':", sound_source_plugin)
         log("plugin=%s", plugin)
         log("options=%s", options)
-        return source_subprocess_wrapper(plugin, options, remote_decoders, volume, options)
+        return source_subprocess_wrapper(plugin, options, remote_decoders, volume, options, codec_options)
     except Exception as e:
         log.error("error setting up sound: %s", e, exc_info=True)
         return None
 
 
-def start_receiving_sound(codec):
-    log("start_receiving_sound(%s)", codec)
+def start_receiving_sound(codec, codec_options=None):
+    log("start_receiving_sound(%s, %s)", codec, codec_options)
     try:
-        return sink_subprocess_wrapper(None, codec, 1.0, {})
+        return sink_subprocess_wrapper(None, codec, 1.0, {}, codec_options)
     except Exception:
         log.error("failed to start sound sink", exc_info=True)
         return None
@@ -199,6 +199,53 @@ def merge_dicts(a, b, path=None):
             a[key] = b[key]
     return a
 
+def dict_delta(old, new):
+    """
+        returns the values of 'new' which differ from 'old' (as a nested dict),
+        and the paths of the keys of 'old' which are missing from 'new'
+    """
+    changed = {}
+    removed = []
+    _dict_delta(old or {}, new, changed, removed, ())
+    return changed, removed
+
+def _dict_delta(old, new, changed, removed, path):
+    for k, v in new.items():
+        if k not in old:
+            changed[k] = v
+            continue
+        ov = old[k]
+        if isinstance(v, dict) and isinstance(ov, dict):
+            sub = {}
+            _dict_delta(ov, v, sub, removed, path+(k, ))
+            if sub:
+                changed[k] = sub
+        elif ov!=v or type(ov)!=type(v):
+            changed[k] = v
+    for k in old.keys():
+        if k not in new:
+            removed.append(path+(k, ))
+
+def apply_dict_delta(d, changed, removed=()):
+    """ updates 'd' using the values returned by dict_delta """
+    for path in removed:
+        node = d
+        for k in path[:-1]:
+            node = node.get(k)
+            if not isinstance(node, dict):
+                break
+        else:
+            node.pop(path[-1], None)
+    _apply_changed(d, changed)
+    return d
+
+def _apply_changed(d, changed):
+    for k, v in changed.items():
+        if isinstance(v, dict) and isinstance(d.get(k), dict):
+            _apply_changed(d[k], v)
+        else:
+            d[k] = v
+
 def make_instance(class_options, *args):
     log = get_util_logger()
     log("make_instance%s", tuple([class_options]+list(args)))